@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""Compare the ebuild daemon protocol versions.
+
+Measures transferring a synthetic env with the given number of variables to
+the daemon and round trips of helper commands run by an ebuild, using each
+protocol version in a separate process, reporting the fastest of all runs,
+e.g.:
+
+    benchmarks/ebd_protocol.py -v 500 -c 2000 src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+PROTOCOLS = (1, 2)
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per protocol (default: 3)"
+)
+argparser.add_argument(
+    "-v",
+    "--vars",
+    type=int,
+    default=200,
+    help="number of env variables (default: %(default)s)",
+)
+argparser.add_argument(
+    "-c",
+    "--commands",
+    type=int,
+    default=500,
+    help="number of helper command round trips (default: %(default)s)",
+)
+
+# run in a separate process per protocol, reporting the fastest runs
+CHILD = """
+import os, sys, tempfile, time
+from types import SimpleNamespace
+from pkgcore.ebuild import eclass_cache, ebd_ipc, processor, repo_objs, repository
+
+protocol, nvars, ncommands, runs = map(int, sys.argv[1:])
+
+class Join(ebd_ipc.IpcCommand):
+    def run(self, args):
+        return ",".join(args)
+
+env = {}
+for i in range(nvars):
+    if i % 10 == 0:
+        env[f"VAR{i}"] = tuple(f"value {i} {j}" for j in range(5))
+    else:
+        env[f"VAR{i}"] = f"value {i} " * (i % 20)
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    files = {
+        "profiles/repo_name": "test\\n",
+        "metadata/layout.conf": "masters =\\n",
+        "cat/a/a-1.ebuild": (
+            "EAPI=8\\nSLOT=0\\n"
+            f"for (( i = 0; i < {ncommands}; i++ )); do\\n"
+            '\\t__ebd_ipc_cmd join "" "${PV}" a "b c" >/dev/null\\n'
+            "done\\n"
+        ),
+    }
+    for path, data in files.items():
+        path = os.path.join(tmpdir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(data)
+    ec = eclass_cache.cache(os.path.join(tmpdir, "eclass"), location=tmpdir)
+    repo = repository.UnconfiguredTree(
+        tmpdir, eclass_cache=ec, repo_config=repo_objs.RepoConfig(tmpdir), cache=()
+    )
+    pkg = repo[("cat", "a", "1")]
+    join = Join(SimpleNamespace(pkg=pkg, observer=None))
+
+    ebp = processor.EbuildProcessor(False, False, protocol=protocol)
+    assert ebp.protocol == protocol
+    best_env = best_ipc = float("inf")
+    for _ in range(runs):
+        # envs can be sent repeatedly before processing starts
+        ebp.write("process_ebuild setup")
+        start = time.perf_counter()
+        for _ in range(10):
+            assert ebp.send_env(env)
+        best_env = min(best_env, (time.perf_counter() - start) / 10)
+        ebp.shutdown_processor()
+        ebp = processor.EbuildProcessor(False, False, protocol=protocol)
+
+        commands = {
+            "join": join,
+            "key": lambda ebp, line: None,
+            "metadata": lambda ebp, line: ebp._read_size(int(line)),
+        }
+        start = time.perf_counter()
+        ebp._ensure_metadata_paths(("/dev/null",))
+        ebp._run_depend_like_phase(
+            "gen_metadata", pkg, ec, env=ebp._metadata_env(pkg), extra_commands=commands
+        )
+        best_ipc = min(best_ipc, time.perf_counter() - start)
+    ebp.shutdown_processor()
+print(best_env, best_ipc / ncommands)
+"""
+
+
+def run(tree, protocol, options):
+    """Return the fastest env transfer and helper command times in seconds."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    args = (protocol, options.vars, options.commands, options.runs)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, *map(str, args)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return map(float, out.split())
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    print(f"{'protocol':<8}  {'env transfer':>12}  {'helper round trip':>17}")
+    for protocol in PROTOCOLS:
+        env_time, ipc_time = run(options.tree, protocol, options)
+        print(f"{protocol:<8}  {env_time * 1000:>9.2f} ms  {ipc_time * 1e6:>14.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Compare preloading eclasses per processor and via a shared snapshot.
+
+Generates a directory of synthetic eclasses and preloads all of them into
+the given number of freshly spawned ebuild processors, either sending each
+eclass to each processor separately or loading a snapshot shared by all
+processors, reporting the fastest of all runs, e.g.:
+
+    benchmarks/eclass_preload.py -p 16 -e 100 src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per mode (default: 3)"
+)
+argparser.add_argument(
+    "-p",
+    "--processors",
+    type=int,
+    default=8,
+    help="number of processors (default: %(default)s)",
+)
+argparser.add_argument(
+    "-e",
+    "--eclasses",
+    type=int,
+    default=50,
+    help="number of eclasses (default: %(default)s)",
+)
+
+# run in a separate process per mode, reporting the fastest run
+CHILD = """
+import os, sys, tempfile, time
+from pkgcore.ebuild import eclass_cache, processor
+
+mode, processors, eclasses, runs = sys.argv[1], *map(int, sys.argv[2:])
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    for i in range(eclasses):
+        with open(os.path.join(tmpdir, f"e{i}.eclass"), "w") as f:
+            for j in range(50):
+                f.write(f"e{i}_f{j}() {{\\n\\tlocal x=${{1:-{j}}}\\n\\techo ${{x}}\\n}}\\n")
+    best = float("inf")
+    for _ in range(runs):
+        ebps = [processor.EbuildProcessor(False, False) for _ in range(processors)]
+        ec = eclass_cache.cache(tmpdir)
+        start = time.perf_counter()
+        if mode == "snapshot":
+            snapshot = processor.get_eclass_snapshot(ec)
+            snapshot.add(ec.eclasses)
+            for ebp in ebps:
+                assert ebp.load_eclass_snapshot(snapshot)
+        else:
+            for ebp in ebps:
+                assert ebp.preload_eclasses(ec)
+        best = min(best, time.perf_counter() - start)
+        for ebp in ebps:
+            ebp.shutdown_processor()
+print(best)
+"""
+
+
+def run(tree, mode, options):
+    """Return the fastest time in seconds."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    args = (options.processors, options.eclasses, options.runs)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, *map(str, args)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(out)
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    for mode in ("per-eclass", "snapshot"):
+        elapsed = run(options.tree, mode, options)
+        print(f"{mode:<10}  {elapsed * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""Compare the raw and accelerated environment filtering scanners.
+
+Filters a corpus of saved ebuild environments with the raw scanner stepping
+over every char and the accelerated one, each in a separate process using the
+given source tree, reporting the fastest of all runs and whether both produce
+identical output. The corpus defaults to the environment files of installed
+packages in the vdb, falling back to a synthetic environment dumped by bash
+from the ebd libraries if there are none, e.g.:
+
+    benchmarks/filter_env.py -c /var/db/pkg src
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ("raw", "fast")
+VDB = "/var/db/pkg"
+EBD_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "lib", "pkgcore", "ebd"
+)
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per mode (default: 3)"
+)
+argparser.add_argument(
+    "-c",
+    "--corpus",
+    action="append",
+    help="environment file or directory searched for environment and "
+    "environment.bz2 files, can be given multiple times (default: %s)" % VDB,
+)
+argparser.add_argument(
+    "-s",
+    "--scale",
+    type=int,
+    default=10,
+    help="copies of each function in the synthetic environment (default: %(default)s)",
+)
+
+# dump the ebd library functions, copied to reach the size of real environments
+DUMP = """
+for f in isolated-functions.bash ebuild-default-functions.bash \\
+		ebuild-env-utils.bash ebuild-daemon-lib.bash eapi/*.bash; do
+	source "${f}" >/dev/null 2>&1
+done
+for f in $(compgen -A function); do
+	for (( i = 1; i < $1; i++ )); do
+		eval "${f}_${i} () $(declare -f "${f}" | tail -n +2)"
+	done
+done
+declare -p
+declare -f
+"""
+
+# filter options similar to those used when reloading saved environments
+CHILD = """
+import bz2, hashlib, io, sys, time
+from pkgcore.ebuild import filter_env
+
+mode, runs = sys.argv[1], int(sys.argv[2])
+if mode == "raw":
+    filter_env.is_function = filter_env.raw_is_function
+    filter_env.is_envvar = filter_env.raw_is_envvar
+    filter_env.walk_command_complex = filter_env.raw_walk_command_complex
+    filter_env.walk_command_escaped_parsing = filter_env.raw_walk_command_escaped_parsing
+
+corpus = []
+for path in sys.stdin.read().splitlines():
+    opener = bz2.open if path.endswith(".bz2") else open
+    with opener(path, "rt", encoding="utf8", errors="surrogateescape") as f:
+        corpus.append(f.read())
+
+vars = ["BASH_.*", "COLUMNS", "OLDPWD", "SANDBOX_.*", "PKGCORE_.*", "PORTAGE_.*"]
+vars += ["CATEGORY", "PF", "P", "PN", "PV", "PR", "PVR", "EBUILD", "A", "T", "D"]
+funcs = ["__.*", "die", "has", "use"]
+
+best = float("inf")
+for _ in range(runs):
+    outs = []
+    start = time.perf_counter()
+    for data in corpus:
+        out = io.BytesIO()
+        filter_env.main_run(out, data, vars, funcs)
+        outs.append(out)
+    best = min(best, time.perf_counter() - start)
+digest = hashlib.sha256(b"".join(x.getvalue() for x in outs)).hexdigest()
+print(best, sum(len(x.encode("utf8", "surrogateescape")) for x in corpus), digest)
+"""
+
+
+def find_corpus(paths):
+    """Yield the environment files of the given paths."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for name in ("environment", "environment.bz2"):
+            yield from sorted(glob.glob(os.path.join(path, "**", name), recursive=True))
+
+
+def run(tree, mode, corpus, runs):
+    """Return the fastest run in seconds, the corpus size and output digest."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, str(runs)],
+        env=env,
+        input="\n".join(corpus),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    elapsed, size, digest = out.split()
+    return float(elapsed), int(size), digest
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus = list(find_corpus(options.corpus or [VDB]))
+        if not corpus and not options.corpus:
+            path = os.path.join(tmpdir, "environment")
+            with open(path, "w") as f:
+                subprocess.run(
+                    [
+                        "bash",
+                        "--norc",
+                        "--noprofile",
+                        "-c",
+                        DUMP,
+                        "dump",
+                        str(options.scale),
+                    ],
+                    cwd=EBD_PATH,
+                    env={"PATH": os.environ.get("PATH", "/usr/bin:/bin")},
+                    stdout=f,
+                    check=True,
+                )
+            corpus = [path]
+        if not corpus:
+            argparser.error("no environment files found")
+
+        results = {
+            mode: run(options.tree, mode, corpus, options.runs) for mode in MODES
+        }
+
+    size = results[MODES[0]][1]
+    print(f"{len(corpus)} environment file(s), {size / 1024:.1f} KiB")
+    print(f"{'mode':<4}  {'time':>10}  {'throughput':>12}")
+    for mode, (elapsed, _size, _digest) in results.items():
+        throughput = size / elapsed / 1024 / 1024
+        print(f"{mode:<4}  {elapsed * 1000:>7.1f} ms  {throughput:>7.2f} MiB/s")
+    identical = len({x[2] for x in results.values()}) == 1
+    print(f"identical output: {'yes' if identical else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
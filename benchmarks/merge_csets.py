@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Measure the merge engine's cset operations across pkgcore trees.
+
+Each given source tree is used as PYTHONPATH for running the cset operations
+of a package replacement on synthetic packages: generating the replace and
+remove csets, resolving symlinked directories, the FileCollision checks, and
+child node queries. To compare changes, check out the baseline in a separate
+worktree and pass both trees, e.g.:
+
+    git worktree add /tmp/pkgcore-before HEAD~1
+    benchmarks/merge_csets.py /tmp/pkgcore-before/src src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "trees", nargs="+", metavar="SRC", help="pkgcore source trees to compare"
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per tree (default: 3)"
+)
+argparser.add_argument(
+    "-e",
+    "--entries",
+    type=int,
+    default=200_000,
+    help="number of entries per package (default: %(default)s)",
+)
+
+# run in a separate process per tree, reporting the fastest of all runs
+CHILD = """
+import sys, time
+from pkgcore.fs import contents, fs
+from pkgcore.merge.engine import MergeEngine
+
+entries = int(sys.argv[2])
+dirs = [f"/usr/share/pkg/d{i // 100}/s{i % 100}" for i in range(entries // 20)]
+def files(version):
+    for i in range(entries - 2 * len(dirs)):
+        # a tenth of the files differ between versions
+        name = f"f{i}-{version}" if i % 10 == 0 else f"f{i}"
+        yield fs.fsFile(f"{dirs[i % len(dirs)]}/{name}", strict=False)
+def pkg_contents(version):
+    cset = contents.contentsSet(fs.fsDir(d, strict=False) for d in dirs)
+    cset.update(fs.fsDir(d.rsplit("/", 1)[0], strict=False) for d in dirs)
+    cset.update(files(version))
+    return cset
+
+class pkg:
+    def __init__(self, version):
+        self.contents = pkg_contents(version)
+old, new = pkg(1), pkg(2)
+# symlinked directories on the livefs
+ondisk = contents.contentsSet(
+    fs.fsLink(d, d.replace("/pkg/", "/pkg-real/"), strict=False) for d in dirs[::500]
+)
+ondisk.update(fs.fsDir(x.target, strict=False) for x in list(ondisk))
+
+def run():
+    csets = {}
+    t = time.perf_counter()
+    csets["old_cset"] = MergeEngine.get_pkg_contents(None, csets, old)
+    csets["install"] = MergeEngine.get_pkg_contents(None, csets, new)
+    yield "load", time.perf_counter() - t
+
+    t = time.perf_counter()
+    csets["install"] = csets["install"].map_directory_structure(ondisk)
+    yield "map", time.perf_counter() - t
+
+    t = time.perf_counter()
+    MergeEngine.get_replace_cset(None, csets)
+    MergeEngine.get_remove_cset(None, csets)
+    yield "replace/remove", time.perf_counter() - t
+
+    # FileCollision with all files already existing
+    t = time.perf_counter()
+    colliding = csets["old_cset"].clone().difference(csets["install"].iterdirs())
+    colliding.difference_update(csets["old_cset"])
+    yield "collision", time.perf_counter() - t
+
+    t = time.perf_counter()
+    for d in dirs[::100]:
+        csets["install"].child_nodes(d)
+    yield "children", time.perf_counter() - t
+
+best = {}
+for _ in range(int(sys.argv[1])):
+    for name, elapsed in run():
+        best[name] = min(best.get(name, elapsed), elapsed)
+print(" ".join(f"{k}={v}" for k, v in best.items()))
+"""
+
+
+def run(tree, runs, entries):
+    """Return the times in seconds of all measured steps."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(runs), str(entries)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return {k: float(v) for k, v in (x.split("=") for x in out.split())}
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    results = [
+        (tree, run(tree, options.runs, options.entries)) for tree in options.trees
+    ]
+    base = results[0][1]
+    for tree, times in results:
+        fields = []
+        for name, t in times.items():
+            b = base[name]
+            change = f" ({(t - b) / b:+.1%})" if tree != results[0][0] else ""
+            fields.append(f"{name}: {t * 1000:.1f} ms{change}")
+        print(f"{tree}: {', '.join(fields)}")
+
+
+if __name__ == "__main__":
+    main()
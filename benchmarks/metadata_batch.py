@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""Compare regenerating metadata per ebuild and in batched requests.
+
+Generates a synthetic repository and regenerates the metadata of all its
+ebuilds using a single ebuild processor, either requesting the metadata of
+each ebuild separately or sending them in batches, reporting the fastest of
+all runs, e.g.:
+
+    benchmarks/metadata_batch.py -p 500 src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per mode (default: 3)"
+)
+argparser.add_argument(
+    "-p",
+    "--packages",
+    type=int,
+    default=200,
+    help="number of ebuilds (default: %(default)s)",
+)
+argparser.add_argument(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=16,
+    help="number of ebuilds per batch (default: %(default)s)",
+)
+
+# run in a separate process per mode, reporting the fastest run
+CHILD = """
+import os, sys, tempfile, time
+from pkgcore.ebuild import eclass_cache, processor, repo_objs, repository
+
+mode, packages, batch_size, runs = sys.argv[1], *map(int, sys.argv[2:])
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    files = {
+        "profiles/repo_name": "test\\n",
+        "metadata/layout.conf": "masters =\\n",
+        "eclass/foo.eclass": "FOO=1\\nfoo_src_compile() { :; }\\nEXPORT_FUNCTIONS src_compile\\n",
+    }
+    for i in range(packages):
+        files[f"cat/pkg{i}/pkg{i}-1.ebuild"] = (
+            'EAPI=8\\ninherit foo\\nDESCRIPTION="package {i}"\\nSLOT=0\\n'
+            'KEYWORDS="amd64 x86"\\nIUSE="a b"\\nRDEPEND="a? ( cat/pkg0 )"\\n'
+        ).format(i=i)
+    for path, data in files.items():
+        path = os.path.join(tmpdir, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(data)
+    ec = eclass_cache.cache(os.path.join(tmpdir, "eclass"), location=tmpdir)
+    repo = repository.UnconfiguredTree(
+        tmpdir, eclass_cache=ec, repo_config=repo_objs.RepoConfig(tmpdir), cache=()
+    )
+    pkgs = sorted(repo)
+    ebp = processor.request_ebuild_processor(sandbox=False)
+    ebp.allow_eclass_caching()
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        if mode == "batched":
+            for i in range(0, len(pkgs), batch_size):
+                for data in ebp.get_keys_batch(pkgs[i : i + batch_size], ec):
+                    assert isinstance(data, dict)
+        else:
+            for pkg in pkgs:
+                ebp.get_keys(pkg, ec)
+        best = min(best, time.perf_counter() - start)
+    processor.release_ebuild_processor(ebp)
+print(best)
+"""
+
+
+def run(tree, mode, options):
+    """Return the fastest time in seconds."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    args = (options.packages, options.batch_size, options.runs)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, *map(str, args)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(out)
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    for mode in ("per-ebuild", "batched"):
+        elapsed = run(options.tree, mode, options)
+        per_pkg = elapsed * 1000 / options.packages
+        print(f"{mode:<10}  {elapsed * 1000:>8.1f} ms  {per_pkg:>6.2f} ms/ebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""Compare sequential and parallel matching across multiplexed repos.
+
+Each repo is a synthetic tree with a fixed delay per package, simulating
+repos backed by disk I/O. Reports the fastest time until the first match and
+until all matches of a sorted query for both modes, e.g.:
+
+    benchmarks/multiplex_itermatch.py -r 4 src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per mode (default: 3)"
+)
+argparser.add_argument(
+    "-r",
+    "--repos",
+    type=int,
+    default=4,
+    help="number of repos (default: %(default)s)",
+)
+argparser.add_argument(
+    "-p",
+    "--pkgs",
+    type=int,
+    default=200,
+    help="number of packages per repo (default: %(default)s)",
+)
+argparser.add_argument(
+    "-d",
+    "--delay",
+    type=float,
+    default=0.2,
+    help="milliseconds spent per package (default: %(default)s)",
+)
+
+# run in a separate process per mode, reporting the fastest run
+CHILD = """
+import sys, time
+from pkgcore.repository.multiplex import tree
+from pkgcore.repository.util import SimpleTree
+from pkgcore.restrictions import packages
+
+parallel, repos, pkgs, delay, runs = sys.argv[1] == "parallel", *map(float, sys.argv[2:])
+
+class SlowTree(SimpleTree):
+    def itermatch(self, *args, **kwds):
+        for pkg in super().itermatch(*args, **kwds):
+            # sleep releases the GIL like blocking I/O does
+            time.sleep(delay / 1000)
+            yield pkg
+
+first = total = float("inf")
+for _ in range(int(runs)):
+    trees = []
+    for i in range(int(repos)):
+        data = {f"cat{i}": {f"pkg{j}": ["1"] for j in range(int(pkgs))}}
+        trees.append(SlowTree(data))
+    repo = tree(*trees, parallel=parallel)
+    start = time.perf_counter()
+    it = repo.itermatch(packages.AlwaysTrue, sorter=sorted)
+    next(it)
+    first = min(first, time.perf_counter() - start)
+    for _ in it:
+        pass
+    total = min(total, time.perf_counter() - start)
+print(first, total)
+"""
+
+
+def run(tree, mode, options):
+    """Return the fastest times in seconds until the first and all matches."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    args = (options.repos, options.pkgs, options.delay, options.runs)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, *map(str, args)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return tuple(map(float, out.split()))
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    print(f"{'mode':<10}  {'first':>10}  {'total':>10}")
+    for mode in ("sequential", "parallel"):
+        first, total = run(options.tree, mode, options)
+        print(f"{mode:<10}  {first * 1000:>7.1f} ms  {total * 1000:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Measure the peak RSS of pquery runs across pkgcore source trees.
+
+Each given source tree is used as PYTHONPATH for running pquery, by default
+querying the depend attribute of all packages. To compare changes, check out
+the baseline in a separate worktree and pass both trees, e.g.:
+
+    git worktree add /tmp/pkgcore-before HEAD~1
+    benchmarks/pquery_memory.py /tmp/pkgcore-before/src src
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "trees", nargs="+", metavar="SRC", help="pkgcore source trees to compare"
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per tree (default: 3)"
+)
+argparser.add_argument(
+    "--args",
+    default="--all --attr depend",
+    help="pquery arguments (default: %(default)r)",
+)
+
+
+def peak_rss(tree, args):
+    """Return the peak RSS in KiB of a pquery run using the given source tree."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    pid = os.fork()
+    if pid == 0:
+        try:
+            with open(os.devnull, "w") as null:
+                os.dup2(null.fileno(), 1)
+            os.execvpe(
+                sys.executable,
+                [sys.executable, "-c", "from pkgcore.scripts import run; run('pquery')"]
+                + args,
+                env,
+            )
+        finally:
+            os._exit(127)
+    _pid, status, usage = os.wait4(pid, 0)
+    if os.waitstatus_to_exitcode(status):
+        raise subprocess.CalledProcessError(os.waitstatus_to_exitcode(status), args)
+    # linux reports ru_maxrss in KiB
+    return usage.ru_maxrss
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    args = options.args.split()
+    results = []
+    for tree in options.trees:
+        rss = [peak_rss(tree, args) for _ in range(options.runs)]
+        results.append((tree, statistics.median(rss)))
+    base = results[0][1]
+    for tree, rss in results:
+        change = f" ({(rss - base) / base:+.1%})" if tree != results[0][0] else ""
+        print(f"{tree}: {rss / 1024:.1f} MiB{change}")
+
+
+if __name__ == "__main__":
+    main()
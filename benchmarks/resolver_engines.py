@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""Compare the dependency resolver engines on hard resolution fixtures.
+
+Each fixture generates a synthetic repository of the given size that's known
+to be hard for depth first backtracking: chains of any-of groups that only
+fail deep down the graph, slot conflicts that require an earlier choice to be
+downgraded, blockers between the highest versions, and REQUIRED_USE
+constraints unsatisfied by the highest versions. Every fixture is resolved by
+each engine in a separate process using the given source tree, reporting the
+fastest of all runs and whether a valid plan was found, e.g.:
+
+    benchmarks/resolver_engines.py -s 14 src
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+FIXTURES = ("any-of-chain", "any-of-dead-ends", "slot-downgrade", "blockers")
+FIXTURES += ("required-use",)
+ENGINES = ("plan", "sat")
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument(
+    "tree",
+    nargs="?",
+    metavar="SRC",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    help="pkgcore source tree to use (default: the tree containing this script)",
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=3, help="number of runs per engine (default: 3)"
+)
+argparser.add_argument(
+    "-s",
+    "--size",
+    type=int,
+    default=12,
+    help="size of the generated fixtures (default: %(default)s)",
+)
+argparser.add_argument(
+    "-t",
+    "--timeout",
+    type=float,
+    default=60,
+    help="seconds after which a resolution is aborted (default: %(default)s)",
+)
+argparser.add_argument(
+    "-f",
+    "--fixture",
+    dest="fixtures",
+    action="append",
+    choices=FIXTURES,
+    help="fixture to run, can be given multiple times (default: all)",
+)
+
+# run in a separate process per fixture and engine, reporting the fastest run
+CHILD = """
+import sys, time
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.resolver import plan, sat
+from pkgcore.test.misc import FakePkg, FakeRepo
+
+fixture, engine, size, runs = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+
+def any_of_chain(n, dead_ends=False):
+    # every alternative leads to the next level, the last one is broken
+    for i in range(n):
+        yield f"dev-libs/p{i}-1", {"RDEPEND": f"|| ( dev-libs/x{i} dev-libs/y{i} )"}
+        if dead_ends:
+            # the preferred alternatives fail after resolving the rest
+            yield f"dev-libs/x{i}-1", {"RDEPEND": f"dev-libs/p{i + 1} dev-libs/missing"}
+        else:
+            yield f"dev-libs/x{i}-1", {"RDEPEND": f"dev-libs/p{i + 1}"}
+        yield f"dev-libs/y{i}-1", {"RDEPEND": f"dev-libs/p{i + 1}"}
+    yield f"dev-libs/p{n}-1", {"RDEPEND": "" if dead_ends else "dev-libs/missing"}
+
+def slot_downgrade(n):
+    # only the lowest lib version is accepted by all apps
+    for v in range(1, n + 1):
+        yield f"dev-libs/lib-{v}", {}
+    for i in range(n):
+        for v in range(1, n + 1) if i < n - 1 else [1]:
+            yield f"app-misc/app{i}-{v}", {"RDEPEND": f"=dev-libs/lib-{v}"}
+    apps = " ".join(f"app-misc/app{i}" for i in range(n))
+    yield "app-misc/p0-1", {"RDEPEND": apps}
+
+def blockers(n):
+    # the highest versions block each other, the last one requires them all
+    for i in range(n):
+        yield f"dev-libs/b{i}-1", {}
+        yield f"dev-libs/b{i}-2", {"RDEPEND": f"!>=dev-libs/b{(i + 1) % n}-2"}
+    deps = " ".join(f">=dev-libs/b{i}-{2 - i % 2}" for i in range(n))
+    yield "app-misc/p0-1", {"RDEPEND": deps}
+
+def required_use(n):
+    # all but the lowest versions require a disabled flag
+    for i in range(n):
+        for v in range(1, n + 1):
+            data = {"RDEPEND": f"dev-libs/r{i + 1}" if i < n - 1 else ""}
+            if v > 1:
+                data["REQUIRED_USE"] = "x"
+            yield f"dev-libs/r{i}-{v}", data
+    yield "app-misc/p0-1", {"RDEPEND": "dev-libs/r0"}
+
+fixtures = {
+    "any-of-chain": (any_of_chain, "dev-libs/p0"),
+    "any-of-dead-ends": (lambda n: any_of_chain(n, True), "dev-libs/p0"),
+    "slot-downgrade": (slot_downgrade, "app-misc/p0"),
+    "blockers": (blockers, "app-misc/p0"),
+    "required-use": (required_use, "app-misc/p0"),
+}
+generate, target = fixtures[fixture]
+resolver_cls = sat.sat_plan if engine == "sat" else plan.merge_plan
+
+def valid(pkg):
+    if pkg.eapi.options.has_required_use:
+        return all(x.match(pkg.use) for x in pkg.required_use)
+    return True
+
+best = float("inf")
+for _ in range(runs):
+    repo = FakeRepo(repo_id="gentoo")
+    repo.pkgs = [
+        FakePkg(cpv, repo=repo, eapi="8", iuse=["x"], data=data)
+        for cpv, data in generate(size)
+    ]
+    vdb = FakeRepo(repo_id="vdb", livefs=True)
+    resolver_inst = resolver.upgrade_resolver([vdb], [repo], resolver_cls=resolver_cls)
+    start = time.perf_counter()
+    ret = resolver_inst.add_atoms([atom(target)], finalize=True)
+    best = min(best, time.perf_counter() - start)
+if ret:
+    status = "failed"
+elif not all(valid(op.pkg) for op in resolver_inst.state.iter_ops()):
+    status = "invalid"
+else:
+    status = "ok"
+print(status, best)
+"""
+
+
+def run(tree, fixture, engine, size, runs, timeout):
+    """Return the resolution status and the fastest time in seconds."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    try:
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, fixture, engine, str(size), str(runs)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=timeout * runs,
+        ).stdout
+    except subprocess.TimeoutExpired:
+        return "timeout", None
+    status, elapsed = out.split()
+    return status, float(elapsed)
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    fixtures = options.fixtures or FIXTURES
+    width = max(map(len, fixtures))
+    print(f"{'fixture':<{width}}  " + "  ".join(f"{x:<20}" for x in ENGINES))
+    for fixture in fixtures:
+        fields = []
+        for engine in ENGINES:
+            status, elapsed = run(
+                options.tree,
+                fixture,
+                engine,
+                options.size,
+                options.runs,
+                options.timeout,
+            )
+            if elapsed is not None:
+                status = f"{status} {elapsed * 1000:.1f} ms"
+            fields.append(f"{status:<20}")
+        print(f"{fixture:<{width}}  " + "  ".join(fields))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""Measure sorting all package versions of a repository across pkgcore trees.
+
+Each given source tree is used as PYTHONPATH for creating CPV objects for all
+ebuilds in the repository and sorting them, reporting the time taken by both
+steps. To compare changes, check out the baseline in a separate worktree and
+pass both trees, e.g.:
+
+    git worktree add /tmp/pkgcore-before HEAD~1
+    benchmarks/version_sort.py /var/db/repos/gentoo /tmp/pkgcore-before/src src
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+
+argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+argparser.add_argument("repo", help="path to an ebuild repository")
+argparser.add_argument(
+    "trees", nargs="+", metavar="SRC", help="pkgcore source trees to compare"
+)
+argparser.add_argument(
+    "-n", "--runs", type=int, default=5, help="number of runs per tree (default: 5)"
+)
+
+# run in a separate process per tree, reporting the fastest of all runs
+CHILD = """
+import sys, time
+from pkgcore.ebuild.cpv import VersionedCPV
+cpvstrs = sys.stdin.read().split()
+init = sort = float("inf")
+for _ in range(int(sys.argv[1])):
+    start = time.perf_counter()
+    cpvs = [VersionedCPV(s) for s in cpvstrs]
+    init = min(init, time.perf_counter() - start)
+    start = time.perf_counter()
+    sorted(cpvs)
+    sort = min(sort, time.perf_counter() - start)
+print(init, sort)
+"""
+
+
+def repo_cpvs(path):
+    """Yield the cpvs of all ebuilds in a repository."""
+    for category in sorted(os.listdir(path)):
+        cat_path = os.path.join(path, category)
+        if category.startswith(".") or not os.path.isdir(cat_path):
+            continue
+        for package in os.listdir(cat_path):
+            pkg_path = os.path.join(cat_path, package)
+            if not os.path.isdir(pkg_path):
+                continue
+            for f in os.listdir(pkg_path):
+                if f.endswith(".ebuild") and f.startswith(f"{package}-"):
+                    yield f"{category}/{f[:-7]}"
+
+
+def run(tree, cpvs, runs):
+    """Return the times in seconds creating and sorting the given cpvs."""
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(tree))
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(runs)],
+        input="\n".join(cpvs),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return tuple(map(float, out.split()))
+
+
+def main(argv=None):
+    options = argparser.parse_args(argv)
+    cpvs = list(repo_cpvs(options.repo))
+    if not cpvs:
+        argparser.error(f"no ebuilds found: {options.repo!r}")
+    # sorting presorted input is much faster than the common case
+    random.Random(0).shuffle(cpvs)
+    print(f"{len(cpvs)} versions")
+
+    results = [(tree, run(tree, cpvs, options.runs)) for tree in options.trees]
+    base = results[0][1]
+    for tree, times in results:
+        fields = []
+        for name, t, b in zip(("create", "sort"), times, base):
+            change = f" ({(t - b) / b:+.1%})" if tree != results[0][0] else ""
+            fields.append(f"{name}: {t * 1000:.1f} ms{change}")
+        print(f"{tree}: {', '.join(fields)}")
+
+
+if __name__ == "__main__":
+    main()
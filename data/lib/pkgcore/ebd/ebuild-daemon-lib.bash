@@ -25,12 +25,87 @@ __ebd_read_array() {
 
 # read -N usage requires bash-4.1 or so (EAPI 6 requires >= 4.2)
 __ebd_read_size() {
+	# sizes are in bytes
+	local LC_ALL=C
 	read -u ${PKGCORE_EBD_READ_FD} -r -N $1 $2
 	local ret=$?
 	[[ ${ret} -ne 0 ]] && \
 		die "coms error in ${PKGCORE_EBD_PID}, read_size $@ failed w/ ${ret}"
 }
 
+# Read a block of fields prefixed by their size in hex into an array, see
+# _pack_fields() on the python side.
+__ebd_read_fields() {
+	local __size __block
+	__ebd_read_line __size
+	__ebd_read_size "${__size}" __block
+	__ebd_split_fields "${__block}" $1
+}
+
+# Assign and export the variables of an env packed by _pack_env() on the
+# python side. The env is a block of fields terminated by \x1e, the first one
+# is the number of arrays given as NAME=values fields with each element
+# terminated by \x1d, followed by scalars given as NAME=value fields.
+__ebd_unpack_env() {
+	local IFS=$'\x1e' __opts=$- __escaped=false __ret=0 __i __name
+	local -a __fields __values
+	[[ $1 == *$'\x1f'* ]] && __escaped=true
+	# split without globbing the fields
+	set -f
+	__fields=( $1 )
+	IFS=$'\x1d'
+	# arrays come first as slicing bash arrays is linear in their size
+	for (( __i = 1; __i <= __fields[0]; __i++ )); do
+		__name=${__fields[__i]%%=*}
+		__values=( ${__fields[__i]#*=} )
+		${__escaped} && __ebd_unescape_values
+		eval "${__name}"'=( "${__values[@]}" )' && export -- "${__name}" || __ret=1
+		unset -v "__fields[__i]"
+	done
+	unset -v '__fields[0]'
+	if ${__escaped}; then
+		__values=( "${__fields[@]}" )
+		__ebd_unescape_values
+		__fields=( "${__values[@]}" )
+	fi
+	if (( ${#__fields[@]} )); then
+		export -- "${__fields[@]}" || __ret=1
+	fi
+	[[ ${__opts} == *f* ]] || set +f
+	return ${__ret}
+}
+
+# Unescape separators in the values of __ebd_unpack_env(), see _escape_field()
+# on the python side.
+__ebd_unescape_values() {
+	__values=( "${__values[@]//$'\x1f2'/$'\x1e'}" )
+	__values=( "${__values[@]//$'\x1f3'/$'\x1d'}" )
+	__values=( "${__values[@]//$'\x1f1'/$'\x1f'}" )
+}
+
+# Split a block of fields into an array.
+__ebd_split_fields() {
+	local LC_ALL=C __size __pos=0
+	local -a __split=()
+	while (( __pos < ${#1} )); do
+		__size=$(( 16#${1:__pos:8} ))
+		__split+=( "${1:__pos+8:__size}" )
+		(( __pos += 8 + __size ))
+	done
+	eval "$2=( \"\${__split[@]}\" )"
+}
+
+# Write a command followed by its args as a block of size prefixed fields.
+__ebd_write_fields() {
+	local LC_ALL=C __block='' __field __size
+	for __field in "${@:2}"; do
+		printf -v __size '%08x' "${#__field}"
+		__block+=${__size}${__field}
+	done
+	printf '%s %i\n%s' "$1" "${#__block}" "${__block}" >&${PKGCORE_EBD_WRITE_FD} || \
+		die "coms error, write_fields failed"
+}
+
 __ebd_read_cat_size() {
 	dd bs=$1 count=1 <&${PKGCORE_EBD_READ_FD}
 }
@@ -53,6 +128,13 @@ __ebd_write_raw() {
 	echo -n "$*" >&${PKGCORE_EBD_WRITE_FD} || die "coms error, __ebd_write_raw failed"
 }
 
+# Write a command with the size of the given data in bytes, followed by the data.
+__ebd_write_sized() {
+	local LC_ALL=C
+	__ebd_write_line "$1 ${#2}"
+	__ebd_write_raw "$2"
+}
+
 __ipc_exit() {
 	# exit in a helper compatible way when running IPC command from a helper
 	[[ -n ${HELPER_ERROR_PREFIX} ]] && __helper_exit "$@"
@@ -81,13 +163,19 @@ __ebd_ipc_cmd() {
 	local -a ret
 	shift 2
 
-	__ebd_write_line ${IPC_CMD}
-	__ebd_write_line ${PKGCORE_NONFATAL:-false}
-	__ebd_write_line ${PWD}
-	__ebd_write_line ${EBUILD_PHASE}
-	__ebd_write_line ${opts}
-	__ebd_write_array "$@"
-	__ebd_read_array ret
+	if [[ ${PKGCORE_EBD_PROTOCOL} -ge 2 ]]; then
+		__ebd_write_fields ${IPC_CMD} "${PKGCORE_NONFATAL:-false}" "${PWD}" \
+			"${EBUILD_PHASE}" "${opts}" "$@"
+		__ebd_read_fields ret
+	else
+		__ebd_write_line ${IPC_CMD}
+		__ebd_write_line ${PKGCORE_NONFATAL:-false}
+		__ebd_write_line ${PWD}
+		__ebd_write_line ${EBUILD_PHASE}
+		__ebd_write_line ${opts}
+		__ebd_write_array "$@"
+		__ebd_read_array ret
+	fi
 	__ipc_exit "${ret[@]}"
 }
 
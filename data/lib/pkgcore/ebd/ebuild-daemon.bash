@@ -67,12 +67,22 @@ __ebd_exec_main() {
 
 	# Ensure the other side is still there, well, this moreso is for the python
 	# side to ensure loading up the intermediate funcs succeeded.
-	local com
+	local com version
 	__ebd_read_line com
-	if [[ ${com} != "ebd?" ]]; then
+	if [[ ${com} != "ebd?" && ${com} != "ebd? "* ]]; then
 		die "serv init coms failed, received '${com}' when expecting 'ebd?'"
 	fi
-	__ebd_write_line "ebd!"
+	# use the protocol version requested by the python side if supported,
+	# falling back to the line oriented version 1
+	version=${com#ebd?}
+	if [[ ${version} == " 2" ]]; then
+		declare -gr PKGCORE_EBD_PROTOCOL=2
+		__ebd_write_line "ebd! ${PKGCORE_EBD_PROTOCOL}"
+	else
+		declare -gr PKGCORE_EBD_PROTOCOL=1
+		__ebd_write_line "ebd!"
+	fi
+	unset -v version
 
 	# get our die functionality now.
 	if ! source "${PKGCORE_EBD_PATH}"/exit-handling.bash; then
@@ -204,6 +214,12 @@ __ebd_process_ebuild_phases() {
 						cont=$?
 						__IFS_pop
 						;;
+					fields*)
+						line=${line#fields }
+						__ebd_read_size "${line}" line
+						__ebd_unpack_env "${line}"
+						cont=$?
+						;;
 					lines|*)
 						while __ebd_read_line line && [[ ${line} != "end_receiving_env" ]]; do
 							__IFS_push $'\0'
@@ -285,21 +301,29 @@ __ebd_process_ebuild_phases() {
 }
 
 __ebd_process_metadata() {
+	local __data
+	__ebd_read_size "$1" __data
+	__ebd_source_metadata "${__data}" "$2"
+}
+
+__ebd_source_metadata() {
 	# protect the env.
 	# note the local usage is redundant in light of it, but prefer to write it this
 	# way so that if someone ever drops the (), it'll still not bleed out.
 	(
 		# Heavy QA checks (IFS, shopt, etc) are suppressed for speed
 		declare -r PKGCORE_QA_SUPPRESSED=false
-		# Wipe __mode; it bleeds from our parent.
-		unset -v __mode
-		local __data
+		# Wipe __mode and __data; they bleed from our parent.
+		unset -v __mode __data
 		local __ret
-		__ebd_read_size "$1" __data
-		local IFS=$'\0'
-		eval "$__data"
-		__ret=$?
-		unset -v __data
+		if [[ ${PKGCORE_EBD_PROTOCOL} -ge 2 ]]; then
+			__ebd_unpack_env "$1"
+			__ret=$?
+		else
+			local IFS=$'\0'
+			eval "$1"
+			__ret=$?
+		fi
 		[[ ${__ret} -ne 0 ]] && exit 1
 		unset -v __ret
 		local IFS=$' \t\n'
@@ -328,7 +352,7 @@ __make_preloaded_eclass_func() {
 }
 
 __ebd_main_loop() {
-	PKGCORE_BLACKLIST_VARS+=( __mode com is_depends phases line cont )
+	PKGCORE_BLACKLIST_VARS+=( __mode __count __env __envs com is_depends phases line cont )
 	SANDBOX_ON=1
 	while :; do
 		local com=''
@@ -365,6 +389,15 @@ __ebd_main_loop() {
 				__ebd_write_line "preload_eclass ${success}"
 				unset -v e x success
 				;;
+			preload_eclass_snapshot\ *)
+				line=${com#preload_eclass_snapshot }
+				__ebd_read_size "${line}" line
+				if eval "${line}"; then
+					__ebd_write_line "preload_eclass_snapshot succeeded"
+				else
+					__ebd_write_line "preload_eclass_snapshot failed"
+				fi
+				;;
 			clear_preloaded_eclasses)
 				unset -v PKGCORE_PRELOADED_ECLASSES
 				declare -A PKGCORE_PRELOADED_ECLASSES
@@ -389,6 +422,27 @@ __ebd_main_loop() {
 					__ebd_write_line "phases failed ${error_output}"
 				fi
 				;;
+			gen_metadata_batch\ *)
+				# read all envs, each preceded by its size, before sourcing any
+				# ebuilds since inherit responses share the same pipe
+				local -a __envs=()
+				local __env error_output
+				for (( __count = ${com#* }; __count > 0; __count-- )); do
+					__ebd_read_line line
+					__ebd_read_size "${line}" __env
+					__envs+=( "${__env}" )
+				done
+				for __env in "${__envs[@]}"; do
+					error_output=$(PKGCORE_METADATA_FRAMED=1 __ebd_source_metadata "${__env}" depend 2>&1 1>/dev/null)
+					if [[ $? -eq 0 ]]; then
+						__ebd_write_line "phases succeeded"
+					else
+						[[ -n ${error_output} ]] || error_output="ebd::${com% *} failed"
+						__ebd_write_line "phases failed ${error_output}"
+					fi
+				done
+				unset -v __count __env __envs
+				;;
 			alive)
 				__ebd_write_line "yep!"
 				;;
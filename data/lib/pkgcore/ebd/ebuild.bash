@@ -475,8 +475,7 @@ __execute_phases() {
 							LC_ALL=C "${__path}" -F $'\0' 'BEGIN { content="";chars=0;RS="\0";ORS=""} {chars += length($0);content = content $0} END {printf("receive_env %i\n%s",chars, content)}' >&${PKGCORE_EBD_WRITE_FD}
 					else
 						local my_env=$(__environ_dump)
-						__ebd_write_line "receive_env ${#my_env}"
-						__ebd_write_raw "${my_env}"
+						__ebd_write_sized receive_env "${my_env}"
 						unset -v my_env __path
 					fi
 				fi
@@ -502,6 +501,25 @@ __dump_metadata_keys() {
 	# and directly screw w/ it for speed reasons- about 5% speedup in metadata regen.
 	set -f
 	local key phases phase
+	if [[ -n ${PKGCORE_METADATA_FRAMED} || ${PKGCORE_EBD_PROTOCOL} -ge 2 ]]; then
+		# send all keys as a single record prefixed by its size in bytes
+		local record values LC_ALL=C
+		for key in "${PKGCORE_METADATA_KEYS[@]}"; do
+			if [[ ${key} == DEFINED_PHASES ]]; then
+				for phase in "${PKGCORE_EBUILD_PHASES[@]}"; do
+					__is_function "${phase}" && phases+=( ${phase} )
+				done
+				record+="DEFINED_PHASES=${phases[*]:--}"$'\n'
+			elif [[ ${!key:-unset} != "unset" ]]; then
+				# word splitting normalizes whitespace like echo does below
+				values=( ${!key} )
+				record+="${key}=${values[*]}"$'\n'
+			fi
+		done
+		printf "metadata %i\n%s" "${#record}" "${record}" >&${PKGCORE_EBD_WRITE_FD}
+		set +f
+		return
+	fi
 	for key in "${PKGCORE_METADATA_KEYS[@]}"; do
 		if [[ ${key} == DEFINED_PHASES ]]; then
 			for phase in "${PKGCORE_EBUILD_PHASES[@]}"; do
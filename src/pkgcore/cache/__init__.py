@@ -60,6 +60,14 @@ class base:
         self.set_sync_rate(self.default_sync_rate)
         self.updates = 0
 
+    def sidecar_path(self, name):
+        """Return the path of auxiliary data locally generated for the cache.
+
+        :param name: name of the auxiliary data
+        :return: path or None if the backend has no location to store it
+        """
+        return None
+
     @staticmethod
     def _eclassdir_serializer(data):
         return os.path.dirname(data.path)
@@ -261,6 +269,34 @@ class base:
                 cpv, f"ValueError reading {eclass_string!r}"
             ) from e
 
+    def _inherited_eclasses(self, eclass_string):
+        """Return the eclass names from a serialized ``_eclasses_`` value."""
+        eclass_data = eclass_string.strip().split(self.eclass_splitter)
+        return eclass_data[:: len(self.eclass_chf_types) + 1] if eclass_string else []
+
+    def eclass_users(self, eclasses):
+        """Return the cpvs of entries inheriting any of the given eclasses.
+
+        Backends that don't index inherited eclasses scan all entries.
+        """
+        eclasses = frozenset(eclasses)
+        users = set()
+        for cpv in self.keys():
+            try:
+                inherited = self[cpv].get("_eclasses_", ())
+            except (KeyError, errors.CacheError):
+                continue
+            if not eclasses.isdisjoint(eclass for eclass, _chfs in inherited):
+                users.add(cpv)
+        return frozenset(users)
+
+    def build_eclass_index(self):
+        """Write out a missing or outdated eclass index from the current entries.
+
+        Run by regen before updating entries, the index is kept up to date
+        from then on. Backends without a separately stored index do nothing.
+        """
+
     def validate_entry(self, cache_item, ebuild_hash_item, eclass_db):
         chf_hash = cache_item.get(self._chf_key)
         if chf_hash is None or chf_hash != getattr(
@@ -0,0 +1,230 @@
+"""
+persistent reverse index of eclasses to the cache entries inheriting them
+"""
+
+__all__ = ("EclassIndex",)
+
+import fcntl
+import os
+import threading
+
+from snakeoil.osutils import ensure_dirs
+
+from ..log import logger
+
+
+def _stamp(location):
+    """Return a stamp identifying the state of the cache entries in a dir.
+
+    It's made of the number of entries and the newest inode change time of
+    the entries and their dirs, so added, removed and modified entries all
+    change it, including those copied with their original mtimes.
+    """
+    count = 0
+    newest = 0
+    dirs = [location]
+    while dirs:
+        path = dirs.pop()
+        try:
+            newest = max(newest, os.stat(path).st_ctime_ns)
+            with os.scandir(path) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            # skip internal files, e.g. temporary updates
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                    continue
+                newest = max(newest, entry.stat(follow_symlinks=False).st_ctime_ns)
+            except FileNotFoundError:
+                continue
+            count += 1
+    return f"{count} {newest}"
+
+
+class EclassIndex:
+    """Reverse mapping of eclasses to the cpvs inheriting them.
+
+    The index is stored as an append-only log of lines mapping a cpv to the
+    eclasses it inherits, where later lines override earlier ones. Updates
+    are only appended when the log already exists; a missing log means the
+    index is incomplete and has to be rebuilt from the cache entries via
+    :py:meth:`rebuild`. :py:meth:`compact` rewrites the log dropping
+    overridden lines.
+
+    :param source: dir holding the indexed cache entries; the log starts with
+        a stamp of their state when it was last known to match them, and it's
+        ignored when the entries were changed by anything else since then,
+        e.g. syncing a repo shipping its metadata cache
+    """
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source
+        self._lock = threading.Lock()
+        self._inherits = None
+        # whether the log is known to match the entries in this process
+        self._current = False
+
+    def _stamp(self):
+        return None if self.source is None else _stamp(self.source)
+
+    @staticmethod
+    def _parse(f):
+        stamp = None
+        inherits = {}
+        for line in f:
+            if line.startswith("#"):
+                stamp = line[1:].rstrip("\n")
+                continue
+            cpv, _, eclasses = line.rstrip("\n").partition("\t")
+            if eclasses:
+                inherits[cpv] = frozenset(eclasses.split())
+            else:
+                inherits.pop(cpv, None)
+        return stamp, inherits
+
+    def _read(self):
+        with open(self.path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            return self._parse(f)
+
+    def _open_append(self):
+        """Open the current log for appending, holding a shared lock."""
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            # log was replaced by compaction while waiting for the lock
+            os.close(fd)
+
+    def _load(self):
+        """Return the mapping of cpvs to inherited eclasses.
+
+        :return: mapping, None if the log is missing or outdated
+        """
+        if self._inherits is None:
+            try:
+                stamp, inherits = self._read()
+            except FileNotFoundError:
+                return None
+            if stamp != self._stamp():
+                return None
+            self._inherits = inherits
+            self._current = True
+        return self._inherits
+
+    def current(self):
+        """Return whether the stored log matches the indexed entries."""
+        with self._lock:
+            self._inherits = None
+            return self._load() is not None
+
+    def update(self, cpv, eclasses):
+        """Record the eclasses inherited by a cpv, use no eclasses on removal."""
+        line = f"{cpv}\t{' '.join(sorted(eclasses))}\n"
+        with self._lock:
+            try:
+                fd = self._open_append()
+            except FileNotFoundError:
+                # only kept in memory until the log is written via rebuild()
+                pass
+            except EnvironmentError as e:
+                logger.warning("failed updating eclass index %r: %s", self.path, e)
+                self._inherits = None
+                return
+            else:
+                try:
+                    os.write(fd, line.encode("utf8"))
+                finally:
+                    os.close(fd)
+            if self._inherits is not None:
+                if eclasses:
+                    self._inherits[cpv] = frozenset(eclasses)
+                else:
+                    self._inherits.pop(cpv, None)
+
+    def users(self, eclasses):
+        """Return the cpvs inheriting any of the given eclasses.
+
+        :return: frozenset of cpvs, None if the index is missing or outdated
+        """
+        eclasses = frozenset(eclasses)
+        with self._lock:
+            inherits = self._load()
+        if inherits is None:
+            return None
+        return frozenset(
+            cpv
+            for cpv, inherited in inherits.items()
+            if not eclasses.isdisjoint(inherited)
+        )
+
+    def _write(self, inherits, stamp):
+        base = os.path.dirname(self.path)
+        if base and not ensure_dirs(base, mode=0o775, minimal=False):
+            raise PermissionError(f"failed creating {base!r}")
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            if stamp is not None:
+                f.write(f"#{stamp}\n")
+            for cpv, eclasses in sorted(inherits.items()):
+                f.write(f"{cpv}\t{' '.join(sorted(eclasses))}\n")
+        os.rename(tmp, self.path)
+
+    def rebuild(self, entries, persist=True):
+        """Replace the index content.
+
+        :param entries: iterable of cpv and inherited eclasses pairs
+        :param persist: write the index to disk, otherwise it's only kept in
+            memory
+        """
+        # stamp the state before reading entries so changes made while
+        # reading them invalidate the index
+        stamp = self._stamp() if persist else None
+        inherits = {cpv: frozenset(eclasses) for cpv, eclasses in entries if eclasses}
+        with self._lock:
+            self._inherits = inherits
+            if persist:
+                try:
+                    self._write(inherits, stamp)
+                    self._current = True
+                except EnvironmentError as e:
+                    logger.warning("failed writing eclass index %r: %s", self.path, e)
+
+    def compact(self):
+        """Rewrite the index log dropping overridden entries.
+
+        The log is restamped if it was known to match the entries before they
+        were updated via this index.
+        """
+        with self._lock:
+            try:
+                with open(self.path) as f:
+                    # block appends from other processes while rewriting
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                    self._inherits = None
+                    stamp, inherits = self._parse(f)
+                    if self._current:
+                        stamp = self._stamp()
+                    self._write(inherits, stamp)
+                    if self._current:
+                        self._inherits = inherits
+            except FileNotFoundError:
+                pass
+            except EnvironmentError as e:
+                logger.warning("failed compacting eclass index %r: %s", self.path, e)
+
+    def __getstate__(self):
+        return {"path": self.path, "source": self.source}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
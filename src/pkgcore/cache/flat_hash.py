@@ -12,6 +12,7 @@ from snakeoil.osutils import pjoin
 
 from ..config.hint import ConfigHint
 from . import errors, fs_template
+from .eclass_index import EclassIndex
 
 
 class database(fs_template.FsBased):
@@ -34,6 +35,12 @@ class database(fs_template.FsBased):
     mtime_in_entry = True
     eclass_chf_types = ("eclassdir", "mtime")
 
+    def __init__(self, *args, **config):
+        super().__init__(*args, **config)
+        self._eclass_index = EclassIndex(
+            self.sidecar_path("eclass_index"), source=self.location
+        )
+
     def _getitem(self, cpv):
         path = pjoin(self.location, cpv)
         try:
@@ -99,6 +106,9 @@ class database(fs_template.FsBased):
         except EnvironmentError as e:
             os.remove(fp)
             raise errors.CacheCorruption(cpv, e) from e
+        self._eclass_index.update(
+            cpv, self._inherited_eclasses(values.get("_eclasses_", ""))
+        )
 
     def _delitem(self, cpv):
         try:
@@ -107,6 +117,7 @@ class database(fs_template.FsBased):
             raise KeyError(cpv)
         except OSError as e:
             raise errors.CacheCorruption(cpv, e) from e
+        self._eclass_index.update(cpv, ())
 
     def __contains__(self, cpv):
         return os.path.exists(pjoin(self.location, cpv))
@@ -126,7 +137,8 @@ class database(fs_template.FsBased):
             except EnvironmentError as e:
                 raise KeyError(cpv, f"access failure: {e}")
             for l in os.listdir(d):
-                if l.endswith(".cpickle"):
+                # skip internal files, e.g. temporary updates
+                if l.startswith(".") or l.endswith(".cpickle"):
                     continue
                 p = pjoin(d, l)
                 try:
@@ -140,6 +152,33 @@ class database(fs_template.FsBased):
                     continue
                 yield p[len_base + 1 :]
 
+    def _eclass_entries(self):
+        """Yield the cpv and inherited eclasses of all entries."""
+        for cpv in self.keys():
+            try:
+                data = self[cpv]
+            except (KeyError, errors.CacheError):
+                continue
+            inherited = data.get("_eclasses_", ())
+            yield cpv, [eclass for eclass, _chfs in inherited]
+
+    def eclass_users(self, eclasses):
+        users = self._eclass_index.users(eclasses)
+        if users is None:
+            # index is missing or outdated, build it in memory as only regen
+            # writes it
+            self._eclass_index.rebuild(self._eclass_entries(), persist=False)
+            users = self._eclass_index.users(eclasses)
+        return users
+
+    def build_eclass_index(self):
+        if not self._eclass_index.current():
+            self._eclass_index.rebuild(self._eclass_entries())
+
+    def commit(self, force=False):
+        if force:
+            self._eclass_index.compact()
+
 
 class md5_cache(database):
     chf_type = "md5"
@@ -8,6 +8,7 @@ import os
 
 from snakeoil.osutils import ensure_dirs, pjoin
 
+from .. import const
 from ..os_data import portage_gid
 from . import base
 
@@ -52,6 +53,15 @@ class FsBased(base):
         ]
     )
 
+    def sidecar_path(self, name):
+        # caches are often part of synced repos not owned by the user, so
+        # auxiliary data is kept in the user's cache dir keyed by location
+        cache_dir = (
+            const.SYSTEM_CACHE_PATH if os.getuid() == 0 else const.USER_CACHE_PATH
+        )
+        location = self.location.strip(os.sep)
+        return pjoin(cache_dir, name, f"{location}.{name}")
+
     def _ensure_access(self, path, mtime=None):
         """Ensure access to a path.
 
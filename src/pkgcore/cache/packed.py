@@ -0,0 +1,298 @@
+"""
+single file memory-mapped read-mostly backend
+
+The file consists of a header, the list of stored keys, a table of entries
+sorted by cpv, and a table of interned strings. Each entry is a fixed width
+record of string ids (the cpv followed by one id per stored key), allowing
+lookups via binary search directly on the mapped file without parsing
+anything beyond the requested entry.
+"""
+
+__all__ = ("database", "md5_cache")
+
+import fcntl
+import mmap
+import os
+import struct
+
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from ..config.hint import ConfigHint
+from . import errors, fs_template
+
+_MAGIC = b"pkgcpak\x01"
+# magic, number of entries, number of keys, number of strings
+_header = struct.Struct("<8sIII")
+_missing = 0xFFFFFFFF
+
+
+class database(fs_template.FsBased):
+    """Stores cache entries in a single packed file accessed via mmap.
+
+    Intended for deployments that rarely update their cache: lookups are
+    cheap, but updates are only written out, rewriting the entire file, when
+    a commit is forced, e.g. at the end of regen or pclonecache runs.
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "readonly": "bool",
+            "location": "str",
+            "label": "str",
+            "auxdbkeys": "list",
+        },
+        required=["location"],
+        positional=["location"],
+        typename="cache",
+    )
+
+    autocommits = False
+    eclass_chf_types = ("eclassdir", "mtime")
+
+    def __init__(self, *args, **config):
+        super().__init__(*args, **config)
+        self._pending = {}
+        # mapped file and its index, replaced as a whole so threads sharing
+        # the cache never see a partially loaded state
+        self._state = None
+
+    def _load(self):
+        """Return the mapped file and its index, loading them as required."""
+        if (state := self._state) is not None:
+            return state
+        try:
+            with open(self.location, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            state = self._state = (b"", (0, (), 0, 0, 0))
+            return state
+        except (EnvironmentError, ValueError) as e:
+            # ValueError is raised when mapping empty files
+            raise errors.GeneralCacheCorruption(e) from e
+        try:
+            magic, count, nkeys, nstrings = _header.unpack_from(data)
+            if magic != _MAGIC:
+                raise ValueError(f"invalid magic {magic!r}")
+            offset = _header.size
+            key_ids = struct.unpack_from(f"<{nkeys}I", data, offset)
+            offset += nkeys * 4
+            entries = offset
+            offset += count * (nkeys + 1) * 4
+            strings = offset
+            blob = strings + (nstrings + 1) * 4
+            header = (data, (count, (), entries, strings, blob))
+            keys = tuple(self._string(header, x) for x in key_ids)
+        except (struct.error, ValueError, UnicodeDecodeError) as e:
+            data.close()
+            raise errors.GeneralCacheCorruption(
+                f"{self.location!r}: invalid packed cache: {e}"
+            ) from e
+        state = self._state = (data, (count, keys, entries, strings, blob))
+        return state
+
+    @staticmethod
+    def _raw_string(state, idx):
+        data, (_, _, _, strings, blob) = state
+        start, end = struct.unpack_from("<II", data, strings + idx * 4)
+        return data[blob + start : blob + end]
+
+    @classmethod
+    def _string(cls, state, idx):
+        return str(cls._raw_string(state, idx), "utf8")
+
+    @staticmethod
+    def _entry(state, pos):
+        data, (_, keys, entries, _, _) = state
+        nkeys = len(keys)
+        return struct.unpack_from(
+            f"<{nkeys + 1}I", data, entries + pos * (nkeys + 1) * 4
+        )
+
+    def _find(self, cpv):
+        """Binary search for a cpv, returning the loaded state and its record.
+
+        The record is None if the cpv isn't stored.
+        """
+        state = self._load()
+        target = cpv.encode("utf8")
+        lo, hi = 0, state[1][0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = self._entry(state, mid)
+            key = self._raw_string(state, record[0])
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                return state, record
+        return state, None
+
+    def _records(self):
+        """Return the loaded state and all its records."""
+        state = self._load()
+        return state, [self._entry(state, pos) for pos in range(state[1][0])]
+
+    def _stored_keys(self):
+        state, records = self._records()
+        return [self._string(state, record[0]) for record in records]
+
+    def _getitem(self, cpv):
+        if cpv in self._pending:
+            values = self._pending[cpv]
+            if values is None:
+                raise KeyError(cpv)
+            d = self._cdict_kls(values)
+        else:
+            try:
+                state, record = self._find(cpv)
+                if record is None:
+                    raise KeyError(cpv)
+                d = self._cdict_kls()
+                known = self._known_keys
+                for key, idx in zip(state[1][1], record[1:]):
+                    if idx != _missing and key in known:
+                        d[key] = self._string(state, idx)
+            except (struct.error, UnicodeDecodeError) as e:
+                raise errors.CacheCorruption(cpv, e) from e
+        try:
+            d[self._chf_key] = self._chf_deserializer(d[self._chf_key])
+        except (KeyError, ValueError) as e:
+            raise errors.CacheCorruption(cpv, f"invalid chf: {e}") from e
+        return d
+
+    def _setitem(self, cpv, values):
+        known = self._known_keys
+        self._pending[cpv] = {k: str(v) for k, v in values.items() if k in known}
+
+    def _delitem(self, cpv):
+        if cpv not in self:
+            raise KeyError(cpv)
+        self._pending[cpv] = None
+
+    def __contains__(self, cpv):
+        if cpv in self._pending:
+            return self._pending[cpv] is not None
+        return self._find(cpv)[1] is not None
+
+    def keys(self):
+        pending = self._pending
+        for cpv in self._stored_keys():
+            if cpv not in pending:
+                yield cpv
+        yield from (k for k, v in list(pending.items()) if v is not None)
+
+    def eclass_users(self, eclasses):
+        """Return the cpvs of entries inheriting any of the given eclasses.
+
+        Only the eclass data of each entry is decoded.
+        """
+        eclasses = frozenset(eclasses)
+        users = set()
+        state, records = self._records()
+        try:
+            column = state[1][1].index("_eclasses_") + 1
+        except ValueError:
+            column = None
+        for record in records:
+            cpv = self._string(state, record[0])
+            if cpv in self._pending:
+                continue
+            if column is not None and record[column] != _missing:
+                inherited = self._inherited_eclasses(
+                    self._string(state, record[column])
+                )
+                if not eclasses.isdisjoint(inherited):
+                    users.add(cpv)
+        for cpv, values in self._pending.items():
+            if values is not None:
+                inherited = self._inherited_eclasses(values.get("_eclasses_", ""))
+                if not eclasses.isdisjoint(inherited):
+                    users.add(cpv)
+        return frozenset(users)
+
+    def commit(self, force=False):
+        if not force or not self._pending:
+            return
+        base = os.path.dirname(self.location)
+        if base and not ensure_dirs(base, mode=0o775, minimal=False):
+            raise errors.GeneralCacheCorruption(
+                f"error creating directory for {self.location!r}"
+            )
+        # serialize writers, e.g. regen worker processes, and merge updates
+        # into the file's current content instead of the possibly stale mapping
+        with open(f"{self.location}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._close()
+            entries = {}
+            state, records = self._records()
+            keys = state[1][1]
+            for record in records:
+                cpv = self._string(state, record[0])
+                if cpv not in self._pending:
+                    entries[cpv] = {
+                        k: self._string(state, idx)
+                        for k, idx in zip(keys, record[1:])
+                        if idx != _missing
+                    }
+            entries.update((k, v) for k, v in self._pending.items() if v is not None)
+            self._write(entries)
+        self._pending = {}
+
+    def _write(self, entries):
+        keys = sorted(set().union(*entries.values())) if entries else []
+        strings = {}
+
+        def intern(s):
+            return strings.setdefault(s, len(strings))
+
+        key_ids = [intern(k) for k in keys]
+        records = []
+        for cpv in sorted(entries, key=lambda x: x.encode("utf8")):
+            values = entries[cpv]
+            record = [intern(cpv)]
+            record.extend(
+                _missing if (v := values.get(k)) is None else intern(v) for k in keys
+            )
+            records.append(record)
+
+        encoded = [s.encode("utf8") for s in strings]
+        offsets = [0]
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+
+        base, name = os.path.split(self.location)
+        path = pjoin(base, f".update.{os.getpid()}.{name}")
+        try:
+            with open(path, "wb") as f:
+                f.write(_header.pack(_MAGIC, len(records), len(keys), len(encoded)))
+                f.write(struct.pack(f"<{len(keys)}I", *key_ids))
+                for record in records:
+                    f.write(struct.pack(f"<{len(record)}I", *record))
+                f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+                f.writelines(encoded)
+            self._ensure_access(path)
+            os.rename(path, self.location)
+        except EnvironmentError as e:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            raise errors.GeneralCacheCorruption(e) from e
+        self._close()
+
+    def _close(self):
+        # the mapping is closed once no thread still uses the dropped state
+        self._state = None
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        d["_state"] = None
+        return d
+
+
+class md5_cache(database):
+    """Packed cache using md5 checksums, compatible with md5-cache entries."""
+
+    chf_type = "md5"
+    eclass_chf_types = ("md5",)
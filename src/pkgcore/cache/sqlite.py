@@ -0,0 +1,263 @@
+"""
+single file sqlite based backend
+"""
+
+__all__ = ("database", "md5_cache")
+
+import os
+import sqlite3
+import threading
+
+from snakeoil.osutils import ensure_dirs
+
+from ..config.hint import ConfigHint
+from . import errors, fs_template
+
+# bump on incompatible changes to the table layout
+_SCHEMA_VERSION = 1
+
+# seconds to wait on the database being locked by other writers
+_LOCK_TIMEOUT = 300
+
+
+class database(fs_template.FsBased):
+    """Stores all cache entries in a single indexed sqlite database.
+
+    Entries are keyed by cpv; the chf value and eclass data get their own
+    columns while the remaining keys are stored in key=value form. Writes
+    are queued in a transaction and committed every ``sync_rate`` updates or
+    when :py:meth:`commit` is called.
+    """
+
+    pkgcore_config_type = ConfigHint(
+        types={
+            "readonly": "bool",
+            "location": "str",
+            "label": "str",
+            "auxdbkeys": "list",
+        },
+        required=["location"],
+        positional=["location"],
+        typename="cache",
+    )
+
+    autocommits = False
+    default_sync_rate = 100
+    eclass_chf_types = ("eclassdir", "mtime")
+
+    def __init__(self, *args, **config):
+        super().__init__(*args, **config)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._conn_pid = None
+
+    @property
+    def _db(self):
+        with self._lock:
+            if self._conn is None or self._conn_pid != os.getpid():
+                # connections can't be shared with forked processes
+                self._conn = self._connect()
+                self._conn_pid = os.getpid()
+            return self._conn
+
+    def _connect(self):
+        if not self.readonly:
+            self._ensure_dirs_for_db()
+        elif not os.path.exists(self.location):
+            # readonly and nonexistent; use an empty in-memory db
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_tables(conn)
+            return conn
+        try:
+            uri = f"file:{self.location}" + ("?mode=ro" if self.readonly else "")
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False,
+                isolation_level="DEFERRED",
+                timeout=_LOCK_TIMEOUT,
+            )
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0 and not self.readonly:
+                self._create_tables(conn)
+                self._ensure_access(self.location)
+            elif version != _SCHEMA_VERSION:
+                conn.close()
+                raise errors.InitializationError(
+                    self.__class__.__name__,
+                    f"unsupported schema version {version} in {self.location!r}",
+                )
+            chf_type = conn.execute(
+                "SELECT value FROM info WHERE key = 'chf_type'"
+            ).fetchone()
+            if chf_type is None or chf_type[0] != self.chf_type:
+                conn.close()
+                raise errors.InitializationError(
+                    self.__class__.__name__,
+                    f"{self.location!r} doesn't use {self.chf_type!r} checksums",
+                )
+        except sqlite3.Error as e:
+            raise errors.InitializationError(self.__class__.__name__, e) from e
+        return conn
+
+    def _ensure_dirs_for_db(self):
+        path = os.path.dirname(self.location)
+        if path and not ensure_dirs(path, mode=0o775, minimal=False):
+            raise errors.InitializationError(
+                self.__class__.__name__, f"error creating directory {path!r}"
+            )
+
+    def _create_tables(self, conn):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS info "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata "
+                "(cpv TEXT PRIMARY KEY, chf TEXT NOT NULL, "
+                "eclasses TEXT, data TEXT NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS inherits "
+                "(eclass TEXT NOT NULL, cpv TEXT NOT NULL, "
+                "PRIMARY KEY (eclass, cpv)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS inherits_cpv ON inherits (cpv)")
+            conn.execute(
+                "INSERT OR REPLACE INTO info VALUES ('chf_type', ?)",
+                (self.chf_type,),
+            )
+            conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _getitem(self, cpv):
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT chf, eclasses, data FROM metadata WHERE cpv = ?", (cpv,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+        if row is None:
+            raise KeyError(cpv)
+        return self._parse_row(cpv, *row)
+
+    def _parse_row(self, cpv, chf, eclasses, data):
+        d = self._cdict_kls()
+        known = self._known_keys
+        try:
+            for line in data.splitlines():
+                k, v = line.split("=", 1)
+                if k in known:
+                    d[k] = v
+            if eclasses is not None:
+                d["_eclasses_"] = eclasses
+            d[self._chf_key] = self._chf_deserializer(chf)
+        except ValueError as e:
+            raise errors.CacheCorruption(cpv, e) from e
+        return d
+
+    def _setitem(self, cpv, values):
+        values = dict(values)
+        chf = values.pop(self._chf_key)
+        eclasses = values.pop("_eclasses_", None)
+        known = self._known_keys
+        data = "".join(f"{k}={v}\n" for k, v in sorted(values.items()) if k in known)
+        with self._lock:
+            try:
+                db = self._db
+                db.execute(
+                    "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                    (cpv, str(chf), eclasses, data),
+                )
+                db.execute("DELETE FROM inherits WHERE cpv = ?", (cpv,))
+                db.executemany(
+                    "INSERT OR IGNORE INTO inherits VALUES (?, ?)",
+                    ((x, cpv) for x in self._inherited_eclasses(eclasses or "")),
+                )
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+
+    def _delitem(self, cpv):
+        with self._lock:
+            try:
+                cursor = self._db.execute("DELETE FROM metadata WHERE cpv = ?", (cpv,))
+                self._db.execute("DELETE FROM inherits WHERE cpv = ?", (cpv,))
+            except sqlite3.Error as e:
+                raise errors.CacheCorruption(cpv, e) from e
+        if not cursor.rowcount:
+            raise KeyError(cpv)
+
+    def __contains__(self, cpv):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM metadata WHERE cpv = ?", (cpv,)
+            ).fetchone()
+        return row is not None
+
+    def keys(self):
+        with self._lock:
+            rows = self._db.execute("SELECT cpv FROM metadata").fetchall()
+        return (row[0] for row in rows)
+
+    def items(self):
+        """Yield all entries using a single query."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT cpv, chf, eclasses, data FROM metadata"
+            ).fetchall()
+        for row in rows:
+            d = self._parse_row(*row)
+            if "_eclasses_" in d:
+                d["_eclasses_"] = self.reconstruct_eclasses(row[0], d["_eclasses_"])
+            yield row[0], d
+
+    def eclass_users(self, eclasses):
+        eclasses = tuple(eclasses)
+        if not eclasses:
+            return frozenset()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT cpv FROM inherits WHERE eclass IN (%s)"
+                % ", ".join("?" * len(eclasses)),
+                eclasses,
+            ).fetchall()
+        return frozenset(row[0] for row in rows)
+
+    def commit(self, force=False):
+        with self._lock:
+            if self._conn is None or self._conn_pid != os.getpid() or self.readonly:
+                return
+            try:
+                self._conn.commit()
+            except sqlite3.Error as e:
+                raise errors.GeneralCacheCorruption(e) from e
+
+    def close(self):
+        """Commit pending updates and close the database connection."""
+        with self._lock:
+            if self._conn is not None and self._conn_pid == os.getpid():
+                self.commit()
+                self._conn.close()
+            self._conn = None
+
+    def __getstate__(self):
+        d = self.__dict__.copy()
+        del d["_lock"]
+        d["_conn"] = None
+        return d
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+
+class md5_cache(database):
+    """sqlite database using md5 checksums, compatible with md5-cache entries.
+
+    This allows populating the database from a repo's md5-cache via
+    pclonecache.
+    """
+
+    chf_type = "md5"
+    eclass_chf_types = ("md5",)
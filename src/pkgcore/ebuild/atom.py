@@ -8,6 +8,7 @@ gentoo ebuild atom, should be generalized into an agnostic base
 __all__ = ("atom", "transitive_use_atom")
 
 import string
+from sys import intern
 
 from snakeoil import klass
 from snakeoil.compatibility import cmp
@@ -116,7 +117,11 @@ class atom(boolean.AndRestriction, metaclass=klass.generic_equality):
                 raise errors.MalformedAtom(orig_atom, "use restriction isn't completed")
             elif use_end != len(atom) - 1:
                 raise errors.MalformedAtom(orig_atom, "trailing garbage after use dep")
-            sf(self, "use", tuple(sorted(atom[use_start + 1 : use_end].split(","))))
+            sf(
+                self,
+                "use",
+                tuple(sorted(map(intern, atom[use_start + 1 : use_end].split(",")))),
+            )
             for x in self.use:
                 # stripped purely for validation reasons
                 try:
@@ -173,7 +178,7 @@ class atom(boolean.AndRestriction, metaclass=klass.generic_equality):
                         f"repo_id may contain only [a-Z0-9_-/], found {repo_id!r}",
                     )
                 atom = atom[:i2]
-                sf(self, "repo_id", repo_id)
+                sf(self, "repo_id", intern(repo_id))
             else:
                 sf(self, "repo_id", None)
             # slot dep.
@@ -231,8 +236,8 @@ class atom(boolean.AndRestriction, metaclass=klass.generic_equality):
                     slot, subslot = slots
 
             sf(self, "slot_operator", slot_operator)
-            sf(self, "slot", slot)
-            sf(self, "subslot", subslot)
+            sf(self, "slot", None if slot is None else intern(slot))
+            sf(self, "subslot", None if subslot is None else intern(subslot))
             atom = atom[:slot_start]
         else:
             sf(self, "slot_operator", None)
@@ -259,7 +264,7 @@ class atom(boolean.AndRestriction, metaclass=klass.generic_equality):
 
         if atom[0] in ("<", ">"):
             if atom[1] == "=":
-                sf(self, "op", atom[:2])
+                sf(self, "op", intern(atom[:2]))
                 atom = atom[2:]
             else:
                 sf(self, "op", atom[0])
@@ -298,6 +303,9 @@ class atom(boolean.AndRestriction, metaclass=klass.generic_equality):
             sf(self, "_cpv", cpv.CPV(self.cpvstr, versioned=bool(self.op)))
         except errors.InvalidCPV as e:
             raise errors.MalformedAtom(orig_atom) from e
+        if not self.op:
+            # share the interned key
+            sf(self, "cpvstr", self._cpv.cpvstr)
 
         if self.op:
             if self.version is None:
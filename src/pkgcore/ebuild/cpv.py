@@ -1,6 +1,7 @@
 """gentoo ebuild specific base package class"""
 
 from collections import UserString
+from sys import intern
 
 from snakeoil.compatibility import cmp
 from snakeoil.demandload import demand_compile_regexp
@@ -123,6 +124,62 @@ class Revision(UserString):
         return self.data >= other
 
 
+def _parse_version(ver: str) -> tuple:
+    """Split up a version into a tuple ordered the same way as :py:func:`ver_cmp`."""
+    # Split up the version into a dotted string and a list of suffixes.
+    parts = ver.split("_")
+    ver_parts = parts[0].split(".")
+
+    # Pull out any letter suffix on the final component.
+    if ver_parts[-1][-1].isalpha():
+        letter = ord(ver_parts[-1][-1])
+        ver_parts[-1] = ver_parts[-1][:-1]
+    else:
+        # Using -1 sorts it before any letter
+        letter = -1
+
+    # Components beginning with a "0" are compared as floats so that
+    # 1.1 > 1.02, and always sort before integer components.
+    components = tuple(
+        (0, x.rstrip("0")) if x[0] == "0" else (1, int(x)) for x in ver_parts
+    )
+
+    # Match against our regular expression to make a split between
+    # "beta" and "1" in "beta1".
+    suffixes = []
+    for suffix in parts[1:]:
+        match = suffix_regexp.match(suffix)
+        suffixes.append((suffix_value[match.group(1)], int("0" + match.group(2))))
+    # A missing suffix sorts after "rc" and before "p" suffixes.
+    suffixes.append((0,))
+
+    return components, letter, tuple(suffixes)
+
+
+# shared version keys, the same versions are used by many packages
+_version_keys = {}
+
+
+def version_key(version: str, revision=None) -> tuple:
+    """Return a key for sorting versions.
+
+    Keys compare the same way the versions do via :py:func:`ver_cmp`, allowing
+    versions to be sorted by plain tuple comparisons.
+
+    :param version: version string
+    :param revision: revision as a :py:class:`Revision`, string, or integer
+    """
+    if isinstance(revision, Revision):
+        revision = revision._revint
+    else:
+        revision = int(revision or 0)
+    try:
+        return _version_keys[version, revision]
+    except KeyError:
+        key = (_parse_version(version), revision)
+        return _version_keys.setdefault((version, revision), key)
+
+
 def ver_cmp(ver1: str, rev1: str, ver2: str, rev2: str) -> int:
     # If the versions are the same, comparing revisions will suffice.
     if ver1 == ver2:
@@ -131,115 +188,27 @@ def ver_cmp(ver1: str, rev1: str, ver2: str, rev2: str) -> int:
             return 0
         return cmp(rev1, rev2)
 
-    # Split up the versions into dotted strings and lists of suffixes.
-    parts1 = ver1.split("_")
-    parts2 = ver2.split("_")
-
-    # If the dotted strings are equal, we can skip doing a detailed comparison.
-    if parts1[0] != parts2[0]:
-        # First split up the dotted strings into their components.
-        ver_parts1 = parts1[0].split(".")
-        ver_parts2 = parts2[0].split(".")
-
-        # Pull out any letter suffix on the final components and keep
-        # them for later.
-        letters = []
-        for ver_parts in (ver_parts1, ver_parts2):
-            if ver_parts[-1][-1].isalpha():
-                letters.append(ord(ver_parts[-1][-1]))
-                ver_parts[-1] = ver_parts[-1][:-1]
-            else:
-                # Using -1 simplifies comparisons later
-                letters.append(-1)
-
-        # OPT: Pull length calculation out of the loop
-        ver_parts1_len = len(ver_parts1)
-        ver_parts2_len = len(ver_parts2)
-
-        # Iterate through the components
-        for v1, v2 in zip(ver_parts1, ver_parts2):
-            # If the string components are equal, the numerical
-            # components will be equal too.
-            if v1 == v2:
-                continue
-
-            # If one of the components begins with a "0" then they
-            # are compared as floats so that 1.1 > 1.02; else ints.
-            if v1[0] != "0" and v2[0] != "0":
-                v1 = int(v1)
-                v2 = int(v2)
-            else:
-                # handle the 0.060 == 0.060 case.
-                v1 = v1.rstrip("0")
-                v2 = v2.rstrip("0")
-
-            # If they are not equal, the higher value wins.
-            c = cmp(v1, v2)
-            if c:
-                return c
-
-        if ver_parts1_len > ver_parts2_len:
-            return 1
-        elif ver_parts2_len > ver_parts1_len:
-            return -1
-
-        # The dotted components were equal. Let's compare any single
-        # letter suffixes.
-        if letters[0] != letters[1]:
-            return cmp(letters[0], letters[1])
-
-    # The dotted components were equal, so remove them from our lists
-    # leaving only suffixes.
-    del parts1[0]
-    del parts2[0]
-
-    # OPT: Pull length calculation out of the loop
-    parts1_len = len(parts1)
-    parts2_len = len(parts2)
-
-    # Iterate through the suffixes
-    for x in range(max(parts1_len, parts2_len)):
-        # If we're at the end of one of our lists, we need to use
-        # the next suffix from the other list to decide who wins.
-        if x == parts1_len:
-            match = suffix_regexp.match(parts2[x])
-            val = suffix_value[match.group(1)]
-            if val:
-                return cmp(0, val)
-            return cmp(0, int("0" + match.group(2)))
-        if x == parts2_len:
-            match = suffix_regexp.match(parts1[x])
-            val = suffix_value[match.group(1)]
-            if val:
-                return cmp(val, 0)
-            return cmp(int("0" + match.group(2)), 0)
-
-        # If the string values are equal, no need to parse them.
-        # Continue on to the next.
-        if parts1[x] == parts2[x]:
-            continue
-
-        # Match against our regular expression to make a split between
-        # "beta" and "1" in "beta1"
-        match1 = suffix_regexp.match(parts1[x])
-        match2 = suffix_regexp.match(parts2[x])
-
-        # If our int'ified suffix names are different, use that as the basis
-        # for comparison.
-        c = cmp(suffix_value[match1.group(1)], suffix_value[match2.group(1)])
-        if c:
-            return c
-
-        # Otherwise use the digit as the basis for comparison.
-        c = cmp(int("0" + match1.group(2)), int("0" + match2.group(2)))
-        if c:
-            return c
+    c = cmp(version_key(ver1)[0], version_key(ver2)[0])
+    if c:
+        return c
 
     # Our versions had different strings but ended up being equal.
     # The revision holds the final difference.
     return cmp(rev1, rev2)
 
 
+# shared revision instances, only a handful of distinct revisions exist
+_revisions = {}
+
+
+def _get_revision(rev):
+    """Return the shared :obj:`Revision` instance for a revision string."""
+    try:
+        return _revisions[rev]
+    except KeyError:
+        return _revisions.setdefault(rev, Revision(rev))
+
+
 class CPV(base.base):
     """base ebuild package class
 
@@ -248,6 +217,7 @@ class CPV(base.base):
     :ivar key: strkey (cat/pkg)
     :ivar version: str version
     :ivar revision: str revision
+    :ivar version_key: key sorting versions, see :py:func:`version_key`
     :ivar versioned_atom: atom matching this exact version
     :ivar unversioned_atom: atom matching all versions of this package
     """
@@ -260,6 +230,7 @@ class CPV(base.base):
         "version",
         "revision",
         "fullver",
+        "version_key",
     )
 
     def __init__(self, *args, versioned=None):
@@ -302,7 +273,8 @@ class CPV(base.base):
         if not isvalid_cat_re.match(category):
             raise InvalidCPV(cpvstr, "invalid category name")
         sf = object.__setattr__
-        sf(self, "category", category)
+        # components are shared between the many CPVs and atoms of a tree
+        sf(self, "category", intern(category))
         sf(self, "cpvstr", cpvstr)
         pkg_chunks = pkgver.split("-")
         lpkg_chunks = len(pkg_chunks)
@@ -315,7 +287,7 @@ class CPV(base.base):
                     raise InvalidCPV(
                         cpvstr, "missing package name, version, and/or revision"
                     )
-                rev = Revision(pkg_chunks.pop(-1)[1:])
+                rev = _get_revision(pkg_chunks.pop(-1)[1:])
                 if rev == 0:
                     # reset stored cpvstr to drop -r0+
                     sf(self, "cpvstr", f"{category}/{'-'.join(pkg_chunks)}")
@@ -324,28 +296,31 @@ class CPV(base.base):
                     sf(self, "cpvstr", f"{category}/{'-'.join(pkg_chunks)}-r{int(rev)}")
                 sf(self, "revision", rev)
             else:
-                sf(self, "revision", Revision(""))
+                sf(self, "revision", _get_revision(""))
 
             if not isvalid_version_re.match(pkg_chunks[-1]):
                 raise InvalidCPV(cpvstr, f"invalid version '{pkg_chunks[-1]}'")
-            sf(self, "version", pkg_chunks.pop(-1))
+            sf(self, "version", intern(pkg_chunks.pop(-1)))
             if self.revision:
-                sf(self, "fullver", f"{self.version}-r{self.revision}")
+                sf(self, "fullver", intern(f"{self.version}-r{self.revision}"))
             else:
                 sf(self, "fullver", self.version)
 
             if not isvalid_pkg_name(pkg_chunks):
                 raise InvalidCPV(cpvstr, "invalid package name")
-            sf(self, "package", "-".join(pkg_chunks))
-            sf(self, "key", f"{category}/{self.package}")
+            sf(self, "package", intern("-".join(pkg_chunks)))
+            sf(self, "key", intern(f"{category}/{self.package}"))
+            sf(self, "version_key", version_key(self.version, self.revision))
         else:
             if not isvalid_pkg_name(pkg_chunks):
                 raise InvalidCPV(cpvstr, "invalid package name")
             sf(self, "revision", None)
             sf(self, "fullver", None)
             sf(self, "version", None)
-            sf(self, "key", cpvstr)
-            sf(self, "package", "-".join(pkg_chunks))
+            sf(self, "version_key", None)
+            sf(self, "cpvstr", intern(cpvstr))
+            sf(self, "key", self.cpvstr)
+            sf(self, "package", intern("-".join(pkg_chunks)))
 
     def __hash__(self):
         return hash(self.cpvstr)
@@ -365,10 +340,7 @@ class CPV(base.base):
             if self.cpvstr == other.cpvstr:
                 return True
             if self.category == other.category and self.package == other.package:
-                return (
-                    ver_cmp(self.version, self.revision, other.version, other.revision)
-                    == 0
-                )
+                return self.version_key == other.version_key
         except AttributeError:
             pass
         return False
@@ -380,12 +352,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        < 0
-                    )
+                    return self.version_key < other.version_key
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -398,12 +365,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        <= 0
-                    )
+                    return self.version_key <= other.version_key
                 return self.package < other.package
             return self.category < other.category
         except AttributeError:
@@ -416,12 +378,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        > 0
-                    )
+                    return self.version_key > other.version_key
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
@@ -434,12 +391,7 @@ class CPV(base.base):
         try:
             if self.category == other.category:
                 if self.package == other.package:
-                    return (
-                        ver_cmp(
-                            self.version, self.revision, other.version, other.revision
-                        )
-                        >= 0
-                    )
+                    return self.version_key >= other.version_key
                 return self.package > other.package
             return self.category > other.category
         except AttributeError:
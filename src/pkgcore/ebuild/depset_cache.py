@@ -0,0 +1,378 @@
+"""
+persistent cache of parsed dependency trees
+
+Parsed DepSets are serialized into a compact tree of tagged tuples holding
+only builtin types, allowing them to be stored via :py:mod:`marshal` and
+rebuilt without running the DepSet or atom parsers again. Atoms are restored
+by directly setting their already validated fields.
+"""
+
+__all__ = ("DepSetCache", "encode", "decode", "source_key")
+
+import atexit
+import fcntl
+import marshal
+import os
+import threading
+from contextlib import contextmanager
+from hashlib import blake2b
+from weakref import WeakValueDictionary
+
+from snakeoil.klass import static_attrgetter
+from snakeoil.osutils import ensure_dirs
+
+from ..log import logger
+from ..restrictions import boolean, packages, values
+from .atom import atom, transitive_use_atom
+from .conditionals import DepSet
+from .cpv import CPV, _get_revision, version_key
+
+# bump when the encoded format changes
+_VERSION = 2
+
+# node tags
+_STR, _ATOM, _TRANSITIVE_ATOM, _CONTAINMENT, _CONDITIONAL, _BOOLEAN = range(6)
+
+_element_classes = (str, atom, transitive_use_atom, values.ContainmentMatch)
+_boolean_classes = (
+    boolean.AndRestriction,
+    boolean.OrRestriction,
+    boolean.JustOneRestriction,
+    boolean.AtMostOneOfRestriction,
+)
+
+
+# restored atoms, shared between DepSets like parsed atoms via instance caching
+_atoms = WeakValueDictionary()
+
+# attribute getters of restored conditionals
+_conditional_attrs = {}
+
+
+class UnsupportedNode(TypeError):
+    """DepSet node that can't be encoded."""
+
+
+def _encode_node(node):
+    kls = node.__class__
+    if kls is str:
+        return (_STR, node)
+    elif kls is atom or kls is transitive_use_atom:
+        cpv = node._cpv
+        return (
+            _ATOM if kls is atom else _TRANSITIVE_ATOM,
+            str(node),
+            node.blocks,
+            node.blocks_strongly,
+            node.op,
+            node.negate_vers,
+            node.use,
+            node.slot_operator,
+            node.slot,
+            node.subslot,
+            node.repo_id,
+            cpv.cpvstr,
+            cpv.key,
+            cpv.category,
+            cpv.package,
+            cpv.version,
+            None if cpv.revision is None else cpv.revision.data,
+            cpv.fullver,
+        )
+    elif kls is values.ContainmentMatch:
+        return (_CONTAINMENT, tuple(sorted(node.vals)), node.all, node.negate)
+    elif kls is packages.Conditional and not node.negate:
+        return (
+            _CONDITIONAL,
+            node.attr,
+            _encode_node(node.restriction),
+            tuple(_encode_node(x) for x in node.payload),
+        )
+    elif kls in _boolean_classes and not node.negate and node.type is None:
+        return (
+            _BOOLEAN,
+            _boolean_classes.index(kls),
+            tuple(_encode_node(x) for x in node.restrictions),
+        )
+    raise UnsupportedNode(f"unsupported DepSet node: {node!r}")
+
+
+def _restore_atom(data):
+    if (a := _atoms.get(data[:2])) is not None:
+        return a
+    (
+        tag,
+        s,
+        blocks,
+        blocks_strongly,
+        op,
+        negate_vers,
+        use,
+        slot_operator,
+        slot,
+        subslot,
+        repo_id,
+        cpvstr,
+        key,
+        category,
+        package,
+        version,
+        revision,
+        fullver,
+    ) = data
+    sf = object.__setattr__
+    cpv = object.__new__(CPV)
+    sf(cpv, "cpvstr", cpvstr)
+    sf(cpv, "key", key)
+    sf(cpv, "category", category)
+    sf(cpv, "package", package)
+    sf(cpv, "version", version)
+    sf(cpv, "revision", None if revision is None else _get_revision(revision))
+    sf(cpv, "fullver", fullver)
+    sf(cpv, "version_key", None if version is None else version_key(version, revision))
+    a = object.__new__(atom if tag == _ATOM else transitive_use_atom)
+    sf(a, "blocks", blocks)
+    sf(a, "blocks_strongly", blocks_strongly)
+    sf(a, "op", op)
+    sf(a, "cpvstr", cpvstr)
+    sf(a, "negate_vers", negate_vers)
+    sf(a, "use", use)
+    sf(a, "slot_operator", slot_operator)
+    sf(a, "slot", slot)
+    sf(a, "subslot", subslot)
+    sf(a, "repo_id", repo_id)
+    sf(a, "_cpv", cpv)
+    # string hashes vary between processes, so they're never stored
+    sf(a, "_hash", hash(s))
+    _atoms[data[:2]] = a
+    return a
+
+
+def _restore_conditional(attr, restriction, payload):
+    if (attr_data := _conditional_attrs.get(attr)) is None:
+        attr_data = _conditional_attrs[attr] = (
+            static_attrgetter(attr),
+            attr.split("."),
+        )
+    # skip regenerating attribute getters, see PackageRestriction.__init__()
+    sf = object.__setattr__
+    c = object.__new__(packages.Conditional)
+    sf(c, "negate", False)
+    sf(c, "_pull_attr_func", attr_data[0])
+    sf(c, "_attr_split", attr_data[1])
+    sf(c, "restriction", restriction)
+    sf(c, "ignore_missing", True)
+    sf(c, "payload", payload)
+    return c
+
+
+def _decode_node(data):
+    tag = data[0]
+    if tag == _STR:
+        return data[1]
+    elif tag == _ATOM or tag == _TRANSITIVE_ATOM:
+        return _restore_atom(data)
+    elif tag == _CONTAINMENT:
+        return values.ContainmentMatch(data[1], match_all=data[2], negate=data[3])
+    elif tag == _CONDITIONAL:
+        return _restore_conditional(
+            data[1], _decode_node(data[2]), tuple(map(_decode_node, data[3]))
+        )
+    elif tag == _BOOLEAN:
+        return _boolean_classes[data[1]](*map(_decode_node, data[2]))
+    raise ValueError(f"unknown DepSet node tag: {tag!r}")
+
+
+def encode(depset):
+    """Serialize a freshly parsed DepSet into a tree of builtin types.
+
+    :raises UnsupportedNode: if the DepSet contains nodes that can't be encoded
+    """
+    try:
+        element_class = _element_classes.index(depset.element_class)
+    except ValueError:
+        raise UnsupportedNode(f"unsupported element class: {depset.element_class!r}")
+    node_conds = depset._node_conds
+    if not isinstance(node_conds, bool):
+        # generated node conditionals aren't worth storing
+        node_conds = bool(node_conds)
+    return (
+        element_class,
+        node_conds,
+        tuple(_encode_node(x) for x in depset.restrictions),
+    )
+
+
+def decode(data):
+    """Rebuild a DepSet serialized via :py:func:`encode`."""
+    element_class, node_conds, restrictions = data
+    return DepSet(
+        tuple(map(_decode_node, restrictions)),
+        _element_classes[element_class],
+        node_conds,
+    )
+
+
+def source_key(eapi, *sources):
+    """Return the key identifying the raw strings DepSets are parsed from."""
+    h = blake2b(str(eapi).encode("utf8"), digest_size=16)
+    for s in sources:
+        h.update(b"\0")
+        h.update(s.encode("utf8"))
+    return h.digest()
+
+
+class DepSetCache:
+    """Pre-parsed DepSets of packages, stored in a single file.
+
+    Entries are keyed by cpv and validated against the key of the raw strings
+    they were parsed from, see :py:func:`source_key`, so stale entries are
+    never used. New entries are queued and appended to the file via
+    :py:meth:`flush`, which is automatically run at exit. Superseded and
+    obsolete entries are only dropped via :py:meth:`prune`.
+    """
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._entries = None
+        self._pending = {}
+        self._flush_registered = False
+
+    def _read(self):
+        """Return the stored entries, with later chunks overriding earlier ones."""
+        entries = {}
+        try:
+            with open(self.path, "rb") as f:
+                if marshal.load(f) != _VERSION:
+                    return entries
+                while True:
+                    chunk = marshal.load(f)
+                    if not isinstance(chunk, dict):
+                        raise ValueError("invalid chunk")
+                    entries.update(chunk)
+        except FileNotFoundError:
+            pass
+        except EOFError:
+            # end of file or a truncated trailing chunk
+            pass
+        except (EnvironmentError, ValueError, TypeError) as e:
+            logger.debug("ignoring invalid depset cache %r: %s", self.path, e)
+        return entries
+
+    def get(self, cpv, key):
+        """Return the encoded DepSets stored for a cpv.
+
+        :return: mapping of metadata keys to encoded DepSets, empty if the
+            stored entry is missing or was parsed from different sources
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            entry = self._pending.get(cpv) or self._entries.get(cpv)
+        if entry is not None:
+            try:
+                stored_key, depsets = marshal.loads(entry)
+            except (EOFError, ValueError, TypeError):
+                return {}
+            if stored_key == key:
+                return depsets
+        return {}
+
+    def update(self, cpv, key, attr, depset):
+        """Queue storing a parsed DepSet of a cpv."""
+        if self.readonly:
+            return
+        try:
+            encoded = encode(depset)
+        except UnsupportedNode as e:
+            logger.debug("not caching %s %s: %s", cpv, attr, e)
+            return
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            depsets = {}
+            if (entry := self._pending.get(cpv) or self._entries.get(cpv)) is not None:
+                try:
+                    stored_key, depsets = marshal.loads(entry)
+                except (EOFError, ValueError, TypeError):
+                    depsets = {}
+                else:
+                    if stored_key != key:
+                        depsets = {}
+            depsets[attr] = encoded
+            self._pending[cpv] = marshal.dumps((key, depsets))
+            if not self._flush_registered:
+                atexit.register(self.flush)
+                self._flush_registered = True
+
+    @contextmanager
+    def _locked_file(self):
+        """Lock the cache file, creating its directory as required."""
+        base = os.path.dirname(self.path)
+        if base and not ensure_dirs(base, mode=0o775, minimal=False):
+            raise PermissionError(f"failed creating {base!r}")
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _write(self, entries):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump(_VERSION, f)
+            marshal.dump(entries, f)
+        os.rename(tmp, self.path)
+
+    def flush(self):
+        """Append queued entries to the file without rewriting it."""
+        with self._lock:
+            if not self._pending:
+                return
+            try:
+                with self._locked_file():
+                    try:
+                        with open(self.path, "rb") as f:
+                            valid = marshal.load(f) == _VERSION
+                    except FileNotFoundError:
+                        valid = False
+                    except (EOFError, ValueError, TypeError):
+                        valid = False
+                    if valid:
+                        with open(self.path, "ab") as f:
+                            marshal.dump(self._pending, f)
+                    else:
+                        # replace missing, outdated or corrupted files
+                        self._write(self._pending)
+            except EnvironmentError as e:
+                logger.warning("failed writing depset cache %r: %s", self.path, e)
+            if self._entries is not None:
+                self._entries.update(self._pending)
+            self._pending = {}
+
+    def prune(self, cpvs):
+        """Rewrite the file, only keeping the latest entries of the given cpvs.
+
+        This is meant to be run alongside cleaning up the related metadata
+        cache, e.g. during regen, where the set of valid cpvs is known.
+        """
+        if self.readonly:
+            return
+        with self._lock:
+            try:
+                with self._locked_file():
+                    entries = self._read()
+                    entries.update(self._pending)
+                    entries = {k: v for k, v in entries.items() if k in cpvs}
+                    self._write(entries)
+            except EnvironmentError as e:
+                logger.warning("failed writing depset cache %r: %s", self.path, e)
+                return
+            self._entries = entries
+            self._pending = {}
+
+    def __getstate__(self):
+        return {"path": self.path, "readonly": self.readonly}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -563,7 +563,7 @@ def run_generic_phase(
     except Exception as e:
         if isinstance(e, ebd_ipc.IpcError):
             # notify bash side of IPC error
-            ebd.write(e.ret)
+            e.send(ebd)
             if isinstance(e, ebd_ipc.IpcInternalError):
                 # show main exception cause for internal IPC errors
                 ebd.shutdown_processor(force=True)
@@ -35,6 +35,10 @@ class IpcError(PkgcoreException):
         self.name = name
         self.ret = IpcCommand._encode_ret((code, msg))
 
+    def send(self, ebd):
+        """Notify the bash side of the error."""
+        IpcCommand._send_ret(ebd, (self.code, self.msg))
+
     def __str__(self):
         if self.name:
             return f"{self.name}: {self.msg}"
@@ -95,18 +99,24 @@ class IpcCommand:
         if self.name is None:
             self.name = self.__class__.__name__.lower()
 
-    def __call__(self, ebd):
+    def __call__(self, ebd, size=None):
         self.opts = arghparse.Namespace()
         self.ebd = ebd
         ret = 0
 
         # read info from bash side
-        nonfatal = self.read() == "true"
-        self.cwd = self.read()
-        self.phase = self.read()
-        options = shlex.split(self.read())
-        args = self.read().strip("\0")
-        args = args.split("\0") if args else []
+        if size is not None:
+            # protocol version 2 sends all info as a single block
+            nonfatal, self.cwd, self.phase, options, *args = ebd.read_fields(int(size))
+            nonfatal = nonfatal == "true"
+            options = shlex.split(options)
+        else:
+            nonfatal = self.read() == "true"
+            self.cwd = self.read()
+            self.phase = self.read()
+            options = shlex.split(self.read())
+            args = self.read().strip("\0")
+            args = args.split("\0") if args else []
 
         # parse args and run command
         with chdir(self.cwd):
@@ -124,20 +134,33 @@ class IpcCommand:
                 raise IpcInternalError("internal failure") from e
 
         # return completion status to the bash side
-        self.write(self._encode_ret(ret))
+        self._send_ret(ebd, ret)
 
     @staticmethod
-    def _encode_ret(ret):
-        """Encode exit status and any returned value to be sent back to the bash side."""
+    def _ret_fields(ret):
+        """Convert exit status and any returned value to fields for the bash side."""
         if ret is None:
-            return 0
+            return ("0",)
         elif isinstance(ret, tuple):
             code, response = ret
-            return f"{code}\x07{response}"
+            return (str(code), str(response))
         elif isinstance(ret, (int, str)):
-            return f"0\x07{ret}"
+            return ("0", str(ret))
         raise TypeError(f"unsupported return status type: {type(ret)}")
 
+    @classmethod
+    def _encode_ret(cls, ret):
+        """Encode exit status and any returned value to be sent back to the bash side."""
+        return "\x07".join(cls._ret_fields(ret))
+
+    @classmethod
+    def _send_ret(cls, ebd, ret):
+        """Send exit status and any returned value back to the bash side."""
+        if ebd.protocol > 1:
+            ebd.write_fields(*cls._ret_fields(ret))
+        else:
+            ebd.write(cls._encode_ret(ret))
+
     def parse_args(self, options, args):
         """Parse internal args passed from the bash side."""
         if self.parser is not None:
@@ -20,7 +20,7 @@ from ..package import errors as metadata_errors
 from ..package import metadata
 from ..package.base import DynamicGetattrSetter
 from ..restrictions import boolean, values
-from . import conditionals
+from . import conditionals, depset_cache
 from . import errors as ebuild_errors
 from . import processor
 from .atom import atom
@@ -57,13 +57,59 @@ class base(metadata.package):
 
     __slots__ = ("_pkg_metadata_shared",)
 
+    # metadata keys with parsed DepSets stored in the persistent cache
+    _cached_depset_keys = (
+        "BDEPEND",
+        "DEPEND",
+        "RDEPEND",
+        "PDEPEND",
+        "IDEPEND",
+        "LICENSE",
+        "REQUIRED_USE",
+        "RESTRICT",
+        "PROPERTIES",
+    )
+
+    @DynamicGetattrSetter.register
+    def _cached_depsets(self):
+        """Key and mapping of pre-parsed DepSets from the persistent cache."""
+        cache = getattr(self._parent, "_depset_cache", None)
+        if cache is None:
+            return None
+        # note this must run before any of the raw strings are popped
+        data = self.data
+        key = depset_cache.source_key(
+            data.get("EAPI", "0"), *(data.get(k, "") for k in self._cached_depset_keys)
+        )
+        return cache, key, cache.get(self.cpvstr, key)
+
+    def _parse_depset(self, key, parse):
+        """Return the parsed DepSet for a metadata key, using the persistent cache."""
+        if (cached := self._cached_depsets) is None:
+            return parse(self.data.pop(key, ""))
+        cache, source_key, depsets = cached
+        if (encoded := depsets.get(key)) is not None:
+            try:
+                depset = depset_cache.decode(encoded)
+            except (ValueError, TypeError, IndexError) as e:
+                logger.debug("ignoring invalid cached %s for %s: %s", key, self, e)
+            else:
+                self.data.pop(key, None)
+                return depset
+        depset = parse(self.data.pop(key, ""))
+        cache.update(self.cpvstr, source_key, key, depset)
+        return depset
+
     def _generate_depset(self, kls, key):
-        return conditionals.DepSet.parse(
-            self.data.pop(key, ""),
-            kls,
-            attr=key,
-            element_func=self.eapi.atom_kls,
-            transitive_use_atoms=self.eapi.options.transitive_use_atoms,
+        return self._parse_depset(
+            key,
+            partial(
+                conditionals.DepSet.parse,
+                element_class=kls,
+                attr=key,
+                element_func=self.eapi.atom_kls,
+                transitive_use_atoms=self.eapi.options.transitive_use_atoms,
+            ),
         )
 
     @DynamicGetattrSetter.register
@@ -92,12 +138,15 @@ class base(metadata.package):
 
     @DynamicGetattrSetter.register
     def license(self):
-        return conditionals.DepSet.parse(
-            self.data.pop("LICENSE", ""),
-            str,
-            operators={"||": boolean.OrRestriction, "": boolean.AndRestriction},
-            attr="LICENSE",
-            element_func=intern,
+        return self._parse_depset(
+            "LICENSE",
+            partial(
+                conditionals.DepSet.parse,
+                element_class=str,
+                operators={"||": boolean.OrRestriction, "": boolean.AndRestriction},
+                attr="LICENSE",
+                element_func=intern,
+            ),
         )
 
     @DynamicGetattrSetter.register
@@ -275,8 +324,14 @@ class base(metadata.package):
 
     @DynamicGetattrSetter.register
     def restrict(self):
-        return conditionals.DepSet.parse(
-            self.data.pop("RESTRICT", ""), str, operators={}, attr="RESTRICT"
+        return self._parse_depset(
+            "RESTRICT",
+            partial(
+                conditionals.DepSet.parse,
+                element_class=str,
+                operators={},
+                attr="RESTRICT",
+            ),
         )
 
     @DynamicGetattrSetter.register
@@ -323,8 +378,14 @@ class base(metadata.package):
 
     @DynamicGetattrSetter.register
     def properties(self):
-        return conditionals.DepSet.parse(
-            self.data.pop("PROPERTIES", ""), str, operators={}, attr="PROPERTIES"
+        return self._parse_depset(
+            "PROPERTIES",
+            partial(
+                conditionals.DepSet.parse,
+                element_class=str,
+                operators={},
+                attr="PROPERTIES",
+            ),
         )
 
     @DynamicGetattrSetter.register
@@ -356,35 +417,38 @@ class base(metadata.package):
     @DynamicGetattrSetter.register
     def required_use(self):
         if self.eapi.options.has_required_use:
-            data = self.data.pop("REQUIRED_USE", "")
-            if data:
-                operators = {
-                    "||": boolean.OrRestriction,
-                    "": boolean.AndRestriction,
-                    "^^": boolean.JustOneRestriction,
-                }
-
-                def _invalid_op(msg, *args):
-                    raise metadata_errors.MetadataException(
-                        self, "eapi", f"REQUIRED_USE: {msg}"
-                    )
-
-                if self.eapi.options.required_use_one_of:
-                    operators["??"] = boolean.AtMostOneOfRestriction
-                else:
-                    operators["??"] = partial(
-                        _invalid_op, f"EAPI '{self.eapi}' doesn't support '??' operator"
-                    )
-
-                return conditionals.DepSet.parse(
-                    data,
-                    values.ContainmentMatch,
-                    operators=operators,
-                    element_func=self._mk_required_use_node,
-                    attr="REQUIRED_USE",
-                )
+            return self._parse_depset("REQUIRED_USE", self._parse_required_use)
         return conditionals.DepSet()
 
+    def _parse_required_use(self, data):
+        if not data:
+            return conditionals.DepSet()
+        operators = {
+            "||": boolean.OrRestriction,
+            "": boolean.AndRestriction,
+            "^^": boolean.JustOneRestriction,
+        }
+
+        def _invalid_op(msg, *args):
+            raise metadata_errors.MetadataException(
+                self, "eapi", f"REQUIRED_USE: {msg}"
+            )
+
+        if self.eapi.options.required_use_one_of:
+            operators["??"] = boolean.AtMostOneOfRestriction
+        else:
+            operators["??"] = partial(
+                _invalid_op, f"EAPI '{self.eapi}' doesn't support '??' operator"
+            )
+
+        return conditionals.DepSet.parse(
+            data,
+            values.ContainmentMatch,
+            operators=operators,
+            element_func=self._mk_required_use_node,
+            attr="REQUIRED_USE",
+        )
+
     source_repository = klass.alias_attr("repo.repo_id")
 
     PN = klass.alias_attr("package")
@@ -471,6 +535,7 @@ class package_factory(metadata.factory):
         super().__init__(parent, *args, **kwargs)
         self._cache = cachedb
         self._ecache = eclass_cache
+        self._depset_cache = self._get_depset_cache(cachedb)
 
         if mirrors:
             mirrors = {k: fetch.mirror(v, k) for k, v in mirrors.items()}
@@ -483,6 +548,19 @@ class package_factory(metadata.factory):
         else:
             self.default_mirrors = None
 
+    @staticmethod
+    def _get_depset_cache(caches):
+        """Return the persistent DepSet cache for the given metadata caches.
+
+        It's stored as auxiliary data of the first metadata cache supporting
+        it, see :py:meth:`pkgcore.cache.base.sidecar_path`.
+        """
+        for cache in caches or ():
+            sidecar_path = getattr(cache, "sidecar_path", None)
+            if sidecar_path is not None and (path := sidecar_path("depsets")):
+                return depset_cache.DepSetCache(path)
+        return None
+
     def get_ebuild_src(self, pkg):
         return self._parent_repo._get_ebuild_src(pkg)
 
@@ -493,11 +571,17 @@ class package_factory(metadata.factory):
         return os.stat(self._get_ebuild_path(pkg)).st_mtime
 
     def _get_metadata(self, pkg, ebp=None, force_regen=False):
-        caches = self._cache
-        if force_regen:
-            caches = ()
+        if not force_regen:
+            if (data := self._get_cached_metadata(pkg)) is not None:
+                return data
+
+        # no cache entries, regen
+        return self._update_metadata(pkg, ebp=ebp)
+
+    def _get_cached_metadata(self, pkg):
+        """Return valid cached metadata for a package, None if there is none."""
         ebuild_hash = chksum.LazilyHashedPath(pkg.path)
-        for cache in caches:
+        for cache in self._cache or ():
             if cache is not None:
                 try:
                     data = cache[pkg.cpvstr]
@@ -511,9 +595,7 @@ class package_factory(metadata.factory):
                     logger.warning("caught cache error: %s", e)
                     del e
                     continue
-
-        # no cache entries, regen
-        return self._update_metadata(pkg, ebp=ebp)
+        return None
 
     def _update_metadata(self, pkg, ebp=None):
         parsed_eapi = pkg.eapi
@@ -528,6 +610,49 @@ class package_factory(metadata.factory):
                     pkg, "data", "failed sourcing ebuild", e
                 )
 
+        return self._store_metadata(pkg, mydata)
+
+    def _update_metadata_batch(self, pkgs, ebp):
+        """Regenerate the metadata of multiple packages using a single processor.
+
+        :return: iterable of package and metadata tuples, with
+            :obj:`pkgcore.package.errors.MetadataException` instances in place
+            of the metadata for packages that failed
+        """
+        pending = []
+        for pkg in pkgs:
+            if pkg.eapi.is_supported:
+                pending.append(pkg)
+            else:
+                yield pkg, {"EAPI": str(pkg.eapi)}
+
+        # iterate over results first so the batch runs to completion once all
+        # packages are consumed, callers stopping early must discard the
+        # processor since it's left with pending responses
+        results = ebp.get_keys_batch(pending, self._ecache)
+        done = 0
+        for mydata, pkg in zip(results, pending):
+            done += 1
+            if isinstance(mydata, processor.ProcessorError):
+                yield pkg, metadata_errors.MetadataException(
+                    pkg, "data", "failed sourcing ebuild", mydata
+                )
+                continue
+            try:
+                yield pkg, self._store_metadata(pkg, mydata)
+            except metadata_errors.MetadataException as e:
+                yield pkg, e
+
+        # packages remaining after the processor died
+        for pkg in pending[done:]:
+            try:
+                yield pkg, self._update_metadata(pkg)
+            except metadata_errors.MetadataException as e:
+                yield pkg, e
+
+    def _store_metadata(self, pkg, mydata):
+        """Finalize regenerated metadata and store it in the writable cache."""
+        parsed_eapi = pkg.eapi
         # Rewrite defined_phases as needed, since we now know the EAPI.
         eapi = get_eapi(mydata.get("EAPI", "0"))
         if parsed_eapi != eapi:
@@ -57,9 +57,10 @@ def build_regex_string(tokens, invert=False):
 
 
 FUNC_LEN = len("function")
+_nonspace_search = re.compile(r"\S").search
 
 
-def is_function(buff, pos):
+def raw_is_function(buff, pos):
     """:return: start, end, pos or None, None, None tuple."""
     isspace = str.isspace
     try:
@@ -101,7 +102,7 @@ def is_function(buff, pos):
         return None, None, None
 
 
-def is_envvar(buff, pos):
+def raw_is_envvar(buff, pos):
     """:return: start, end, pos or None, None, None tuple."""
     try:
         while buff[pos] in " \t":
@@ -144,7 +145,9 @@ def process_scope(
         com_start = pos
         ch = buff[pos]
         if isspace(ch):
-            pos += 1
+            # skip to the next non-space char
+            match = _nonspace_search(buff, pos)
+            pos = end if match is None else match.start()
             continue
 
         # Ignore comments.
@@ -155,7 +158,7 @@ def process_scope(
         new_start, new_end, new_p = is_function(buff, pos)
         if new_p is not None:
             func_name = buff[new_start:new_end]
-            logger.debug(f"matched func name {func_name!r}")
+            logger.debug("matched func name %r", func_name)
             new_p = process_scope(
                 None,
                 buff,
@@ -166,11 +169,11 @@ def process_scope(
                 func_callback=func_callback,
                 func_level=func_level + 1,
             )
-            logger.debug(f"ended processing {func_name!r}")
+            logger.debug("ended processing %r", func_name)
             if func_callback is not None:
                 func_callback(func_level, func_name, buff[new_start:new_p])
             if func_match is not None and func_match(func_name):
-                logger.debug(f"filtering func {func_name!r}")
+                logger.debug("filtering func %r", func_name)
                 window_end = com_start
             pos = new_p
             pos += 1
@@ -189,11 +192,11 @@ def process_scope(
             pos = new_p
             if envvar_callback:
                 envvar_callback(var_name)
-            logger.debug(f"matched env assign {var_name!r}")
+            logger.debug("matched env assign %r", var_name)
 
             if var_match is not None and var_match(var_name):
                 # This would be filtered.
-                logger.info(f"filtering var {var_name!r}")
+                logger.info("filtering var %r", var_name)
                 window_end = com_start
 
             if pos >= end:
@@ -307,7 +310,7 @@ def walk_statement_pound(buff, pos, endchar=None):
     return pos
 
 
-def walk_command_complex(buff, pos, endchar, interpret_level):
+def raw_walk_command_complex(buff, pos, endchar, interpret_level):
     start = pos
     isspace = str.isspace
     end = len(buff)
@@ -388,7 +391,147 @@ def raw_walk_command_escaped_parsing(buff, pos, endchar):
     return pos
 
 
-walk_command_escaped_parsing = raw_walk_command_escaped_parsing
+# The accelerated walkers below behave identically to the raw ones they're
+# based on, but use precompiled regexes to jump directly to the next char
+# they act on instead of stepping over every char in Python.
+_specials = {}
+
+
+def _specials_search(chars, spaces=False):
+    """Return a search method for the next occurrence of any of the given chars."""
+    key = (chars, spaces)
+    try:
+        return _specials[key]
+    except KeyError:
+        pattern = "[%s%s]" % (r"\s" if spaces else "", re.escape(chars))
+        search = _specials[key] = re.compile(pattern).search
+        return search
+
+
+def fast_walk_command_complex(buff, pos, endchar, interpret_level):
+    if interpret_level == COMMAND_PARSING:
+        search = _specials_search(endchar + ";\n\\<#${(`\"'")
+    else:
+        search = _specials_search(endchar + "\\<#${`\"'", spaces=True)
+    start = pos
+    isspace = str.isspace
+    end = len(buff)
+    while pos < end:
+        match = search(buff, pos)
+        if match is None:
+            return end
+        pos = match.start()
+        ch = buff[pos]
+        if ch == endchar:
+            if endchar != "}":
+                return pos
+            if start == pos:
+                return pos
+            if buff[pos - 1] in ";\n":
+                return pos
+        elif (interpret_level == COMMAND_PARSING and ch in ";\n") or (
+            interpret_level == SPACE_PARSING and isspace(ch)
+        ):
+            return pos
+        elif ch == "\\":
+            pos += 1
+        elif ch == "<":
+            if (
+                pos < end - 1
+                and buff[pos + 1] == "<"
+                and interpret_level == COMMAND_PARSING
+            ):
+                pos = walk_here_statement(buff, pos + 1)
+                continue
+            else:
+                logger.debug(f"noticed <, interpret_level={interpret_level}")
+        elif ch == "#":
+            if start == pos or isspace(buff[pos - 1]) or buff[pos - 1] == ";":
+                pos = walk_statement_pound(buff, pos)
+                continue
+        elif ch == "$":
+            pos = walk_dollar_expansion(buff, pos + 1, end, endchar)
+            continue
+        elif ch == "{":
+            pos = walk_command_escaped_parsing(buff, pos + 1, "}")
+        elif ch == "(" and interpret_level == COMMAND_PARSING:
+            pos = walk_command_escaped_parsing(buff, pos + 1, ")")
+        elif ch in '`"':
+            pos = walk_command_escaped_parsing(buff, pos + 1, ch)
+        elif ch == "'" and endchar != '"':
+            pos = walk_statement_no_parsing(buff, pos + 1, "'")
+        pos += 1
+    return pos
+
+
+def fast_walk_command_escaped_parsing(buff, pos, endchar):
+    if endchar == '"':
+        # only escapes, backticks and expansions are parsed in double quotes
+        search = _specials_search('"\\`$')
+    else:
+        search = _specials_search(endchar + "\\{(`\"'$#")
+    end = len(buff)
+    while pos < end:
+        match = search(buff, pos)
+        if match is None:
+            return end
+        pos = match.start()
+        ch = buff[pos]
+        if ch == endchar:
+            return pos
+        elif ch == "\\":
+            pos += 1
+        elif ch == "{":
+            if endchar != '"':
+                pos = fast_walk_command_escaped_parsing(buff, pos + 1, "}")
+        elif ch == "(":
+            if endchar != '"':
+                pos = fast_walk_command_escaped_parsing(buff, pos + 1, ")")
+        elif ch in '`"':
+            pos = fast_walk_command_escaped_parsing(buff, pos + 1, ch)
+        elif ch == "'" and endchar != '"':
+            pos = walk_statement_no_parsing(buff, pos + 1, "'")
+        elif ch == "$":
+            pos = walk_dollar_expansion(
+                buff, pos + 1, end, endchar, disable_quote=endchar == '"'
+            )
+            continue
+        elif ch == "#" and endchar != '"':
+            pos = walk_statement_pound(buff, pos, endchar)
+            continue
+        pos += 1
+    return pos
+
+
+# whitespace and an optional "function" keyword followed by a single
+# whitespace char are matched atomically like in raw_is_function(), using
+# negative lookaheads and a lookahead group respectively
+_function_match = re.compile(
+    r"[ \t]*(?![ \t])(?=(function\s|))\1\s*(?!\s)([^\0 \t\n=\"'()]+)[ \t]*\([ \t]*\)\s*\{"
+).match
+_envvar_match = re.compile(r"[ \t]*([^\0\"'()\- \t\n=]+)=").match
+
+
+def fast_is_function(buff, pos):
+    """:return: start, end, pos or None, None, None tuple."""
+    match = _function_match(buff, pos)
+    if match is None:
+        return None, None, None
+    return match.start(2), match.end(2), match.end()
+
+
+def fast_is_envvar(buff, pos):
+    """:return: start, end, pos or None, None, None tuple."""
+    match = _envvar_match(buff, pos)
+    if match is None:
+        return None, None, None
+    return match.start(1), match.end(1), match.end()
+
+
+is_function = fast_is_function
+is_envvar = fast_is_envvar
+walk_command_complex = fast_walk_command_complex
+walk_command_escaped_parsing = fast_walk_command_escaped_parsing
 
 
 def walk_dollar_expansion(buff, pos, end, endchar, disable_quote=False):
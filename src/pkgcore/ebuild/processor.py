@@ -17,7 +17,12 @@ design) reduces regen time by over 40% compared to portage-2.1
 __all__ = (
     "request_ebuild_processor",
     "release_ebuild_processor",
+    "configure_processor_pool",
+    "prefork_ebuild_processors",
+    "processor_pool_stats",
     "EbuildProcessor",
+    "EclassSnapshot",
+    "get_eclass_snapshot",
     "UnhandledCommand",
     "expected_ebuild_env",
 )
@@ -25,9 +30,14 @@ __all__ = (
 import contextlib
 import errno
 import os
+import select
 import signal
+import subprocess
 import threading
+import time
 import traceback
+from weakref import WeakKeyDictionary
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial, wraps
 from itertools import chain
 
@@ -81,8 +91,203 @@ def shutdown_all_processors():
 
 spawn.atexit_register(shutdown_all_processors)
 
+# processors owned by the parent process in forked children; they're kept
+# referenced since collecting them would shut down the parent's daemons
+_forked_ebp_list = []
+
+
+def _forget_processors():
+    """Drop processors owned by the parent process after forking."""
+    global _global_ebp_lock
+    _global_ebp_lock = threading.Lock()
+    _forked_ebp_list.extend(active_ebp_list + inactive_ebp_list)
+    del active_ebp_list[:]
+    del inactive_ebp_list[:]
+    _pool.pending = 0
+    _pool.reset_stats()
+
+
+os.register_at_fork(after_in_child=_forget_processors)
+
+
+class _ProcessorPool:
+    """Limits and statistics of the ebuild processor pool."""
+
+    def __init__(self):
+        self.min_idle = 0
+        self.max_idle = None
+        self.max_uses = None
+        self.userpriv = False
+        self.sandbox = None
+        # processors being spawned to refill the idle pool
+        self.pending = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = self.reused = self.spawned = 0
+        self.recycled = self.evicted = self.unresponsive = 0
+        self.wait_time = 0.0
+
+
+_pool = _ProcessorPool()
+
+
+def configure_processor_pool(
+    min_idle=None, max_idle=None, max_uses=None, userpriv=None, sandbox=None
+):
+    """Configure the limits of the pool of idle processors.
+
+    Processors are spawned on demand and released processors are kept idle
+    for reuse. By default the number of idle processors is unbounded and
+    processors are reused indefinitely. Arguments left as None keep their
+    current setting.
+
+    :param min_idle: number of idle processors to keep available, replacements
+        are spawned in the background when the pool drops below it
+    :param max_idle: maximum number of idle processors, released processors
+        exceeding it are shut down; 0 for no limit
+    :param max_uses: number of commands a processor runs before it's shut
+        down on release, bounding the memory growth of the bash side; 0 for
+        no limit
+    :param userpriv: whether processors spawned for ``min_idle`` are deprived
+    :param sandbox: whether processors spawned for ``min_idle`` are sandboxed
+    """
+    with _global_ebp_lock:
+        if min_idle is not None:
+            _pool.min_idle = min_idle
+        if max_idle is not None:
+            _pool.max_idle = max_idle or None
+        if max_uses is not None:
+            _pool.max_uses = max_uses or None
+        if userpriv is not None:
+            _pool.userpriv = userpriv
+        if sandbox is not None:
+            _pool.sandbox = sandbox
+        # drop idle processors exceeding the new limits
+        shutdown = _trim_idle()
+    for ebp in shutdown:
+        ebp.shutdown_processor()
+    _replenish()
+
+
+def _trim_idle():
+    """Remove idle processors exceeding the pool limits, returning them."""
+    shutdown = [ebp for ebp in inactive_ebp_list if ebp.exhausted]
+    for ebp in shutdown:
+        inactive_ebp_list.remove(ebp)
+    _pool.recycled += len(shutdown)
+    if _pool.max_idle is not None and len(inactive_ebp_list) > _pool.max_idle:
+        evicted = inactive_ebp_list[: len(inactive_ebp_list) - _pool.max_idle]
+        del inactive_ebp_list[: len(evicted)]
+        _pool.evicted += len(evicted)
+        shutdown.extend(evicted)
+    return shutdown
+
+
+def _spawn(userpriv, sandbox, fd_pipes=None):
+    ebp = EbuildProcessor(userpriv, sandbox, fd_pipes=fd_pipes)
+    with _global_ebp_lock:
+        _pool.spawned += 1
+    return ebp
+
+
+def prefork_ebuild_processors(count, userpriv=None, sandbox=None):
+    """Spawn idle processors in parallel so later requests reuse them.
+
+    Idle processors already available count towards the requested number.
+
+    :param count: number of idle processors to make available
+    :param userpriv: should the processors be deprived, defaults to the pool setting
+    :param sandbox: should the processors be sandboxed, defaults to the pool setting
+    :return: number of spawned processors
+    """
+    if userpriv is None:
+        userpriv = _pool.userpriv
+    if sandbox is None:
+        sandbox = _pool.sandbox
+    if sandbox is None:
+        sandbox = spawn.is_sandbox_capable()
+    with _global_ebp_lock:
+        count -= sum(
+            1
+            for ebp in inactive_ebp_list
+            if ebp.userpriv == userpriv and (ebp.sandbox or not sandbox)
+        )
+    if count <= 0:
+        return 0
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(_spawn, userpriv, sandbox) for _ in range(count)]
+        ebps = [f.result() for f in futures]
+    with _global_ebp_lock:
+        inactive_ebp_list.extend(ebps)
+    return len(ebps)
+
+
+def _replenish():
+    """Refill the idle pool in the background if it dropped below its minimum."""
+    with _global_ebp_lock:
+        count = _pool.min_idle - len(inactive_ebp_list) - _pool.pending
+        if count <= 0:
+            return
+        _pool.pending += count
+
+    def worker():
+        try:
+            prefork_ebuild_processors(_pool.min_idle)
+        except Exception as e:
+            logger.warning(f"failed spawning idle ebuild processors: {e}")
+        finally:
+            with _global_ebp_lock:
+                _pool.pending -= count
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def processor_pool_stats():
+    """Return statistics of processor usage.
+
+    :return: mapping of the number of processor ``requests``, how many of
+        those ``reused`` an idle processor, the ``reuse_rate``, the number of
+        ``spawned`` processors, how many were ``recycled`` after reaching
+        their maximum uses, ``evicted`` for exceeding the maximum idle
+        processors, or dropped as ``unresponsive``, the total ``wait_time``
+        of requests in seconds, and the current ``active`` and ``idle``
+        processor counts
+    """
+    with _global_ebp_lock:
+        requests = _pool.requests
+        return {
+            "requests": requests,
+            "reused": _pool.reused,
+            "reuse_rate": _pool.reused / requests if requests else 0.0,
+            "spawned": _pool.spawned,
+            "recycled": _pool.recycled,
+            "evicted": _pool.evicted,
+            "unresponsive": _pool.unresponsive,
+            "wait_time": _pool.wait_time,
+            "active": len(active_ebp_list),
+            "idle": len(inactive_ebp_list),
+        }
+
 
 @_singled_threaded
+def _reuse_ebuild_processor(userpriv, sandbox, fd_pipes):
+    _pool.requests += 1
+    if fd_pipes:
+        # custom fds are bound at spawn time
+        return None
+    for ebp in inactive_ebp_list[:]:
+        if ebp.userpriv == userpriv and (ebp.sandbox or not sandbox):
+            inactive_ebp_list.remove(ebp)
+            if not ebp.is_responsive:
+                _pool.unresponsive += 1
+                continue
+            active_ebp_list.append(ebp)
+            _pool.reused += 1
+            return ebp
+    return None
+
+
 def request_ebuild_processor(userpriv=False, sandbox=None, fd_pipes=None):
     """Request a processor instance, creating a new one if needed.
 
@@ -95,18 +300,16 @@ def request_ebuild_processor(userpriv=False, sandbox=None, fd_pipes=None):
     if sandbox is None:
         sandbox = spawn.is_sandbox_capable()
 
-    for ebp in inactive_ebp_list:
-        if ebp.userpriv == userpriv and (ebp.sandbox or not sandbox):
-            if not ebp.is_responsive:
-                inactive_ebp_list.remove(ebp)
-                continue
-            inactive_ebp_list.remove(ebp)
+    start = time.monotonic()
+    ebp = _reuse_ebuild_processor(userpriv, sandbox, fd_pipes)
+    if ebp is None:
+        # spawn outside the lock so other requests aren't serialized behind it
+        ebp = _spawn(userpriv, sandbox, fd_pipes=fd_pipes)
+        with _global_ebp_lock:
             active_ebp_list.append(ebp)
-            break
-    else:
-        ebp = EbuildProcessor(userpriv, sandbox, fd_pipes=fd_pipes)
-        active_ebp_list.append(ebp)
-
+    with _global_ebp_lock:
+        _pool.wait_time += time.monotonic() - start
+    _replenish()
     return ebp
 
 
@@ -133,8 +336,11 @@ def release_ebuild_processor(ebp):
     # shutdown processors that can't be reused
     if ebp.is_locked or ebp.custom_fds:
         ebp.shutdown_processor()
-    else:
-        inactive_ebp_list.append(ebp)
+        return True
+    inactive_ebp_list.append(ebp)
+    # shutdown processors exceeding the pool limits
+    for x in _trim_idle():
+        x.shutdown_processor()
     return True
 
 
@@ -172,6 +378,164 @@ def reuse_or_request(ebp=None, **kwargs):
             release_ebuild_processor(ebp)
 
 
+def _eclass_func(eclass, text):
+    """Return the bash definition of a preloaded eclass function."""
+    # matches __make_preloaded_eclass_func() on the bash side
+    func = f"__preloaded_eclass_{eclass}"
+    return f"{func}() {{\n{text}\n}}\nPKGCORE_PRELOADED_ECLASSES[{eclass}]={func}\n"
+
+
+def _valid_bash(text):
+    """Return whether bash parses the given text without syntax errors."""
+    ret = subprocess.run(
+        [spawn.BASH_BINARY, "-n"],
+        input=text,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        encoding="utf8",
+        errors="surrogateescape",
+    )
+    return ret.returncode == 0
+
+
+class EclassSnapshot:
+    """Preloaded eclass functions shared by all processors.
+
+    Eclasses are read and syntax checked once, with processors loading all
+    functions they lack in a single request via
+    :py:meth:`EbuildProcessor.load_eclass_snapshot`. Functions are keyed by
+    the path and md5 of their eclass, so changed eclasses replace stale
+    functions.
+
+    :param eclass_cache: :obj:`pkgcore.ebuild.eclass_cache.base` instance
+    """
+
+    def __init__(self, eclass_cache):
+        self.eclass_cache = eclass_cache
+        self._lock = threading.Lock()
+        # mapping of eclass names to their keys and function definitions
+        self._eclasses = {}
+
+    def __len__(self):
+        return len(self._eclasses)
+
+    def add(self, eclasses):
+        """Add eclasses to the snapshot.
+
+        Eclasses with syntax errors are skipped, leaving them to be sourced
+        on inherit.
+
+        :param eclasses: iterable of eclass names
+        """
+        with self._lock:
+            new = {}
+            for eclass in eclasses:
+                data = self.eclass_cache.eclasses.get(eclass)
+                if data is None or data.path is None:
+                    continue
+                try:
+                    key = (data.path, data.md5)
+                    if (entry := self._eclasses.get(eclass)) and entry[0] == key:
+                        continue
+                    with open(
+                        data.path, encoding="utf8", errors="surrogateescape"
+                    ) as f:
+                        new[eclass] = (key, _eclass_func(eclass, f.read()))
+                except EnvironmentError as e:
+                    logger.warning(f"failed reading eclass {eclass!r}: {e}")
+                    self._eclasses.pop(eclass, None)
+            if not new:
+                return
+            # check everything at once, falling back to checking each eclass
+            if not _valid_bash("".join(func for _, func in new.values())):
+                for eclass, (key, func) in list(new.items()):
+                    if not _valid_bash(func):
+                        logger.warning(f"errors detected in {key[0]!r}")
+                        del new[eclass]
+                        self._eclasses.pop(eclass, None)
+            self._eclasses.update(new)
+
+    def missing(self, loaded):
+        """Return the functions missing from or stale in a processor.
+
+        :param loaded: mapping of eclass names to the keys loaded by a processor
+        :return: mapping of eclass names to keys and function definitions
+        """
+        with self._lock:
+            return {
+                eclass: entry
+                for eclass, entry in self._eclasses.items()
+                if loaded.get(eclass) != entry[0]
+            }
+
+
+_eclass_snapshots = WeakKeyDictionary()
+_eclass_snapshots_lock = threading.Lock()
+
+
+def get_eclass_snapshot(eclass_cache):
+    """Return the shared :obj:`EclassSnapshot` of an eclass cache."""
+    with _eclass_snapshots_lock:
+        snapshot = _eclass_snapshots.get(eclass_cache)
+        if snapshot is None:
+            snapshot = _eclass_snapshots[eclass_cache] = EclassSnapshot(eclass_cache)
+        return snapshot
+
+
+# maximum total size of the ebuild envs sent in a single metadata batch
+_METADATA_BATCH_SIZE = 32 * 1024
+
+# Highest supported version of the daemon protocol. Version 1 is line
+# oriented, sending envs as shell code. Version 2 sends envs, IPC command
+# args and results as blocks of size prefixed fields.
+EBD_PROTOCOL = 2
+
+
+def _encode(data):
+    return data.encode("utf8", "surrogateescape")
+
+
+def _decode(data):
+    return data.decode("utf8", "surrogateescape")
+
+
+def _pack_fields(fields):
+    """Pack strings into a block of fields prefixed by their size in hex."""
+    data = []
+    for field in fields:
+        field = _encode(str(field))
+        data.append(b"%08x%s" % (len(field), field))
+    return b"".join(data)
+
+
+def _escape_field(value):
+    """Escape the separators of packed envs, see :meth:`EbuildProcessor._pack_env`."""
+    value = value.replace("\x1f", "\x1f1").replace("\x1e", "\x1f2")
+    return value.replace("\x1d", "\x1f3")
+
+
+def _parse_metadata(record):
+    """Parse a metadata record of KEY=value lines."""
+    metadata = {}
+    for line in record.split("\n"):
+        if line:
+            key, _, val = line.partition("=")
+            metadata[key] = val
+    return metadata
+
+
+def _unpack_fields(data):
+    """Unpack a block of fields created by :py:func:`_pack_fields`."""
+    fields = []
+    pos = 0
+    while pos < len(data):
+        size = int(data[pos : pos + 8], 16)
+        pos += 8
+        fields.append(_decode(data[pos : pos + size]))
+        pos += size
+    return fields
+
+
 class ProcessingInterruption(PkgcoreException):
     """Generic processor exception."""
 
@@ -315,11 +679,13 @@ class EbuildProcessor:
     Contains the env, functions, etc that ebuilds expect.
     """
 
-    def __init__(self, userpriv, sandbox, fd_pipes=None):
+    def __init__(self, userpriv, sandbox, fd_pipes=None, protocol=None):
         """
         :param sandbox: enables a sandboxed processor
         :param userpriv: enables a userpriv'd processor
         :param fd_pipes: mapping from existing fd to fd inside the ebd process
+        :param protocol: highest daemon protocol version to negotiate,
+            defaults to $PKGCORE_EBD_PROTOCOL or :py:data:`EBD_PROTOCOL`
         """
         self.lock()
         self.ebd = e_const.EBUILD_DAEMON_PATH
@@ -329,9 +695,16 @@ class EbuildProcessor:
 
         self._preloaded_eclasses = {}
         self._eclass_caching = False
+        self._eclass_snapshot = False
         self._outstanding_expects = []
         self._metadata_paths = None
         self.pid = None
+        # negotiated daemon protocol version
+        self.protocol = 1
+        if protocol is None:
+            protocol = int(os.environ.get("PKGCORE_EBD_PROTOCOL", EBD_PROTOCOL))
+        # number of commands run
+        self.uses = 0
 
         spawn_opts = {"umask": 0o002}
         if self.userpriv:
@@ -420,15 +793,19 @@ class EbuildProcessor:
                 os.close(cread)
             if dwrite is not None:
                 os.close(dwrite)
-        self.ebd_write = os.fdopen(cwrite, "w")
-        self.ebd_read = os.fdopen(dread, "r")
-
-        # verify ebd is running
-        self.write("ebd?")
-        if not self.expect("ebd!"):
+        self.ebd_write = os.fdopen(cwrite, "wb")
+        self.ebd_read = os.fdopen(dread, "rb")
+
+        # verify ebd is running and negotiate the protocol version, daemons
+        # lacking support for the requested version fall back to version 1
+        self.write("ebd? %i" % min(protocol, EBD_PROTOCOL) if protocol > 1 else "ebd?")
+        response = self.read().split()
+        if response[:1] != ["ebd!"]:
             raise InternalError(
                 "expected 'ebd!' response from ebd, which wasn't received"
             )
+        if len(response) > 1:
+            self.protocol = int(response[1])
 
         if self.sandbox:
             self.write("sandbox_log?")
@@ -478,17 +855,18 @@ class EbuildProcessor:
     ):
         """Send something to the bash side.
 
-        :param string: string to write to the bash processor.
+        :param string: string or bytes to write to the bash processor.
             All strings written are automatically \\n terminated.
         :param flush: boolean controlling whether the data is flushed
             immediately.  Disabling flush is useful when dumping large
             amounts of data.
         """
-        string = str(string)
+        if not isinstance(string, bytes):
+            string = _encode(str(string))
         try:
             if append_newline:
-                if string != "\n":
-                    string += "\n"
+                if string != b"\n":
+                    string += b"\n"
             self.ebd_write.write(string)
             if flush:
                 self.ebd_write.flush()
@@ -497,6 +875,30 @@ class EbuildProcessor:
                 raise RuntimeError(ie)
             raise
 
+    def write_block(self, command, data, flush=True):
+        """Send a command followed by data prefixed by its size in bytes.
+
+        :param command: command the data size is appended to, None to send
+            the size on its own
+        :param data: string or bytes to send
+        """
+        if isinstance(data, str):
+            data = _encode(data)
+        header = str(len(data)) if command is None else f"{command} {len(data)}"
+        self.write(b"%s\n%s" % (_encode(header), data), flush, append_newline=False)
+
+    def write_fields(self, *fields, command=None):
+        """Send strings as a size prefixed block of fields.
+
+        Requires protocol version 2, the bash side reads the block via
+        __ebd_read_fields.
+        """
+        self.write_block(command, _pack_fields(fields))
+
+    def read_fields(self, size):
+        """Read a block of fields of the given size in bytes."""
+        return _unpack_fields(self._read_bytes(size))
+
     def _consume_async_expects(self):
         if any(x[0] for x in self._outstanding_expects):
             self.ebd_write.flush()
@@ -508,13 +910,36 @@ class EbuildProcessor:
     def _timeout_ebp(self, signum, frame):
         raise TimeoutError("ebp for pid '%i' appears dead, timing out" % self.pid)
 
+    def _wait_readable(self, timeout):
+        """Wait for data from the daemon, including data already buffered.
+
+        :return: boolean, is data available for reading?
+        """
+        fd = self.ebd_read.fileno()
+        # replies can already be read into the buffer, selecting the fd
+        # doesn't see those
+        os.set_blocking(fd, False)
+        try:
+            if self.ebd_read.peek(1):
+                return True
+        finally:
+            os.set_blocking(fd, True)
+        return bool(select.select([fd], [], [], timeout)[0])
+
     def expect(self, want, async_req=False, flush=False, timeout=0):
         """Read from the daemon, check if the returned string is expected.
 
         :param want: string we're expecting
         :return: boolean, was what was read == want?
         """
-        if timeout:
+        if timeout and threading.current_thread() is not threading.main_thread():
+            # signals are only handled in the main thread, poll instead
+            if flush:
+                self.ebd_write.flush()
+            if not self._wait_readable(timeout):
+                return False
+            timeout = 0
+        elif timeout:
             signal.signal(signal.SIGALRM, self._timeout_ebp)
             signal.setitimer(signal.ITIMER_REAL, timeout)
 
@@ -539,7 +964,7 @@ class EbuildProcessor:
     def readlines(self, lines):
         mydata = []
         while lines > 0:
-            mydata.append(self.ebd_read.readline())
+            mydata.append(_decode(self.ebd_read.readline()))
             cmd, _, args_str = mydata[-1].strip().partition(" ")
             if cmd == "SIGINT":
                 chuck_KeyboardInterrupt(self, args_str)
@@ -557,6 +982,17 @@ class EbuildProcessor:
         """
         return "\n".join(self.readlines(lines))
 
+    def _read_bytes(self, size):
+        """Read data of the given size in bytes from the daemon."""
+        data = self.ebd_read.read(size)
+        if len(data) != size:
+            raise InternalError(None, "unexpected end of data")
+        return data
+
+    def _read_size(self, size):
+        """Read a string of the given size in bytes from the daemon."""
+        return _decode(self._read_bytes(size))
+
     def sandbox_summary(self, move_log=False):
         """If the instance is sandboxed, print the sandbox access summary.
 
@@ -638,12 +1074,41 @@ class EbuildProcessor:
             return self._consume_async_expects()
         return True
 
-    def allow_eclass_caching(self):
+    def load_eclass_snapshot(self, snapshot, async_req=False):
+        """Load the functions of an eclass snapshot the processor lacks.
+
+        All missing or stale functions are sent in a single request.
+
+        :param snapshot: :obj:`EclassSnapshot` instance
+        :return: boolean, True for success
+        """
+        missing = snapshot.missing(self._preloaded_eclasses)
+        if not missing:
+            return True
+        data = "".join(func for _, func in missing.values())
+        self.write_block("preload_eclass_snapshot", data, flush=False)
+        if self.expect(
+            "preload_eclass_snapshot succeeded", async_req=async_req, flush=True
+        ):
+            self._preloaded_eclasses.update(
+                (eclass, key) for eclass, (key, _) in missing.items()
+            )
+            return True
+        return False
+
+    def allow_eclass_caching(self, snapshot=False):
+        """Preload inherited eclasses for later runs.
+
+        :param snapshot: share preloaded eclasses with other processors via
+            :obj:`EclassSnapshot` instead of preloading them separately
+        """
         self._eclass_caching = True
+        self._eclass_snapshot = snapshot
 
     def disable_eclass_caching(self):
         self.clear_preloaded_eclasses()
         self._eclass_caching = False
+        self._eclass_snapshot = False
 
     def _preload_eclass(self, ec_file, async_req=False):
         """Preload an eclass into a bash function.
@@ -676,6 +1141,11 @@ class EbuildProcessor:
 
     is_locked = klass.alias_attr("processing_lock")
 
+    @property
+    def exhausted(self):
+        """Return whether the processor reached the pool's maximum uses."""
+        return _pool.max_uses is not None and self.uses >= _pool.max_uses
+
     @property
     def is_alive(self):
         """Return whether the processor is alive."""
@@ -734,8 +1204,7 @@ class EbuildProcessor:
         # which isn't always true.
         self.pid = None
 
-    def _generate_env_str(self, env_dict):
-        data = []
+    def _env_items(self, env_dict):
         for key, val in sorted(env_dict.items()):
             if key in self._readonly_vars:
                 continue
@@ -747,6 +1216,36 @@ class EbuildProcessor:
                 raise ValueError(
                     f"_generate_env_str was fed a bad value; key={key}, val={val}"
                 )
+            yield key, val
+
+    def _generate_env_data(self, env_dict):
+        """Serialize an env to bytes using the negotiated protocol."""
+        if self.protocol > 1:
+            return self._pack_env(env_dict)
+        return _encode(self._generate_env_str(env_dict))
+
+    def _pack_env(self, env_dict):
+        """Pack an env for __ebd_unpack_env, sending values verbatim.
+
+        Values are sent as fields terminated by \\x1e that the daemon assigns
+        without evaluating them. The first field is the number of arrays sent
+        as NAME=values fields with each element terminated by \\x1d, followed
+        by scalars sent as NAME=value fields.
+        """
+        scalars = []
+        arrays = []
+        for key, val in self._env_items(env_dict):
+            if isinstance(val, (list, tuple)):
+                val = "".join(f"{_escape_field(x)}\x1d" for x in val)
+                arrays.append(f"{key}={val}")
+            else:
+                scalars.append(f"{key}={_escape_field(val)}")
+        fields = [str(len(arrays))] + arrays + scalars
+        return _encode("".join(f"{x}\x1e" for x in fields))
+
+    def _generate_env_str(self, env_dict):
+        data = []
+        for key, val in self._env_items(env_dict):
 
             if isinstance(val, (list, tuple)):
                 data.append(
@@ -771,6 +1270,14 @@ class EbuildProcessor:
         :type env_dict: mapping with string keys and values.
         :param env_dict: the bash env.
         """
+        if self.protocol > 1:
+            # no file needed as the env isn't eval'd, the block is read
+            # directly into the env
+            self.write_block(
+                "start_receiving_env fields", self._pack_env(env_dict), flush=False
+            )
+            return self.expect("env_received", async_req=async_req, flush=True)
+
         data = self._generate_env_str(env_dict)
         old_umask = os.umask(0o002)
         if tmpdir:
@@ -779,9 +1286,7 @@ class EbuildProcessor:
                 file.write(data)
             self.write(f"start_receiving_env file {path}")
         else:
-            self.write(
-                f"start_receiving_env bytes {len(data)}\n{data}", append_newline=False
-            )
+            self.write_block("start_receiving_env bytes", data)
         os.umask(old_umask)
         return self.expect("env_received", async_req=async_req, flush=True)
 
@@ -813,10 +1318,27 @@ class EbuildProcessor:
         # filter here, so that a screwy default doesn't result in resetting it
         # every time.
         data = os.pathsep.join(filter(None, paths))
-        self.write(f"set_metadata_path {len(data)}\n{data}", append_newline=False)
+        self.write_block("set_metadata_path", data, flush=False)
         if self.expect("metadata_path_received", flush=True):
             self._metadata_paths = paths
 
+    @contextlib.contextmanager
+    def _inherit_tracking(self, eclass_cache):
+        """Track inherited eclasses during depend like runs for preloading."""
+        updates = snapshot = None
+        if self._eclass_caching:
+            updates = set()
+            if self._eclass_snapshot:
+                snapshot = get_eclass_snapshot(eclass_cache)
+                self.load_eclass_snapshot(snapshot, async_req=True)
+        yield updates
+        if updates:
+            if snapshot is not None:
+                # loaded by all processors on their next run
+                snapshot.add(updates)
+            else:
+                self.preload_eclasses(eclass_cache, limited_to=updates, async_req=True)
+
     def _run_depend_like_phase(
         self, command, package_inst, eclass_cache, env=None, extra_commands={}
     ):
@@ -824,20 +1346,15 @@ class EbuildProcessor:
         # depend phases; use /dev/null since "" == "."
         self._ensure_metadata_paths(("/dev/null",))
 
-        env = expected_ebuild_env(package_inst, env, depends=True)
-        data = self._generate_env_str(env)
-        self.write(f"{command} {len(data)}\n{data}", append_newline=False)
+        with self._inherit_tracking(eclass_cache) as updates:
+            env = expected_ebuild_env(package_inst, env, depends=True)
+            self.write_block(command, self._generate_env_data(env))
 
-        updates = None
-        if self._eclass_caching:
-            updates = set()
-        commands = extra_commands.copy()
-        commands["request_inherit"] = partial(
-            inherit_handler, eclass_cache, updates=updates
-        )
-        self.generic_handler(additional_commands=commands)
-        if updates:
-            self.preload_eclasses(eclass_cache, limited_to=updates, async_req=True)
+            commands = extra_commands.copy()
+            commands["request_inherit"] = partial(
+                inherit_handler, eclass_cache, updates=updates
+            )
+            self.generic_handler(additional_commands=commands)
 
     def get_ebuild_environment(self, package_inst, eclass_cache):
         """Request a dump of the ebuild environ for a package.
@@ -864,7 +1381,7 @@ class EbuildProcessor:
             elif not line.isdigit():
                 raise InternalError(line, "Returned size wasn't an integer")
             # This is a raw transfer, for obvious reasons.
-            environ.append(self.ebd_read.read(int(line)))
+            environ.append(self._read_size(int(line)))
 
         self._run_depend_like_phase(
             "gen_ebuild_env",
@@ -894,22 +1411,91 @@ class EbuildProcessor:
                 raise FinishedProcessing(True)
             metadata_keys[line[0]] = line[1]
 
-        # pass down phase and metadata key lists to avoid hardcoding them on the bash side
-        env = {
-            "PKGCORE_EBUILD_PHASES": tuple(package_inst.eapi.phases.values()),
-            "PKGCORE_METADATA_KEYS": tuple(package_inst.eapi.metadata_keys),
-        }
+        def receive_metadata(self, line):
+            # protocol version 2 sends all keys in a single record
+            metadata_keys.update(_parse_metadata(self._read_size(int(line))))
 
         self._run_depend_like_phase(
             "gen_metadata",
             package_inst,
             eclass_cache,
-            env=env,
-            extra_commands={"key": receive_key},
+            env=self._metadata_env(package_inst),
+            extra_commands={"key": receive_key, "metadata": receive_metadata},
         )
 
         return metadata_keys
 
+    def _metadata_env(self, package_inst):
+        # pass down phase and metadata key lists to avoid hardcoding them on the bash side
+        env = {
+            "PKGCORE_EBUILD_PHASES": tuple(package_inst.eapi.phases.values()),
+            "PKGCORE_METADATA_KEYS": tuple(package_inst.eapi.metadata_keys),
+        }
+        return expected_ebuild_env(package_inst, env, depends=True)
+
+    def get_keys_batch(self, pkgs, eclass_cache):
+        """Request the metadata of multiple ebuilds be regenerated.
+
+        Ebuilds are sent in batches the daemon sources back to back, returning
+        the metadata of each ebuild as a single size prefixed record.
+
+        :param pkgs: sequence of :obj:`pkgcore.ebuild.ebuild_src.package`
+            instances to regenerate
+        :param eclass_cache: :obj:`pkgcore.ebuild.eclass_cache` instance to use
+            for eclass access
+        :return: iterable of metadata dicts, or :obj:`ProcessorError`
+            instances for ebuilds that failed sourcing, in package order.
+            Iteration stops early if the processor died. Closing the iterator
+            early leaves the processor out of sync, so it must be discarded.
+        """
+        self._ensure_metadata_paths(("/dev/null",))
+        records = []
+
+        def receive_metadata(self, line):
+            records.append(self._read_size(int(line)))
+
+        with self._inherit_tracking(eclass_cache) as updates:
+            commands = {
+                "metadata": receive_metadata,
+                "request_inherit": partial(
+                    inherit_handler, eclass_cache, updates=updates
+                ),
+            }
+            for batch in self._metadata_batches(pkgs):
+                self.write(f"gen_metadata_batch {len(batch)}", flush=False)
+                for data in batch:
+                    self.write_block(None, data, flush=False)
+                self.ebd_write.flush()
+                for _ in batch:
+                    records.clear()
+                    try:
+                        self.generic_handler(additional_commands=commands)
+                    except ProcessorError as e:
+                        yield e
+                        if not self.is_alive:
+                            return
+                        continue
+                    yield _parse_metadata(records[0]) if records else {}
+
+    def _metadata_batches(self, pkgs):
+        """Split the envs of packages into batches sent in a single write.
+
+        The daemon reads all envs of a batch before sourcing any ebuilds, so
+        batches are limited in size to bound its memory usage.
+        """
+        batch = []
+        size = 0
+        for pkg in pkgs:
+            data = self._generate_env_data(self._metadata_env(pkg))
+            if batch and size + len(data) > _METADATA_BATCH_SIZE:
+                yield batch
+                batch = []
+                size = 0
+            batch.append(data)
+            size += len(data)
+        if batch:
+            yield batch
+
     # this basically handles all hijacks from the daemon, whether
     # confcache or portageq.
     def generic_handler(self, additional_commands=None):
@@ -951,6 +1537,7 @@ class EbuildProcessor:
             handlers.update(additional_commands)
 
         self.lock()
+        self.uses += 1
 
         try:
             if self._outstanding_expects:
@@ -178,6 +178,16 @@ class repo_operations(_repo_ops.operations):
 
         return ret
 
+    def _cmd_implementation_clean_cache(self, pkgs=None):
+        if pkgs is None:
+            pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
+        super()._cmd_implementation_clean_cache(pkgs)
+        # drop parsed DepSets of removed pkgs, only done here since the
+        # full set of pkgs is already known
+        cache = getattr(self.repo.package_class, "_depset_cache", None)
+        if cache is not None:
+            cache.prune(pkgs)
+
 
 def _sort_eclasses(config, repo_config):
     repo_path = repo_config.location
@@ -616,6 +626,18 @@ class UnconfiguredTree(prototype.tree):
             f"{pkg.package}-{pkg.fullver}{self.extension}",
         )
 
+    def eclass_users(self, eclasses):
+        """Return the cpvs of cached packages inheriting any of the given eclasses.
+
+        Packages without cached metadata aren't included.
+
+        :return: frozenset of cpv strings, None if the repo has no cache
+        """
+        caches = [x for x in self.cache if x is not None]
+        if not caches:
+            return None
+        return frozenset().union(*(x.eclass_users(eclasses) for x in caches))
+
     def _get_ebuild_src(self, pkg):
         return local_source(self._get_ebuild_path(pkg), encoding="utf8")
 
@@ -795,10 +817,20 @@ class _RegenOpHelper:
     def request_ebp(self):
         ebp = processor.request_ebuild_processor()
         if self.eclass_caching:
-            ebp.allow_eclass_caching()
+            # share preloaded eclasses across all regen processors
+            ebp.allow_eclass_caching(snapshot=True)
         return ebp
 
+    def release_ebp(self):
+        if self.eclass_caching:
+            self.ebp.disable_eclass_caching()
+        processor.release_ebuild_processor(self.ebp)
+
     def __call__(self, pkg):
+        if self.ebp.exhausted:
+            # recycle processors that reached their maximum uses
+            self.release_ebp()
+            self.ebp = self.request_ebp()
         try:
             return pkg._fetch_metadata(ebp=self.ebp, force_regen=self.force)
         except pkg_errors.MetadataException as e:
@@ -806,10 +838,39 @@ class _RegenOpHelper:
             self.ebp = self.request_ebp()
             raise
 
+    def batch(self, pkgs):
+        """Regenerate metadata for multiple packages using batched requests.
+
+        :return: iterable of package and metadata tuples, with
+            :obj:`pkgcore.package.errors.MetadataException` instances in place
+            of the metadata for packages that failed
+        """
+        if self.ebp.exhausted:
+            self.release_ebp()
+            self.ebp = self.request_ebp()
+        if not self.force:
+            pkgs = [
+                pkg for pkg in pkgs if pkg._parent._get_cached_metadata(pkg) is None
+            ]
+        if not pkgs:
+            return
+        completed = False
+        try:
+            yield from pkgs[0]._parent._update_metadata_batch(pkgs, self.ebp)
+            completed = True
+        finally:
+            if not completed:
+                # failed or abandoned batches leave pending responses that put
+                # the processor out of sync
+                processor.drop_ebuild_processor(self.ebp)
+                self.ebp.shutdown_processor(force=True)
+                self.ebp = self.request_ebp()
+        if not self.ebp.is_alive:
+            # ebuild processor is dead, so force a replacement request
+            self.ebp = self.request_ebp()
+
     def __del__(self):
-        if self.eclass_caching:
-            self.ebp.disable_eclass_caching()
-        processor.release_ebuild_processor(self.ebp)
+        self.release_ebp()
 
 
 class ConfiguredTree(configured.tree):
@@ -8,7 +8,7 @@ from functools import partial
 from itertools import chain
 
 from ..repository import misc, multiplex
-from ..resolver import plan
+from ..resolver import plan, sat
 from ..restrictions import packages, values
 from .atom import atom
 
@@ -134,7 +134,9 @@ _vdb_restrict = packages.OrRestriction(
 )
 
 
-class empty_tree_merge_plan(plan.merge_plan):
+class _empty_tree_plan:
+    """Resolver mixin ignoring the livefs when selecting packages."""
+
     _vdb_restriction = _vdb_restrict
 
     def __init__(self, dbs, *args, **kwds):
@@ -151,6 +153,14 @@ class empty_tree_merge_plan(plan.merge_plan):
         )
 
 
+class empty_tree_merge_plan(_empty_tree_plan, plan.merge_plan):
+    pass
+
+
+class empty_tree_sat_plan(_empty_tree_plan, sat.sat_plan):
+    pass
+
+
 def generate_replace_resolver_kls(resolver_kls):
     class replace_resolver(resolver_kls):
         overriding_resolver_kls = resolver_kls
@@ -486,14 +486,25 @@ class ProtectOwned(FileCollision):
         self.vdb = vdb
 
     def collision(self, colliding):
-        real_pkgs = (pkg for repo in self.vdb for pkg in repo if pkg.package_is_real)
         collisions = {}
+        locations = {x.location: x for x in colliding}
+
+        for repo in self.vdb:
+            owners = getattr(repo, "owners", None)
+            if owners is not None:
+                # use the repo's file ownership index
+                for path, cpvs in owners(locations).items():
+                    for cpv in cpvs:
+                        collisions.setdefault(cpv, set()).add(locations[path])
+                continue
 
-        # TODO: worth parallelizing this vdb scanning?
-        for pkg in real_pkgs:
-            pkg_file_collisions = pkg.contents.intersection(colliding)
-            if pkg_file_collisions:
-                collisions[pkg.cpvstr] = pkg_file_collisions
+            # TODO: worth parallelizing this vdb scanning?
+            for pkg in repo:
+                if not pkg.package_is_real:
+                    continue
+                pkg_file_collisions = pkg.contents.intersection(colliding)
+                if pkg_file_collisions:
+                    collisions[pkg.cpvstr] = pkg_file_collisions
 
         if collisions:
             pkg_collisions = [
@@ -52,6 +52,17 @@ class fetchable(metaclass=generic_equality):
         uri_list = self.uri.remove_mirrors()
         return self.__class__(self.filename, uri=uri_list, chksums=self.chksums)
 
+    def rotate_mirrors(self, offset):
+        """Return a new fetchable with mirror hosts rotated by the given offset.
+
+        Used to spread concurrent fetches across the hosts of a mirror tier
+        instead of having every fetch start from the same host.
+        """
+        if not isinstance(self.uri, uri_list):
+            return self
+        uris = self.uri.rotate_mirrors(offset)
+        return self.__class__(self.filename, uri=uris, chksums=self.chksums)
+
 
 class mirror(metaclass=generic_equality):
     """uri source representing a mirror tier"""
@@ -89,6 +100,14 @@ class mirror(metaclass=generic_equality):
     def __repr__(self):
         return f"<{self.__class__} mirror tier={self.mirror_name!r}>"
 
+    def rotate(self, offset):
+        """Return a new mirror tier with its hosts rotated by the given offset."""
+        if not self.mirrors:
+            return self
+        offset %= len(self.mirrors)
+        mirrors = self.mirrors[offset:] + self.mirrors[:offset]
+        return self.__class__(mirrors, self.mirror_name)
+
 
 class unknown_mirror(mirror):
     """Unknown mirror tier."""
@@ -126,6 +145,19 @@ class uri_list:
         )
         return uri_list
 
+    def rotate_mirrors(self, offset):
+        """Return a new URI source list with all mirror tiers rotated by offset."""
+        uri_list = self.__class__(self.filename)
+        uri_source = []
+        for entry in self._uri_source:
+            if isinstance(entry, mirror):
+                entry = entry.rotate(offset)
+            elif isinstance(entry, tuple):
+                entry = (entry[0].rotate(offset), entry[1])
+            uri_source.append(entry)
+        uri_list._uri_source = tuple(uri_source)
+        return uri_list
+
     def add_uri(self, uri):
         self._uri_source.append(uri)
 
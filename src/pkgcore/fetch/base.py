@@ -2,15 +2,49 @@
 prototype fetcher class, all fetchers should derive from this
 """
 
-__all__ = ("fetcher",)
+__all__ = ("fetcher", "HostLimiter")
 
 import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 
 from snakeoil.chksum import MissingChksumHandler, get_chksums, get_handlers
 
 from . import errors
 
 
+class HostLimiter:
+    """Bound the number of concurrent fetches running against a single host.
+
+    Instances are shared between fetchers that run in parallel; calling the
+    limiter with a uri returns a context manager that blocks until a slot for
+    that uri's host is available.
+    """
+
+    def __init__(self, limit: int):
+        """
+        :param limit: max number of concurrent fetches allowed per host
+        """
+        if limit < 1:
+            raise ValueError(f"per host fetch limit must be positive: {limit!r}")
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = self._semaphores[host] = threading.BoundedSemaphore(self.limit)
+            return sem
+
+    @contextmanager
+    def __call__(self, uri: str):
+        with self._semaphore(urlsplit(uri).netloc):
+            yield
+
+
 class fetcher:
     def _verify(self, file_location, target, all_chksums=True, handlers=None):
         """Internal function for derivatives.
@@ -44,6 +44,7 @@ class fetcher(base.fetcher):
         userpriv: bool = True,
         attempts: int = 10,
         readonly: bool = False,
+        host_limiter=None,
         **extra_env: str,
     ):
         """
@@ -57,6 +58,8 @@ class fetcher(base.fetcher):
         :param userpriv: depriv for fetching?
         :param attempts: max number of attempts before failing the fetch
         :param readonly: controls whether fetching is allowed
+        :param host_limiter: if not None, a :obj:`pkgcore.fetch.base.HostLimiter`
+            instance bounding concurrent fetches per host
         """
         super().__init__()
         self.distdir = distdir
@@ -94,6 +97,7 @@ class fetcher(base.fetcher):
         self.attempts = attempts
         self.userpriv = userpriv
         self.readonly = readonly
+        self.host_limiter = host_limiter
         self.extra_env = extra_env
 
     def fetch(self, target: fetchable):
@@ -135,13 +139,20 @@ class fetcher(base.fetcher):
             # the loop handles this. In other words, don't trust the external
             # fetcher's exit code, trust our chksums instead.
             try:
-                spawn_bash(
-                    command % {"URI": next(uris), "FILE": target.filename}, **spawn_opts
-                )
+                uri = next(uris)
             except StopIteration:
                 raise errors.FetchFailed(
                     target.filename, "ran out of urls to fetch from"
                 )
+            if self.host_limiter is None:
+                spawn_bash(
+                    command % {"URI": uri, "FILE": target.filename}, **spawn_opts
+                )
+            else:
+                with self.host_limiter(uri):
+                    spawn_bash(
+                        command % {"URI": uri, "FILE": target.filename}, **spawn_opts
+                    )
         else:
             raise last_exc
 
@@ -4,6 +4,7 @@ contents set- container of fs objects
 
 import os
 import time
+from bisect import bisect_left, insort
 from collections import OrderedDict, defaultdict
 from functools import partial
 from operator import attrgetter
@@ -399,3 +400,158 @@ class OrderedContentsSet(contentsSet):
         if add_missing_directories:
             self.add_missing_directories()
         self.mutable = mutable
+
+
+class SortedContentsSet(contentsSet):
+    """contentsSet keeping a sorted index of its locations
+
+    Child node queries are bisections of the index instead of full scans, and
+    set operations against other contents sets work on their location keys,
+    filtering the index so results stay sorted without sorting them again.
+    """
+
+    def __init__(self, initial=None, mutable=True):
+        self._sorted = None
+        super().__init__(initial=initial, mutable=mutable)
+
+    @classmethod
+    def _from_sorted(cls, locations, objs, mutable=True):
+        cset = cls(mutable=mutable)
+        cset._dict.update(zip(locations, objs))
+        cset._sorted = locations
+        return cset
+
+    def _index(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._dict)
+        return self._sorted
+
+    def add(self, obj):
+        new = fs.isfs_obj(obj) and obj.location not in self._dict
+        super().add(obj)
+        if new and self._sorted is not None:
+            insort(self._sorted, obj.location)
+
+    def __delitem__(self, obj):
+        super().__delitem__(obj)
+        if self._sorted is not None:
+            location = obj.location if fs.isfs_obj(obj) else normpath(obj)
+            del self._sorted[bisect_left(self._sorted, location)]
+
+    def discard(self, obj):
+        location = obj.location if fs.isfs_obj(obj) else obj
+        if self._dict.pop(location, None) is not None and self._sorted is not None:
+            del self._sorted[bisect_left(self._sorted, location)]
+
+    def clear(self):
+        super().clear()
+        self._sorted = None
+
+    def update(self, iterable):
+        d = self._dict
+        new = []
+        for x in iterable:
+            if x.location not in d:
+                new.append(x.location)
+            d[x.location] = x
+        if new and self._sorted is not None:
+            # merging two sorted runs is linear
+            new.sort()
+            self._sorted.extend(new)
+            self._sorted.sort()
+
+    def _filter(self, keep):
+        """Drop all locations not matching a callable."""
+        d = self._dict
+        for location in [x for x in d if not keep(x)]:
+            del d[location]
+        if self._sorted is not None:
+            self._sorted = [x for x in self._sorted if x in d]
+
+    def _remove_all(self, locations):
+        d = self._dict
+        if len(locations) * 16 > len(d):
+            self._filter(lambda x: x not in locations)
+            return
+        # removing few entries, e.g. a subtree, is cheaper done one by one
+        index = self._sorted
+        for location in locations:
+            if d.pop(location, None) is not None and index is not None:
+                del index[bisect_left(index, location)]
+
+    def _keys(self, other):
+        if isinstance(other, contentsSet):
+            return other._dict
+        elif not hasattr(other, "__contains__"):
+            return set(self._convert_loc(other))
+        return None
+
+    def difference(self, other):
+        if (keys := self._keys(other)) is None:
+            return super().difference(other)
+        locations = [x for x in self._index() if x not in keys]
+        return self._from_sorted(
+            locations, map(self._dict.__getitem__, locations), mutable=self.mutable
+        )
+
+    def difference_update(self, other):
+        if not self.mutable:
+            raise TypeError(f"immutable type {self!r}")
+        if isinstance(other, contentsSet):
+            keys = other._dict
+        else:
+            keys = {x.location if fs.isfs_obj(x) else normpath(x) for x in other}
+        self._remove_all(keys)
+
+    def intersection(self, other):
+        if not isinstance(other, contentsSet):
+            return self.__class__((x for x in other if x in self), mutable=self.mutable)
+        # like contentsSet, the objects of the other set are returned
+        d = other._dict
+        locations = [x for x in self._index() if x in d]
+        return self._from_sorted(
+            locations, map(d.__getitem__, locations), mutable=self.mutable
+        )
+
+    def intersection_update(self, other):
+        if not self.mutable:
+            raise TypeError(f"immutable type {self!r}")
+        if (keys := self._keys(other)) is None:
+            return super().intersection_update(other)
+        self._filter(keys.__contains__)
+
+    def issubset(self, other):
+        if isinstance(other, contentsSet):
+            return self._dict.keys() <= other._dict.keys()
+        return super().issubset(other)
+
+    def isdisjoint(self, other):
+        if isinstance(other, contentsSet):
+            return self._dict.keys().isdisjoint(other._dict.keys())
+        return super().isdisjoint(other)
+
+    def clone(self, empty=False):
+        if empty:
+            return self.__class__(mutable=True)
+        locations = list(self._index())
+        return self._from_sorted(locations, map(self._dict.__getitem__, locations))
+
+    def _child_range(self, start_point):
+        if isinstance(start_point, fs.fsBase):
+            if start_point.is_sym:
+                start_point = start_point.target
+            else:
+                start_point = start_point.location
+        prefix = normpath(start_point).rstrip(os.path.sep) + os.path.sep
+        index = self._index()
+        # all paths starting with the prefix sort between it and the prefix
+        # with its trailing separator replaced by the next character
+        end = prefix[:-1] + chr(ord(os.path.sep) + 1)
+        return index[bisect_left(index, prefix) : bisect_left(index, end)]
+
+    def iter_child_nodes(self, start_point):
+        return map(self._dict.__getitem__, self._child_range(start_point))
+
+    def child_nodes(self, start_point):
+        locations = self._child_range(start_point)
+        return self._from_sorted(locations, map(self._dict.__getitem__, locations))
@@ -183,6 +183,13 @@ class fsFile(fsBase):
     def _chksum_callback(self, chfs):
         return list(zip(chfs, get_chksums(self.data, *chfs)))
 
+    def load_chksums(self):
+        """Generate all lazily loaded checksums, reading the file data once."""
+        # lazy checksums are all generated on the first lookup
+        for chf in self.chksums:
+            self.chksums[chf]
+            break
+
     def change_attributes(self, **kwds):
         if "data" in kwds and (
             "chksums" not in kwds and isinstance(self.chksums, _LazyChksums)
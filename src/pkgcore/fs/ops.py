@@ -6,9 +6,12 @@ Shouldn't be accessed directly for the most part, use
 """
 
 import errno
+import fcntl
 import os
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+from snakeoil.data_source import local_source
 from snakeoil.osutils import ensure_dirs, pjoin, unlink_if_exists
 from snakeoil.process.spawn import spawn
 
@@ -104,6 +107,46 @@ class CannotOverwrite(FailedCopy):
         return f"cannot write {self.obj} due to {self.existing} existing"
 
 
+# linux ioctl cloning a file's extents on filesystems supporting reflinks
+_FICLONE = 0x40049409
+
+
+def _copy_data(data, path):
+    """Copy a data source to a path, using kernel side copies when possible."""
+    if not isinstance(data, local_source) or data.path is None:
+        return data.transfer_to_path(path)
+    src = os.open(data.path, os.O_RDONLY)
+    try:
+        dst = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            try:
+                fcntl.ioctl(dst, _FICLONE, src)
+                return
+            except OSError:
+                pass
+            copied = 0
+            remaining = os.fstat(src).st_size
+            try:
+                while remaining > 0:
+                    n = os.copy_file_range(src, dst, remaining)
+                    if not n:
+                        break
+                    copied += n
+                    remaining -= n
+                else:
+                    return
+            except (AttributeError, OSError):
+                # unsupported by the platform or filesystems
+                if copied:
+                    raise
+        finally:
+            os.close(dst)
+    finally:
+        os.close(src)
+    # fall back to copying the data in userspace
+    data.transfer_to_path(path)
+
+
 def copyfile(obj, mkdirs=False):
     """
     copy a :class:`pkgcore.fs.fs.fsBase` to its stated location.
@@ -142,7 +185,7 @@ def copyfile(obj, mkdirs=False):
         fp = existent_fp = obj.location + "#new"
 
     if fs.isreg(obj):
-        obj.data.transfer_to_path(fp)
+        _copy_data(obj.data, fp)
     elif fs.issym(obj):
         os.symlink(obj.target, fp)
     elif fs.isfifo(obj):
@@ -197,7 +240,13 @@ def do_link(src, trg):
     return True
 
 
-def merge_contents(cset, offset=None, callback=None):
+def _merge_file(obj, load_chksums):
+    copyfile(obj)
+    if load_chksums:
+        obj.load_chksums()
+
+
+def merge_contents(cset, offset=None, callback=None, parallelism=1, chksums=False):
     """
     merge a :class:`pkgcore.fs.contents.contentsSet` instance to the livefs
 
@@ -206,6 +255,10 @@ def merge_contents(cset, offset=None, callback=None):
         Think of it as target dir.
     :param callback: callable to report each entry being merged; given a single arg,
         the fs object being merged.
+    :param parallelism: number of threads copying regular files; directories
+        are always created first and all other entries are merged in order
+    :param chksums: if True, lazily generated checksums of merged files are
+        loaded while copying them, so they're available without rereading them
     :raise EnvironmentError: Thrown for permission failures.
     """
 
@@ -248,46 +301,92 @@ def merge_contents(cset, offset=None, callback=None):
                 os.unlink(x.location)
                 mkdir(x)
             ensure_perms(x)
+    # parent directories known to exist
+    parents = {x.location for x in d}
     del d
 
+    executor = None
+    if parallelism > 1:
+        executor = ThreadPoolExecutor(max_workers=parallelism)
+    # pending background work on regular files, keyed by location
+    copies = {}
+
+    def merged(target):
+        """Wait for a regular file copied in the background to be merged."""
+        if (future := copies.get(target.location)) is not None:
+            future.result()
+        return True
+
     # might look odd, but what this does is minimize the try/except cost
     # to one time, assuming everything behaves, rather then per item.
     i = iterate(cset.iterdirs(invert=True))
     merged_inodes = {}
-    while True:
-        try:
-            for x in i:
-                callback(x)
-
-                if x.is_reg:
-                    key = (x.dev, x.inode)
-                    # This logic could be made smarter- instead of
-                    # blindly trying candidates, we could inspect the st_dev
-                    # of the final location.  This however can be broken by
-                    # overlayfs's potentially.  Brute force is in use either
-                    # way.
-                    candidates = merged_inodes.setdefault(key, [])
-                    if any(
-                        target._can_be_hardlinked(x) and do_link(target, x)
-                        for target in candidates
-                    ):
-                        continue
-                    candidates.append(x)
-
-                copyfile(x, mkdirs=True)
-
-            break
-        except CannotOverwrite as cf:
-            if not fs.issym(x):
-                raise
-
-            # by this time, all directories should've been merged.
-            # thus we can check the target
+    try:
+        while True:
             try:
-                if not fs.isdir(gen_obj(pjoin(x.location, x.target))):
+                for x in i:
+                    callback(x)
+
+                    if x.is_reg:
+                        key = (x.dev, x.inode)
+                        # This logic could be made smarter- instead of
+                        # blindly trying candidates, we could inspect the st_dev
+                        # of the final location.  This however can be broken by
+                        # overlayfs's potentially.  Brute force is in use either
+                        # way.
+                        candidates = merged_inodes.setdefault(key, [])
+                        if any(
+                            target._can_be_hardlinked(x)
+                            and merged(target)
+                            and do_link(target, x)
+                            for target in candidates
+                        ):
+                            if chksums and executor is not None:
+                                copies[x.location] = executor.submit(x.load_chksums)
+                            elif chksums:
+                                x.load_chksums()
+                            continue
+                        candidates.append(x)
+
+                        if executor is not None:
+                            # create missing parent directories up front,
+                            # ensure_dirs() isn't thread safe
+                            parent = os.path.dirname(x.location)
+                            if parent not in parents:
+                                if not os.path.exists(parent) and not ensure_dirs(
+                                    parent, mode=0o750, minimal=True
+                                ):
+                                    raise FailedCopy(
+                                        x, f"failed creating directory: {parent!r}"
+                                    )
+                                parents.add(parent)
+                            copies[x.location] = executor.submit(
+                                _merge_file, x, chksums
+                            )
+                            continue
+
+                    copyfile(x, mkdirs=True)
+                    if chksums and x.is_reg:
+                        x.load_chksums()
+
+                break
+            except CannotOverwrite as cf:
+                if not fs.issym(x):
                     raise
-            except OSError:
-                raise cf
+
+                # by this time, all directories should've been merged.
+                # thus we can check the target
+                try:
+                    if not fs.isdir(gen_obj(pjoin(x.location, x.target))):
+                        raise
+                except OSError:
+                    raise cf
+
+        for future in copies.values():
+            future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
     return True
 
 
@@ -379,7 +379,7 @@ class MergeEngine:
     @staticmethod
     def get_pkg_contents(engine, csets, pkg):
         """Generate the cset of what files shall be merged to the livefs."""
-        return pkg.contents.clone()
+        return contents.SortedContentsSet(pkg.contents)
 
     @staticmethod
     def get_remove_cset(engine, csets):
@@ -394,7 +394,7 @@ class MergeEngine:
     @staticmethod
     def _get_livefs_intersect_cset(engine, csets, cset_name, realpath=False):
         """Generate the livefs intersection against a cset."""
-        return contents.contentsSet(
+        return contents.SortedContentsSet(
             livefs.intersect(csets[cset_name], realpath=realpath)
         )
 
@@ -427,7 +427,13 @@ class merge(base):
     suppress_exceptions = False
 
     def trigger(self, engine, merging_cset):
-        return merge_contents(merging_cset, callback=engine.observer.installing_fs_obj)
+        # checksums are needed for recording the merged files later on
+        return merge_contents(
+            merging_cset,
+            callback=engine.observer.installing_fs_obj,
+            parallelism=engine.parallelism,
+            chksums=True,
+        )
 
 
 class unmerge(base):
@@ -15,6 +15,8 @@ __all__ = (
 )
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from snakeoil import klass
 from snakeoil.dependant_methods import ForcedDepends
@@ -22,41 +24,81 @@ from snakeoil.osutils import pjoin
 
 from .. import operations as _operations_mod
 from ..exceptions import PkgcoreUserException
+from ..fetch import base as fetch_base_mod
 from ..fetch import custom as fetch_custom
 from ..fetch import errors as fetch_errors
 
 
 class fetch_base:
-    def __init__(self, domain, pkg, fetchables, distdir=None):
+    def __init__(self, domain, pkg, fetchables, distdir=None, jobs=None):
+        """
+        :param jobs: max number of concurrent fetches, if None the FETCH_JOBS
+            setting is used (defaulting to serial fetching)
+        """
         self.verified_files = {}
         self._basenames = set()
+        self._lock = threading.Lock()
         self.domain = domain
         self.pkg = pkg
         self.fetchables = fetchables
         self.distdir = distdir if distdir is not None else domain.distdir
+        if jobs is None:
+            jobs = int(domain.settings.get("FETCH_JOBS", 1))
+        self.jobs = max(jobs, 1)
 
         # create fetcher
         fetchcmd = domain.settings["FETCHCOMMAND"]
         resumecmd = domain.settings.get("RESUMECOMMAND", fetchcmd)
         attempts = int(domain.settings.get("FETCH_ATTEMPTS", 10))
+        host_limiter = None
+        if self.jobs > 1:
+            host_jobs = int(domain.settings.get("FETCH_JOBS_PER_HOST", 2))
+            host_limiter = fetch_base_mod.HostLimiter(host_jobs)
         self.fetcher = fetch_custom.fetcher(
             self.distdir,
             fetchcmd,
             resumecmd,
             attempts=attempts,
+            host_limiter=host_limiter,
             PATH=os.environ["PATH"],
             http_proxy=domain.get_settings_envvar("http_proxy", ""),
             https_proxy=domain.get_settings_envvar("https_proxy", ""),
         )
 
     def fetch_all(self, observer):
-        # TODO: add parallel fetch support
+        if self.jobs > 1 and len(self.fetchables) > 1:
+            return self._fetch_all_parallel(observer)
         failures = []
         for fetchable in self.fetchables:
             if not self.fetch_one(fetchable, observer):
                 failures.append(fetchable)
         return self.verified_files, failures
 
+    def _fetch_all_parallel(self, observer):
+        # fetchables sharing a filename target the same distdir path so they
+        # have to be handled serially by the same worker
+        groups = {}
+        for fetchable in self.fetchables:
+            groups.setdefault(fetchable.filename, []).append(fetchable)
+
+        def fetch_group(offset, fetchables):
+            failed = []
+            for fetchable in fetchables:
+                # spread concurrent fetches across the hosts of mirror tiers
+                if not self.fetch_one(fetchable.rotate_mirrors(offset), observer):
+                    failed.append(fetchable)
+            return failed
+
+        failures = []
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(groups))) as executor:
+            futures = [
+                executor.submit(fetch_group, offset, fetchables)
+                for offset, fetchables in enumerate(groups.values())
+            ]
+            for future in futures:
+                failures.extend(future.result())
+        return self.verified_files, failures
+
     def fetch_one(self, fetchable, observer, retry=False):
         if fetchable.filename in self._basenames:
             return True
@@ -72,19 +114,21 @@ class fetch_base:
             os.rename(path, failed_path)
             if retry:
                 raise
-            observer.error(str(e))
-            observer.error(
-                f"renaming to {failed_filename!r} and refetching from upstream"
-            )
-            observer.flush()
+            with self._lock:
+                observer.error(str(e))
+                observer.error(
+                    f"renaming to {failed_filename!r} and refetching from upstream"
+                )
+                observer.flush()
             # refetch directly from upstream
             return self.fetch_one(fetchable.upstream, observer, retry=True)
         except fetch_errors.FetchFailed:
             fp = None
         if fp is None:
             return False
-        self.verified_files[fp] = fetchable
-        self._basenames.add(fetchable.filename)
+        with self._lock:
+            self.verified_files[fp] = fetchable
+            self._basenames.add(fetchable.filename)
         return True
 
 
@@ -130,13 +174,15 @@ class operations(_operations_mod.base):
         return self._cmd_implementation_configure(self._get_observer(observer))
 
     @_operations_mod.is_standalone
-    def _cmd_api_fetch(self, fetchables=None, observer=klass.sentinel, distdir=None):
+    def _cmd_api_fetch(
+        self, fetchables=None, observer=klass.sentinel, distdir=None, jobs=None
+    ):
         observer = observer if observer is not klass.sentinel else self.observer
         if fetchables is None:
             fetchables = self.pkg.fetchables
         elif not isinstance(fetchables, (tuple, list)):
             fetchables = [fetchables]
-        fetcher = self._fetch_kls(self.domain, self.pkg, fetchables, distdir)
+        fetcher = self._fetch_kls(self.domain, self.pkg, fetchables, distdir, jobs=jobs)
         verified, failures = fetcher.fetch_all(self._get_observer(observer))
 
         if failures:
@@ -0,0 +1,104 @@
+"""
+background distfile fetching for resolved merge plans
+"""
+
+__all__ = ("Prefetcher",)
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from snakeoil.osutils import pjoin
+
+
+class Prefetcher:
+    """Fetch distfiles for upcoming plan ops while earlier ops are processed.
+
+    Ops are fetched in plan order by a single background worker, running at
+    most ``depth`` ops ahead of the op currently being processed. If
+    ``max_size`` is set, ops ahead of the current one are only scheduled while
+    the total size of distfiles still missing for scheduled but unprocessed ops
+    stays within that limit.
+
+    Fetch results (or raised exceptions) are handed back when the caller
+    reaches the related op via :py:meth:`fetch`, so failures get reported in
+    plan order exactly like fetching in the foreground.
+    """
+
+    def __init__(self, domain, ops, observer=None, depth=1, max_size=None, jobs=None):
+        """
+        :param domain: domain used to get package operations
+        :param ops: sequence of resolved plan ops
+        :param observer: observer passed to the package operations
+        :param depth: max number of ops to fetch ahead of the current op
+        :param max_size: if not None, max number of bytes to fetch ahead
+        :param jobs: number of concurrent fetches used per package
+        """
+        self.domain = domain
+        self.ops = tuple(ops)
+        self.observer = observer
+        self.depth = depth
+        self.max_size = max_size
+        self.jobs = jobs
+        self.pending_size = 0
+        self._futures = {}
+        self._sizes = {}
+        self._next = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _missing_size(self, pkg):
+        """Return the number of bytes left to fetch for a package's distfiles."""
+        size = 0
+        for fetchable in getattr(pkg, "fetchables", ()):
+            expected = fetchable.chksums.get("size", 0)
+            try:
+                existing = os.stat(pjoin(self.domain.distdir, fetchable.filename))
+            except FileNotFoundError:
+                size += expected
+            else:
+                size += max(expected - existing.st_size, 0)
+        return size
+
+    def _fetch(self, pkg):
+        pkg_ops = self.domain.get_pkg_operations(pkg, observer=self.observer)
+        ret = pkg_ops.run_if_supported("fetch", or_return=True, jobs=self.jobs)
+        return pkg_ops, ret
+
+    def _schedule(self, current):
+        while self._next < len(self.ops) and self._next <= current + self.depth:
+            idx = self._next
+            op = self.ops[idx]
+            if op.desc == "remove":
+                self._next += 1
+                continue
+            size = self._missing_size(op.pkg)
+            if (
+                idx > current
+                and self.max_size is not None
+                and self.pending_size + size > self.max_size
+            ):
+                # back-pressure; resume once earlier ops are consumed
+                break
+            self._sizes[idx] = size
+            self.pending_size += size
+            self._futures[idx] = self._executor.submit(self._fetch, op.pkg)
+            self._next += 1
+
+    def fetch(self, idx):
+        """Wait for the fetch of the op at the given plan index.
+
+        :return: tuple of the package operations instance used for fetching
+            and the fetch operation's return value
+        """
+        self._schedule(idx)
+        future = self._futures.pop(idx)
+        try:
+            return future.result()
+        finally:
+            self.pending_size -= self._sizes.pop(idx)
+            # queue up the following ops before handing control back
+            self._schedule(idx)
+
+    def close(self):
+        """Cancel queued fetches and wait for any running one to finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._futures.clear()
@@ -1,10 +1,33 @@
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import subprocess
+from itertools import islice
+
 from snakeoil.compatibility import IGNORED_EXCEPTIONS
+from snakeoil.osutils import pjoin
 
+from ..ebuild import processor
+from ..log import logger
 from ..package.errors import MetadataException
 from ..util.thread_pool import map_async
 
+# number of packages handed to a worker process at a time
+_CHUNK_SIZE = 16
+
+# number of packages regenerated per batched ebuild processor request
+_BATCH_SIZE = 16
+
+# interval in seconds used to check if worker processes are still alive
+_WORKER_POLL_INTERVAL = 1.0
+
 
 def regen_iter(iterable, regen_func, observer):
+    if (batch_func := getattr(regen_func, "batch", None)) is not None:
+        yield from _regen_batches(iterable, regen_func, batch_func)
+        return
     for pkg in iterable:
         try:
             regen_func(pkg)
@@ -20,7 +43,36 @@ def regen_iter(iterable, regen_func, observer):
             yield pkg, e
 
 
-def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwargs):
+def _regen_batches(iterable, regen_func, batch_func):
+    """Regen packages in batches sent to the ebuild processor at once."""
+    iterable = iter(iterable)
+    while chunk := list(islice(iterable, _BATCH_SIZE)):
+        done = set()
+        try:
+            for pkg, _data in batch_func(chunk):
+                done.add(pkg)
+        except IGNORED_EXCEPTIONS as e:
+            if isinstance(e, KeyboardInterrupt):
+                return
+            raise
+        except Exception:
+            # pinpoint unexpected errors by regenerating the rest individually
+            for pkg in chunk:
+                if pkg in done:
+                    continue
+                try:
+                    regen_func(pkg)
+                except IGNORED_EXCEPTIONS as e:
+                    if isinstance(e, KeyboardInterrupt):
+                        return
+                    raise
+                except MetadataException:
+                    pass
+                except Exception as e:
+                    yield pkg, e
+
+
+def _regen_threads(repo, pkgs, observer, threads, **kwargs):
     helpers = []
 
     def _get_repo_helper():
@@ -34,7 +86,280 @@ def regen_repository(repo, pkgs, observer, threads=1, pkg_attr="keywords", **kwa
     def get_args():
         return (_get_repo_helper(), observer)
 
-    errors = map_async(pkgs, regen_iter, threads=threads, per_thread_args=get_args)
+    if hasattr(repo, "_regen_operation_helper"):
+        # spawn the processors used by the helpers concurrently
+        if hasattr(pkgs, "__len__"):
+            threads = min(threads, len(pkgs))
+        processor.prefork_ebuild_processors(threads)
+
+    return map_async(pkgs, regen_iter, threads=threads, per_thread_args=get_args)
+
+
+# state shared with forked worker processes
+_worker_state = None
+
+
+def _iter_tasks(tasks, pkgs):
+    while (chunk := tasks.get()) is not None:
+        for idx in chunk:
+            yield pkgs[idx]
+
+
+def _picklable(e):
+    try:
+        pickle.dumps(e)
+    except Exception:
+        return Exception(str(e))
+    return e
+
+
+def _regen_worker(worker_id, tasks, results):
+    """Regen packages pulled from the shared task queue in a worker process."""
+    repo, pkgs, observer, threads, kwargs = _worker_state
+    error = None
+    try:
+        errors = _regen_threads(
+            repo, _iter_tasks(tasks, pkgs), observer, threads, **kwargs
+        )
+        for pkg, e in errors:
+            results.put(("error", pkg.cpvstr, _picklable(e)))
+        # write out queued updates for caches that don't autocommit
+        repo.operations.run_if_supported("flush_cache")
+    except Exception as e:
+        error = _picklable(e)
+    finally:
+        # forked processes skip exit handlers, so explicitly kill ebds
+        processor.shutdown_all_processors()
+        results.put(("done", worker_id, error))
+
+
+def _regen_processes(repo, pkgs, observer, threads, processes, **kwargs):
+    """Regen packages using forked worker processes, each running threads."""
+    global _worker_state
+    pkgs = list(pkgs)
+    processes = max(min(processes, len(pkgs)), 1)
+    # split the requested thread count across the worker processes
+    threads = max(-(-threads // processes), 1)
+
+    ctx = multiprocessing.get_context("fork")
+    tasks = ctx.Queue()
+    results = ctx.Queue()
+    # workers pull chunks as they become idle so load is balanced dynamically
+    for start in range(0, len(pkgs), _CHUNK_SIZE):
+        tasks.put(range(start, min(start + _CHUNK_SIZE, len(pkgs))))
+    for _ in range(processes):
+        tasks.put(None)
+
+    _worker_state = (repo, pkgs, observer, threads, kwargs)
+    workers = []
+    try:
+        for worker_id in range(processes):
+            proc = ctx.Process(
+                target=_regen_worker, args=(worker_id, tasks, results), daemon=True
+            )
+            proc.start()
+            workers.append(proc)
+    finally:
+        _worker_state = None
+
+    by_cpv = {pkg.cpvstr: pkg for pkg in pkgs}
+    running = set(range(processes))
+    try:
+        while running:
+            try:
+                msg, key, e = results.get(timeout=_WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                dead = [x for x in running if not workers[x].is_alive()]
+                if not dead:
+                    continue
+                # the worker can still have a queued result in flight
+                try:
+                    msg, key, e = results.get(timeout=_WORKER_POLL_INTERVAL)
+                except queue.Empty:
+                    raise RuntimeError(
+                        "regen worker process exited unexpectedly: "
+                        f"exit code {workers[dead[0]].exitcode}"
+                    )
+            if msg == "error":
+                yield by_cpv[key], e
+                continue
+            running.discard(key)
+            if e is not None:
+                raise RuntimeError(f"regen worker process failed: {e}") from e
+    finally:
+        for proc in workers:
+            if running:
+                proc.terminate()
+            proc.join()
+
+
+def regen_repository(
+    repo, pkgs, observer, threads=1, processes=1, pkg_attr="keywords", **kwargs
+):
+    """Regenerate metadata for the given packages of a repo.
+
+    :param threads: number of concurrent regen threads
+    :param processes: if greater than 1, the number of worker processes the
+        threads are spread across
+    :return: iterable of package and exception tuples for unexpected errors
+    """
+    if processes > 1 and pkgs:
+        errors = _regen_processes(repo, pkgs, observer, threads, processes, **kwargs)
+    else:
+        errors = _regen_threads(repo, pkgs, observer, threads, **kwargs)
 
     # yield any errors that occurred during metadata generation
     yield from errors
+
+
+# repo files that affect the metadata of all packages
+_global_paths = frozenset(["metadata/layout.conf", "profiles/eapi"])
+
+
+def _git(location, *args):
+    """Run a git command in a repo, returning its output or None on failure."""
+    try:
+        ret = subprocess.run(
+            ["git", "-C", location] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            encoding="utf8",
+        )
+    except (EnvironmentError, subprocess.CalledProcessError):
+        return None
+    return ret.stdout
+
+
+def _load_journal(path):
+    try:
+        with open(path) as f:
+            journal = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (EnvironmentError, ValueError) as e:
+        logger.warning("ignoring invalid regen journal %r: %s", path, e)
+        return {}
+    if not isinstance(journal, dict):
+        logger.warning("ignoring invalid regen journal %r", path)
+        return {}
+    return journal
+
+
+def read_journal(path, repo):
+    """Load the state recorded by the previous regen of a repo.
+
+    :return: dict of journaled repo state, None if the repo isn't journaled
+    """
+    return _load_journal(path).get(repo.location)
+
+
+def write_journal(path, repo, timestamp, commit=None, failed=()):
+    """Record the state of a repo's regen for incremental regen runs.
+
+    :param failed: cpvs that failed metadata generation, always regenerated
+        by the next incremental regen
+    """
+    journal = _load_journal(path)
+    journal[repo.location] = {
+        "timestamp": timestamp,
+        "commit": commit,
+        "failed": sorted(failed),
+    }
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(journal, f, indent=2, sort_keys=True)
+    os.rename(f"{path}.tmp", path)
+
+
+def git_head(repo):
+    """Return the current commit of a git repo, None for non-git repos."""
+    if (head := _git(repo.location, "rev-parse", "--verify", "-q", "HEAD")) is None:
+        return None
+    return head.strip() or None
+
+
+def _git_changed_paths(repo, commit):
+    """Return the repo paths changed since a commit, including uncommitted ones.
+
+    Paths are relative to the repo, which can be a subdir of a git checkout.
+    """
+    changed = _git(
+        repo.location, "diff", "--relative", "--name-only", "-z", commit, "--"
+    )
+    untracked = _git(repo.location, "ls-files", "-z", "--others", "--exclude-standard")
+    if changed is None or untracked is None:
+        return None
+    return frozenset(x for x in (changed + untracked).split("\0") if x)
+
+
+def _modified(st, timestamp):
+    """Return whether a file was modified after the given time.
+
+    Change times are checked too since copied files can keep older mtimes,
+    e.g. when extracting tarballs or syncing via rsync.
+    """
+    return st.st_mtime > timestamp or st.st_ctime > timestamp
+
+
+def _mtime_changed_paths(repo, timestamp):
+    """Return the repo paths modified after the given time."""
+    paths = set()
+    for path in _global_paths:
+        try:
+            if _modified(os.stat(pjoin(repo.location, path)), timestamp):
+                paths.add(path)
+        except FileNotFoundError:
+            pass
+    for category in repo.categories:
+        for package in repo.packages.get(category, ()):
+            try:
+                with os.scandir(pjoin(repo.location, category, package)) as it:
+                    for entry in it:
+                        if entry.name.endswith(repo.extension) and _modified(
+                            entry.stat(), timestamp
+                        ):
+                            paths.add(pjoin(category, package, entry.name))
+            except FileNotFoundError:
+                continue
+    return frozenset(paths)
+
+
+def changed_packages(repo, pkgs, journal):
+    """Select the packages affected by changes since a journaled regen.
+
+    Packages are affected if their ebuild changed, they inherit a changed
+    eclass, including eclasses from master repos, or their metadata
+    generation failed during the journaled regen.
+
+    :param pkgs: iterable of all packages in the repo
+    :param journal: journal data as returned by :py:func:`read_journal`
+    :return: list of affected packages, None if all packages are affected
+    """
+    timestamp = journal["timestamp"]
+    paths = None
+    if journal.get("commit") is not None:
+        paths = _git_changed_paths(repo, journal["commit"])
+    if paths is None:
+        paths = _mtime_changed_paths(repo, timestamp)
+    if not _global_paths.isdisjoint(paths):
+        return None
+
+    cpvs = set(journal.get("failed", ()))
+    eclasses = set()
+    for path in paths:
+        parts = path.split("/")
+        if len(parts) == 2 and parts[0] == "eclass" and path.endswith(".eclass"):
+            eclasses.add(parts[1][: -len(".eclass")])
+        elif len(parts) == 3 and parts[2].endswith(repo.extension):
+            cpvs.add(f"{parts[0]}/{parts[2][: -len(repo.extension)]}")
+    for eclass, data in repo.eclass_cache.eclasses.items():
+        try:
+            if _modified(os.stat(data.path), timestamp):
+                eclasses.add(eclass)
+        except FileNotFoundError:
+            eclasses.add(eclass)
+    if eclasses:
+        if (users := repo.eclass_users(eclasses)) is None:
+            return None
+        cpvs.update(users)
+    return [pkg for pkg in pkgs if pkg.cpvstr in cpvs]
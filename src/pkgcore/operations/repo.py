@@ -12,6 +12,7 @@ __all__ = (
     "operations_proxy",
 )
 
+import time
 from functools import partial
 
 from snakeoil import klass
@@ -227,7 +228,7 @@ class operations(sync_operations):
                 del cache[p]
 
     @operations_mod.is_standalone
-    def _cmd_api_regen_cache(self, observer=None, threads=1, **kwargs):
+    def _cmd_api_regen_cache(self, observer=None, threads=1, journal=None, **kwargs):
         cache = getattr(self.repo, "cache", None)
         if not cache and not kwargs.get("force", False):
             return
@@ -236,30 +237,62 @@ class operations(sync_operations):
             if sync_rate is not None:
                 cache.set_sync_rate(1000000)
             errors = 0
+            observer = self._get_observer(observer)
+
+            # eclass indexes are only written by regen
+            for x in self._get_caches():
+                if not x.readonly:
+                    x.build_eclass_index()
+
+            # record the repo state before scanning it so changes made while
+            # running are picked up by the next incremental regen
+            if journal is not None:
+                start = time.time()
+                head = regen.git_head(self.repo)
+                changes = regen.read_journal(journal, self.repo)
+            else:
+                changes = None
 
             # Force usage of unfiltered repo to include pkgs with metadata issues.
             # Matches are collapsed directly to a list to avoid threading issues such
             # as EBADF since the repo iterator isn't thread-safe.
             pkgs = list(self.repo.itermatch(packages.AlwaysTrue, pkg_filter=None))
-
-            observer = self._get_observer(observer)
+            all_pkgs = None
+            if changes is not None:
+                changed = regen.changed_packages(self.repo, pkgs, changes)
+                if changed is not None:
+                    # only regen affected pkgs, listing the rest for cache cleanup
+                    all_pkgs = frozenset(pkg.cpvstr for pkg in pkgs)
+                    pkgs = changed
+
+            failed = set()
             for pkg, e in regen.regen_repository(
                 self.repo, pkgs, observer=observer, threads=threads, **kwargs
             ):
                 observer.error(f"caught exception {e} while processing {pkg.cpvstr}")
+                failed.add(pkg.cpvstr)
                 errors += 1
 
             # report pkgs with bad metadata -- relies on iterating over the
             # unfiltered repo to populate the masked repo
-            pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
+            if all_pkgs is None:
+                all_pkgs = frozenset(pkg.cpvstr for pkg in self.repo)
+            else:
+                for pkg in pkgs:
+                    self.repo.match(pkg.versioned_atom)
             for pkg in sorted(self.repo._bad_masked):
                 observer.error(
                     f"{pkg.cpvstr}: {pkg.data.msg(verbosity=observer.verbosity)}"
                 )
+                failed.add(pkg.cpvstr)
                 errors += 1
 
             # remove old/invalid cache entries
-            self._cmd_implementation_clean_cache(pkgs)
+            self._cmd_implementation_clean_cache(all_pkgs)
+
+            if journal is not None:
+                # failed pkgs are retried by the next incremental regen
+                regen.write_journal(journal, self.repo, start, head, failed)
 
             return errors
         finally:
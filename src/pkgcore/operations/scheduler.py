@@ -0,0 +1,111 @@
+"""
+concurrent execution of resolved merge plans
+"""
+
+__all__ = ("Scheduler",)
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# interval in seconds used to recheck the system load while builds are held back
+_LOAD_POLL_INTERVAL = 1.0
+
+
+class Scheduler:
+    """Build plan ops concurrently following their dependency graph.
+
+    Ops are handed to a pool of worker threads in plan order as soon as all
+    the ops they depend on were successfully merged. Merges are run serially in
+    the thread calling :py:meth:`run`, so only a single livefs modification
+    happens at a time.
+
+    Build and merge callables signal failures by returning False, any raised
+    exception aborts the run after waiting on running builds.
+    """
+
+    def __init__(self, graph, build, merge, jobs=1, load_average=None):
+        """
+        :param graph: mapping of ops in plan order to the set of ops they
+            depend on, see
+            :py:meth:`pkgcore.resolver.state.plan_state.dependency_graph`
+        :param build: callable run in a worker thread for an op, returns the
+            result to pass to the merge callable or False on failure
+        :param merge: callable run for an op and its build result, returns
+            False on failure
+        :param jobs: max number of concurrent builds
+        :param load_average: if not None, don't start new builds while other
+            builds are running and the system load average is at least this
+        """
+        self.graph = graph
+        self.build = build
+        self.merge = merge
+        self.jobs = jobs
+        self.load_average = load_average
+
+    def _overloaded(self):
+        if self.load_average is None:
+            return False
+        return os.getloadavg()[0] >= self.load_average
+
+    def run(self, keep_going=False):
+        """Build and merge all ops.
+
+        :param keep_going: if False, stop starting new builds after the first
+            failure, otherwise only skip ops depending on failed ones
+        :return: list of failed ops in plan order, including skipped ones
+        """
+        pending = list(self.graph)
+        order = {op: idx for idx, op in enumerate(pending)}
+        merged = set()
+        failed = set()
+        running = {}
+        stopped = False
+
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        try:
+            while pending or running:
+                held_back = False
+                if not stopped:
+                    for op in list(pending):
+                        deps = self.graph[op]
+                        if not failed.isdisjoint(deps):
+                            # skip ops depending on failed ones
+                            pending.remove(op)
+                            failed.add(op)
+                            continue
+                        if not deps.issubset(merged):
+                            continue
+                        if running:
+                            if len(running) >= self.jobs:
+                                break
+                            if self._overloaded():
+                                held_back = True
+                                break
+                        pending.remove(op)
+                        running[executor.submit(self.build, op)] = op
+
+                if not running:
+                    # remaining ops can't be started
+                    failed.update(pending)
+                    break
+
+                timeout = _LOAD_POLL_INTERVAL if held_back else None
+                finished, _ = wait(
+                    running, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                # merge finished builds in plan order
+                for future in sorted(finished, key=lambda x: order[running[x]]):
+                    op = running.pop(future)
+                    result = future.result()
+                    if result is not False:
+                        result = self.merge(op, result)
+                    if result is False:
+                        failed.add(op)
+                        if not keep_going:
+                            stopped = True
+                    else:
+                        merged.add(op)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return [op for op in self.graph if op in failed]
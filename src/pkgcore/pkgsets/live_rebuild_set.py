@@ -20,6 +20,12 @@ class EclassConsumerSet(VersionedInstalled):
         self.eclasses = frozenset(eclasses)
 
     def __iter__(self):
+        # use the repos' reverse eclass indexes where available
+        users = {}
+        for repo in self.repos:
+            if (eclass_users := getattr(repo, "eclass_users", None)) is not None:
+                users[repo.repo_id] = eclass_users(self.eclasses)
+
         for atom in VersionedInstalled.__iter__(self):
             pkgs = self.repos.match(atom)
             if not pkgs:
@@ -27,5 +33,9 @@ class EclassConsumerSet(VersionedInstalled):
                 continue
             assert len(pkgs) == 1, f"I do not know what I am doing: {pkgs}"
             pkg = pkgs[0]
-            if self.eclasses.isdisjoint(pkg.data.get("_eclasses_", ())):
+            repo_users = users.get(pkg.repo.repo_id)
+            if repo_users is not None:
+                if pkg.cpvstr in repo_users:
+                    yield atom
+            elif not self.eclasses.isdisjoint(pkg.inherited):
                 yield atom
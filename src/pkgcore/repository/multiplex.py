@@ -5,6 +5,9 @@ repository that combines multiple repos together
 __all__ = ("tree", "operations")
 
 import os
+import queue
+import threading
+import weakref
 from functools import partial
 from itertools import chain
 from operator import itemgetter
@@ -18,6 +21,57 @@ from ..config.hint import ConfigHint
 from ..operations import repo as repo_interface
 from . import errors, prototype
 
+_done = object()
+
+
+def _cancel_prefetch(stop, q):
+    stop.set()
+    # unblock the worker if it's waiting on a full queue
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def _prefetch(functor, maxsize=256):
+    """Consume the iterable returned by a callable in a background thread.
+
+    Items are buffered in a bounded queue and exceptions are reraised on the
+    consuming side. The worker stops once the returned iterator is exhausted,
+    closed, or garbage collected.
+    """
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def worker():
+        try:
+            for item in functor():
+                q.put((item, None))
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            q.put((_done, e))
+        else:
+            q.put((_done, None))
+
+    def consume():
+        try:
+            while True:
+                item, exc = q.get()
+                if item is _done:
+                    if exc is not None:
+                        raise exc
+                    return
+                yield item
+        finally:
+            cancel()
+
+    it = consume()
+    cancel = weakref.finalize(it, _cancel_prefetch, stop, q)
+    threading.Thread(target=worker, daemon=True).start()
+    return it
+
 
 class operations(repo_interface.operations_proxy):
     ops_stop_after_first_supported = frozenset(["install", "uninstall", "replace"])
@@ -67,6 +121,7 @@ class tree(prototype.tree):
 
     Args:
         trees (list): :obj:`pkgcore.repository.prototype.tree` instances
+        parallel (bool): query the trees concurrently in :py:meth:`itermatch`
 
     Attributes:
         frozen_settable (bool): controls whether frozen is able to be set
@@ -74,14 +129,19 @@ class tree(prototype.tree):
         operations_kls: callable to generate a repo operations instance
 
         trees (list): :obj:`pkgcore.repository.prototype.tree` instances
+        parallel (bool): whether :py:meth:`itermatch` queries the trees
+            concurrently, each in its own thread, with the results of sorted
+            queries being merged as they arrive
     """
 
     frozen_settable = False
     operations_kls = operations
 
-    pkgcore_config_type = ConfigHint(types={"repos": "refs:repo"}, typename="repo")
+    pkgcore_config_type = ConfigHint(
+        types={"repos": "refs:repo", "parallel": "bool"}, typename="repo"
+    )
 
-    def __init__(self, *trees, repos=()):
+    def __init__(self, *trees, repos=(), parallel=False):
         super().__init__()
         trees = trees + tuple(repos)
         for x in trees:
@@ -90,6 +150,7 @@ class tree(prototype.tree):
                     f"{x} is not a repository tree derivative"
                 )
         self.trees = trees
+        self.parallel = parallel
 
     def _get_categories(self):
         d = set()
@@ -149,7 +210,17 @@ class tree(prototype.tree):
 
     def itermatch(self, restrict, **kwds):
         sorter = kwds.get("sorter", iter)
+        if self.parallel and len(self.trees) > 1:
+            # all trees are queried up front, results are buffered until used
+            iters = [
+                _prefetch(partial(repo.itermatch, restrict, **kwds))
+                for repo in self.trees
+            ]
+        else:
+            iters = None
         if sorter is iter:
+            if iters is not None:
+                return (match for matches in iters for match in matches)
             return (
                 match
                 for repo in self.trees
@@ -164,7 +235,9 @@ class tree(prototype.tree):
             return -1
 
         f = post_curry(sorted_cmp, f, key=itemgetter(0))
-        return iter_sort(f, *[repo.itermatch(restrict, **kwds) for repo in self.trees])
+        if iters is None:
+            iters = [repo.itermatch(restrict, **kwds) for repo in self.trees]
+        return iter_sort(f, *iters)
 
     itermatch.__doc__ = prototype.tree.itermatch.__doc__.replace(
         "@param", "@keyword"
@@ -215,7 +288,7 @@ class tree(prototype.tree):
                 self.trees += (other,)
             return self
         elif isinstance(other, tree):
-            return tree(*(self.trees + other.trees))
+            return tree(*(self.trees + other.trees), parallel=self.parallel)
         raise TypeError(
             f"cannot add {other.__class__.__name__!r} and {self.__class__.__name__!r} objects"
         )
@@ -226,7 +299,7 @@ class tree(prototype.tree):
                 self.trees = (other,) + self.trees
             return self
         elif isinstance(other, tree):
-            return tree(*(other.trees + self.trees))
+            return tree(*(other.trees + self.trees), parallel=self.parallel)
         raise TypeError(
             f"cannot add {other.__class__.__name__!r} and {self.__class__.__name__!r} objects"
         )
@@ -1,10 +1,11 @@
-__all__ = ("resolver_frame", "resolver_stack", "merge_plan")
+__all__ = ("resolver_frame", "resolver_stack", "match_cache", "merge_plan")
 
 import operator
 import sys
-from collections import deque
+from collections import OrderedDict, deque
 from functools import partial
 from itertools import chain, filterfalse, islice
+from time import perf_counter
 
 from snakeoil.compatibility import cmp, sort_cmp
 from snakeoil.iterables import caching_iter
@@ -34,6 +35,10 @@ pkg_sort_lowest = sorted
 pkg_grabber = operator.itemgetter(0)
 
 
+def _version_sort_key(pkg):
+    return (pkg.category, pkg.package, pkg.version_key)
+
+
 def highest_iter_sort(l, pkg_grabber=pkg_grabber):
     """Sort a list of packages from highest to lowest and prefer livefs.
 
@@ -42,19 +47,11 @@ def highest_iter_sort(l, pkg_grabber=pkg_grabber):
     :return: sorted list of packages
     """
 
-    def f(x, y):
-        c = cmp(x, y)
-        if c:
-            return c
-        elif x.repo.livefs:
-            if y.repo.livefs:
-                return 0
-            return 1
-        elif y.repo.livefs:
-            return -1
-        return 0
+    def key(x):
+        pkg = pkg_grabber(x)
+        return (_version_sort_key(pkg), pkg.repo.livefs)
 
-    sort_cmp(l, f, key=pkg_grabber, reverse=True)
+    l.sort(key=key, reverse=True)
     return l
 
 
@@ -94,19 +91,11 @@ def lowest_iter_sort(l, pkg_grabber=pkg_grabber):
     :return: sorted list of packages
     """
 
-    def f(x, y):
-        c = cmp(x, y)
-        if c:
-            return c
-        elif x.repo.livefs:
-            if y.repo.livefs:
-                return 0
-            return -1
-        elif y.repo.livefs:
-            return 1
-        return 0
+    def key(x):
+        pkg = pkg_grabber(x)
+        return (_version_sort_key(pkg), not pkg.repo.livefs)
 
-    sort_cmp(l, f, key=pkg_grabber)
+    l.sort(key=key)
     return l
 
 
@@ -119,6 +108,55 @@ class MutableContainmentRestriction(values.base):
         sf(self, "match", self._blacklist.__contains__)
 
 
+class match_cache:
+    """Bounded LRU cache of repository matches.
+
+    Matches are stored as :obj:`caching_iter` instances keyed by the queried
+    repository and restriction, so repeated queries share the packages already
+    pulled from the repository.
+    """
+
+    def __init__(self, maxsize=4096):
+        """
+        :param maxsize: maximum number of cached queries, 0 disables caching
+        """
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = self.misses = 0
+
+    def match(self, dbs, restrict):
+        key = (dbs, restrict)
+        cache = self._cache
+        matches = cache.get(key)
+        if matches is not None:
+            self.hits += 1
+            cache.move_to_end(key)
+            return matches
+        self.misses += 1
+        matches = caching_iter(dbs.itermatch(restrict))
+        if self.maxsize:
+            cache[key] = matches
+            if len(cache) > self.maxsize:
+                cache.popitem(last=False)
+        return matches
+
+    def invalidate(self, dbs):
+        """Drop all cached matches of a repository."""
+        for key in [k for k in self._cache if k[0] is dbs]:
+            del self._cache[key]
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
 class resolver_frame:
     __slots__ = (
         "parent",
@@ -303,6 +341,8 @@ class merge_plan:
         debug=False,
         debug_handle=None,
         pdb_intercept=None,
+        match_cache_size=4096,
+        trace=None,
     ):
         if debug:
             if debug_handle is None:
@@ -342,6 +382,10 @@ class merge_plan:
             ]
         )
 
+        self.match_cache = match_cache(match_cache_size)
+        # vdb filter generation matches against the livefs were cached for
+        self._livefs_generation = self.state.vdb_filter_generation
+
         self.insoluble = set()
         self.vdb_preloaded = False
         self._ensure_livefs_is_loaded = self._ensure_livefs_is_loaded_nonpreloaded
@@ -354,6 +398,11 @@ class merge_plan:
             )
             self._debugging_depth = 0
             self._debugging_drop_cycles = False
+        # structured event sink, see pkgcore.resolver.trace
+        self._trace = trace
+        if trace is not None:
+            self._trace_frames = []
+            self._rec_add_atom = partial(self._tracing_rec_add_atom, self._rec_add_atom)
 
     @property
     def forced_restrictions(self):
@@ -362,6 +411,21 @@ class merge_plan:
     def reset(self, point=0):
         self.state.backtrack(point)
 
+    def _backtrack(self, atom, point):
+        if self._trace is not None and len(self.state.plan) > point:
+            self._trace(
+                {
+                    "type": "backtrack",
+                    "atom": str(atom),
+                    "ops": len(self.state.plan) - point,
+                }
+            )
+        self.state.backtrack(point)
+
+    def _trace_cycle(self, atom, action):
+        if self._trace is not None:
+            self._trace({"type": "cycle", "atom": str(atom), "action": action})
+
     def notify_starting_mode(self, mode, stack):
         if mode == "pdepend":
             mode = "prdepends"
@@ -379,6 +443,8 @@ class merge_plan:
         self._dprint(
             "choose for %s%s, %s", (stack.depth * 2 * " ", atom, choices.current_pkg)
         )
+        if self._trace is not None:
+            self._trace_frames[-1][1] += 1
         stack.add_event(("inspecting", choices.current_pkg))
 
     def notify_choice_failed(self, stack, atom, choices, msg, msg_args=()):
@@ -440,6 +506,14 @@ class merge_plan:
             # note via this being outside the recursion, backtracking
             # is excluded... inline it somehow.
             self.process_finalize()
+        if self._trace is not None:
+            self._trace(
+                {
+                    "type": "match_cache",
+                    "hits": self.match_cache.hits,
+                    "misses": self.match_cache.misses,
+                }
+            )
         return ()
 
     def process_finalize(self):
@@ -479,6 +553,34 @@ class merge_plan:
             self._debugging_drop_cycles = False
         return ret
 
+    def _tracing_rec_add_atom(self, func, atom, stack, dbs, **kwds):
+        frames = self._trace_frames
+        # time spent on dependencies, candidates tried, match cache hit
+        frame = [0.0, 0, None]
+        frames.append(frame)
+        start = perf_counter()
+        try:
+            ret = func(atom, stack, dbs, **kwds)
+        finally:
+            elapsed = perf_counter() - start
+            frames.pop()
+        if frames:
+            frames[-1][0] += elapsed
+        self._trace(
+            {
+                "type": "atom",
+                "atom": str(atom),
+                "mode": kwds.get("mode", "none"),
+                "depth": len(frames),
+                "elapsed": elapsed,
+                "own": elapsed - frame[0],
+                "candidates": frame[1],
+                "cached": frame[2],
+                "success": not ret,
+            }
+        )
+        return ret
+
     def _rec_add_atom(self, atom, stack, dbs, mode="none", drop_cycles=False):
         """Add an atom.
 
@@ -592,7 +694,7 @@ class merge_plan:
                 self.notify_choice_failed(
                     stack, atom, choices, "failed inserting: %s", l
                 )
-                self.state.backtrack(stack.current_frame.start_point)
+                self._backtrack(atom, stack.current_frame.start_point)
                 choices.force_next_pkg()
                 continue
 
@@ -614,7 +716,7 @@ class merge_plan:
                 "ran out of choices",
             )
         )
-        self.state.backtrack(stack.current_frame.start_point)
+        self._backtrack(atom, stack.current_frame.start_point)
         # saving roll.  if we're allowed to drop cycles, try it again.
         # this needs to be *far* more fine grained also. it'll try
         # regardless of if it's a cycle issue
@@ -623,6 +725,7 @@ class merge_plan:
                 ("cycle", stack.current_frame, "trying to drop any cycles"),
             )
             self._dprint("trying saving throw for %s ignoring cycles", atom, "cycle")
+            self._trace_cycle(atom, "drop cycles")
             # note everything is retored to a pristine state prior also.
             stack[-1].ignored = True
             l = self._rec_add_atom(atom, stack, dbs, mode=mode, drop_cycles=True)
@@ -663,7 +766,7 @@ class merge_plan:
                 ret = ((True,), {"pre_solved": True})
             else:
                 # not in the plan thus far.
-                matches = caching_iter(dbs.itermatch(atom))
+                matches = self._match(dbs, atom)
                 if matches:
                     choices = choice_point(atom, matches)
                     # ignore what dropped out, at this juncture we don't care.
@@ -701,6 +804,21 @@ class merge_plan:
             return None
         return choices, matches
 
+    def _match(self, dbs, atom):
+        if dbs is self.livefs_dbs:
+            # livefs matches depend on the packages currently being replaced
+            # or removed, which change as ops are applied and backtracked
+            generation = self.state.vdb_filter_generation
+            if generation != self._livefs_generation:
+                self.match_cache.invalidate(dbs)
+                self._livefs_generation = generation
+        if self._trace is not None:
+            hits = self.match_cache.hits
+            matches = self.match_cache.match(dbs, atom)
+            self._trace_frames[-1][2] = self.match_cache.hits > hits
+            return matches
+        return self.match_cache.match(dbs, atom)
+
     def check_for_cycles(self, stack, cur_frame):
         """Check the current stack for cyclical issues.
 
@@ -748,6 +866,7 @@ class merge_plan:
         # we already know the current pkg isn't livefs; force livefs to
         # sidestep this.
         cur_frame.parent.events.append(("cycle", cur_frame, "limiting to vdb"))
+        self._trace_cycle(cur_frame.atom, "limit to vdb")
         cur_frame.ignored = True
         return self._rec_add_atom(
             cur_frame.atom,
@@ -771,7 +890,7 @@ class merge_plan:
                 "resetting for %s%s because of %s: %s",
                 (depth * 2 * " ", atom, attr, l[0]),
             )
-            self.state.backtrack(stack.current_frame.start_point)
+            self._backtrack(atom, stack.current_frame.start_point)
             return [], l[0]
 
         additions = l[0]
@@ -815,6 +934,7 @@ class merge_plan:
                             (mode, cur_frame.atom, or_node, cur_frame.current_pkg),
                             "cycle",
                         )
+                        self._trace_cycle(or_node, f"drop {mode} dependency")
                         failure = None
                         break
 
@@ -989,6 +1109,7 @@ class merge_plan:
         return None
 
     def free_caches(self):
+        self.match_cache.clear()
         for repo in self.all_raw_dbs:
             repo.clear()
 
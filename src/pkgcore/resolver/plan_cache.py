@@ -0,0 +1,226 @@
+"""
+persistent cache of resolved plans
+
+Plans are stored keyed by a fingerprint of all resolution inputs, see
+:py:func:`fingerprint`, and only hold the package ops of the plan. Restoring
+a plan looks up the packages in the repositories of a fresh resolver and
+replays the ops on its state, so a stored plan is never used if any of its
+packages disappeared or no longer fit together.
+"""
+
+__all__ = (
+    "PlanCache",
+    "StalePlan",
+    "fingerprint",
+    "tree_stamp",
+    "serialize",
+    "restore",
+)
+
+import marshal
+import os
+from hashlib import blake2b
+
+from snakeoil.osutils import ensure_dirs, pjoin
+
+from ..ebuild.atom import atom
+from ..log import logger
+from . import state
+from .choice_point import choice_point
+
+# bump when the stored format changes
+_VERSION = 1
+
+_op_kls = {"add": state.add_op, "remove": state.remove_op, "replace": state.replace_op}
+
+
+class StalePlan(ValueError):
+    """Stored plan that doesn't apply to the current repositories."""
+
+
+def tree_stamp(path, depth=1, contents=False, names=None):
+    """Return a stamp of the files in a directory tree.
+
+    The stamp covers the relative paths of all entries up to the given depth
+    and either the sizes and modification times or the contents of files,
+    so it's independent of the host for trees synced or copied with their
+    modification times preserved.
+
+    :param depth: number of directory levels to include
+    :param contents: hash file contents instead of sizes and modification times
+    :param names: only include files with the given names
+    :return: hex digest, None if the path doesn't exist
+    """
+    if not os.path.exists(path):
+        return None
+    h = blake2b(digest_size=16)
+    dirs = [("", 1)]
+    while dirs:
+        base, level = dirs.pop()
+        try:
+            entries = sorted(os.scandir(pjoin(path, base)), key=lambda x: x.name)
+        except (NotADirectoryError, FileNotFoundError):
+            continue
+        for entry in entries:
+            relpath = pjoin(base, entry.name) if base else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if level < depth:
+                        dirs.append((relpath, level + 1))
+                    h.update(b"d\0%s\0" % os.fsencode(relpath))
+                    continue
+                if names is not None and entry.name not in names:
+                    continue
+                h.update(b"f\0%s\0" % os.fsencode(relpath))
+                if contents:
+                    with open(entry.path, "rb") as f:
+                        h.update(blake2b(f.read(), digest_size=16).digest())
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    h.update(b"%i:%i\0" % (st.st_size, st.st_mtime_ns))
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+    return h.hexdigest()
+
+
+def _stable(data):
+    """Convert data to builtin types with a stable serialization."""
+    if isinstance(data, (str, int, float, bool, bytes)) or data is None:
+        return data
+    elif isinstance(data, dict):
+        return tuple(sorted((str(k), _stable(v)) for k, v in data.items()))
+    elif isinstance(data, (set, frozenset)):
+        return tuple(sorted(map(_stable, data), key=repr))
+    elif isinstance(data, (list, tuple)):
+        return tuple(map(_stable, data))
+    return str(data)
+
+
+def fingerprint(*parts):
+    """Return the fingerprint of the given resolution inputs.
+
+    Parts can be any nesting of builtin containers, other objects are
+    included via their string representation.
+    """
+    # marshal output depends on reference counts, repr is stable
+    data = repr((_VERSION, _stable(parts))).encode("utf8", "surrogateescape")
+    h = blake2b(data, digest_size=20)
+    return h.hexdigest()
+
+
+def _pkg_ref(pkg):
+    return (pkg.repo.repo_id, bool(pkg.repo.livefs), pkg.cpvstr)
+
+
+def serialize(plan_state):
+    """Return the package ops of a plan as builtin types."""
+    entries = []
+    for op in plan_state.iter_ops(True):
+        if op.desc not in _op_kls:
+            raise ValueError(f"unsupported plan op: {op!r}")
+        old = _pkg_ref(op.old_pkg) if op.desc == "replace" else None
+        entries.append((op.desc, _pkg_ref(op.pkg), bool(op.force), old))
+    return tuple(entries)
+
+
+def _find_pkg(dbs, ref):
+    repo_id, livefs, cpvstr = ref
+    restrict = atom(f"={cpvstr}")
+    for repo in dbs:
+        if bool(repo.livefs) != livefs:
+            continue
+        for pkg in repo.itermatch(restrict):
+            if pkg.repo.repo_id == repo_id and pkg.cpvstr == cpvstr:
+                return pkg
+    raise StalePlan(f"package no longer available: {cpvstr}::{repo_id}")
+
+
+def restore(resolver, entries):
+    """Replay stored package ops on the state of a fresh resolver.
+
+    :param resolver: :obj:`pkgcore.resolver.plan.merge_plan` instance
+    :raises StalePlan: if the stored plan doesn't apply, in which case the
+        resolver state should be reset before resolving
+    """
+    plan_state = resolver.state
+    for desc, ref, force, old_ref in entries:
+        try:
+            op_kls = _op_kls[desc]
+        except KeyError:
+            raise StalePlan(f"unknown plan op: {desc!r}")
+        pkg = _find_pkg(resolver.all_raw_dbs, ref)
+        if desc == "remove":
+            try:
+                choices = plan_state.pkg_choices[pkg]
+            except KeyError:
+                raise StalePlan(f"removed package isn't in the plan: {pkg}")
+        else:
+            choices = choice_point(pkg.versioned_atom, [pkg])
+        op = op_kls(choices, pkg, force=force)
+        if op.apply(plan_state):
+            raise StalePlan(f"failed applying {op}")
+        if old_ref is not None and _pkg_ref(op.old_pkg) != old_ref:
+            raise StalePlan(f"replaced package changed: {op}")
+
+
+class PlanCache:
+    """Resolved plans stored as files named by their fingerprint.
+
+    Only the most recently stored plans are kept, see ``max_entries``.
+    """
+
+    def __init__(self, path, max_entries=16):
+        self.path = path
+        self.max_entries = max_entries
+
+    def _entry_path(self, key):
+        return pjoin(self.path, f"{key}.plan")
+
+    def get(self, key):
+        """Return the stored plan entries for a fingerprint, None if missing."""
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                version, stored_key, entries = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (EnvironmentError, EOFError, ValueError, TypeError) as e:
+            logger.debug("ignoring invalid cached plan %r: %s", key, e)
+            return None
+        if version != _VERSION or stored_key != key:
+            return None
+        return entries
+
+    def store(self, key, entries):
+        """Store plan entries for a fingerprint.
+
+        :raises EnvironmentError: if the plan couldn't be written
+        """
+        if not ensure_dirs(self.path, mode=0o755, minimal=True):
+            raise PermissionError(f"failed creating {self.path!r}")
+        path = self._entry_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump((_VERSION, key, entries), f)
+        os.rename(tmp, path)
+        self._prune()
+
+    def discard(self, key):
+        try:
+            os.unlink(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self):
+        plans = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".plan"):
+                try:
+                    plans.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    continue
+        plans.sort(reverse=True)
+        for _mtime, path in plans[self.max_entries :]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
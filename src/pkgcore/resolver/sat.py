@@ -0,0 +1,661 @@
+"""
+SAT based resolver engine
+
+:py:class:`sat_plan` is an alternative to the depth first backtracking of
+:py:class:`pkgcore.resolver.plan.merge_plan`. Instead of trying candidates one
+at a time, all packages reachable from the requested atoms are collected up
+front, with one boolean variable per package stating whether it's part of the
+resulting plan. Dependencies, slots, blockers and REQUIRED_USE are encoded as
+clauses over these variables and solved by :py:class:`sat_solver`, so
+conflicts found deep in the graph are learned instead of being rediscovered
+for every combination of choices above them.
+
+Candidates are tried in the order of the resolver's strategies, packages
+already in the plan first, so the solution matches the one found by
+:py:class:`pkgcore.resolver.plan.merge_plan` where both succeed.
+"""
+
+__all__ = ("sat_solver", "sat_problem", "sat_plan")
+
+from collections import deque
+from heapq import heappop, heappush
+from itertools import chain
+from time import perf_counter
+
+from snakeoil.sequences import iter_stable_unique
+
+from . import plan, state
+from .choice_point import choice_point
+
+
+class sat_solver:
+    """Conflict driven clause learning SAT solver.
+
+    Variables are positive integers allocated via :py:meth:`new_var`,
+    literals are variables or their negation.
+
+    Decisions are driven by requirements, clauses that are active once their
+    trigger variable is true: the first undecided literal of the earliest
+    active and unsatisfied requirement is set to true. Remaining variables are
+    set to false, so solutions are minimal with regards to the requirements.
+    """
+
+    def __init__(self):
+        self.values = [None]
+        self.levels = [0]
+        self.reasons = [None]
+        # literal -> clauses watching it
+        self.watches = {}
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.ok = True
+        self.requirements = []
+        self.triggers = {}
+        # heap of possibly open requirements, and the requirements dropped
+        # from it per decision level
+        self.pending = []
+        self.popped = []
+        self.cursor = 1
+        self.model = None
+        self.clauses = self.conflicts = self.decisions = 0
+
+    @property
+    def nvars(self):
+        return len(self.values) - 1
+
+    def new_var(self):
+        self.values.append(None)
+        self.levels.append(0)
+        self.reasons.append(None)
+        return len(self.values) - 1
+
+    def value(self, lit):
+        """Return the value of a literal, None if it's unassigned."""
+        value = self.values[lit if lit > 0 else -lit]
+        if value is None or lit > 0:
+            return value
+        return not value
+
+    def add_clause(self, lits):
+        """Add a clause.
+
+        :return: False if the problem is known to be unsatisfiable
+        """
+        if not self.ok:
+            return False
+        self._cancel(0)
+        clause = []
+        seen = set()
+        for lit in lits:
+            if -lit in seen:
+                return True
+            elif lit in seen:
+                continue
+            value = self.value(lit)
+            if value:
+                return True
+            seen.add(lit)
+            if value is None:
+                clause.append(lit)
+        self.clauses += 1
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._assign(clause[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self._watch(clause)
+        return self.ok
+
+    def add_requirement(self, lits, trigger=None):
+        """Add a clause preferring its literals in the given order.
+
+        :param trigger: variable required to be true for the clause to apply,
+            None if it always applies
+        :return: False if the problem is known to be unsatisfiable
+        """
+        lits = tuple(lits)
+        ok = self.add_clause(lits if trigger is None else (-trigger,) + lits)
+        index = len(self.requirements)
+        self.requirements.append((trigger, lits))
+        if trigger is None or self.values[trigger]:
+            heappush(self.pending, index)
+        if trigger is not None:
+            self.triggers.setdefault(trigger, []).append(index)
+        return ok
+
+    def solve(self, assumptions=()):
+        """Solve the problem with the given literals assumed to be true.
+
+        Learned clauses are kept, so solving repeatedly with different
+        assumptions is cheap.
+
+        :return: True if a solution was found, see :py:attr:`model`
+        """
+        self.model = None
+        if not self.ok:
+            return False
+        self._cancel(0)
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, level = self._analyze(conflict)
+                self._cancel(level)
+                if len(learnt) == 1:
+                    self._assign(learnt[0], None)
+                else:
+                    self._watch(learnt)
+                    self._assign(learnt[0], learnt)
+                continue
+
+            lit = None
+            while len(self.trail_lim) < len(assumptions):
+                assumption = assumptions[len(self.trail_lim)]
+                value = self.value(assumption)
+                if value is False:
+                    self._cancel(0)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if value is None:
+                    lit = assumption
+                    break
+            if lit is None:
+                lit = self._pick()
+                if lit is None:
+                    self.model = self.values[:]
+                    self._cancel(0)
+                    return True
+                self.trail_lim.append(len(self.trail))
+            self.decisions += 1
+            self._assign(lit, None)
+
+    def _watch(self, clause):
+        self.watches.setdefault(clause[0], []).append(clause)
+        self.watches.setdefault(clause[1], []).append(clause)
+
+    def _assign(self, lit, reason):
+        var = lit if lit > 0 else -lit
+        self.values[var] = lit > 0
+        self.levels[var] = len(self.trail_lim)
+        self.reasons[var] = reason
+        self.trail.append(lit)
+        if lit > 0 and var in self.triggers:
+            for index in self.triggers[var]:
+                heappush(self.pending, index)
+
+    def _cancel(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        start = self.trail_lim[level]
+        values, reasons = self.values, self.reasons
+        cursor = self.cursor
+        for lit in self.trail[start:]:
+            var = lit if lit > 0 else -lit
+            values[var] = reasons[var] = None
+            if var < cursor:
+                cursor = var
+        self.cursor = cursor
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = start
+        popped = self.popped
+        while popped and popped[-1][0] > level:
+            heappush(self.pending, popped.pop()[1])
+
+    def _propagate(self):
+        """Propagate all assignments, returning a conflicting clause if any."""
+        value = self.value
+        watches = self.watches
+        trail = self.trail
+        while self.qhead < len(trail):
+            false_lit = -trail[self.qhead]
+            self.qhead += 1
+            watching = watches.get(false_lit)
+            if not watching:
+                continue
+            kept = []
+            for i, clause in enumerate(watching):
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                if value(first):
+                    kept.append(clause)
+                    continue
+                for k in range(2, len(clause)):
+                    if value(clause[k]) is not False:
+                        clause[1], clause[k] = clause[k], false_lit
+                        watches.setdefault(clause[1], []).append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if value(first) is False:
+                        kept.extend(watching[i + 1 :])
+                        watches[false_lit] = kept
+                        return clause
+                    self._assign(first, clause)
+            watches[false_lit] = kept
+        return None
+
+    def _analyze(self, conflict):
+        """Derive the first unique implication point clause of a conflict.
+
+        :return: learnt clause with the asserted literal first, and the level
+            to backjump to
+        """
+        levels, reasons, trail = self.levels, self.reasons, self.trail
+        level = len(self.trail_lim)
+        seen = set()
+        learnt = [None]
+        pending = 0
+        index = len(trail) - 1
+        clause, lit = conflict, None
+        while True:
+            for q in clause if lit is None else clause[1:]:
+                var = q if q > 0 else -q
+                if var not in seen and levels[var]:
+                    seen.add(var)
+                    if levels[var] >= level:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while abs(trail[index]) not in seen:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            pending -= 1
+            if not pending:
+                break
+            clause = reasons[abs(lit)]
+        learnt[0] = -lit
+        if len(learnt) == 1:
+            return learnt, 0
+        # watch the literal of the highest remaining level
+        i = max(range(1, len(learnt)), key=lambda x: levels[abs(learnt[x])])
+        learnt[1], learnt[i] = learnt[i], learnt[1]
+        return learnt, levels[abs(learnt[1])]
+
+    def _pick(self):
+        """Return the next decision literal, None if all variables are assigned."""
+        values, pending = self.values, self.pending
+        level = len(self.trail_lim)
+        while pending:
+            index = pending[0]
+            trigger, lits = self.requirements[index]
+            if trigger is None or values[trigger]:
+                choice = None
+                for lit in lits:
+                    value = self.value(lit)
+                    if value:
+                        break
+                    elif value is None and choice is None:
+                        choice = lit
+                else:
+                    if choice is not None:
+                        return choice
+            heappop(pending)
+            self.popped.append((level, index))
+        n = len(values)
+        while self.cursor < n:
+            if values[self.cursor] is None:
+                return -self.cursor
+            self.cursor += 1
+        return None
+
+
+class sat_problem:
+    """Encoding of the resolution of a set of atoms for a :py:class:`sat_solver`.
+
+    Besides one variable per package, every requested atom gets a selector
+    variable requiring one of its matches, assumed to be true while solving.
+    Packages already in the plan are kept, though installed packages may be
+    replaced by another package of the same slot.
+    """
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self.solver = sat_solver()
+        self.vars = {}
+        self.pkgs = {}
+        self.choices = {}
+        # variable -> dependency modes, or blocks, and their candidates
+        self.deps = {}
+        # variable -> unsatisfied REQUIRED_USE nodes
+        self.masked = {}
+        # depending variable, blocker, or block alternative variable
+        self.blockers = []
+        self.targets = []
+        self.planned = set()
+        self._unexplored = deque()
+        self._kept = {}
+
+    def pkg_var(self, pkg):
+        key = (id(pkg.repo), pkg.cpvstr)
+        var = self.vars.get(key)
+        if var is None:
+            var = self.vars[key] = self.solver.new_var()
+            self.pkgs[var] = pkg
+            self._unexplored.append(var)
+        return var
+
+    def candidates(self, restrict):
+        """Return the variables of all matching packages in preference order."""
+        resolver = self.resolver
+        matches = chain(
+            resolver.state.match_atom(restrict),
+            resolver.match_cache.match(resolver.default_dbs, restrict),
+        )
+        return list(iter_stable_unique(map(self.pkg_var, matches)))
+
+    def get_choices(self, var):
+        choices = self.choices.get(var)
+        if choices is None:
+            pkg = self.pkgs[var]
+            choices = self.choices[var] = choice_point(pkg.versioned_atom, [pkg])
+        return choices
+
+    def build(self, restricts):
+        solver = self.solver
+        for restrict in restricts:
+            selector = solver.new_var()
+            candidates = self.candidates(restrict)
+            solver.add_requirement(candidates, selector)
+            self.targets.append((restrict, selector, candidates))
+
+        for pkg, choices in self.resolver.state.pkg_choices.items():
+            var = self.pkg_var(pkg)
+            self.choices[var] = choices
+            self.planned.add(var)
+            if pkg.repo.livefs:
+                self._keep_slot(var)
+            else:
+                solver.add_clause((var,))
+
+        # installed packages hit by blockers have to be replaced
+        blockers = 0
+        livefs_dbs = self.resolver.livefs_dbs
+        while True:
+            self._explore()
+            if blockers == len(self.blockers):
+                break
+            for _var, blocker, _alt in self.blockers[blockers:]:
+                for pkg in livefs_dbs.itermatch(blocker):
+                    self._keep_slot(self.pkg_var(pkg))
+            blockers = len(self.blockers)
+
+        self._encode_blockers()
+        self._encode_slots()
+        for lits in self._kept.values():
+            solver.add_requirement(lits)
+
+    def _keep_slot(self, var):
+        if var not in self._kept:
+            pkg = self.pkgs[var]
+            self._kept[var] = [var] + [
+                x for x in self.candidates(pkg.slotted_atom) if x != var
+            ]
+
+    def _explore(self):
+        resolver = self.resolver
+        solver = self.solver
+        while self._unexplored:
+            var = self._unexplored.popleft()
+            pkg = self.pkgs[var]
+            if pkg.built and not resolver.process_built_depends:
+                modes = ("rdepend", "idepend", "pdepend")
+            else:
+                modes = ("bdepend", "depend", "rdepend", "idepend", "pdepend")
+                if pkg.eapi.options.has_required_use:
+                    failed = [x for x in pkg.required_use if not x.match(pkg.use)]
+                    if failed:
+                        self.masked[var] = failed
+                        solver.add_clause((-var,))
+                        continue
+            deps = self.deps[var] = []
+            for mode in modes:
+                depset = getattr(pkg, mode, None)
+                if depset is None:
+                    continue
+                for or_block in resolver.depset_reorder(depset.cnf_solutions(), mode):
+                    lits = []
+                    for atom in or_block:
+                        if not atom.blocks:
+                            lits.extend(self.candidates(atom))
+                        elif len(or_block) == 1:
+                            self.blockers.append((var, atom, None))
+                        else:
+                            alt = solver.new_var()
+                            self.blockers.append((var, atom, alt))
+                            lits.append(alt)
+                    if lits or not or_block[0].blocks:
+                        lits = list(iter_stable_unique(lits))
+                        deps.append((mode, or_block, lits))
+                        solver.add_requirement(lits, var)
+
+    def _encode_blockers(self):
+        by_key = {}
+        for var, pkg in self.pkgs.items():
+            by_key.setdefault(pkg.key, []).append(var)
+        for var, blocker, alt in self.blockers:
+            blocker = self.resolver.generate_mangled_blocker(
+                self.get_choices(var), blocker
+            )
+            for blocked in by_key.get(blocker.key, ()):
+                # packages never block themselves
+                if blocked != var and blocker.match(self.pkgs[blocked]):
+                    self.solver.add_clause((-var if alt is None else -alt, -blocked))
+
+    def _encode_slots(self):
+        slots = {}
+        for var, pkg in self.pkgs.items():
+            if getattr(pkg, "package_is_real", True):
+                slots.setdefault((pkg.key, pkg.slot), []).append(var)
+        for pkgs in slots.values():
+            for i, var in enumerate(pkgs):
+                for other in pkgs[i + 1 :]:
+                    self.solver.add_clause((-var, -other))
+
+    def solve(self):
+        return self.solver.solve([selector for _, selector, _ in self.targets])
+
+    def selected(self, lits):
+        """Return the first package variable of a clause in the solution."""
+        model = self.solver.model
+        for lit in lits:
+            if model[lit] and lit in self.pkgs:
+                return lit
+        return None
+
+    def failed_target(self):
+        """Return the index of the first requested atom making the problem insoluble."""
+        selectors = [selector for _, selector, _ in self.targets]
+        # prefixes of the selectors are checked, the whole set is insoluble
+        lo, hi = 0, len(selectors)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.solver.solve(selectors[:mid]):
+                lo = mid
+            else:
+                hi = mid
+        return hi - 1
+
+    def explain(self, var):
+        """Return the failure event of a candidate package."""
+        pkg = self.pkgs[var]
+        if var in self.masked:
+            nodes = ", ".join(map(str, self.masked[var]))
+            return ("choice", str(pkg), False, f"REQUIRED_USE unsatisfied: {nodes}")
+        for _mode, or_block, lits in self.deps.get(var, ()):
+            if not lits:
+                if len(or_block) == 1:
+                    atom = or_block[0]
+                else:
+                    atom = "|| ( %s )" % " ".join(map(str, or_block))
+                return ("viable", False, False, atom, "no matches")
+        return (
+            "choice",
+            str(pkg),
+            False,
+            "no solution for its dependencies, slots and blockers",
+        )
+
+
+class sat_plan(plan.merge_plan):
+    """Resolver solving the requested atoms as a SAT problem.
+
+    Takes the same arguments as :py:class:`pkgcore.resolver.plan.merge_plan`
+    and fills its state the same way, so it can be used in its place. Dependency
+    cycles are broken in the merge order instead of being resolved against
+    installed packages, hence cycles between build time dependencies of new
+    packages are accepted.
+    """
+
+    def load_vdb_state(self):
+        atoms = [pkg.versioned_atom for pkg in self.livefs_dbs]
+        ret = self.add_atoms(atoms)
+        if ret:
+            raise Exception("couldn't load vdb state, %s %s" % (ret[0][0], ret))
+        self.vdb_preloaded = True
+        self._ensure_livefs_is_loaded = self._ensure_livefs_is_loaded_preloaded
+
+    def add_atoms(self, restricts, finalize=False):
+        if restricts:
+            for restrict in restricts:
+                state.add_hardref_op(restrict).apply(self.state)
+            ret = self._solve(restricts)
+            if ret:
+                return ret
+        return super().add_atoms((), finalize=finalize)
+
+    def _solve(self, restricts):
+        start = perf_counter()
+        problem = sat_problem(self)
+        problem.build(restricts)
+        solved = problem.solve()
+        solver = problem.solver
+        self._dprint(
+            "sat: %i variables, %i clauses, %i conflicts, %i decisions",
+            (solver.nvars, solver.clauses, solver.conflicts, solver.decisions),
+        )
+        if solved:
+            self._insert_solution(problem)
+            ret = ()
+        else:
+            ret = self._failure(problem)
+        if self._trace is not None:
+            self._trace(
+                {
+                    "type": "solve",
+                    "atoms": len(restricts),
+                    "variables": solver.nvars,
+                    "clauses": solver.clauses,
+                    "conflicts": solver.conflicts,
+                    "decisions": solver.decisions,
+                    "elapsed": perf_counter() - start,
+                    "success": solved,
+                }
+            )
+        return ret
+
+    def _failure(self, problem):
+        index = problem.failed_target()
+        restrict, _selector, candidates = problem.targets[index]
+        stack = plan.resolver_stack()
+        frame = stack.add_frame(
+            "none",
+            restrict,
+            choice_point(restrict, [problem.pkgs[x] for x in candidates]),
+            self.default_dbs,
+            self.state.current_state,
+            False,
+        )
+        if not candidates:
+            frame.events.append(("viable", False, False, restrict, "no matches"))
+        for var in candidates:
+            frame.events.append(("inspecting", problem.pkgs[var]))
+            frame.events.append(problem.explain(var))
+        stack.pop_frame(False)
+        self._dprint("failed- %s", restrict)
+        return [restrict], stack.events[-1]
+
+    def _insert_solution(self, problem):
+        """Add the solved packages to the plan, dependencies first."""
+        model = problem.solver.model
+        edges = {}
+        by_key = {}
+        for var, pkg in problem.pkgs.items():
+            if not model[var]:
+                continue
+            pre, post = [], []
+            for mode, _or_block, lits in problem.deps.get(var, ()):
+                if (dep := problem.selected(lits)) is not None:
+                    (post if mode == "pdepend" else pre).append((mode, dep))
+            edges[var] = (pre, post)
+            by_key.setdefault(pkg.key, []).append(var)
+        # packages replacing blocked ones come first
+        active_blockers = []
+        for var, blocker, alt in problem.blockers:
+            if model[var] and (alt is None or model[alt]):
+                active_blockers.append((var, blocker))
+                edges[var][0].extend(
+                    ("blocker", x) for x in by_key.get(blocker.key, ()) if x != var
+                )
+
+        roots = [problem.selected(x[2]) for x in problem.targets]
+        roots.extend(edges)
+        seen = set()
+        for root in roots:
+            if root is None or root in seen:
+                continue
+            seen.add(root)
+            stack = [(root, iter(edges[root][0]), False)]
+            visiting = {root}
+            while stack:
+                var, deps, post = stack[-1]
+                for mode, dep in deps:
+                    if dep not in seen:
+                        seen.add(dep)
+                        visiting.add(dep)
+                        stack.append((dep, iter(edges[dep][0]), False))
+                        break
+                    elif dep in visiting and mode in ("bdepend", "depend"):
+                        pkg = problem.pkgs[var]
+                        if not pkg.repo.livefs:
+                            self._dprint(
+                                "%s level cycle: %s: ordering %s after it",
+                                (mode, problem.pkgs[dep], pkg),
+                                "cycle",
+                            )
+                            self._trace_cycle(pkg.versioned_atom, f"order {mode}")
+                else:
+                    stack.pop()
+                    if not post:
+                        visiting.discard(var)
+                        if var not in problem.planned:
+                            self._insert_pkg(problem, var)
+                        stack.append((var, iter(edges[var][1]), True))
+
+        for var, blocker in active_blockers:
+            choices = problem.get_choices(var)
+            l = self.state.add_blocker(
+                choices,
+                self.generate_mangled_blocker(choices, blocker),
+                key=blocker.key,
+            )
+            if l:
+                raise AssertionError(
+                    f"solved plan violates blocker {blocker}: {', '.join(map(str, l))}"
+                )
+
+    def _insert_pkg(self, problem, var):
+        pkg = problem.pkgs[var]
+        self._dprint("inserting %s", (pkg,))
+        l = self.insert_choice(pkg.versioned_atom, problem.get_choices(var))
+        if l:
+            raise AssertionError(
+                f"failed inserting solved package {pkg}: {', '.join(map(str, l))}"
+            )
@@ -11,6 +11,8 @@ __all__ = (
     "decref_forward_block_op",
 )
 
+from collections import defaultdict
+
 from snakeoil.containers import RefCountingSet
 
 from .pigeonholes import PigeonHoledSlots
@@ -25,6 +27,8 @@ class plan_state:
         self.blockers_refcnt = RefCountingSet()
         self.match_atom = self.state.find_atom_matches
         self.vdb_filter = set()
+        # bumped on every vdb_filter change
+        self.vdb_filter_generation = 0
         self.forced_restrictions = RefCountingSet()
 
     def add_blocker(self, choices, blocker, key=None):
@@ -78,6 +82,67 @@ class plan_state:
             i = (x for x in i if x.pkg.package_is_real)
         return ops_sequence(i)
 
+    def dependency_graph(self, livefs=False, only_real=False):
+        """Map ops to the set of earlier ops that must be merged beforehand.
+
+        Ops depend on the earlier ops providing packages matching their build,
+        runtime, and install time dependencies (all alternatives of any-of
+        groups are considered) or matching the keys of their blockers. Ops
+        without dependency information and removals act as barriers, all
+        earlier ops are required to be merged before them and all later ops
+        depend on them.
+
+        Since only earlier ops are considered, the plan order is always a
+        valid topological order for the returned graph.
+
+        :param only_real: if True, ops for virtual packages are skipped while
+            keeping dependencies that were passing through them
+        :return: dict mapping ops in plan order to sets of ops
+        """
+        graph = {}
+        by_key = defaultdict(list)
+        seen = []
+        barrier = None
+        for op in self.iter_ops(livefs):
+            required = set()
+            if barrier is not None:
+                required.add(barrier)
+            atoms = None if op.desc == "remove" else _op_dep_atoms(op)
+            if atoms is None:
+                required.update(seen)
+                barrier = op
+                seen = []
+            else:
+                for atom in atoms:
+                    key = getattr(atom, "key", None)
+                    candidates = seen if key is None else by_key.get(key, ())
+                    for dep in candidates:
+                        if getattr(atom, "blocks", False):
+                            if dep.pkg.key == key:
+                                required.add(dep)
+                        elif atom.match(dep.pkg):
+                            required.add(dep)
+                seen.append(op)
+            graph[op] = required
+            by_key[op.pkg.key].append(op)
+
+        if only_real:
+            # collapse dependencies passing through virtual packages
+            collapsed = {}
+            real_graph = {}
+            for op, required in graph.items():
+                deps = set()
+                for dep in required:
+                    if dep.pkg.package_is_real:
+                        deps.add(dep)
+                    else:
+                        deps.update(collapsed[dep])
+                collapsed[op] = deps
+                if op.pkg.package_is_real:
+                    real_graph[op] = deps
+            graph = real_graph
+        return graph
+
     def __getitem__(self, slice):
         return self.plan[slice]
 
@@ -86,6 +151,22 @@ class plan_state:
         return len(self.plan)
 
 
+def _op_dep_atoms(op):
+    """Return all dependency atoms for an op, None if they're unavailable."""
+    choices = op.choices
+    if choices is None:
+        return None
+    try:
+        return [
+            atom
+            for attr in ("bdepend", "depend", "rdepend", "idepend")
+            for or_block in getattr(choices, attr)
+            for atom in or_block
+        ]
+    except IndexError:
+        return None
+
+
 class ops_sequence:
     def __init__(self, sequence, is_livefs=True):
         self._ops = tuple(sequence)
@@ -193,11 +274,13 @@ class remove_op(base_op_state):
         del plan.pkg_choices[self.pkg]
         plan.plan.append(self)
         plan.vdb_filter.add(self.pkg)
+        plan.vdb_filter_generation += 1
 
     def revert(self, plan):
         plan.state.fill_slotting(self.pkg, force=True)
         plan.pkg_choices[self.pkg] = self.choices
         plan.vdb_filter.remove(self.pkg)
+        plan.vdb_filter_generation += 1
 
 
 class replace_op(base_op_state):
@@ -237,6 +320,7 @@ class replace_op(base_op_state):
         plan.pkg_choices[self.pkg] = self.choices
         plan.plan.append(self)
         plan.vdb_filter.add(old)
+        plan.vdb_filter_generation += 1
 
     def revert(self, plan):
         # far simpler, since the apply op generates multiple ops on its own.
@@ -251,6 +335,7 @@ class replace_op(base_op_state):
         del plan.pkg_choices[self.pkg]
         plan.pkg_choices[self.old_pkg] = self.old_choices
         plan.vdb_filter.remove(self.old_pkg)
+        plan.vdb_filter_generation += 1
 
     def __str__(self):
         s = ""
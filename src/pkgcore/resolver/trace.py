@@ -0,0 +1,116 @@
+"""
+structured resolver trace events
+
+A trace sink is any callable accepting event dicts, passed to
+:py:class:`pkgcore.resolver.plan.merge_plan` via its ``trace`` argument.
+Every event has a ``type`` key:
+
+- ``atom``: an atom was processed, with its ``mode``, stack ``depth``, the
+  ``elapsed`` time in seconds including processing its dependencies, the
+  ``own`` time excluding them, the number of ``candidates`` tried, whether
+  the repository match was a match cache hit (``cached``, None if no
+  repository query was needed), and whether it was resolved (``success``)
+- ``backtrack``: the plan was rolled back while processing an atom, undoing
+  ``ops`` operations
+- ``cycle``: a dependency cycle was broken by ``action``
+- ``match_cache``: the total match cache ``hits`` and ``misses`` after
+  resolving a set of atoms
+- ``solve``: a set of ``atoms`` was solved by
+  :py:class:`pkgcore.resolver.sat.sat_plan`, with the number of
+  ``variables``, ``clauses``, ``conflicts`` and ``decisions`` of the problem,
+  the ``elapsed`` time, and whether it was solvable (``success``)
+"""
+
+__all__ = ("jsonlines_sink", "read_events", "atom_stats", "summarize")
+
+import json
+
+
+class jsonlines_sink:
+    """Trace sink writing events as JSON lines to a file object."""
+
+    def __init__(self, handle):
+        self.handle = handle
+
+    def __call__(self, event):
+        self.handle.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+
+def read_events(handle):
+    """Yield the events written by :py:class:`jsonlines_sink`.
+
+    :raises ValueError: on invalid lines
+    """
+    for lineno, line in enumerate(handle, 1):
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {lineno}: invalid trace event: {e}")
+        if not isinstance(event, dict) or "type" not in event:
+            raise ValueError(f"line {lineno}: invalid trace event: {line.strip()!r}")
+        yield event
+
+
+class atom_stats:
+    """Aggregated trace events of an atom."""
+
+    __slots__ = (
+        "atom",
+        "count",
+        "elapsed",
+        "own",
+        "candidates",
+        "failures",
+        "backtracks",
+        "cycles",
+    )
+
+    def __init__(self, atom):
+        self.atom = atom
+        self.count = self.candidates = self.failures = 0
+        self.backtracks = self.cycles = 0
+        self.elapsed = self.own = 0.0
+
+
+def summarize(events):
+    """Aggregate trace events.
+
+    :return: mapping of atom strings to :py:class:`atom_stats` instances, and
+        a mapping of overall totals
+    """
+    stats = {}
+    totals = dict.fromkeys(
+        ("atoms", "backtracks", "backtracked_ops", "cycles", "hits", "misses"), 0
+    )
+    totals["elapsed"] = 0.0
+    for event in events:
+        kind = event["type"]
+        if kind == "match_cache":
+            # counts are cumulative
+            totals["hits"] = event["hits"]
+            totals["misses"] = event["misses"]
+            continue
+        elif kind not in ("atom", "backtrack", "cycle"):
+            continue
+        atom = event["atom"]
+        if (s := stats.get(atom)) is None:
+            s = stats[atom] = atom_stats(atom)
+        if kind == "atom":
+            s.count += 1
+            s.elapsed += event["elapsed"]
+            s.own += event["own"]
+            s.candidates += event["candidates"]
+            if not event["success"]:
+                s.failures += 1
+            totals["atoms"] += 1
+            totals["elapsed"] += event["own"]
+        elif kind == "backtrack":
+            s.backtracks += 1
+            totals["backtracks"] += 1
+            totals["backtracked_ops"] += event["ops"]
+        else:
+            s.cycles += 1
+            totals["cycles"] += 1
+    return stats, totals
@@ -2,6 +2,9 @@
 
 import time
 
+from snakeoil.chksum import LazilyHashedPath
+from snakeoil.osutils import pjoin
+
 from ..util import commandline
 
 argparser = commandline.ArgumentParser(
@@ -24,6 +27,24 @@ argparser.add_argument(
 )
 
 
+def _convert_entry(source, data):
+    """Convert a source cache entry into the form accepted for writing."""
+    data = dict(data.items())
+    data["_chf_"] = LazilyHashedPath(
+        None, **{source.chf_type: data.pop(f"_{source.chf_type}_")}
+    )
+    if eclasses := data.get("_eclasses_"):
+        d = {}
+        for eclass, chfs in eclasses:
+            chfs = dict(chfs)
+            path = chfs.pop("eclassdir", None)
+            if path is not None:
+                path = pjoin(path, f"{eclass}.eclass")
+            d[eclass] = LazilyHashedPath(path, **chfs)
+        data["_eclasses_"] = d
+    return data
+
+
 @argparser.bind_main_func
 def main(options, out, err):
     if options.target.readonly:
@@ -32,6 +53,16 @@ def main(options, out, err):
         )
 
     source, target = options.source, options.target
+    if source.chf_type != target.chf_type or not set(target.eclass_chf_types).issubset(
+        source.eclass_chf_types
+    ):
+        argparser.error(
+            "incompatible caches: source uses %s checksums, target requires %s"
+            % (
+                ", ".join((source.chf_type,) + tuple(source.eclass_chf_types)),
+                ", ".join((target.chf_type,) + tuple(target.eclass_chf_types)),
+            )
+        )
     if not target.autocommits:
         target.sync_rate = 1000
     if options.verbosity > 0:
@@ -41,11 +72,11 @@ def main(options, out, err):
     if options.verbosity > 0:
         for k, v in source.items():
             out.write(f"updating {k}")
-            target[k] = v
+            target[k] = _convert_entry(source, v)
             valid.add(k)
     else:
         for k, v in source.items():
-            target[k] = v
+            target[k] = _convert_entry(source, v)
             valid.add(k)
 
     for x in target.keys():
@@ -54,5 +85,8 @@ def main(options, out, err):
                 out.write(f"deleting {x}")
             del target[x]
 
+    if not target.autocommits:
+        target.commit(force=True)
+
     if options.verbosity > 0:
         out.write("took %i seconds" % int(time.time() - start))
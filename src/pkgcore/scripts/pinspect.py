@@ -10,10 +10,14 @@ masks, inheritance trees, etc. This makes it easier to inspect profile
 differences without sorting through the inheritance tree and reading the raw
 files.
 
-Finally, a portageq compatible interface is provided for several commands that
-were historically used in ebuilds.
+A portageq compatible interface is provided for several commands that were
+historically used in ebuilds.
+
+Finally, resolver traces written by ``pmerge --resolver-trace`` can be
+summarized to find the atoms dominating resolution time.
 """
 
+import argparse
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby, islice
@@ -26,6 +30,7 @@ from .. import fetch
 from ..ebuild import inspect_profile
 from ..ebuild import portageq as _portageq
 from ..package import errors
+from ..resolver import trace as _trace
 from ..restrictions import packages
 from ..util import commandline
 
@@ -461,3 +466,93 @@ def digest_manifest(options, out, err):
             out.write("repo has no packages")
 
         out.write()
+
+
+resolver_trace = subparsers.add_parser(
+    "resolver-trace", description="summarize pmerge resolver traces"
+)
+resolver_trace.add_argument(
+    "trace",
+    type=argparse.FileType("r"),
+    help="trace file written by pmerge --resolver-trace",
+)
+resolver_trace.add_argument(
+    "-s",
+    "--sort",
+    choices=("own", "elapsed", "count", "candidates", "backtracks"),
+    default="own",
+    help="sort atoms by the given field (default: %(default)s)",
+    docs="""
+        Sort atoms by the given field, where ``own`` is the time spent on the
+        atom itself and ``elapsed`` includes the time spent on resolving its
+        dependencies.
+    """,
+)
+resolver_trace.add_argument(
+    "-n",
+    "--first",
+    type=arghparse.positive_int,
+    default=20,
+    help="show only the first N atoms (default: %(default)s)",
+)
+
+
+@resolver_trace.bind_main_func
+def resolver_trace_main(options, out, err):
+    try:
+        with options.trace as f:
+            stats, totals = _trace.summarize(_trace.read_events(f))
+    except ValueError as e:
+        resolver_trace.error(f"{options.trace.name}: {e}")
+
+    lookups = totals["hits"] + totals["misses"]
+    hit_rate = totals["hits"] / lookups * 100 if lookups else 0.0
+    out.write(
+        "%i atoms processed in %.3fs, %i backtracks undoing %i ops, %i cycles broken"
+        % (
+            totals["atoms"],
+            totals["elapsed"],
+            totals["backtracks"],
+            totals["backtracked_ops"],
+            totals["cycles"],
+        )
+    )
+    out.write(
+        "match cache: %i hits, %i misses (%.2f%% hit rate)"
+        % (totals["hits"], totals["misses"], hit_rate)
+    )
+    if not stats:
+        return 0
+
+    out.write()
+    out.write(
+        out.bold,
+        "%10s %10s %6s %10s %8s %10s %6s  %s"
+        % (
+            "own",
+            "elapsed",
+            "count",
+            "candidates",
+            "failures",
+            "backtracks",
+            "cycles",
+            "atom",
+        ),
+        out.reset,
+    )
+    atoms = sorted(stats.values(), key=lambda s: (-getattr(s, options.sort), s.atom))
+    for s in islice(atoms, options.first):
+        out.write(
+            "%9.3fs %9.3fs %6i %10i %8i %10i %6i  %s"
+            % (
+                s.own,
+                s.elapsed,
+                s.count,
+                s.candidates,
+                s.failures,
+                s.backtracks,
+                s.cycles,
+                s.atom,
+            )
+        )
+    return 0
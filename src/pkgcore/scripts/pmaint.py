@@ -14,6 +14,7 @@ from snakeoil.osutils import pjoin
 from snakeoil.sequences import iter_stable_unique
 
 from ..cache.flat_hash import md5_cache
+from ..ebuild import processor
 from ..ebuild import repository as ebuild_repo
 from ..ebuild import triggers
 from ..ebuild.cpv import CPV
@@ -337,6 +338,44 @@ regen_opts.add_argument(
         available processors.
     """,
 )
+regen_opts.add_argument(
+    "-p",
+    "--processes",
+    type=arghparse.positive_int,
+    default=1,
+    help="number of processes to spread threads across",
+    docs="""
+        Number of worker processes the regeneration threads are spread across,
+        defaults to 1 running all threads in the current process. Using
+        multiple processes avoids the Python side of regeneration being
+        limited to a single core on large repos.
+    """,
+)
+regen_opts.add_argument(
+    "--ebd-max-uses",
+    type=arghparse.positive_int,
+    metavar="N",
+    help="recycle ebuild processors after N packages",
+    docs="""
+        Shut down each ebuild processor after it sourced N packages and
+        replace it with a fresh one, bounding the memory growth of long
+        running bash processes. By default processors are used for the whole
+        regeneration run.
+    """,
+)
+regen_opts.add_argument(
+    "--journal",
+    metavar="FILE",
+    help="only regenerate packages changed since the journaled regen",
+    docs="""
+        Record the repo state to the given file after regeneration and, if
+        the file exists, only regenerate packages with ebuilds or inherited
+        eclasses changed since that state was recorded, along with packages
+        that failed regeneration. Changes are determined via git for git
+        repos, otherwise via file modification times. A single journal file
+        can be shared by multiple repos.
+    """,
+)
 regen_opts.add_argument(
     "--force",
     action="store_true",
@@ -375,6 +414,8 @@ def regen_main(options, out, err):
     ret = []
 
     observer = observer_mod.formatter_output(out)
+    if options.ebd_max_uses is not None:
+        processor.configure_processor_pool(max_uses=options.ebd_max_uses)
     for repo in iter_stable_unique(options.repos):
         if options.cache_dir is not None:
             # recreate new repo object with cache dir override
@@ -391,6 +432,8 @@ def regen_main(options, out, err):
         ret.append(
             repo.operations.regen_cache(
                 threads=options.threads,
+                processes=options.processes,
+                journal=options.journal,
                 observer=observer,
                 force=options.force,
                 eclass_caching=(not options.disable_eclass_caching),
@@ -402,6 +445,18 @@ def regen_main(options, out, err):
             out.write(
                 "finished %d nodes in %.2f seconds" % (len(repo), end_time - start_time)
             )
+            # processors used by forked workers aren't tracked
+            if (stats := processor.processor_pool_stats())["requests"]:
+                out.write(
+                    "ebuild processors: %i spawned, %i recycled, "
+                    "%0.2f%% reuse rate, %.2f seconds waiting"
+                    % (
+                        stats["spawned"],
+                        stats["recycled"],
+                        100 * stats["reuse_rate"],
+                        stats["wait_time"],
+                    )
+                )
 
         if options.rsync:
             timestamp = pjoin(repo.location, "metadata", "timestamp.chk")
@@ -422,6 +477,50 @@ def regen_main(options, out, err):
     return int(any(ret))
 
 
+owners = subparsers.add_parser(
+    "owners",
+    parents=shared_options_domain,
+    description="rebuild or verify the file ownership index of installed repos",
+)
+owners.add_argument(
+    "repos",
+    metavar="repo",
+    nargs="*",
+    action=commandline.StoreRepoObject,
+    repo_type="installed-raw",
+    help="installed repo(s) to process",
+)
+owners_opts = owners.add_argument_group("subcommand options")
+owners_opts.add_argument(
+    "--check",
+    action="store_true",
+    default=False,
+    help="verify the index instead of rebuilding it",
+    docs="""
+        Compare the stored index against the CONTENTS files of all installed
+        packages, reporting missing, outdated, and mismatching entries.
+    """,
+)
+
+
+@owners.bind_main_func
+def owners_main(options, out, err):
+    """Rebuild or verify the file ownership index of installed repos."""
+    ret = []
+    operation = "check_owner_index" if options.check else "rebuild_owner_index"
+    observer = observer_mod.formatter_output(out)
+    for repo in iter_stable_unique(options.repos):
+        if not repo.operations.supports(operation):
+            out.write(f"repo {repo} doesn't support a file ownership index")
+            continue
+        result = getattr(repo.operations, operation)(observer=observer)
+        if options.check:
+            ret.append(result)
+        else:
+            ret.append(not result)
+    return int(any(ret))
+
+
 env_update = subparsers.add_parser(
     "env-update", description="update env.d and ldconfig", parents=shared_options_domain
 )
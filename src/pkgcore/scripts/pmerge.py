@@ -5,23 +5,33 @@ system. It provides an interface to install, update, and uninstall ebuilds from
 source or binary packages.
 """
 
+import argparse
+import os
 import sys
+import threading
 from functools import partial
 from textwrap import dedent
 from time import time
 
+from snakeoil.cli import arghparse
 from snakeoil.cli.exceptions import ExitException
+from snakeoil.osutils import pjoin
 from snakeoil.sequences import iflatten_instance, stable_unique
 from snakeoil.strings import pluralism
 
+from .. import const
 from ..config.basics import ConfigSectionFromStringDict
-from ..ebuild import resolver, restricts
+from ..ebuild import processor, resolver, restricts
 from ..ebuild.atom import atom
 from ..ebuild.misc import run_sanity_checks
 from ..merge import errors as merge_errors
 from ..operations import format, observer
+from ..operations.prefetch import Prefetcher
+from ..operations.scheduler import Scheduler
 from ..repository.util import get_raw_repos
 from ..repository.virtual import RestrictionRepo
+from ..resolver import plan_cache, sat
+from ..resolver.trace import jsonlines_sink
 from ..resolver.util import reduce_to_failures
 from ..restrictions import packages
 from ..restrictions.boolean import OrRestriction
@@ -160,6 +170,72 @@ resolution_options.add_argument(
         USE configuration.
     """,
 )
+resolution_options.add_argument(
+    "--fetch-jobs",
+    type=arghparse.positive_int,
+    metavar="N",
+    help="number of distfiles to fetch concurrently",
+    docs="""
+        Fetch up to N distfiles of a package concurrently. If unset, the
+        FETCH_JOBS setting is used which defaults to fetching serially.
+
+        Concurrent fetches against a single host are additionally bounded by
+        the FETCH_JOBS_PER_HOST setting (defaults to 2) and downloads from
+        mirror tiers are spread across the tier's hosts.
+    """,
+)
+resolution_options.add_argument(
+    "-j",
+    "--jobs",
+    type=arghparse.positive_int,
+    default=1,
+    metavar="N",
+    help="number of packages to build concurrently",
+    docs="""
+        Build up to N packages concurrently. Packages are started as soon as
+        all the packages they depend on in the merge list have been merged
+        while merging to the livefs is still done one package at a time.
+
+        Background prefetching via --prefetch is unused in this mode since
+        distfiles are fetched by the concurrent build jobs.
+    """,
+)
+resolution_options.add_argument(
+    "--load-average",
+    type=float,
+    metavar="LOAD",
+    help="don't start new builds if the load average is at least LOAD",
+    docs="""
+        When building packages concurrently, don't start new builds while
+        other builds are running and the system load average is at least LOAD.
+    """,
+)
+resolution_options.add_argument(
+    "--prefetch",
+    type=partial(arghparse.bounded_int, lambda x: x >= 0, ">= 0"),
+    default=0,
+    metavar="N",
+    help="fetch distfiles for up to N packages ahead in the background",
+    docs="""
+        Fetch distfiles for up to N packages following the one currently
+        being built in the background, overlapping downloads with builds.
+        Disabled by default.
+
+        Fetch failures are still reported when the related package is
+        reached in the merge list.
+    """,
+)
+resolution_options.add_argument(
+    "--prefetch-size",
+    type=arghparse.positive_int,
+    metavar="MIB",
+    help="max size of distfiles fetched ahead in MiB",
+    docs="""
+        Limit the total size of missing distfiles fetched in the background
+        for packages that haven't been reached yet. Background fetching pauses
+        when the limit would be exceeded and resumes as packages are merged.
+    """,
+)
 resolution_options.add_argument(
     "-1",
     "--oneshot",
@@ -328,6 +404,25 @@ resolution_options.add_argument(
         Force (un)merging on the livefs (vdb), regardless of if it's frozen.
     """,
 )
+resolution_options.add_argument(
+    "--resolver",
+    dest="resolver_engine",
+    choices=("plan", "sat"),
+    default="plan",
+    help="dependency resolver engine to use",
+    docs="""
+        Select the engine used for dependency resolution. The default
+        ``plan`` engine resolves dependencies depth first, backtracking over
+        the candidates of each dependency.
+
+        The ``sat`` engine collects all candidates up front and encodes their
+        dependencies, slots, blockers, and REQUIRED_USE constraints as a SAT
+        problem. It finds solutions the default engine misses, e.g. for slot
+        conflicts that require downgrading an earlier choice, and avoids
+        exponential backtracking over large any-of groups, at the cost of
+        loading the metadata of all reachable package versions.
+    """,
+)
 resolution_options.add_argument(
     "--preload-vdb-state",
     action="store_true",
@@ -340,6 +435,29 @@ resolution_options.add_argument(
         the graph of the requested operation.
     """,
 )
+resolution_options.add_argument(
+    "--plan-cache",
+    action="store_true",
+    default=None,
+    help="reuse cached resolver plans",
+    docs="""
+        Store resolved plans and reuse them when resolving the same targets
+        with the same options, repositories, installed packages, profiles, and
+        configuration, skipping dependency resolution.
+
+        This is also enabled by the ``plan-cache`` FEATURES setting.
+    """,
+)
+resolution_options.add_argument(
+    "--no-plan-cache",
+    action="store_false",
+    dest="plan_cache",
+    help="disable reusing cached resolver plans",
+    docs="""
+        Always resolve dependencies from scratch, overriding ``--plan-cache``
+        and the ``plan-cache`` FEATURES setting.
+    """,
+)
 
 output_options = argparser.add_argument_group("output options")
 output_options.add_argument(
@@ -386,6 +504,19 @@ debug_options.add_argument(
         what it has decided and why.
     """,
 )
+debug_options.add_argument(
+    "--resolver-trace",
+    metavar="FILE",
+    type=argparse.FileType("w"),
+    help="write resolver trace events to a file",
+    docs="""
+        Write structured resolver events to the given file as JSON lines,
+        recording the time spent and the number of candidates tried per atom,
+        backtracking, broken dependency cycles, and match cache usage.
+
+        Use ``pinspect resolver-trace`` to summarize the written events.
+    """,
+)
 debug_options.add_argument(
     "--disable-resolver-target-sorting",
     dest="force_stable_ordering_of_targets",
@@ -676,6 +807,61 @@ def _validate(parser, namespace):
         namespace.resolver_kls = resolver.min_install_resolver
 
 
+# options affecting resolution results
+_plan_options = (
+    "deep",
+    "empty",
+    "ignore_cycles",
+    "newuse",
+    "nodeps",
+    "onlydeps",
+    "preload_vdb_state",
+    "replace",
+    "resolver_engine",
+    "with_bdeps",
+)
+
+
+# installed pkg files affecting resolution
+_vdb_plan_files = frozenset(
+    ("BDEPEND", "DEPEND", "EAPI", "IDEPEND", "IUSE", "PDEPEND", "RDEPEND")
+    + ("SLOT", "USE", "repository")
+)
+
+
+def plan_fingerprint(options, domain, source_repos, installed_repos, atoms):
+    """Return the fingerprint of all inputs for resolving the given targets."""
+    repos = []
+    for repo in get_raw_repos(source_repos):
+        location = getattr(repo, "location", None)
+        # ebuilds, eclasses, and metadata cache entries
+        stamp = None if location is None else plan_cache.tree_stamp(location, 3)
+        repos.append((repo.repo_id, location, stamp))
+    for repo in get_raw_repos(installed_repos):
+        location = getattr(repo, "location", None)
+        stamp = None
+        if location is not None:
+            stamp = plan_cache.tree_stamp(
+                location, 3, contents=True, names=_vdb_plan_files
+            )
+        repos.append((repo.repo_id, location, stamp))
+    profiles = [
+        (node.path, plan_cache.tree_stamp(node.path, 2, contents=True))
+        for node in domain.profile.stack
+    ]
+    return plan_cache.fingerprint(
+        repos,
+        profiles,
+        domain.settings,
+        domain.features,
+        plan_cache.tree_stamp(domain.config_dir, 3, contents=True),
+        [str(x) for x in atoms],
+        options.resolver_kls.__name__,
+        {x: getattr(options, x) for x in _plan_options},
+        [token for token, _restriction in options.excludes],
+    )
+
+
 def parse_target(restriction, repo, installed_repos, return_none=False):
     """Use :obj:`parserestrict.parse_match` to produce a list of matches.
 
@@ -757,6 +943,141 @@ def display_pkgsets(out, options):
             out.write(name)
 
 
+def build_pkg(domain, op, pkg_ops, out, build_obs, cleanup):
+    """Build and localize the package for a plan op.
+
+    :param pkg_ops: package operations instance the op's distfiles were
+        fetched with
+    :param cleanup: list the cleanup callables for the build are added to
+    :return: the package to merge
+    :raises Failure: if building the package failed
+    """
+    buildop = pkg_ops.run_if_supported("build", or_return=None)
+    pkg = op.pkg
+    if buildop is not None:
+        out.write(f"building {op.pkg.cpvstr}")
+        try:
+            result = buildop.finalize()
+        except format.BuildError as e:
+            out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
+            raise Failure(f"failed building {op.pkg.cpvstr}") from e
+        if result is False:
+            out.error(f"failed building {op.pkg.cpvstr}")
+            raise Failure(f"failed building {op.pkg.cpvstr}")
+        pkg = result
+        cleanup.append(pkg.release_cached_data)
+        pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
+        cleanup.append(buildop.cleanup)
+
+    cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
+    return pkg_ops.run_if_supported("localize", or_return=pkg)
+
+
+def merge_op(domain, op, pkg, out, repo_obs, cleanup):
+    """Apply a plan op to the livefs.
+
+    :param pkg: built package to merge, unused for removals
+    :param cleanup: list the cleanup callables for the merge are added to
+    :raises pkgcore.merge.errors.BlockModification: if merging failed
+    """
+    if op.desc == "remove":
+        out.write(f">>> Removing {op.pkg.cpvstr}")
+        i = domain.uninstall_pkg(op.pkg, repo_obs)
+    else:
+        out.write()
+        if op.desc == "replace":
+            if op.old_pkg == pkg:
+                out.write(f">>> Reinstalling {pkg.cpvstr}")
+            else:
+                out.write(f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}")
+            i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
+            cleanup.append(op.old_pkg.release_cached_data)
+        else:
+            out.write(f">>> Installing {pkg.cpvstr}")
+            i = domain.install_pkg(pkg, repo_obs)
+    return i.finish()
+
+
+def update_world(options, out, world_set, source_repos, atoms, op):
+    """Update the world file for a merged plan op."""
+    if op.desc == "remove":
+        out.write(f">>> Removing {op.pkg.cpvstr} from world file")
+        removal_pkg = slotatom_if_slotted(source_repos.combined, op.pkg.versioned_atom)
+        update_worldset(world_set, removal_pkg, remove=True)
+    elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
+        if not (options.upgrade or options.downgrade):
+            out.write(f">>> Adding {op.pkg.cpvstr} to world file")
+            add_pkg = slotatom_if_slotted(source_repos.combined, op.pkg.versioned_atom)
+            update_worldset(world_set, add_pkg)
+
+
+def merge_parallel(
+    options, out, domain, graph, build_obs, repo_obs, world_set, source_repos, atoms
+):
+    """Build plan ops concurrently, merging them one at a time.
+
+    :param graph: plan op dependency graph
+    :return: list of failed ops
+    """
+    change_count = len(graph)
+    # serialize status output from build threads
+    lock = threading.Lock()
+    cleanups = {}
+    merged = []
+    build_obs = observer.threadsafe_repo_observer(build_obs)
+
+    def build(op):
+        cleanup = cleanups[op] = []
+        if op.desc == "remove":
+            return None
+        with lock:
+            out.write(f"\nStarting {op.pkg.cpvstr}::{op.pkg.repo}")
+        cleanup.append(op.pkg.release_cached_data)
+        pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
+        if not pkg_ops.run_if_supported(
+            "fetch", or_return=True, jobs=options.fetch_jobs
+        ):
+            with lock:
+                out.error(f"fetching failed for {op.pkg.cpvstr}")
+            return False
+        if options.fetchonly:
+            return None
+        try:
+            return build_pkg(domain, op, pkg_ops, out, build_obs, cleanup)
+        except Failure:
+            return False
+
+    def merge(op, pkg):
+        cleanup = cleanups.pop(op)
+        try:
+            if options.fetchonly:
+                return True
+            merged.append(op)
+            with lock:
+                out.write(
+                    f"\nMerging {len(merged)} of {change_count}: "
+                    f"{op.pkg.cpvstr}::{op.pkg.repo}"
+                )
+                out.title(f"{len(merged)}/{change_count}: {op.pkg.cpvstr}")
+            # merges are run serially by the scheduler
+            try:
+                merge_op(domain, op, pkg, out, repo_obs, cleanup)
+            except merge_errors.BlockModification as e:
+                out.error(f"Failed to merge {op.pkg}: {e}")
+                return False
+            if world_set is not None:
+                update_world(options, out, world_set, source_repos, atoms, op)
+            return True
+        finally:
+            for func in cleanup:
+                func()
+
+    scheduler = Scheduler(
+        graph, build, merge, jobs=options.jobs, load_average=options.load_average
+    )
+    return scheduler.run(keep_going=options.ignore_failures)
+
+
 @argparser.bind_main_func
 def main(options, out, err):
     if options.list_sets:
@@ -876,10 +1197,17 @@ def main(options, out, err):
             )
 
     extra_kwargs = {}
-    if options.empty:
+    if options.resolver_engine == "sat":
+        if options.empty:
+            extra_kwargs["resolver_cls"] = resolver.empty_tree_sat_plan
+        else:
+            extra_kwargs["resolver_cls"] = sat.sat_plan
+    elif options.empty:
         extra_kwargs["resolver_cls"] = resolver.empty_tree_merge_plan
     if options.debug:
         extra_kwargs["debug"] = True
+    if options.resolver_trace is not None:
+        extra_kwargs["trace"] = jsonlines_sink(options.resolver_trace)
 
     # XXX: This should recurse on deep
     if options.newuse:
@@ -926,7 +1254,28 @@ def main(options, out, err):
         **extra_kwargs,
     )
 
-    if options.preload_vdb_state:
+    plans = plan_key = None
+    cached_plan = False
+    if options.plan_cache or (
+        options.plan_cache is None and "plan-cache" in domain.features
+    ):
+        cache_dir = (
+            const.SYSTEM_CACHE_PATH if os.getuid() == 0 else const.USER_CACHE_PATH
+        )
+        plans = plan_cache.PlanCache(pjoin(cache_dir, "plans"))
+        plan_key = plan_fingerprint(
+            options, domain, source_repos, installed_repos, atoms
+        )
+        if (entries := plans.get(plan_key)) is not None:
+            try:
+                plan_cache.restore(resolver_inst, entries)
+                cached_plan = True
+            except plan_cache.StalePlan as e:
+                out.warn(f"discarding stale cached plan: {e}")
+                resolver_inst.reset()
+                plans.discard(plan_key)
+
+    if options.preload_vdb_state and not cached_plan:
         out.write(out.bold, " * ", out.reset, "Preloading vdb... ")
         vdb_time = time()
         resolver_inst.load_vdb_state()
@@ -940,11 +1289,15 @@ def main(options, out, err):
 
     failures = []
     resolve_time = time()
-    if sys.stdout.isatty():
-        out.title("Resolving...")
-        out.write(out.bold, " * ", out.reset, "Resolving...")
-        out.flush()
-    ret = resolver_inst.add_atoms(atoms, finalize=True)
+    if cached_plan:
+        out.write(out.bold, " * ", out.reset, "Using cached resolver plan")
+        ret = ()
+    else:
+        if sys.stdout.isatty():
+            out.title("Resolving...")
+            out.write(out.bold, " * ", out.reset, "Resolving...")
+            out.flush()
+        ret = resolver_inst.add_atoms(atoms, finalize=True)
     while ret:
         out.error("resolution failed")
         restrict = ret[0][0]
@@ -958,6 +1311,38 @@ def main(options, out, err):
         resolver_inst.reset()
         ret = resolver_inst.add_atoms(atoms, finalize=True)
     resolve_time = time() - resolve_time
+    if options.resolver_trace is not None:
+        options.resolver_trace.close()
+
+    if plans is not None and not cached_plan and not failures:
+        try:
+            plans.store(plan_key, plan_cache.serialize(resolver_inst.state))
+        except EnvironmentError as e:
+            out.warn(f"failed storing resolver plan: {e}")
+
+    if options.debug:
+        match_cache = resolver_inst.match_cache
+        out.write(
+            out.bold,
+            " * ",
+            out.reset,
+            "debug: match cache: %i hits, %i misses (%0.2f%% hit rate)"
+            % (match_cache.hits, match_cache.misses, 100 * match_cache.hit_rate),
+        )
+        stats = processor.processor_pool_stats()
+        out.write(
+            out.bold,
+            " * ",
+            out.reset,
+            "debug: ebuild processors: %i requests, %i spawned, "
+            "%0.2f%% reuse rate, %.2f seconds waiting"
+            % (
+                stats["requests"],
+                stats["spawned"],
+                100 * stats["reuse_rate"],
+                stats["wait_time"],
+            ),
+        )
 
     if failures:
         out.write()
@@ -1122,6 +1507,42 @@ def main(options, out, err):
 
     change_count = len(changes)
 
+    if options.jobs > 1:
+        graph = resolver_inst.state.dependency_graph(only_real=True)
+        failures = merge_parallel(
+            options,
+            out,
+            domain,
+            graph,
+            build_obs,
+            repo_obs,
+            world_set,
+            source_repos,
+            atoms,
+        )
+        if failures:
+            out.write()
+            for op in failures:
+                out.error(f"failed processing {op.pkg.cpvstr}::{op.pkg.repo}")
+            # ignored failures are skipped like when merging serially
+            if not options.ignore_failures:
+                return 1
+        return 0
+
+    prefetcher = None
+    if options.prefetch:
+        max_size = options.prefetch_size
+        if max_size is not None:
+            max_size *= 1024 * 1024
+        prefetcher = Prefetcher(
+            domain,
+            changes,
+            observer=build_obs,
+            depth=options.prefetch,
+            max_size=max_size,
+            jobs=options.fetch_jobs,
+        )
+
     # left in place for ease of debugging.
     cleanup = []
     try:
@@ -1142,11 +1563,17 @@ def main(options, out, err):
                 if not options.fetchonly and options.debug:
                     out.write("Forcing a clean of workdir")
 
-                pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
                 out.write(
                     f"\n{len(op.pkg.distfiles)} file{pluralism(op.pkg.distfiles)} required-"
                 )
-                if not pkg_ops.run_if_supported("fetch", or_return=True):
+                if prefetcher is not None:
+                    pkg_ops, fetched = prefetcher.fetch(count)
+                else:
+                    pkg_ops = domain.get_pkg_operations(op.pkg, observer=build_obs)
+                    fetched = pkg_ops.run_if_supported(
+                        "fetch", or_return=True, jobs=options.fetch_jobs
+                    )
+                if not fetched:
                     out.error(f"fetching failed for {op.pkg.cpvstr}")
                     if not options.ignore_failures:
                         return 1
@@ -1154,57 +1581,21 @@ def main(options, out, err):
                 if options.fetchonly:
                     continue
 
-                buildop = pkg_ops.run_if_supported("build", or_return=None)
-                pkg = op.pkg
-                if buildop is not None:
-                    out.write(f"building {op.pkg.cpvstr}")
-                    result = False
-                    exc = None
-                    try:
-                        result = buildop.finalize()
-                    except format.BuildError as e:
-                        out.error(f"caught exception building {op.pkg.cpvstr}: {e}")
-                        exc = e
-                    else:
-                        if result is False:
-                            out.error(f"failed building {op.pkg.cpvstr}")
-                    if result is False:
-                        if not options.ignore_failures:
-                            raise ExitException(1) from exc
-                        continue
-                    pkg = result
-                    cleanup.append(pkg.release_cached_data)
-                    pkg_ops = domain.get_pkg_operations(pkg, observer=build_obs)
-                    cleanup.append(buildop.cleanup)
-
-                cleanup.append(partial(pkg_ops.run_if_supported, "cleanup"))
-                pkg = pkg_ops.run_if_supported("localize", or_return=pkg)
+                try:
+                    pkg = build_pkg(domain, op, pkg_ops, out, build_obs, cleanup)
+                except Failure as e:
+                    if not options.ignore_failures:
+                        raise ExitException(1) from e.__cause__
+                    continue
                 # wipe this to ensure we don't inadvertantly use it further down;
                 # we aren't resetting it after localizing, so could have the wrong
                 # set of ops.
                 del pkg_ops
-
-                out.write()
-                if op.desc == "replace":
-                    if op.old_pkg == pkg:
-                        out.write(f">>> Reinstalling {pkg.cpvstr}")
-                    else:
-                        out.write(
-                            f">>> Replacing {op.old_pkg.cpvstr} with {pkg.cpvstr}"
-                        )
-                    i = domain.replace_pkg(op.old_pkg, pkg, repo_obs)
-                    cleanup.append(op.old_pkg.release_cached_data)
-                else:
-                    out.write(f">>> Installing {pkg.cpvstr}")
-                    i = domain.install_pkg(pkg, repo_obs)
-
-                # force this explicitly- can hold onto a helluva lot more
-                # then we would like.
             else:
-                out.write(f">>> Removing {op.pkg.cpvstr}")
-                i = domain.uninstall_pkg(op.pkg, repo_obs)
+                pkg = None
+
             try:
-                ret = i.finish()
+                merge_op(domain, op, pkg, out, repo_obs, cleanup)
             except merge_errors.BlockModification as e:
                 out.error(f"Failed to merge {op.pkg}: {e}")
                 if not options.ignore_failures:
@@ -1218,19 +1609,7 @@ def main(options, out, err):
             # basically, be protective
 
             if world_set is not None:
-                if op.desc == "remove":
-                    out.write(f">>> Removing {op.pkg.cpvstr} from world file")
-                    removal_pkg = slotatom_if_slotted(
-                        source_repos.combined, op.pkg.versioned_atom
-                    )
-                    update_worldset(world_set, removal_pkg, remove=True)
-                elif not options.oneshot and any(x.match(op.pkg) for x in atoms):
-                    if not (options.upgrade or options.downgrade):
-                        out.write(f">>> Adding {op.pkg.cpvstr} to world file")
-                        add_pkg = slotatom_if_slotted(
-                            source_repos.combined, op.pkg.versioned_atom
-                        )
-                        update_worldset(world_set, add_pkg)
+                update_world(options, out, world_set, source_repos, atoms, op)
 
     #    again... left in place for ease of debugging.
     #    except KeyboardInterrupt:
@@ -1238,7 +1617,8 @@ def main(options, out, err):
     #    else:
     #        import pdb;pdb.set_trace()
     finally:
-        pass
+        if prefetcher is not None:
+            prefetcher.close()
 
     # the final run from the loop above doesn't invoke cleanups;
     # we could ignore it, but better to run it to ensure nothing is
@@ -549,6 +549,16 @@ repo_group.add_argument(
         By default, virtuals are included during matching.
     """,
 )
+repo_group.add_argument(
+    "--parallel",
+    action="store_true",
+    help="query repos concurrently",
+    docs="""
+        Query all selected repos at the same time, each in its own thread,
+        merging their matches into a single sorted stream as they arrive
+        instead of listing the matches of each repo in turn.
+    """,
+)
 
 
 class RawAwareStoreRepoObject(commandline.StoreRepoObject):
@@ -852,28 +862,128 @@ def parse_eapi(value):
     return packages.PackageRestriction("eapi", values.StrExactMatch(value))
 
 
-@bind_add_query("--owns", action="append", help="exact match on an owned file/dir")
-def parse_owns(value):
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(
-            values.GetAttrRestriction("location", values.StrExactMatch(value))
+@bind_add_query(
+    "--inherits",
+    action="append",
+    default=[],
+    type=None,
+    bind="final_converter",
+    help="match packages inheriting a given eclass",
+    docs="""
+        Match packages inheriting a given eclass, directly or indirectly. For
+        ebuild repos this is answered via the reverse eclass index of the
+        repo's metadata cache, so only packages with cached metadata are
+        matched.
+    """,
+)
+def inherits_finalize(eclasses, namespace):
+    if not eclasses:
+        return []
+    eclasses = frozenset(eclasses)
+    restricts = []
+    for repo in namespace.repos:
+        users = getattr(repo, "eclass_users", None)
+        if users is not None:
+            users = users(eclasses)
+        if users is None:
+            # fallback to loading each package's metadata
+            restrict = packages.PackageRestriction(
+                "inherited", values.ContainmentMatch(eclasses)
+            )
+        else:
+            restrict = packages.PackageRestriction(
+                "cpvstr", values.FunctionRestriction(users.__contains__)
+            )
+        restricts.append(
+            packages.AndRestriction(
+                packages.PackageRestriction(
+                    "repo.repo_id", values.StrExactMatch(repo.repo_id)
+                ),
+                restrict,
+            )
+        )
+    return packages.OrRestriction(*restricts)
+
+
+def _owners_restrict(repos, owners, fallback):
+    """Build a restriction matching packages owning files.
+
+    :param owners: callable returning the owning cpvs for a repo supporting
+        file ownership lookups
+    :param fallback: restriction matching the contents of a package, used for
+        repos lacking ownership lookups
+    """
+    restricts = []
+    for repo in repos:
+        if getattr(repo, "owners", None) is None:
+            restrict = packages.PackageRestriction(
+                "contents", values.AnyMatch(fallback)
+            )
+        else:
+            restrict = packages.PackageRestriction(
+                "cpvstr", values.FunctionRestriction(owners(repo).__contains__)
+            )
+        restricts.append(
+            packages.AndRestriction(
+                packages.PackageRestriction(
+                    "repo.repo_id", values.StrExactMatch(repo.repo_id)
+                ),
+                restrict,
+            )
+        )
+    return packages.OrRestriction(*restricts)
+
+
+@bind_add_query(
+    "--owns",
+    action="append",
+    default=[],
+    type=None,
+    bind="final_converter",
+    help="exact match on an owned file/dir",
+)
+def owns_finalize(paths, namespace):
+    if not paths:
+        return []
+
+    def owners(repo):
+        return frozenset().union(*repo.owners(paths).values())
+
+    return _owners_restrict(
+        namespace.repos,
+        owners,
+        values.OrRestriction(
+            *(
+                values.GetAttrRestriction("location", values.StrExactMatch(path))
+                for path in paths
+            )
         ),
     )
 
 
 @bind_add_query(
-    "--owns-re", action="append", help='like "owns" but using a regexp for matching'
+    "--owns-re",
+    action="append",
+    default=[],
+    type=None,
+    bind="final_converter",
+    help='like "owns" but using a regexp for matching',
 )
-def parse_ownsre(value):
-    """Value is a regexp matched against the string form of an fs object.
+def ownsre_finalize(regexes, namespace):
+    """Values are regexps matched against the paths of fs objects."""
+    if not regexes:
+        return []
+    matchers = tuple(values.StrRegex(regex) for regex in regexes)
 
-    This means the object kind is prepended to the path the regexp has
-    to match.
-    """
-    return packages.PackageRestriction(
-        "contents",
-        values.AnyMatch(values.GetAttrRestriction("location", values.StrRegex(value))),
+    def owners(repo):
+        return repo.owners_matching(lambda path: any(m.match(path) for m in matchers))
+
+    return _owners_restrict(
+        namespace.repos,
+        owners,
+        values.OrRestriction(
+            *(values.GetAttrRestriction("location", m) for m in matchers)
+        ),
     )
 
 
@@ -1179,7 +1289,10 @@ def main(options, out, err):
 
     if options.query is None:
         return 0
-    for repo in options.repos:
+    repos = options.repos
+    if options.parallel and len(repos) > 1:
+        repos = [multiplex.tree(*repos, parallel=True)]
+    for repo in repos:
         try:
             for pkgs in pkgutils.groupby_pkg(
                 repo.itermatch(options.query, sorter=sorted)
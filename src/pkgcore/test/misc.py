@@ -1,5 +1,7 @@
 # misc things useful for tests.
 
+from copy import deepcopy
+
 from snakeoil.mappings import AttrAccessible
 
 from ..ebuild.atom import atom
@@ -67,6 +69,8 @@ class FakeProfile:
 
 
 class FakeRepo:
+    livefs = False
+
     def __init__(self, pkgs=(), repo_id="", location="", masks=(), **kwds):
         self.pkgs = pkgs
         self.repo_id = repo_id or location
@@ -150,6 +154,22 @@ class FakePkg(FakePkgBase):
         return cls(f"{cat}/{pkg}-{version}", **kwargs)
 
 
+def fake_repos(pkgs=(), installed=()):
+    """Create a source repo and a vdb for resolver tests.
+
+    :param pkgs: iterable of cpv and :obj:`FakePkg` keyword argument pairs
+        of the source repo's pkgs
+    :param installed: iterable of installed cpvs
+    :return: tuple of the source repo and the vdb
+    """
+    repo = FakeRepo(repo_id="gentoo", livefs=False)
+    # pkg metadata is consumed when parsed
+    repo.pkgs = [FakePkg(cpv, repo=repo, **deepcopy(kwds)) for cpv, kwds in pkgs]
+    vdb = FakeRepo(repo_id="vdb", livefs=True)
+    vdb.pkgs = [FakePkg(cpv, repo=vdb) for cpv in installed]
+    return repo, vdb
+
+
 # misc setup code for generating glsas for testing
 
 glsa_template = """<?xml version="1.0" encoding="UTF-8"?>
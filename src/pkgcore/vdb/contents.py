@@ -1,11 +1,22 @@
-__all__ = ("LookupFsDev", "ContentsFile")
+__all__ = (
+    "LookupFsDev",
+    "ContentsFile",
+    "PackedContents",
+    "PackedContentsSet",
+    "load_contents",
+    "write_packed_contents",
+)
 
+import mmap
 import os
 import stat
+import struct
+from bisect import bisect_left
 
 from snakeoil import data_source
 from snakeoil.chksum import get_handler
 from snakeoil.fileutils import AtomicWriteFile, readlines_utf8
+from snakeoil.osutils import normpath
 
 from .. import os_data
 from ..fs import fs
@@ -160,3 +171,347 @@ class ContentsFile(contentsSet):
         finally:
             # if atomic, it forces the update to be wiped.
             del outfile
+
+
+# Packed CONTENTS sidecars hold the entries of a CONTENTS file sorted by path,
+# using a header, fixed size records, and a blob of the encoded path and
+# symlink target strings the records point into.
+_PACKED_MAGIC = b"PKGCONTS"
+_PACKED_VERSION = 1
+# magic, version, entry count, CONTENTS mtime in ns, CONTENTS size
+_packed_header = struct.Struct("<8sIIqq")
+# path offset and length, target offset and length, kind, mtime, md5
+_packed_record = struct.Struct("<IIIIBq16s")
+_OBJ, _DIR, _SYM, _DEV, _FIF = range(5)
+_packed_kinds = {
+    "files": _OBJ,
+    "dirs": _DIR,
+    "symlinks": _SYM,
+    "devs": _DEV,
+    "fifos": _FIF,
+}
+
+
+def _packed_path(path):
+    return f"{path}.pack"
+
+
+def _encode_path(path):
+    return path.encode("utf8", "surrogateescape")
+
+
+def write_packed_contents(path, cset):
+    """Write the packed sidecar of a CONTENTS file.
+
+    :param path: path to the CONTENTS file, already written out
+    :param cset: contents set the CONTENTS file was written from
+    """
+    st = os.stat(path)
+    records = []
+    blob = bytearray()
+    for location, obj in sorted((_encode_path(x.location), x) for x in cset):
+        path_offset = len(blob)
+        blob += location
+        target_offset = target_len = mtime = 0
+        md5 = bytes(16)
+        if obj.is_reg:
+            kind = _OBJ
+            mtime = int(obj.mtime)
+            md5 = obj.chksums["md5"].to_bytes(16, "big")
+        elif obj.is_sym:
+            kind = _SYM
+            mtime = int(obj.mtime)
+            target = _encode_path(obj.target)
+            target_offset, target_len = len(blob), len(target)
+            blob += target
+        elif obj.is_dir:
+            kind = _DIR
+        elif obj.is_dev:
+            kind = _DEV
+        elif obj.is_fifo:
+            kind = _FIF
+        else:
+            raise TypeError(f"unknown type {type(obj)}: {obj}")
+        records.append(
+            _packed_record.pack(
+                path_offset,
+                len(location),
+                target_offset,
+                target_len,
+                kind,
+                mtime,
+                md5,
+            )
+        )
+
+    f = AtomicWriteFile(
+        _packed_path(path),
+        binary=True,
+        uid=os_data.root_uid,
+        gid=os_data.root_gid,
+        perms=0o644,
+    )
+    try:
+        f.write(
+            _packed_header.pack(
+                _PACKED_MAGIC, _PACKED_VERSION, len(records), st.st_mtime_ns, st.st_size
+            )
+        )
+        f.write(b"".join(records))
+        f.write(blob)
+        f.close()
+    finally:
+        # if atomic, it forces the update to be wiped.
+        del f
+
+
+class PackedContents:
+    """Read access to a packed CONTENTS sidecar.
+
+    Entries are addressed by their index in path order and only decoded when
+    requested.
+    """
+
+    __slots__ = ("_data", "_count", "_blob")
+
+    def __init__(self, data):
+        self._data = data
+        self._count = _packed_header.unpack_from(data)[2]
+        self._blob = _packed_header.size + self._count * _packed_record.size
+
+    @classmethod
+    def load(cls, path):
+        """Return the packed sidecar of a CONTENTS file.
+
+        :param path: path to the CONTENTS file
+        :return: :py:class:`PackedContents` instance, None if the sidecar is
+            missing, invalid, or doesn't match the CONTENTS file
+        """
+        try:
+            with open(_packed_path(path), "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            st = os.stat(path)
+        except (EnvironmentError, ValueError):
+            return None
+        if len(data) >= _packed_header.size:
+            magic, version, count, mtime, size = _packed_header.unpack_from(data)
+            if (
+                magic == _PACKED_MAGIC
+                and version == _PACKED_VERSION
+                and (mtime, size) == (st.st_mtime_ns, st.st_size)
+                and len(data) >= _packed_header.size + count * _packed_record.size
+            ):
+                return cls(data)
+        data.close()
+        return None
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, i):
+        return _packed_record.unpack_from(
+            self._data, _packed_header.size + i * _packed_record.size
+        )
+
+    def _string(self, offset, length):
+        start = self._blob + offset
+        return self._data[start : start + length]
+
+    def path_bytes(self, i):
+        """Return the encoded path of an entry."""
+        offset, length = struct.unpack_from(
+            "<II", self._data, _packed_header.size + i * _packed_record.size
+        )
+        return self._string(offset, length)
+
+    def location(self, i):
+        """Return the path of an entry."""
+        return self.path_bytes(i).decode("utf8", "surrogateescape")
+
+    def locations(self):
+        """Iterate over the paths of all entries."""
+        return map(self.location, range(self._count))
+
+    def kind(self, i):
+        """Return the type of an entry."""
+        return self._data[_packed_header.size + i * _packed_record.size + 16]
+
+    def index(self, location):
+        """Return the index of the entry for a normalized path, None if missing."""
+        path = _encode_path(location)
+        i = bisect_left(range(self._count), path, key=self.path_bytes)
+        if i < self._count and self.path_bytes(i) == path:
+            return i
+        return None
+
+    def obj(self, i):
+        """Return the fs object for an entry."""
+        path_offset, path_len, target_offset, target_len, kind, mtime, md5 = (
+            self._record(i)
+        )
+        path = self._string(path_offset, path_len).decode("utf8", "surrogateescape")
+        if kind == _OBJ:
+            return fs.fsFile(
+                path,
+                chksums={"md5": int.from_bytes(md5, "big")},
+                mtime=mtime,
+                strict=False,
+            )
+        elif kind == _DIR:
+            return fs.fsDir(path, strict=False)
+        elif kind == _SYM:
+            target = self._string(target_offset, target_len)
+            return fs.fsLink(
+                path,
+                target.decode("utf8", "surrogateescape"),
+                mtime=mtime,
+                strict=False,
+            )
+        elif kind == _DEV:
+            return LookupFsDev(path, strict=False)
+        return fs.fsFifo(path, strict=False)
+
+    def difference(self, other):
+        """Yield the indexes of entries with paths missing from another sidecar."""
+        i = j = 0
+        count, other_count = self._count, len(other)
+        while i < count:
+            if j == other_count:
+                yield from range(i, count)
+                return
+            path, other_path = self.path_bytes(i), other.path_bytes(j)
+            if path < other_path:
+                yield i
+                i += 1
+            elif path > other_path:
+                j += 1
+            else:
+                i += 1
+                j += 1
+
+
+class PackedContentsSet(contentsSet):
+    """Contents set backed by a packed CONTENTS sidecar.
+
+    Membership tests, iteration, and set differences work directly on the
+    packed data, only creating fs objects for returned entries. The set is
+    fully materialized on the first modification.
+    """
+
+    def __init__(self, packed, mutable=False):
+        self._packed = packed
+        self._materialized = None
+        self.mutable = mutable
+
+    @property
+    def _dict(self):
+        if self._materialized is None:
+            packed = self._packed
+            self._materialized = {
+                packed.location(i): packed.obj(i) for i in range(len(packed))
+            }
+        return self._materialized
+
+    def __contains__(self, key):
+        if self._materialized is not None:
+            return super().__contains__(key)
+        if fs.isfs_obj(key):
+            key = key.location
+        else:
+            key = normpath(key)
+        return self._packed.index(key) is not None
+
+    def __getitem__(self, obj):
+        if self._materialized is not None:
+            return super().__getitem__(obj)
+        location = obj.location if fs.isfs_obj(obj) else normpath(obj)
+        i = self._packed.index(location)
+        if i is None:
+            raise KeyError(location)
+        return self._packed.obj(i)
+
+    def __iter__(self):
+        if self._materialized is not None:
+            return super().__iter__()
+        return map(self._packed.obj, range(len(self._packed)))
+
+    def __len__(self):
+        if self._materialized is not None:
+            return super().__len__()
+        return len(self._packed)
+
+    def _locations(self):
+        if self._materialized is not None:
+            return iter(self._materialized)
+        return self._packed.locations()
+
+    def difference(self, other):
+        if self._materialized is not None:
+            return super().difference(other)
+        packed = self._packed
+        if isinstance(other, PackedContentsSet) and other._materialized is None:
+            # both sets are sorted by path
+            indexes = packed.difference(other._packed)
+        else:
+            if isinstance(other, contentsSet):
+                other = other._dict
+            elif not hasattr(other, "__contains__"):
+                other = set(self._convert_loc(other))
+            indexes = (i for i in range(len(packed)) if packed.location(i) not in other)
+        return contentsSet(map(packed.obj, indexes), mutable=self.mutable)
+
+    def issubset(self, other):
+        if not hasattr(other, "__contains__"):
+            other = set(self._convert_loc(other))
+        return all(x in other for x in self._locations())
+
+    def isdisjoint(self, other):
+        if not hasattr(other, "__contains__"):
+            other = set(self._convert_loc(other))
+        return not any(x in other for x in self._locations())
+
+    def _iter_kind(self, name, invert):
+        if self._materialized is not None:
+            return getattr(super(), f"iter{name}")(invert=invert)
+        packed = self._packed
+        kind = _packed_kinds[name]
+        return (
+            packed.obj(i)
+            for i in range(len(packed))
+            if (packed.kind(i) == kind) != invert
+        )
+
+    def iterfiles(self, invert=False):
+        return self._iter_kind("files", invert)
+
+    def iterdirs(self, invert=False):
+        return self._iter_kind("dirs", invert)
+
+    def itersymlinks(self, invert=False):
+        return self._iter_kind("symlinks", invert)
+
+    def iterdevs(self, invert=False):
+        return self._iter_kind("devs", invert)
+
+    def iterfifos(self, invert=False):
+        return self._iter_kind("fifos", invert)
+
+    def clone(self, empty=False):
+        if empty:
+            return contentsSet(mutable=True)
+        elif self._materialized is None:
+            return self.__class__(self._packed, mutable=True)
+        return contentsSet(self._materialized.values(), mutable=True)
+
+
+def load_contents(path, mutable=True):
+    """Load the contents set of a CONTENTS file, preferring its packed sidecar.
+
+    :param path: path to the CONTENTS file
+    :return: :py:class:`PackedContentsSet` instance if a matching sidecar
+        exists, otherwise a :py:class:`ContentsFile` instance
+    """
+    packed = PackedContents.load(path)
+    if packed is not None:
+        return PackedContentsSet(packed, mutable=mutable)
+    return ContentsFile(path, mutable=mutable)
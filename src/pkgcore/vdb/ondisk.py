@@ -18,7 +18,8 @@ from ..log import logger
 from ..package import base as pkg_base
 from ..repository import errors, prototype, wrapper
 from . import repo_ops
-from .contents import ContentsFile
+from .contents import PackedContents, load_contents
+from .owners import OwnerIndex, contents_paths
 
 
 class tree(prototype.tree):
@@ -36,21 +37,32 @@ class tree(prototype.tree):
             "cache_location": "str",
             "repo_id": "str",
             "disable_cache": "bool",
+            "packed_contents": "bool",
         },
         typename="repo",
     )
 
     def __init__(
-        self, location, cache_location=None, repo_id="vdb", disable_cache=False
+        self,
+        location,
+        cache_location=None,
+        repo_id="vdb",
+        disable_cache=False,
+        packed_contents=True,
     ):
         super().__init__(frozen=False)
         self.repo_id = repo_id
         self.location = location
+        # write packed CONTENTS sidecars for merged packages
+        self.packed_contents = packed_contents
         if disable_cache:
             cache_location = None
         elif cache_location is None:
             cache_location = pjoin("/var/cache/edb/dep", location.lstrip("/"))
         self.cache_location = cache_location
+        self._owner_index = OwnerIndex(
+            None if cache_location is None else pjoin(cache_location, "owners")
+        )
         self._versions_tmp_cache = {}
         try:
             st = os.stat(self.location)
@@ -166,7 +178,7 @@ class tree(prototype.tree):
     def _internal_load_key(self, path, key):
         key = self._metadata_rewrites.get(key, key)
         if key == "contents":
-            data = ContentsFile(pjoin(path, "CONTENTS"), mutable=True)
+            data = load_contents(pjoin(path, "CONTENTS"), mutable=True)
         elif key == "environment":
             fp = pjoin(path, key)
             if not os.path.exists(f"{fp}.bz2"):
@@ -193,9 +205,106 @@ class tree(prototype.tree):
             data = data.rstrip("\n")
         return data
 
+    def _contents_stamp(self, cpv):
+        try:
+            st = os.stat(pjoin(self.location, cpv, "CONTENTS"))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _owner_entry(self, cpv):
+        # stat before reading so concurrent changes are caught on the next use
+        stamp = self._contents_stamp(cpv)
+        if stamp is None:
+            return None, ()
+        path = pjoin(self.location, cpv, "CONTENTS")
+        if (packed := PackedContents.load(path)) is not None:
+            return stamp, tuple(packed.locations())
+        return stamp, tuple(contents_paths(path))
+
+    def _installed_cpvs(self):
+        return frozenset(
+            f"{category}/{package}-{fullver}"
+            for (category, package), versions in self.versions.items()
+            for fullver in versions
+        )
+
+    def _update_owner_index(self, changes, warn=True):
+        try:
+            self._owner_index.update(changes)
+        except EnvironmentError as e:
+            log = logger.warning if warn else logger.debug
+            log("failed updating owner index %r: %s", self._owner_index.path, e)
+
+    def _synced_owner_index(self):
+        """Return the owner index, updated for packages changed outside pkgcore."""
+        index = self._owner_index
+        entries = index.entries()
+        installed = self._installed_cpvs()
+        changes = dict.fromkeys(entries.keys() - installed)
+        for cpv in installed:
+            entry = entries.get(cpv)
+            if entry is None or entry[0] != self._contents_stamp(cpv):
+                changes[cpv] = self._owner_entry(cpv)
+        if changes:
+            # queries are commonly run unprivileged
+            self._update_owner_index(changes, warn=False)
+        return index
+
+    def owners(self, paths):
+        """Return the installed packages owning the given paths.
+
+        :param paths: iterable of absolute paths
+        :return: mapping of owned paths to frozensets of owning cpvs
+        """
+        return self._synced_owner_index().owners(paths)
+
+    def owners_matching(self, match):
+        """Return the installed packages owning any path passing a check.
+
+        :param match: callable run on paths
+        :return: frozenset of cpvs
+        """
+        return self._synced_owner_index().matching(match)
+
+    def rebuild_owner_index(self):
+        """Regenerate the owner index from the CONTENTS files of all packages.
+
+        :return: number of indexed packages
+        :raises EnvironmentError: if the index couldn't be written
+        """
+        installed = sorted(self._installed_cpvs())
+        self._owner_index.rebuild((cpv, *self._owner_entry(cpv)) for cpv in installed)
+        return len(installed)
+
+    def check_owner_index(self):
+        """Verify the stored owner index against the CONTENTS files.
+
+        :return: iterable of error strings
+        """
+        entries = self._owner_index.entries()
+        installed = self._installed_cpvs()
+        for cpv in sorted(entries.keys() - installed):
+            yield f"{cpv}: indexed but not installed"
+        for cpv in sorted(installed):
+            entry = entries.get(cpv)
+            if entry is None:
+                yield f"{cpv}: not indexed"
+                continue
+            stamp, paths = self._owner_entry(cpv)
+            if entry[0] != stamp:
+                yield f"{cpv}: outdated entry"
+            elif frozenset(entry[1]) != frozenset(paths):
+                yield f"{cpv}: indexed paths differ from CONTENTS"
+
+    def notify_add_package(self, pkg):
+        prototype.tree.notify_add_package(self, pkg)
+        self._update_owner_index({pkg.cpvstr: self._owner_entry(pkg.cpvstr)})
+
     def notify_remove_package(self, pkg):
         remove_it = len(self.packages[pkg.category]) == 1
         prototype.tree.notify_remove_package(self, pkg)
+        self._update_owner_index({pkg.cpvstr: None})
         if remove_it:
             try:
                 os.rmdir(pjoin(self.location, pkg.category))
@@ -0,0 +1,190 @@
+"""
+persistent index of paths to the installed packages owning them
+"""
+
+__all__ = ("OwnerIndex", "contents_paths")
+
+import fcntl
+import marshal
+import os
+import threading
+
+from snakeoil.fileutils import readlines_utf8
+from snakeoil.osutils import ensure_dirs, normpath
+
+from ..log import logger
+
+# bump when the stored format changes
+_VERSION = 1
+
+
+def contents_paths(path):
+    """Yield the paths listed in a CONTENTS file.
+
+    Paths are normalized the same way as the locations of the fs objects
+    created by :py:class:`pkgcore.vdb.contents.ContentsFile`, without
+    creating the objects themselves.
+    """
+    for line in readlines_utf8(path, True):
+        if not line:
+            continue
+        kind, _, data = line.partition(" ")
+        if kind == "obj":
+            data = data.rsplit(" ", 2)[0]
+        elif kind == "sym":
+            data = data.split(" -> ", 1)[0]
+        elif kind not in ("dir", "dev", "fif"):
+            raise ValueError(f"unknown entry type {line!r}")
+        yield normpath(data)
+
+
+class OwnerIndex:
+    """Mapping of paths to the installed packages owning them.
+
+    Entries map a cpv to the stamp of the CONTENTS file they were read from
+    and the paths listed in it. Changes are written out by rewriting the
+    whole index under an exclusive lock, so readers never see partially
+    applied updates. Without a path the index is only kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+        self._stat = None
+        self._owners = None
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.path)
+        except EnvironmentError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                version, entries = marshal.load(f)
+        except FileNotFoundError:
+            return {}
+        except (EnvironmentError, EOFError, ValueError, TypeError) as e:
+            logger.debug("ignoring invalid owner index %r: %s", self.path, e)
+            return {}
+        if version != _VERSION or not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def _load(self):
+        if self.path is None:
+            if self._entries is None:
+                self._entries = {}
+            return self._entries
+        # pick up changes written by other processes
+        st = self._file_stat()
+        if self._entries is None or st != self._stat:
+            self._entries = self._read()
+            self._stat = st
+            self._owners = None
+        return self._entries
+
+    def _write(self, entries):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump((_VERSION, entries), f)
+        os.rename(tmp, self.path)
+
+    def _transaction(self, func):
+        """Apply a change to the index, writing it out if it's stored on disk."""
+        if self.path is not None:
+            base = os.path.dirname(self.path)
+            if base and not ensure_dirs(base, mode=0o755, minimal=True):
+                raise PermissionError(f"failed creating {base!r}")
+            with open(f"{self.path}.lock", "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._entries = None
+                entries = func(self._load())
+                self._write(entries)
+            self._stat = self._file_stat()
+        else:
+            entries = func(self._load())
+        self._entries = entries
+        self._owners = None
+
+    def entries(self):
+        """Return the mapping of cpvs to CONTENTS stamps and owned paths."""
+        with self._lock:
+            return self._load()
+
+    def update(self, changes):
+        """Update the entries of the given cpvs.
+
+        :param changes: mapping of cpvs to CONTENTS stamp and owned paths
+            pairs, None for removed packages
+        :raises EnvironmentError: if the index couldn't be written, in which
+            case the changes are only applied in memory
+        """
+
+        def apply(entries):
+            entries = dict(entries)
+            for cpv, entry in changes.items():
+                if entry is None:
+                    entries.pop(cpv, None)
+                else:
+                    entries[cpv] = (entry[0], tuple(entry[1]))
+            return entries
+
+        with self._lock:
+            current = self._load()
+            try:
+                self._transaction(apply)
+            except EnvironmentError:
+                self._entries = apply(current)
+                self._owners = None
+                raise
+
+    def rebuild(self, entries):
+        """Replace the index content.
+
+        :param entries: iterable of cpv, CONTENTS stamp, and owned paths
+        :raises EnvironmentError: if the index couldn't be written
+        """
+        entries = {cpv: (stamp, tuple(paths)) for cpv, stamp, paths in entries}
+        with self._lock:
+            try:
+                self._transaction(lambda _entries: entries)
+            except EnvironmentError:
+                self._entries = entries
+                self._owners = None
+                raise
+
+    def owners(self, paths):
+        """Return the owners of the given paths.
+
+        :return: mapping of owned paths to frozensets of owning cpvs
+        """
+        with self._lock:
+            entries = self._load()
+            if self._owners is None:
+                owners = {}
+                for cpv, (_stamp, owned) in entries.items():
+                    for path in owned:
+                        owners.setdefault(path, []).append(cpv)
+                self._owners = owners
+            owners = self._owners
+        return {
+            path: frozenset(owners[path]) for path in frozenset(paths) if path in owners
+        }
+
+    def matching(self, match):
+        """Return the cpvs owning any path the given callable matches."""
+        with self._lock:
+            entries = self._load()
+        return frozenset(
+            cpv for cpv, (_stamp, owned) in entries.items() if any(map(match, owned))
+        )
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
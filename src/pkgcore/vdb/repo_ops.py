@@ -11,10 +11,11 @@ from snakeoil.osutils import ensure_dirs, normpath, pjoin
 from snakeoil.version import get_version
 
 from .. import __title__
+from .. import operations as operations_mod
 from ..ebuild import conditionals
 from ..log import logger
 from ..operations import repo as repo_ops
-from .contents import ContentsFile
+from .contents import ContentsFile, write_packed_contents
 
 
 def update_mtime(path, timestamp=None):
@@ -46,6 +47,11 @@ class install(repo_ops.install):
                 v = ContentsFile(pjoin(dirpath, "CONTENTS"), mutable=True, create=True)
                 v.update(self.new_pkg.contents)
                 v.flush()
+                if self.repo.packed_contents:
+                    try:
+                        write_packed_contents(pjoin(dirpath, "CONTENTS"), v)
+                    except EnvironmentError as e:
+                        logger.warning(f"failed writing packed CONTENTS: {e}")
             elif k == "environment":
                 data = compression.compress_data(
                     "bzip2", self.new_pkg.environment.bytes_fileobj().read()
@@ -170,3 +176,23 @@ class operations(repo_ops.operations):
     def _cmd_api_regen_cache(self, *args, **kwargs):
         # disable threaded cache updates
         super()._cmd_api_regen_cache(*args, threads=1, **kwargs)
+
+    @operations_mod.is_standalone
+    def _cmd_api_rebuild_owner_index(self, observer=None):
+        observer = self._get_observer(observer)
+        try:
+            count = self.repo.rebuild_owner_index()
+        except EnvironmentError as e:
+            observer.error(f"failed writing owner index: {e}")
+            return False
+        observer.info(f"indexed {count} package(s)")
+        return True
+
+    @operations_mod.is_standalone
+    def _cmd_api_check_owner_index(self, observer=None):
+        observer = self._get_observer(observer)
+        errors = 0
+        for error in self.repo.check_owner_index():
+            observer.error(error)
+            errors += 1
+        return errors
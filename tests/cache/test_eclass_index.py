@@ -0,0 +1,46 @@
+from pkgcore.cache.eclass_index import EclassIndex
+
+
+class TestEclassIndex:
+    def test_missing(self, tmp_path):
+        index = EclassIndex(str(tmp_path / "index"))
+        assert index.users(["foo"]) is None
+        # updates aren't recorded for missing indexes
+        index.update("cat/pkg-1", ["foo"])
+        assert not (tmp_path / "index").exists()
+        assert index.users(["foo"]) is None
+
+    def test_update(self, tmp_path):
+        path = str(tmp_path / "index")
+        index = EclassIndex(path)
+        index.rebuild([("cat/pkg-1", ["foo", "bar"]), ("cat/pkg-2", [])])
+        assert index.users(["foo"]) == {"cat/pkg-1"}
+        index.update("cat/pkg-2", ["foo"])
+        index.update("cat/pkg-1", ["bar"])
+        assert index.users(["foo"]) == {"cat/pkg-2"}
+        assert index.users(["foo", "bar"]) == {"cat/pkg-1", "cat/pkg-2"}
+
+        # updates are persisted
+        assert EclassIndex(path).users(["foo"]) == {"cat/pkg-2"}
+        index.update("cat/pkg-2", ())
+        assert EclassIndex(path).users(["foo"]) == frozenset()
+
+    def test_compact(self, tmp_path):
+        path = tmp_path / "index"
+        index = EclassIndex(str(path))
+        index.rebuild([("cat/pkg-1", ["foo"])])
+        for eclasses in (["bar"], [], ["foo", "bar"]):
+            index.update("cat/pkg-1", eclasses)
+        assert len(path.read_text().splitlines()) == 4
+        index.compact()
+        assert path.read_text() == "cat/pkg-1\tbar foo\n"
+        assert EclassIndex(str(path)).users(["foo"]) == {"cat/pkg-1"}
+
+    def test_rebuild_memory(self, tmp_path):
+        index = EclassIndex(str(tmp_path / "index"))
+        index.rebuild([("cat/pkg-1", ["foo"])], persist=False)
+        assert index.users(["foo"]) == {"cat/pkg-1"}
+        # updates are kept in memory
+        index.update("cat/pkg-2", ["foo"])
+        assert index.users(["foo"]) == {"cat/pkg-1", "cat/pkg-2"}
+        assert not (tmp_path / "index").exists()
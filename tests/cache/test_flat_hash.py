@@ -1,3 +1,6 @@
+import os
+import time
+
 import pytest
 
 from pkgcore.cache import errors, flat_hash
@@ -96,3 +99,87 @@ class TestFlatHash:
         for key, raw_data in self.test_data:
             d = dict(raw_data)
             db[key] = d
+
+
+class TestEclassUsers:
+    def mk_data(self, *eclasses):
+        return {
+            "EAPI": "8",
+            "_eclasses_": {
+                x: LazilyHashedPath("/repo/eclass", mtime=100) for x in eclasses
+            },
+        }
+
+    def test_index(self, tmp_path, cache_path):
+        cache = db(str(tmp_path))
+        index = cache.sidecar_path("eclass_index")
+        # synced repos aren't written to
+        assert index.startswith(cache_path)
+        cache["cat/pkg-1"] = self.mk_data("foo", "bar")
+        cache["cat/pkg-2"] = self.mk_data("bar")
+        cache["cat/pkg-3"] = self.mk_data()
+        # missing index is built from the cache entries, only in memory
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1"}
+        assert not os.path.exists(index)
+        cache["cat/pkg-2"] = self.mk_data("foo", "bar")
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1", "cat/pkg-2"}
+        cache["cat/pkg-2"] = self.mk_data("bar")
+        assert not os.path.exists(index)
+        # as written by regen
+        cache = db(str(tmp_path))
+        cache.build_eclass_index()
+        assert os.path.exists(index)
+        assert sorted(cache.keys()) == ["cat/pkg-1", "cat/pkg-2", "cat/pkg-3"]
+
+        # updates are reflected in the index
+        cache["cat/pkg-3"] = self.mk_data("foo")
+        del cache["cat/pkg-1"]
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-3"}
+        cache.commit(force=True)
+        with open(index) as f:
+            data = f.read()
+        assert db(str(tmp_path)).eclass_users(["foo", "bar"]) == {
+            "cat/pkg-2",
+            "cat/pkg-3",
+        }
+        # the restamped index is used as is
+        db(str(tmp_path)).build_eclass_index()
+        with open(index) as f:
+            assert f.read() == data
+
+    def test_outdated_index(self, tmp_path):
+        cache = db(str(tmp_path))
+        cache["cat/pkg-1"] = self.mk_data("foo")
+        cache["cat/pkg-2"] = self.mk_data("bar")
+        cache.build_eclass_index()
+        cache.commit(force=True)
+        # entries updated without pkgcore, keeping their original mtime
+        entry = tmp_path / "cat" / "pkg-2"
+        st = entry.stat()
+        newest = entry.parent.stat().st_ctime_ns
+        entry.write_text(entry.read_text().replace("=bar\t", "=foo\t"))
+        os.utime(entry, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # wait for the change time to be distinguishable on coarse clocks
+        while entry.stat().st_ctime_ns <= newest:
+            time.sleep(0.001)
+            os.utime(entry, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # outdated indexes are ignored
+        cache = db(str(tmp_path))
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1", "cat/pkg-2"}
+        with open(cache.sidecar_path("eclass_index")) as f:
+            assert "cat/pkg-2\tbar\n" in f.read()
+        # and rewritten by regen
+        db(str(tmp_path)).build_eclass_index()
+        with open(cache.sidecar_path("eclass_index")) as f:
+            assert "cat/pkg-2\tfoo\n" in f.read()
+
+        # removed entries
+        (tmp_path / "cat" / "pkg-1").unlink()
+        assert db(str(tmp_path)).eclass_users(["foo"]) == {"cat/pkg-2"}
+
+    def test_readonly(self, tmp_path):
+        cache = db(str(tmp_path))
+        cache["cat/pkg-1"] = self.mk_data("foo")
+        cache = db(str(tmp_path), readonly=True)
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1"}
+        assert not os.path.exists(cache.sidecar_path("eclass_index"))
@@ -0,0 +1,196 @@
+import threading
+
+import pytest
+
+from pkgcore.cache import errors, flat_hash, packed
+from pkgcore.scripts.pclonecache import _convert_entry
+from snakeoil.chksum import LazilyHashedPath
+
+from . import test_base
+from .test_flat_hash import generic_data
+
+
+class db(packed.database):
+    def __setitem__(self, cpv, data):
+        data["_chf_"] = test_base._chf_obj
+        return packed.database.__setitem__(self, cpv, data)
+
+
+class TestPacked:
+    cache_keys = (
+        "DEPENDS",
+        "RDEPEND",
+        "EAPI",
+        "HOMEPAGE",
+        "KEYWORDS",
+        "LICENSE",
+        "PDEPEND",
+        "RESTRICT",
+        "SLOT",
+        "SRC_URI",
+        "_eclasses_",
+        "_mtime_",
+    )
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "cache" / "metadata.pack")
+
+    def test_readwrite(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys)
+        key, raw_data = generic_data
+        cpvs = ["sys-libs/libtrash-2.4", "app-misc/foo-1", "dev-util/bar-2.0"]
+        for cpv in cpvs:
+            cache[cpv] = dict(raw_data)
+        # pending updates are visible before committing
+        assert key in cache
+        cache.commit()
+        assert list(db(path, readonly=True).keys()) == []
+        cache.commit(force=True)
+
+        cache = db(path, auxdbkeys=self.cache_keys, readonly=True)
+        assert sorted(cache.keys()) == sorted(cpvs)
+        for cpv in cpvs:
+            assert cpv in cache
+        assert "sys-libs/libtrash-2" not in cache
+        d = cache[key]
+        assert d["_mtime_"] == 100
+        assert d["RDEPEND"] == "virtual/libc dev-lang/perl"
+        assert "DESCRIPTION" not in d
+        assert dict(d["_eclasses_"])["multilib"] == (
+            ("eclassdir", "/var/gentoo/repos/gentoo"),
+            ("mtime", 1156014349),
+        )
+        with pytest.raises(KeyError):
+            cache["sys-libs/libtrash-2"]
+
+    def test_update(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys)
+        key, raw_data = generic_data
+        cache[key] = dict(raw_data)
+        cache["cat/pkg-1"] = {"SLOT": "1"}
+        cache.commit(force=True)
+
+        cache = db(path, auxdbkeys=self.cache_keys)
+        del cache[key]
+        cache["cat/pkg-2"] = {"SLOT": "2"}
+        assert key not in cache
+        cache.commit(force=True)
+
+        cache = db(path, auxdbkeys=self.cache_keys, readonly=True)
+        assert sorted(cache.keys()) == ["cat/pkg-1", "cat/pkg-2"]
+        assert cache["cat/pkg-1"]["SLOT"] == "1"
+        assert cache["cat/pkg-2"]["SLOT"] == "2"
+
+    def test_readonly(self, path):
+        cache = db(path, readonly=True)
+        assert list(cache.keys()) == []
+        assert "cat/pkg-1" not in cache
+        with pytest.raises(errors.ReadOnly):
+            cache["cat/pkg-1"] = {}
+
+    def test_corrupt(self, path, tmp_path):
+        (tmp_path / "cache").mkdir()
+        with open(path, "wb") as f:
+            f.write(b"x" * 64)
+        with pytest.raises(errors.GeneralCacheCorruption):
+            "cat/pkg-1" in db(path, readonly=True)
+
+
+class TestClone:
+    def test_md5_cache(self, tmp_path):
+        repo = tmp_path / "repo"
+        md5_dir = repo / "metadata" / "md5-cache" / "cat"
+        md5_dir.mkdir(parents=True)
+        for ver in ("1", "2"):
+            (md5_dir / f"pkg-{ver}").write_text(
+                f"EAPI=8\nSLOT={ver}\n"
+                "_eclasses_=foo\t5d41402abc4b2a76b9719d911017c592\n"
+                "_md5_=d41d8cd98f00b204e9800998ecf8427e\n"
+            )
+        source = flat_hash.md5_cache(str(repo), readonly=True)
+        target = packed.md5_cache(str(tmp_path / "md5.pack"))
+        for k, v in source.items():
+            target[k] = _convert_entry(source, v)
+        target.commit(force=True)
+
+        target = packed.md5_cache(str(tmp_path / "md5.pack"), readonly=True)
+        assert dict(target.items()) == dict(source.items())
+
+
+class TestConcurrentWriters:
+    def test_commit_merges(self, tmp_path):
+        path = str(tmp_path / "metadata.pack")
+        first, second = db(path), db(path)
+        # load the initial, empty state in both instances
+        assert "cat/pkg-1" not in first
+        assert "cat/pkg-2" not in second
+        first["cat/pkg-1"] = {"SLOT": "1"}
+        second["cat/pkg-2"] = {"SLOT": "2"}
+        first.commit(force=True)
+        second.commit(force=True)
+        cache = db(path, readonly=True)
+        assert sorted(cache.keys()) == ["cat/pkg-1", "cat/pkg-2"]
+
+
+class TestConcurrentReaders:
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = str(tmp_path / "metadata.pack")
+        cache = db(path, auxdbkeys=TestPacked.cache_keys)
+        for i in range(10):
+            cache[f"cat/pkg-{i}"] = {"SLOT": str(i), "EAPI": "8"}
+        cache.commit(force=True)
+        return path
+
+    def test_partial_load(self, path, monkeypatch):
+        cache = db(path, auxdbkeys=TestPacked.cache_keys, readonly=True)
+        string = packed.database._string.__func__
+        seen = []
+
+        def _string(kls, state, idx):
+            if not seen:
+                seen.append(None)
+                # simulate another thread using the cache while it's loading
+                seen.append(cache["cat/pkg-3"]["SLOT"])
+            return string(kls, state, idx)
+
+        monkeypatch.setattr(packed.database, "_string", classmethod(_string))
+        assert cache["cat/pkg-5"]["SLOT"] == "5"
+        assert seen == [None, "3"]
+
+    def test_threads(self, path):
+        cache = db(path, auxdbkeys=TestPacked.cache_keys, readonly=True)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def lookup():
+            barrier.wait()
+            results.append([cache[f"cat/pkg-{i}"]["SLOT"] for i in range(10)])
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [[str(i) for i in range(10)]] * 8
+
+
+class TestEclassUsers:
+    def test_eclass_users(self, tmp_path):
+        path = str(tmp_path / "metadata.pack")
+        cache = db(path)
+        eclass = LazilyHashedPath("/repo/eclass", mtime=100)
+        cache["cat/pkg-1"] = {"_eclasses_": {"foo": eclass, "bar": eclass}}
+        cache["cat/pkg-2"] = {"_eclasses_": {"bar": eclass}}
+        cache["cat/pkg-3"] = {}
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1"}
+        cache.commit(force=True)
+
+        cache = db(path)
+        assert cache.eclass_users(["foo", "bar"]) == {"cat/pkg-1", "cat/pkg-2"}
+        # pending updates override stored entries
+        cache["cat/pkg-1"] = {"_eclasses_": {"bar": eclass}}
+        del cache["cat/pkg-2"]
+        assert cache.eclass_users(["foo"]) == frozenset()
+        assert cache.eclass_users(["bar"]) == {"cat/pkg-1"}
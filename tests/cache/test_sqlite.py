@@ -0,0 +1,141 @@
+import pytest
+
+from pkgcore.cache import errors, flat_hash, sqlite
+from pkgcore.scripts.pclonecache import _convert_entry
+from snakeoil.chksum import LazilyHashedPath
+
+from . import test_base
+from .test_flat_hash import generic_data
+
+
+class db(sqlite.database):
+    def __setitem__(self, cpv, data):
+        data["_chf_"] = test_base._chf_obj
+        return sqlite.database.__setitem__(self, cpv, data)
+
+    def __getitem__(self, cpv):
+        d = dict(sqlite.database.__getitem__(self, cpv).items())
+        d.pop(f"_{self.chf_type}_", None)
+        return d
+
+
+class TestSqlite:
+    cache_keys = (
+        "DEPENDS",
+        "RDEPEND",
+        "EAPI",
+        "HOMEPAGE",
+        "KEYWORDS",
+        "LICENSE",
+        "PDEPEND",
+        "RESTRICT",
+        "SLOT",
+        "SRC_URI",
+        "_eclasses_",
+        "_mtime_",
+    )
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / "cache" / "metadata.sqlite")
+
+    def test_readwrite(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys)
+        key, raw_data = generic_data
+        cache[key] = dict(raw_data)
+        assert key in cache
+        assert list(cache.keys()) == [key]
+        d = cache[key]
+        assert d["RDEPEND"] == "virtual/libc dev-lang/perl"
+        assert "DESCRIPTION" not in d
+        eclasses = dict(d["_eclasses_"])
+        assert eclasses["multilib"] == (
+            ("eclassdir", "/var/gentoo/repos/gentoo"),
+            ("mtime", 1156014349),
+        )
+        cache.close()
+
+        # entries persist once committed
+        cache = db(path, auxdbkeys=self.cache_keys, readonly=True)
+        assert dict(cache.items())[key]["_mtime_"] == 100
+        assert cache[key]["SLOT"] == "0"
+
+    def test_uncommitted(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys)
+        cache.set_sync_rate(1000)
+        key, raw_data = generic_data
+        cache[key] = dict(raw_data)
+        assert key not in db(path, auxdbkeys=self.cache_keys, readonly=True)
+        cache.commit()
+        assert key in db(path, auxdbkeys=self.cache_keys, readonly=True)
+
+    def test_delitem(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys)
+        key, raw_data = generic_data
+        cache[key] = dict(raw_data)
+        del cache[key]
+        assert key not in cache
+        with pytest.raises(KeyError):
+            cache[key]
+        with pytest.raises(KeyError):
+            del cache[key]
+
+    def test_readonly(self, path):
+        cache = db(path, auxdbkeys=self.cache_keys, readonly=True)
+        assert list(cache.keys()) == []
+        key, raw_data = generic_data
+        with pytest.raises(errors.ReadOnly):
+            cache[key] = dict(raw_data)
+
+    def test_chf_mismatch(self, path):
+        db(path).commit(force=True)
+        cache = db(path)
+        cache["cat/pkg-1"] = {}
+        cache.close()
+        cache = sqlite.md5_cache(path)
+        with pytest.raises(errors.InitializationError):
+            "cat/pkg-1" in cache
+
+
+class TestClone:
+    def test_md5_cache(self, tmp_path):
+        repo = tmp_path / "repo"
+        md5_dir = repo / "metadata" / "md5-cache" / "cat"
+        md5_dir.mkdir(parents=True)
+        (md5_dir / "pkg-1").write_text(
+            "EAPI=8\nSLOT=0\n_eclasses_=foo\t5d41402abc4b2a76b9719d911017c592\n"
+            "_md5_=d41d8cd98f00b204e9800998ecf8427e\n"
+        )
+        source = flat_hash.md5_cache(str(repo), readonly=True)
+        target = sqlite.md5_cache(str(tmp_path / "md5.sqlite"))
+        for k, v in source.items():
+            target[k] = _convert_entry(source, v)
+        target.close()
+
+        assert dict(target.items()) == dict(source.items())
+        assert target["cat/pkg-1"]["_md5_"] == int(
+            "d41d8cd98f00b204e9800998ecf8427e", 16
+        )
+        ebuild_hash = LazilyHashedPath(
+            None, md5=int("d41d8cd98f00b204e9800998ecf8427e", 16)
+        )
+        data = target["cat/pkg-1"]
+        data.pop("_eclasses_")
+        data.pop("INHERIT", None)
+        assert target.validate_entry(data, ebuild_hash, None)
+
+
+class TestEclassUsers:
+    def test_index(self, tmp_path):
+        cache = db(str(tmp_path / "cache.sqlite"))
+        eclass = LazilyHashedPath("/repo/eclass", mtime=100)
+        cache["cat/pkg-1"] = {"_eclasses_": {"foo": eclass, "bar": eclass}}
+        cache["cat/pkg-2"] = {"_eclasses_": {"bar": eclass}}
+        cache["cat/pkg-3"] = {}
+        assert cache.eclass_users(["foo"]) == {"cat/pkg-1"}
+        assert cache.eclass_users(["foo", "bar"]) == {"cat/pkg-1", "cat/pkg-2"}
+        assert cache.eclass_users([]) == frozenset()
+        cache["cat/pkg-1"] = {"_eclasses_": {"bar": eclass}}
+        del cache["cat/pkg-2"]
+        assert cache.eclass_users(["foo"]) == frozenset()
+        assert cache.eclass_users(["bar"]) == {"cat/pkg-1"}
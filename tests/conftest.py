@@ -1,6 +1,7 @@
 from functools import partial
 
 import pytest
+from pkgcore import const
 
 
 def pytest_addoption(parser):
@@ -23,3 +24,13 @@ def mark_network(config, func):
 
 def pytest_configure(config):
     pytest.mark_network = partial(mark_network, config)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_path(tmp_path_factory):
+    """Keep data cached while running tests out of the real cache dirs."""
+    path = str(tmp_path_factory.mktemp("cache"))
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(const, "SYSTEM_CACHE_PATH", path)
+        mp.setattr(const, "USER_CACHE_PATH", path)
+        yield path
@@ -105,6 +105,20 @@ class TestAtom(TestRestriction):
         a = self.kls("dev-util/diffball", negate_vers=True)
         assert a == loads(dumps(a))
 
+    def test_instance_sharing(self):
+        s = "!>=dev-util/diffball-0.7:1/2::gentoo[use,x]"
+        assert self.kls(s) is self.kls(s)
+        a = self.kls(s, disable_inst_caching=True)
+        b = self.kls(s, disable_inst_caching=True)
+        assert a is not b
+        assert a._cpv.key is b._cpv.key
+        assert a.slot is b.slot
+        assert a.subslot is b.subslot
+        assert a.repo_id is b.repo_id
+        assert a.use[0] is b.use[0]
+        unversioned = self.kls("dev-util/" + "diffball", disable_inst_caching=True)
+        assert unversioned.cpvstr is a.key
+
     def test_glob(self):
         pytest.raises(errors.MalformedAtom, self.kls, "dev-util/diffball-1*")
         pytest.raises(errors.MalformedAtom, self.kls, "dev-util/diffball-1.*")
@@ -311,6 +311,44 @@ class TestCPV:
             "da/ba-6.0-r0", versioned=True
         )
 
+    def test_version_key(self):
+        versions = [
+            "0.1",
+            "1_alpha",
+            "1_beta2",
+            "1_pre",
+            "1_rc1",
+            "1",
+            "1-r1",
+            "1_p",
+            "1_p1-r2",
+            "1a",
+            "1.01",
+            "1.1",
+            "1.1.0_alpha_p1",
+            "1.1.0",
+            "1.1.0_p1_alpha",
+            "2",
+            "10",
+        ]
+        pkgs = [cpv.VersionedCPV(f"da/ba-{v}") for v in versions]
+        assert sorted(reversed(pkgs)) == pkgs
+        for a in pkgs:
+            for b in pkgs:
+                c = cpv.ver_cmp(a.version, a.revision, b.version, b.revision)
+                assert c == (a.version_key > b.version_key) - (
+                    a.version_key < b.version_key
+                )
+        # keys are shared between equal versions
+        assert (
+            cpv.VersionedCPV("da/ba-1.1").version_key
+            is cpv.VersionedCPV("db/bb-1.1").version_key
+        )
+        assert (
+            cpv.version_key("1.1", "1") == cpv.VersionedCPV("da/ba-1.1-r1").version_key
+        )
+        assert cpv.UnversionedCPV("da/ba").version_key is None
+
     def test_no_init(self):
         """Test if the cpv is in a somewhat sane state if __init__ fails.
 
@@ -362,6 +400,19 @@ class TestCPV:
         assert obj.fullver == "1.0-r0001"
         assert obj.revision == 1
 
+    def test_shared_components(self):
+        a = cpv.VersionedCPV("dev-util/diff" + "ball-1.0-r1")
+        b = cpv.VersionedCPV("dev-util/diff" + "ball-1.0-r1")
+        assert a.category is b.category
+        assert a.package is b.package
+        assert a.key is b.key
+        assert a.version is b.version
+        assert a.fullver is b.fullver
+        assert a.revision is b.revision
+        assert cpv.VersionedCPV("dev-util/foo-2-r1").revision is a.revision
+        c = cpv.UnversionedCPV("dev-util/diff" + "ball")
+        assert c.key is a.key
+
     def test_attribute_errors(self):
         obj = cpv.VersionedCPV("foo/bar-0")
         assert not obj == 0
@@ -0,0 +1,231 @@
+import marshal
+from unittest import mock
+
+import pytest
+from pkgcore.cache import flat_hash
+from pkgcore.ebuild import conditionals, depset_cache, ebuild_src
+from pkgcore.ebuild.atom import atom, transitive_use_atom
+from pkgcore.ebuild.eapi import get_eapi
+from pkgcore.restrictions import boolean, values
+
+
+def parse_deps(s, eapi="8"):
+    if eapi is None:
+        # allow repo deps
+        return conditionals.DepSet.parse(s, atom)
+    eapi = get_eapi(eapi)
+    return conditionals.DepSet.parse(
+        s,
+        atom,
+        element_func=eapi.atom_kls,
+        transitive_use_atoms=eapi.options.transitive_use_atoms,
+    )
+
+
+def roundtrip(depset):
+    return depset_cache.decode(
+        marshal.loads(marshal.dumps(depset_cache.encode(depset)))
+    )
+
+
+class TestEncoding:
+    @pytest.mark.parametrize(
+        "deps",
+        (
+            "",
+            "dev-util/foo",
+            ">=dev-libs/glib-2.40:2[introspection?,static-libs(+)] ~dev-util/bar-2",
+            "!!<sys-apps/foo-1.2-r3:0/1= !app-misc/bar =dev-lang/python-3.11*",
+            "|| ( dev-lang/python:3.11 dev-lang/python:3.12 ) cat/pkg",
+            "ssl? ( dev-libs/openssl:0= ) !test? ( || ( a/b c/d ) x/y:= )",
+        ),
+    )
+    def test_deps(self, deps):
+        depset = parse_deps(deps)
+        restored = roundtrip(depset)
+        assert restored == depset
+        assert hash(restored) == hash(depset)
+        assert str(restored) == str(depset)
+        assert restored.element_class is depset.element_class
+        assert restored.node_conds == depset.node_conds
+        for a, b in zip(restored, depset):
+            assert a.__class__ is b.__class__
+        assert restored.evaluate_depset(["ssl"]) == depset.evaluate_depset(["ssl"])
+
+    def test_transitive_use(self):
+        depset = parse_deps("dev-util/foo[bar?,!baz=]")
+        restored = roundtrip(depset)
+        assert isinstance(restored[0], transitive_use_atom)
+        assert restored.evaluate_depset(["bar"]) == depset.evaluate_depset(["bar"])
+
+    def test_atom_fields(self):
+        a = roundtrip(parse_deps(">=dev-util/foo-1.2-r3:1/2=::repo", eapi=None))[0]
+        assert a == atom(">=dev-util/foo-1.2-r3:1/2=::repo")
+        assert a.key == "dev-util/foo"
+        assert a.fullver == "1.2-r3"
+        assert a.revision == 3
+        assert a.restrictions == atom(">=dev-util/foo-1.2-r3:1/2=::repo").restrictions
+
+    def test_strings(self):
+        depset = conditionals.DepSet.parse(
+            "GPL-2 || ( MIT BSD ) foo? ( Apache-2.0 )",
+            str,
+            operators={"||": boolean.OrRestriction, "": boolean.AndRestriction},
+        )
+        assert roundtrip(depset) == depset
+        assert str(roundtrip(depset)) == str(depset)
+
+    def test_required_use(self):
+        pkg = ebuild_src.base(None, "cat/pkg-1")
+        object.__setattr__(pkg, "eapi", get_eapi("8"))
+        depset = pkg._parse_required_use("^^ ( a b ) ?? ( c !d ) foo? ( bar )")
+        restored = roundtrip(depset)
+        assert restored == depset
+        assert restored.element_class is values.ContainmentMatch
+
+    def test_unsupported(self):
+        depset = conditionals.DepSet.parse(
+            "a b", object, operators={}, element_func=str
+        )
+        with pytest.raises(depset_cache.UnsupportedNode):
+            depset_cache.encode(depset)
+
+    def test_source_key(self):
+        key = depset_cache.source_key("8", "a/b", "")
+        assert key == depset_cache.source_key("8", "a/b", "")
+        assert key != depset_cache.source_key("7", "a/b", "")
+        assert key != depset_cache.source_key("8", "", "a/b")
+
+
+class TestDepSetCache:
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / "cache" / "depsets")
+        cache = depset_cache.DepSetCache(path)
+        depset = parse_deps("a/b c? ( d/e )")
+        cache.update("cat/pkg-1", b"key", "RDEPEND", depset)
+        cache.update("cat/pkg-1", b"key", "DEPEND", parse_deps("x/y"))
+        # queued updates are visible
+        assert set(cache.get("cat/pkg-1", b"key")) == {"RDEPEND", "DEPEND"}
+        cache.flush()
+
+        cache = depset_cache.DepSetCache(path, readonly=True)
+        depsets = cache.get("cat/pkg-1", b"key")
+        assert depset_cache.decode(depsets["RDEPEND"]) == depset
+        # entries parsed from different sources aren't used
+        assert cache.get("cat/pkg-1", b"other") == {}
+        assert cache.get("cat/pkg-2", b"key") == {}
+
+    def test_stale_entry(self, tmp_path):
+        path = str(tmp_path / "depsets")
+        cache = depset_cache.DepSetCache(path)
+        cache.update("cat/pkg-1", b"old", "RDEPEND", parse_deps("a/b"))
+        cache.update("cat/pkg-1", b"new", "DEPEND", parse_deps("c/d"))
+        assert set(cache.get("cat/pkg-1", b"new")) == {"DEPEND"}
+
+    def test_merge(self, tmp_path):
+        path = str(tmp_path / "depsets")
+        first = depset_cache.DepSetCache(path)
+        second = depset_cache.DepSetCache(path)
+        first.update("cat/pkg-1", b"key", "RDEPEND", parse_deps("a/b"))
+        second.update("cat/pkg-2", b"key", "RDEPEND", parse_deps("c/d"))
+        first.flush()
+        second.flush()
+        cache = depset_cache.DepSetCache(path)
+        assert cache.get("cat/pkg-1", b"key")
+        assert cache.get("cat/pkg-2", b"key")
+
+    def test_append(self, tmp_path):
+        path = tmp_path / "depsets"
+        cache = depset_cache.DepSetCache(str(path))
+        cache.update("cat/pkg-1", b"key", "RDEPEND", parse_deps("a/b"))
+        cache.flush()
+        data = path.read_bytes()
+        cache = depset_cache.DepSetCache(str(path))
+        cache.update("cat/pkg-1", b"new", "RDEPEND", parse_deps("c/d"))
+        cache.flush()
+        # flushing appends to the existing file
+        assert path.read_bytes().startswith(data)
+        cache = depset_cache.DepSetCache(str(path))
+        assert not cache.get("cat/pkg-1", b"key")
+        assert cache.get("cat/pkg-1", b"new")
+
+        # truncated trailing entries are ignored
+        path.write_bytes(path.read_bytes()[:-1])
+        assert depset_cache.DepSetCache(str(path)).get("cat/pkg-1", b"key")
+
+    def test_prune(self, tmp_path):
+        path = tmp_path / "depsets"
+        cache = depset_cache.DepSetCache(str(path))
+        for i in range(3):
+            cache.update(f"cat/pkg-{i}", b"key", "RDEPEND", parse_deps("a/b"))
+            cache.flush()
+        size = path.stat().st_size
+        cache.update("cat/pkg-3", b"key", "RDEPEND", parse_deps("e/f"))
+        # entries of removed packages are dropped and the file is compacted
+        cache.prune({"cat/pkg-1", "cat/pkg-3"})
+        assert path.stat().st_size < size
+        cache = depset_cache.DepSetCache(str(path))
+        assert not cache.get("cat/pkg-0", b"key")
+        assert cache.get("cat/pkg-1", b"key")
+        assert not cache.get("cat/pkg-2", b"key")
+        assert cache.get("cat/pkg-3", b"key")
+
+    def test_readonly(self, tmp_path):
+        path = tmp_path / "depsets"
+        cache = depset_cache.DepSetCache(str(path), readonly=True)
+        cache.update("cat/pkg-1", b"key", "RDEPEND", parse_deps("a/b"))
+        cache.flush()
+        assert not path.exists()
+
+    def test_corrupt(self, tmp_path):
+        path = tmp_path / "depsets"
+        path.write_bytes(b"garbage")
+        assert depset_cache.DepSetCache(str(path)).get("cat/pkg-1", b"key") == {}
+
+
+class TestPackage:
+    def mk_pkg(self, cache, data):
+        parent = mock.Mock(_depset_cache=cache)
+        pkg = ebuild_src.base(parent, "cat/pkg-1")
+        object.__setattr__(pkg, "eapi", get_eapi("8"))
+        object.__setattr__(pkg, "data", dict(data))
+        return pkg
+
+    def test_cached_depsets(self, tmp_path):
+        data = {
+            "EAPI": "8",
+            "RDEPEND": "a/b ssl? ( dev-libs/openssl:= )",
+            "LICENSE": "|| ( MIT GPL-2 )",
+            "REQUIRED_USE": "^^ ( a b )",
+        }
+        cache = depset_cache.DepSetCache(str(tmp_path / "depsets"))
+        pkg = self.mk_pkg(cache, data)
+        rdepend, license, required_use = pkg.rdepend, pkg.license, pkg.required_use
+        cache.flush()
+
+        cache = depset_cache.DepSetCache(str(tmp_path / "depsets"))
+        pkg = self.mk_pkg(cache, data)
+        with mock.patch.object(conditionals.DepSet, "parse") as parse:
+            assert pkg.rdepend == rdepend
+            assert pkg.license == license
+            assert pkg.required_use == required_use
+            parse.assert_not_called()
+        # raw strings are still released
+        assert "RDEPEND" not in pkg.data
+
+        # changed sources force reparsing
+        pkg = self.mk_pkg(cache, dict(data, LICENSE="MIT"))
+        assert pkg.rdepend == rdepend
+        assert pkg.license == conditionals.DepSet.parse("MIT", str)
+
+    def test_location(self, tmp_path, cache_path):
+        metadata = flat_hash.md5_cache(str(tmp_path / "repo"))
+        cache = ebuild_src.package_factory._get_depset_cache((metadata,))
+        # synced repos aren't written to
+        assert cache.path.startswith(cache_path)
+        assert cache.path.endswith(f"{tmp_path}/repo/metadata/md5-cache.depsets")
+        assert ebuild_src.package_factory._get_depset_cache(()) is None
+
+    def test_no_cache(self):
+        pkg = self.mk_pkg(None, {"RDEPEND": "a/b"})
+        assert pkg.rdepend == parse_deps("a/b")
@@ -1,11 +1,35 @@
+import bz2
+import glob
 import io
+import os
+import subprocess
 import textwrap
 
 import pytest
+from pkgcore.const import EBD_PATH
+from pkgcore.ebuild import filter_env
 from pkgcore.ebuild.filter_env import main_run
 
+VDB_ENVS = sorted(glob.glob("/var/db/pkg/*/*/environment.bz2"))[:50]
+
+
+def use_raw_scanner(monkeypatch):
+    """Replace the accelerated scanner functions with the raw ones."""
+    for name in (
+        "is_function",
+        "is_envvar",
+        "walk_command_complex",
+        "walk_command_escaped_parsing",
+    ):
+        monkeypatch.setattr(filter_env, name, getattr(filter_env, f"raw_{name}"))
+
 
 class TestFilterEnv:
+    @pytest.fixture(autouse=True, params=("fast", "raw"))
+    def scanner(self, request, monkeypatch):
+        if request.param == "raw":
+            use_raw_scanner(monkeypatch)
+
     def get_output(
         self,
         raw_data,
@@ -267,3 +291,67 @@ class TestFilterEnv:
         l = set()
         self.get_output(data, global_envvar_callback=l.add)
         assert var_list == l
+
+
+class TestAccelerated:
+    """The accelerated scanner matches the raw one on real environments."""
+
+    @staticmethod
+    def filter(data, monkeypatch=None):
+        events = []
+        out = io.BytesIO()
+        with pytest.MonkeyPatch.context() as mp:
+            if monkeypatch:
+                use_raw_scanner(mp)
+            main_run(
+                out,
+                data,
+                vars_to_filter=["BASH_.*", "PKGCORE_.*", "P.*", "A"],
+                funcs_to_filter=["__.*", "die"],
+                global_envvar_callback=events.append,
+                func_callback=lambda *args: events.append(args),
+            )
+        return out.getvalue(), events
+
+    def assert_identical(self, data):
+        fast = self.filter(data)
+        assert fast == self.filter(data, monkeypatch=True)
+        return fast
+
+    @pytest.mark.parametrize(
+        "path",
+        sorted(
+            os.path.relpath(x, EBD_PATH)
+            for x in glob.glob(f"{EBD_PATH}/**/*", recursive=True)
+            if os.path.isfile(x) and not x.endswith((".pyc", "Makefile"))
+        ),
+    )
+    def test_ebd_libs(self, path):
+        with open(os.path.join(EBD_PATH, path), errors="surrogateescape") as f:
+            self.assert_identical(f.read())
+
+    def test_dumped_env(self):
+        # a saved env as dumped by bash with all the ebd functions loaded
+        script = (
+            "for f in isolated-functions.bash ebuild-default-functions.bash "
+            "ebuild-env-utils.bash eapi/*.bash; do source $f &>/dev/null; done; "
+            "X=$'a\\n\"b'; Y=( \"a b\" '$c' ); declare -p; declare -f"
+        )
+        data = subprocess.run(
+            ["bash", "--norc", "--noprofile", "-c", script],
+            cwd=EBD_PATH,
+            env={"PATH": os.environ.get("PATH", "")},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        out, events = self.assert_identical(data)
+        assert "__filter_env ()" in data
+        assert b"__filter_env ()" not in out
+        assert "__filter_env" in {x[1] for x in events}
+
+    @pytest.mark.skipif(not VDB_ENVS, reason="no vdb environments available")
+    @pytest.mark.parametrize("path", VDB_ENVS)
+    def test_vdb(self, path):
+        with bz2.open(path, "rt", errors="surrogateescape") as f:
+            self.assert_identical(f.read())
@@ -0,0 +1,343 @@
+import os
+import subprocess
+import threading
+from types import SimpleNamespace
+
+import pytest
+from pkgcore.const import EBD_PATH
+from pkgcore.ebuild import eclass_cache, ebd_ipc, processor, repo_objs, repository
+from pkgcore.package.errors import MetadataException
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    processor.shutdown_all_processors()
+    processor._pool.reset_stats()
+    yield
+    processor.configure_processor_pool(min_idle=0, max_idle=0, max_uses=0)
+    processor.shutdown_all_processors()
+    processor._pool.reset_stats()
+
+
+def test_prefork():
+    assert processor.prefork_ebuild_processors(2, sandbox=False) == 2
+    # available idle processors are counted
+    assert processor.prefork_ebuild_processors(3, sandbox=False) == 1
+    stats = processor.processor_pool_stats()
+    assert stats["spawned"] == 3
+    assert stats["idle"] == 3
+
+    ebp = processor.request_ebuild_processor(sandbox=False)
+    stats = processor.processor_pool_stats()
+    assert stats["requests"] == stats["reused"] == 1
+    assert stats["reuse_rate"] == 1.0
+    assert stats["spawned"] == 3
+    assert (stats["active"], stats["idle"]) == (1, 2)
+    assert processor.release_ebuild_processor(ebp)
+    assert not processor.release_ebuild_processor(ebp)
+
+
+def test_limits():
+    processor.prefork_ebuild_processors(3, sandbox=False)
+    processor.configure_processor_pool(max_idle=1)
+    stats = processor.processor_pool_stats()
+    assert stats["evicted"] == 2
+    assert stats["idle"] == 1
+
+    processor.configure_processor_pool(max_uses=2)
+    ebp = processor.request_ebuild_processor(sandbox=False)
+    assert not ebp.exhausted
+    ebp.uses = 2
+    assert ebp.exhausted
+    processor.release_ebuild_processor(ebp)
+    stats = processor.processor_pool_stats()
+    assert stats["recycled"] == 1
+    assert stats["idle"] == 0
+    assert not ebp.is_alive
+
+
+def test_thread_requests():
+    processor.prefork_ebuild_processors(1, sandbox=False)
+    ebps = []
+
+    def request():
+        ebps.append(processor.request_ebuild_processor(sandbox=False))
+
+    # idle processors are health checked outside of the main thread too
+    thread = threading.Thread(target=request)
+    thread.start()
+    thread.join()
+    assert ebps and ebps[0].is_responsive
+    assert processor.processor_pool_stats()["reused"] == 1
+    processor.release_ebuild_processor(ebps[0])
+
+
+def test_thread_expect_buffered():
+    ebp = object.__new__(processor.EbuildProcessor)
+    ebp._outstanding_expects = []
+    read, write = os.pipe()
+    ebp.ebd_read = os.fdopen(read, "rb")
+    ebp.ebd_write = None
+    try:
+        os.write(write, b"yep!\nyep!\n")
+        assert ebp.expect("yep!")
+        results = []
+
+        def expect():
+            results.append(ebp.expect("yep!", timeout=1))
+            results.append(ebp.expect("yep!", timeout=0.01))
+
+        # the second reply was already read into the buffer
+        thread = threading.Thread(target=expect)
+        thread.start()
+        thread.join()
+        assert results == [True, False]
+    finally:
+        ebp.ebd_read.close()
+        os.close(write)
+
+
+def test_min_idle():
+    processor.configure_processor_pool(min_idle=2, sandbox=False)
+    ebp = processor.request_ebuild_processor(sandbox=False)
+    processor.release_ebuild_processor(ebp)
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and thread.daemon:
+            thread.join(10)
+    assert processor.processor_pool_stats()["idle"] >= 2
+
+
+def make_repo(path, files=None):
+    """Create an ebuild repo at the given path from a mapping of files.
+
+    Without files, the repo already at the path is reloaded.
+    """
+    if files is not None:
+        files = {
+            "profiles/repo_name": "test\n",
+            "metadata/layout.conf": "masters =\n",
+            **files,
+        }
+        for name, data in files.items():
+            (path / name).parent.mkdir(parents=True, exist_ok=True)
+            (path / name).write_text(data)
+    location = str(path)
+    ec = eclass_cache.cache(f"{location}/eclass", location=location)
+    return repository.UnconfiguredTree(
+        location,
+        eclass_cache=ec,
+        repo_config=repo_objs.RepoConfig(location),
+        cache=(),
+    )
+
+
+class TestEclassSnapshot:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        return make_repo(
+            tmp_path,
+            {
+                "eclass/foo.eclass": "FOO=1\n",
+                "eclass/bar.eclass": "inherit foo\nBAR=$FOO\n",
+                "eclass/broken.eclass": "if true; then\n",
+                "cat/a/a-1.ebuild": 'EAPI=8\ninherit bar\nDESCRIPTION="a $BAR"\nSLOT=0\n',
+                "cat/b/b-1.ebuild": 'EAPI=8\ninherit foo\nDESCRIPTION="b $FOO"\nSLOT=0\n',
+            },
+        )
+
+    def test_snapshot(self, repo):
+        snapshot = processor.get_eclass_snapshot(repo.eclass_cache)
+        assert processor.get_eclass_snapshot(repo.eclass_cache) is snapshot
+        snapshot.add(["foo", "broken", "missing"])
+        assert set(snapshot.missing({})) == {"foo"}
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        assert ebp.load_eclass_snapshot(snapshot)
+        assert not snapshot.missing(ebp._preloaded_eclasses)
+        # nothing left to load
+        assert ebp.load_eclass_snapshot(snapshot)
+        assert ebp.is_responsive
+        processor.release_ebuild_processor(ebp)
+
+    def test_shared(self, repo, monkeypatch, tmp_path):
+        inherits = []
+        inherit_handler = processor.inherit_handler
+
+        def handler(ecache, ebp, line=None, updates=None):
+            inherits.append(line)
+            return inherit_handler(ecache, ebp, line, updates)
+
+        pkg_a, pkg_b = sorted(repo)
+        monkeypatch.setattr(processor, "inherit_handler", handler)
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        ebp.allow_eclass_caching(snapshot=True)
+        assert ebp.get_keys(pkg_a, repo.eclass_cache)["DESCRIPTION"] == "a 1"
+        assert sorted(inherits) == ["bar", "foo"]
+
+        # other processors load the inherited eclasses in one step
+        other = processor.EbuildProcessor(False, False)
+        other.allow_eclass_caching(snapshot=True)
+        keys = other.get_keys(pkg_b, repo.eclass_cache)
+        assert keys["DESCRIPTION"] == "b 1"
+        assert keys["INHERITED"] == "foo"
+        assert len(inherits) == 2
+        other.shutdown_processor()
+
+        # changed eclasses replace stale functions
+        (tmp_path / "eclass" / "foo.eclass").write_text("FOO=2\n")
+        repo = make_repo(tmp_path)
+        processor.get_eclass_snapshot(repo.eclass_cache).add(["foo", "bar"])
+        assert ebp.get_keys(pkg_a, repo.eclass_cache)["DESCRIPTION"] == "a 2"
+        assert len(inherits) == 2
+        ebp.disable_eclass_caching()
+        processor.release_ebuild_processor(ebp)
+
+
+class TestGetKeysBatch:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        return make_repo(
+            tmp_path,
+            {
+                "eclass/foo.eclass": "FOO=1\nfoo_src_compile() { :; }\n",
+                "cat/a/a-1.ebuild": 'EAPI=8\ninherit foo\nDESCRIPTION="a $FOO"\nSLOT=0\n',
+                "cat/b/b-1.ebuild": 'EAPI=8\nDESCRIPTION="b ü \n  x"\nSLOT=0\n',
+                "cat/c/c-1.ebuild": "EAPI=8\nSLOT=0\ndie broken\n",
+                "cat/d/d-1.ebuild": 'EAPI=8\nDESCRIPTION="d"\nSLOT=0\nIUSE="x y"\n',
+            },
+        )
+
+    def test_matches_get_keys(self, repo):
+        pkgs = [x for x in sorted(repo) if x.package != "c"]
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        expected = [ebp.get_keys(pkg, repo.eclass_cache) for pkg in pkgs]
+        assert list(ebp.get_keys_batch(pkgs, repo.eclass_cache)) == expected
+        assert expected[0]["INHERITED"] == "foo"
+        assert expected[1]["DESCRIPTION"] == "b ü x"
+        assert ebp.is_responsive
+        processor.release_ebuild_processor(ebp)
+
+    def test_large_batch(self, repo, monkeypatch):
+        # envs are split across multiple writes
+        monkeypatch.setattr(processor, "_METADATA_BATCH_SIZE", 1)
+        pkg = sorted(repo)[1]
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        results = list(ebp.get_keys_batch([pkg] * 5, repo.eclass_cache))
+        assert len(results) == 5
+        assert all(x["DESCRIPTION"] == "b ü x" for x in results)
+        processor.release_ebuild_processor(ebp)
+
+    @pytest.mark.parametrize("interrupt", (False, True))
+    def test_abandoned(self, repo, interrupt):
+        pkgs = [x for x in sorted(repo) if x.package != "c"]
+        helper = repository._RegenOpHelper(repo, eclass_caching=False)
+        ebp = helper.ebp
+        batch = helper.batch(pkgs)
+        assert next(batch)[0] == pkgs[0]
+        if interrupt:
+            with pytest.raises(KeyboardInterrupt):
+                batch.throw(KeyboardInterrupt)
+        else:
+            batch.close()
+        # the processor left with pending responses is replaced
+        assert not ebp.is_alive
+        assert helper.ebp is not ebp
+        assert helper.ebp.is_responsive
+        assert [x for x, _ in helper.batch(pkgs)] == pkgs
+        helper.release_ebp()
+
+    def test_failure(self, repo):
+        # iterating the repo skips packages with invalid metadata
+        pkgs = [repo[("cat", x, "1")] for x in "abcd"]
+        ebp = processor.request_ebuild_processor(sandbox=False)
+        results = list(pkgs[0]._parent._update_metadata_batch(pkgs, ebp))
+        assert [pkg.package for pkg, _ in results] == ["a", "b", "c", "d"]
+        data = {pkg.package: x for pkg, x in results}
+        assert isinstance(data["c"], MetadataException)
+        assert data["b"]["DESCRIPTION"] == "b ü x"
+        # remaining packages are regenerated after the processor died
+        assert not ebp.is_alive
+        assert data["d"]["IUSE"] == "x y"
+
+
+class TestProtocol:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        ebuild = (
+            'EAPI=8\nDESCRIPTION="$(__ebd_ipc_cmd join "" "${A}" "${B[@]}")"\nSLOT=0\n'
+        )
+        return make_repo(
+            tmp_path,
+            {
+                "cat/a/a-1.ebuild": ebuild,
+                "cat/b/b-1.ebuild": (
+                    'EAPI=8\nDESCRIPTION="b ü"\nSLOT=0\nexport LC_ALL=C.UTF-8\nX="ä€"\n'
+                ),
+            },
+        )
+
+    class Join(ebd_ipc.IpcCommand):
+        def run(self, args):
+            return ",".join(args)
+
+    @pytest.mark.parametrize("protocol", (1, 2, 3))
+    def test_negotiation(self, protocol):
+        ebp = processor.EbuildProcessor(False, False, protocol=protocol)
+        assert ebp.protocol == min(protocol, processor.EBD_PROTOCOL)
+        assert ebp.is_responsive
+        ebp.shutdown_processor()
+
+    @pytest.mark.parametrize("protocol", (1, 2))
+    def test_ipc(self, repo, protocol):
+        pkg = repo[("cat", "a", "1")]
+        join = self.Join(SimpleNamespace(pkg=pkg, observer=None))
+        env = {"A": "a", "B": ("b", "c")}
+        if protocol > 1:
+            # values are passed verbatim
+            env = {"A": "'\"$a\\n`a`\x1e\x1f1", "B": ("$b'\x1d", "c\\")}
+        keys = {}
+
+        def receive_metadata(ebp, line):
+            keys.update(processor._parse_metadata(ebp._read_size(int(line))))
+
+        ebp = processor.EbuildProcessor(False, False, protocol=protocol)
+        env.update(ebp._metadata_env(pkg))
+        ebp._ensure_metadata_paths(("/dev/null",))
+        ebp._run_depend_like_phase(
+            "gen_metadata",
+            pkg,
+            repo.eclass_cache,
+            env=env,
+            extra_commands={
+                "join": join,
+                "key": lambda ebp, line: keys.update([line.split("=", 1)]),
+                "metadata": receive_metadata,
+            },
+        )
+        assert keys["DESCRIPTION"] == ",".join([env["A"], *env["B"]])
+        assert ebp.is_responsive
+        ebp.shutdown_processor()
+
+    def test_ebuild_environment(self, repo):
+        # sizes are sent in bytes regardless of the locale set by the ebuild
+        pkg = repo[("cat", "b", "1")]
+        ebp = processor.EbuildProcessor(False, False)
+        env = ebp.get_ebuild_environment(pkg, repo.eclass_cache)
+        assert "ä€" in env
+        assert env.endswith("}")
+        assert ebp.is_responsive
+        ebp.shutdown_processor()
+
+    def test_write_sized(self):
+        # used without gawk to send the ebuild environment
+        script = (
+            "source ebuild-daemon-lib.bash; PKGCORE_EBD_WRITE_FD=1; "
+            '__ebd_write_sized receive_env "ä€"'
+        )
+        out = subprocess.run(
+            ["bash", "--norc", "--noprofile", "-c", script],
+            cwd=EBD_PATH,
+            env={"PATH": os.environ["PATH"], "LC_ALL": "C.UTF-8"},
+            capture_output=True,
+            check=True,
+        ).stdout
+        assert out == b"receive_env 5\n" + "ä€".encode()
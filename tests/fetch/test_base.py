@@ -1,4 +1,5 @@
 import os
+import threading
 from functools import partial
 
 import pytest
@@ -124,3 +125,28 @@ class TestFetcher:
         alt_handlers = {chf: partial(f, chf) for chf in chksums}
         assert None == self.fetcher._verify(self.fp, self.obj, handlers=alt_handlers)
         assert sorted(l) == sorted(alt_handlers)
+
+
+class TestHostLimiter:
+    def test_invalid_limit(self):
+        with pytest.raises(ValueError):
+            base.HostLimiter(0)
+
+    def test_per_host_limit(self):
+        limiter = base.HostLimiter(1)
+        with limiter("http://foo.org/a"):
+            # other hosts aren't blocked
+            with limiter("http://bar.org/a"):
+                pass
+            # same host is blocked
+            acquired = threading.Event()
+
+            def fetch():
+                with limiter("https://foo.org/b"):
+                    acquired.set()
+
+            t = threading.Thread(target=fetch)
+            t.start()
+            assert not acquired.wait(0.1)
+        t.join()
+        assert acquired.is_set()
@@ -17,6 +17,18 @@ class TestFetchable:
         assert_uri(o.uri, ["asdf"])
         assert o.chksums == {"asdf": 1}
 
+    def test_rotate_mirrors(self):
+        uris = fetch.uri_list("dar")
+        uris.add_mirror(fetch.mirror(["a", "b", "c"], "tier"))
+        o = fetch.fetchable("dar", uri=uris, chksums={"asdf": 1})
+        rotated = o.rotate_mirrors(2)
+        assert rotated.filename == o.filename
+        assert rotated.chksums == o.chksums
+        assert_uri(rotated.uri, ["c/dar", "a/dar", "b/dar"])
+        # plain uri sequences are returned as is
+        o = fetch.fetchable("dar", uri=["asdf"])
+        assert o.rotate_mirrors(1) is o
+
     def test_eq_ne(self):
         o1 = fetch.fetchable("dar", uri=["asdf"], chksums={"asdf": 1})
         assert o1 == o1
@@ -56,6 +68,13 @@ class TestMirror:
         assert mirror == self.kls(self.default_mirrors, "fork")
         assert mirror != self.kls(self.default_mirrors + ["http://fark"], "fork")
 
+    def test_rotate(self, mirror):
+        assert mirror.rotate(0) == mirror
+        rotated = mirror.rotate(1)
+        assert isinstance(rotated, self.kls)
+        assert list(rotated) == self.default_mirrors[1:] + self.default_mirrors[:1]
+        assert mirror.rotate(len(self.default_mirrors)) == mirror
+
 
 class TestDefaultMirror(TestMirror):
     kls = fetch.default_mirror
@@ -86,6 +105,19 @@ class Test_uri_list:
         uril.add_mirror(mirror, "foon/boon")
         assert_uri(uril, ["me/cows", "WI/cows", "me/foon/boon", "WI/foon/boon"])
 
+    def test_rotate_mirrors(self, uril):
+        uril.add_uri("blarn")
+        uril.add_mirror(fetch.mirror(["me", "WI"], "asdf"))
+        uril.add_mirror(fetch.mirror(["me", "WI"], "asdf"), "foon/boon")
+        assert_uri(
+            uril.rotate_mirrors(1),
+            ["blarn", "WI/cows", "me/cows", "WI/foon/boon", "me/foon/boon"],
+        )
+        # original is left untouched
+        assert_uri(
+            uril, ["blarn", "me/cows", "WI/cows", "me/foon/boon", "WI/foon/boon"]
+        )
+
     def test_uris(self, uril):
         uril.add_uri("blar")
         assert_uri(uril, ["blar"])
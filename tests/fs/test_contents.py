@@ -12,6 +12,8 @@ mk_fifo = partial(fs.fsFifo, strict=False)
 
 
 class TestContentsSet:
+    kls = contents.contentsSet
+
     files = list(
         map(
             mk_file,
@@ -37,15 +39,15 @@ class TestContentsSet:
 
     def test_init(self):
         with pytest.raises(TypeError):
-            contents.contentsSet(self.all + [1])
-        contents.contentsSet(self.all)
-        contents.contentsSet(self.all, mutable=True)
+            self.kls(self.all + [1])
+        self.kls(self.all)
+        self.kls(self.all, mutable=True)
         # test to ensure no one screwed up the optional initials
         # making it mandatory
-        assert len(contents.contentsSet()) == 0
+        assert len(self.kls()) == 0
 
     def test_add(self):
-        cs = contents.contentsSet(self.files + self.dirs, mutable=True)
+        cs = self.kls(self.files + self.dirs, mutable=True)
         for x in self.links:
             cs.add(x)
             assert x in cs
@@ -53,7 +55,7 @@ class TestContentsSet:
             set(x.location for x in self.files + self.dirs + self.links)
         )
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).add(self.devs[0])
+            self.kls(mutable=False).add(self.devs[0])
         with pytest.raises(TypeError):
             cs.add(1)
         with pytest.raises(TypeError):
@@ -61,13 +63,13 @@ class TestContentsSet:
 
     def test_remove(self):
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).remove(self.devs[0])
+            self.kls(mutable=False).remove(self.devs[0])
         with pytest.raises(AttributeError):
-            contents.contentsSet(mutable=False).remove(1)
-        cs = contents.contentsSet(self.all, mutable=True)
+            self.kls(mutable=False).remove(1)
+        cs = self.kls(self.all, mutable=True)
         for x in self.all:
             cs.remove(x)
-        cs = contents.contentsSet(self.all, mutable=True)
+        cs = self.kls(self.all, mutable=True)
         for location in (x.location for x in self.all):
             cs.remove(location)
         assert len(cs) == 0
@@ -75,7 +77,7 @@ class TestContentsSet:
             cs.remove(self.all[0])
 
     def test_contains(self):
-        cs = contents.contentsSet(mutable=True)
+        cs = self.kls(mutable=True)
         for x in [
             y[0] for y in [self.files, self.dirs, self.links, self.devs, self.fifos]
         ]:
@@ -87,13 +89,13 @@ class TestContentsSet:
             cs.remove(x)
 
     def test_clear(self):
-        cs = contents.contentsSet(self.all, mutable=True)
+        cs = self.kls(self.all, mutable=True)
         assert len(cs) > 0
         cs.clear()
         assert len(cs) == 0
 
     def test_len(self):
-        assert len(contents.contentsSet(self.all)) == len(self.all)
+        assert len(self.kls(self.all)) == len(self.all)
 
     fs_types = (
         pytest.param("files", fs.fsFile, id="files"),
@@ -106,7 +108,7 @@ class TestContentsSet:
     @pytest.mark.parametrize(("name", "obj_class"), fs_types)
     def test_iterobj(self, name, obj_class):
         s = set(getattr(self, name))
-        cs = contents.contentsSet(s)
+        cs = self.kls(s)
         forced_name = "iter" + name
 
         s2 = set(getattr(cs, forced_name)())
@@ -127,7 +129,7 @@ class TestContentsSet:
     @pytest.mark.parametrize(("name", "obj_class"), fs_types)
     def test_listobj(self, name, obj_class):
         valid_list = getattr(self, name)
-        cs = contents.contentsSet(valid_list)
+        cs = self.kls(valid_list)
         test_list = getattr(cs, name)()
         if obj_class is not None:
             for x in test_list:
@@ -136,7 +138,7 @@ class TestContentsSet:
 
     def test_iterobj_all(self):
         s = set(self.all)
-        assert set(contents.contentsSet(s)) == s
+        assert set(self.kls(s)) == s
 
     def test_check_instance(self):
         for x in [
@@ -153,7 +155,7 @@ class TestContentsSet:
                 [fs.fsFile("/tmp", strict=False)],
             )
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(c2)
             c3 = c1
@@ -161,7 +163,7 @@ class TestContentsSet:
             c3 = getattr(c1, name)(c2)
         assert set(ret) == {x.location for x in c3}
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(iter(c2))
             c3 = c1
@@ -213,7 +215,7 @@ class TestContentsSet:
                 [fs.fsFile("/tmp", strict=False)],
             )
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(c2)
             c3 = c1
@@ -221,7 +223,7 @@ class TestContentsSet:
             c3 = getattr(c1, name)(c2)
         assert {x.location for x in c3} == ret
 
-        c1, c2 = [contents.contentsSet(x) for x in source]
+        c1, c2 = [self.kls(x) for x in source]
         if name.endswith("_update"):
             getattr(c1, name)(iter(c2))
             c3 = c1
@@ -232,8 +234,8 @@ class TestContentsSet:
     del f, fstrings
 
     def check_complex_set_op(self, name, required, data1, data2):
-        cset1 = contents.contentsSet(data1)
-        cset2 = contents.contentsSet(data2)
+        cset1 = self.kls(data1)
+        cset2 = self.kls(data2)
         f = getattr(cset1, name)
         got = f(cset2)
         assert (
@@ -297,14 +299,12 @@ class TestContentsSet:
     def test_child_nodes(self):
         assert {"/usr", "/usr/bin", "/usr/foo"} == {
             x.location
-            for x in contents.contentsSet(
-                [mk_dir("/usr"), mk_dir("/usr/bin"), mk_file("/usr/foo")]
-            )
+            for x in self.kls([mk_dir("/usr"), mk_dir("/usr/bin"), mk_file("/usr/foo")])
         }
 
     def test_map_directory_structure(self):
-        old = contents.contentsSet([mk_dir("/dir"), mk_link("/sym", "dir")])
-        new = contents.contentsSet([mk_file("/sym/a"), mk_dir("/sym")])
+        old = self.kls([mk_dir("/dir"), mk_link("/sym", "dir")])
+        new = self.kls([mk_file("/sym/a"), mk_dir("/sym")])
         # verify the machinery is working as expected.
         ret = new.map_directory_structure(old)
         assert set(ret) == {mk_dir("/dir"), mk_file("/dir/a")}
@@ -325,7 +325,7 @@ class TestContentsSet:
 
     def test_add_missing_directories(self):
         src = [mk_file("/dir1/a"), mk_file("/dir2/dir3/b"), mk_dir("/dir1/dir4")]
-        cs = contents.contentsSet(src)
+        cs = self.kls(src)
         cs.add_missing_directories()
         assert {x.location for x in cs} == {
             "/dir1",
@@ -344,7 +344,7 @@ class TestContentsSet:
             target = {k: set(v) for k, v in target.items()}
             assert d == target
 
-        cs = contents.contentsSet()
+        cs = self.kls()
         f1 = mk_file("/f", dev=1, inode=1)
         cs.add(f1)
         check_it({(1, 1): [f1]})
@@ -362,6 +362,62 @@ class TestContentsSet:
         check_it({(1, 1): [f1, f4], (1, 2): [f2], (2, 1): [f3]})
 
 
+class TestSortedContentsSet(TestContentsSet):
+    kls = contents.SortedContentsSet
+
+    def test_child_range(self):
+        cs = self.kls(
+            [
+                mk_dir("/usr"),
+                mk_dir("/usr/bin"),
+                mk_file("/usr/bin/foo"),
+                mk_file("/usr/bin-extra"),
+                mk_file("/usr/bin0"),
+                mk_file("/usr-foo"),
+                mk_link("/lib", "/usr/bin"),
+            ]
+        )
+        assert {x.location for x in cs.iter_child_nodes("/usr")} == {
+            "/usr/bin",
+            "/usr/bin/foo",
+            "/usr/bin-extra",
+            "/usr/bin0",
+        }
+        assert {x.location for x in cs.child_nodes("/usr/bin/")} == {"/usr/bin/foo"}
+        # symlinks are followed
+        assert {x.location for x in cs.child_nodes(cs["/lib"])} == {"/usr/bin/foo"}
+        assert len(cs.child_nodes("/")) == len(cs)
+        assert not cs.child_nodes("/usr/bin/foo")
+
+    def test_index_updates(self):
+        cs = self.kls([mk_dir("/usr"), mk_file("/usr/foo")], mutable=True)
+        assert len(cs.child_nodes("/usr")) == 1
+        cs.add(mk_file("/usr/bar"))
+        cs.update([mk_file("/usr/baz"), mk_file("/usr/foo"), mk_dir("/etc")])
+        cs.remove("/usr/foo")
+        cs.discard(mk_file("/usr/baz"))
+        assert cs._sorted == sorted(cs._dict)
+        assert {x.location for x in cs.child_nodes("/usr")} == {"/usr/bar"}
+        cs.difference_update(["/usr/bar/"])
+        cs.intersection_update(self.kls([mk_dir("/usr")]))
+        assert cs._sorted == ["/usr"]
+        cs.clear()
+        assert not cs.child_nodes("/usr")
+
+    def test_set_op_results(self):
+        old = self.kls([mk_dir("/usr"), mk_file("/usr/a"), mk_file("/usr/b")])
+        new = contents.contentsSet([mk_dir("/usr"), mk_file("/usr/b", mtime=1)])
+        removed = old.difference(new)
+        assert isinstance(removed, self.kls)
+        assert removed._sorted == ["/usr/a"]
+        replaced = old.intersection(new)
+        assert isinstance(replaced, self.kls)
+        # objects are taken from the other set
+        assert replaced["/usr/b"].mtime == 1
+        assert old.clone() == old
+        assert old.clone()._sorted is not old._sorted
+
+
 class Test_offset_rewriting:
     change_offset = staticmethod(contents.change_offset_rewriter)
     offset_insert = staticmethod(contents.offset_rewriter)
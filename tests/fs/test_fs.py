@@ -136,6 +136,20 @@ class Test_fsFile(base):
         obj2 = self.make_obj(__file__, chksums={1: 2})
         assert obj2.chksums is obj2.change_attributes(data=data_source).chksums
 
+    def test_load_chksums(self, tmp_path):
+        (path := tmp_path / "file").write_text("data")
+        obj = self.make_obj(str(path))
+        obj.load_chksums()
+        # checksums don't have to be read from the file anymore
+        path.unlink()
+        assert dict(obj.chksums) == dict(
+            zip(obj.chksums, get_chksums(data_source("data"), *obj.chksums))
+        )
+        # not lazily loaded checksums are left alone
+        obj = self.make_obj(chksums={"md5": 1})
+        obj.load_chksums()
+        assert obj.chksums == {"md5": 1}
+
 
 class Test_fsLink(base):
     kls = fs.fsLink
@@ -1,10 +1,11 @@
 import os
+import shutil
 from pathlib import Path
 
 import pytest
 
 from pkgcore.fs import contents, fs, livefs, ops
-from snakeoil.data_source import local_source
+from snakeoil.data_source import data_source, local_source
 
 
 def verify(obj, kwds):
@@ -76,6 +77,12 @@ class TestCopyFile:
         assert dest.read_text() == content
         verify(o, kwds)
 
+    def test_data_source(self, tmp_path):
+        dest = tmp_path / "dest"
+        o = fs.fsFile(str(dest), data=data_source("content"), strict=False)
+        assert ops.copyfile(o)
+        assert dest.read_text() == "content"
+
     def test_sym_perms(self, tmp_path):
         curgid = os.getgid()
         group = [x for x in os.getgroups() if x != curgid]
@@ -172,6 +179,57 @@ class TestMergeContents(ContentsMixin):
         ops.merge_contents(cset, offset=dest, callback=s.remove)
         assert not s
 
+    def test_parallel(self, tmp_path):
+        src = tmp_path / "src"
+        entries = {f"dir{i}": ["dir"] for i in range(5)}
+        entries.update(
+            {f"dir{i}/file{j}": ["reg"] for i in range(5) for j in range(20)}
+        )
+        entries.update({f"dir{i}/sym": ["sym", "file0"] for i in range(5)})
+        self.generate_tree(src, entries)
+        for i in range(5):
+            (src / f"dir{i}" / "file1").write_text(f"content {i}\n" * 1000)
+            os.link(src / f"dir{i}" / "file1", src / f"dir{i}" / "hardlink")
+        cset = livefs.scan(str(src), offset=str(src))
+        (dest := tmp_path / "dest").mkdir()
+        merged = []
+        assert ops.merge_contents(
+            cset, offset=str(dest), callback=merged.append, parallelism=4, chksums=True
+        )
+        assert cset == livefs.scan(str(dest), offset=str(dest))
+        for i in range(5):
+            path = dest / f"dir{i}"
+            assert (path / "file1").read_text() == f"content {i}\n" * 1000
+            assert os.path.samefile(path / "file1", path / "hardlink")
+        # directories are reported before all other entries
+        assert all(x.is_dir for x in merged[:5])
+        assert len(merged) == len(cset)
+        # checksums were generated while merging, the source isn't reread
+        shutil.rmtree(src)
+        assert all(dict(x.chksums) for x in cset.iterfiles())
+
+    def test_parallel_missing_parents(self, tmp_path):
+        (src := tmp_path / "src").write_text("data")
+        cset = contents.contentsSet(
+            livefs.gen_obj(str(src)).change_attributes(location=f"/a/b/file{i}")
+            for i in range(5)
+        )
+        (dest := tmp_path / "dest").mkdir()
+        assert ops.merge_contents(cset, offset=str(dest), parallelism=4)
+        for i in range(5):
+            assert (dest / "a" / "b" / f"file{i}").read_text() == "data"
+
+    def test_parallel_failure(self, tmp_path):
+        (src := tmp_path / "src").write_text("data")
+        (dest := tmp_path / "dest").mkdir()
+        # regular files can't be merged over directories
+        (dest / "file").mkdir()
+        cset = contents.contentsSet(
+            [livefs.gen_obj(str(src)).change_attributes(location="/file")]
+        )
+        with pytest.raises(ops.CannotOverwrite):
+            ops.merge_contents(cset, offset=str(dest), parallelism=4)
+
     def test_dangling_symlink(self, tmp_path):
         src = self.generate_tree(tmp_path / "src", {"dir": ["dir"]})
         cset = livefs.scan(src, offset=src)
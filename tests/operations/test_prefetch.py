@@ -0,0 +1,97 @@
+import pytest
+from pkgcore.fetch import fetchable
+from pkgcore.operations.prefetch import Prefetcher
+
+
+class FakeOp:
+    def __init__(self, name, desc="add", size=0):
+        self.desc = desc
+        self.pkg = FakePkg(name, size)
+
+
+class FakePkg:
+    def __init__(self, name, size):
+        self.name = name
+        self.fetchables = (fetchable(name, chksums={"size": size}),)
+
+
+class FakePkgOps:
+    def __init__(self, domain, pkg):
+        self.domain = domain
+        self.pkg = pkg
+
+    def run_if_supported(self, op, or_return=None, jobs=None):
+        assert op == "fetch"
+        self.domain.fetched.append(self.pkg.name)
+        if self.pkg.name in self.domain.failures:
+            raise RuntimeError(self.pkg.name)
+        return True
+
+
+class FakeDomain:
+    def __init__(self, distdir, failures=()):
+        self.distdir = distdir
+        self.failures = failures
+        self.fetched = []
+
+    def get_pkg_operations(self, pkg, observer=None):
+        return FakePkgOps(self, pkg)
+
+
+class TestPrefetcher:
+    def test_fetch_order(self, tmp_path):
+        domain = FakeDomain(str(tmp_path))
+        ops = [FakeOp("a"), FakeOp("b", desc="remove"), FakeOp("c"), FakeOp("d")]
+        prefetcher = Prefetcher(domain, ops, depth=2)
+        try:
+            for idx in (0, 2, 3):
+                pkg_ops, ret = prefetcher.fetch(idx)
+                assert ret
+                assert pkg_ops.pkg is ops[idx].pkg
+        finally:
+            prefetcher.close()
+        # removals aren't fetched
+        assert domain.fetched == ["a", "c", "d"]
+
+    def test_failures(self, tmp_path):
+        domain = FakeDomain(str(tmp_path), failures=("b",))
+        ops = [FakeOp("a"), FakeOp("b"), FakeOp("c")]
+        prefetcher = Prefetcher(domain, ops, depth=2)
+        try:
+            assert prefetcher.fetch(0)[1]
+            # exceptions are raised when the related op is reached
+            with pytest.raises(RuntimeError, match="b"):
+                prefetcher.fetch(1)
+            assert prefetcher.fetch(2)[1]
+        finally:
+            prefetcher.close()
+
+    def test_size_limit(self, tmp_path):
+        domain = FakeDomain(str(tmp_path))
+        ops = [FakeOp("a", size=10), FakeOp("b", size=10), FakeOp("c", size=10)]
+        (tmp_path / "c").write_bytes(b"x" * 10)
+        prefetcher = Prefetcher(domain, ops, depth=5, max_size=15)
+        try:
+            prefetcher._schedule(0)
+            # b exceeds the size limit while a is pending
+            assert set(prefetcher._futures) == {0}
+            assert prefetcher.pending_size == 10
+            prefetcher.fetch(0)
+            # c is already fully fetched so doesn't count against the limit
+            assert set(prefetcher._futures) == {1, 2}
+            assert prefetcher.pending_size == 10
+            prefetcher.fetch(1)
+            prefetcher.fetch(2)
+            assert prefetcher.pending_size == 0
+        finally:
+            prefetcher.close()
+
+    def test_depth(self, tmp_path):
+        domain = FakeDomain(str(tmp_path))
+        ops = [FakeOp(str(x)) for x in range(5)]
+        prefetcher = Prefetcher(domain, ops, depth=1)
+        try:
+            prefetcher.fetch(0)
+            assert set(prefetcher._futures) == {1}
+        finally:
+            prefetcher.close()
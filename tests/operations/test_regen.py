@@ -0,0 +1,268 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from pkgcore.cache import flat_hash
+from pkgcore.ebuild import depset_cache, eclass_cache, repo_objs, repository
+from pkgcore.operations import regen
+from pkgcore.restrictions import packages
+from snakeoil.chksum import LazilyHashedPath
+
+from ..cache import test_base
+
+
+class FakePkg:
+    def __init__(self, cpvstr, fail=False):
+        self.cpvstr = cpvstr
+        self.fail = fail
+
+    @property
+    def keywords(self):
+        if self.fail:
+            raise ValueError(f"{self.cpvstr} failed in {os.getpid()}")
+        return ("amd64",)
+
+
+class FakeOperations:
+    def __init__(self):
+        self.flushed = 0
+
+    def run_if_supported(self, name):
+        assert name == "flush_cache"
+        self.flushed += 1
+
+
+class FakeRepo:
+    location = "/fake/repo"
+
+    def __init__(self):
+        self.operations = FakeOperations()
+
+
+class TestRegenRepository:
+    def pkgs(self):
+        return [FakePkg(f"cat/pkg-{i}", fail=not i % 10) for i in range(100)]
+
+    def test_threads(self):
+        pkgs = self.pkgs()
+        errors = list(regen.regen_repository(FakeRepo(), pkgs, None, threads=4))
+        assert sorted(pkg.cpvstr for pkg, _ in errors) == sorted(
+            pkg.cpvstr for pkg in pkgs if pkg.fail
+        )
+
+    @pytest.mark.parametrize("processes", (2, 4))
+    def test_processes(self, processes):
+        pkgs = self.pkgs()
+        errors = list(
+            regen.regen_repository(
+                FakeRepo(), pkgs, None, threads=processes * 2, processes=processes
+            )
+        )
+        failed = {pkg.cpvstr for pkg in pkgs if pkg.fail}
+        assert sorted(pkg.cpvstr for pkg, _ in errors) == sorted(failed)
+        for pkg, e in errors:
+            # the original package objects and errors are returned
+            assert pkg in pkgs
+            assert isinstance(e, ValueError)
+            # regen occurred in worker processes
+            assert str(os.getpid()) not in str(e)
+
+    def test_worker_failure(self):
+        repo = FakeRepo()
+        repo.operations = None
+        with pytest.raises(RuntimeError, match="worker process failed"):
+            list(regen.regen_repository(repo, self.pkgs(), None, processes=2))
+
+
+class TestChangedPackages:
+    @pytest.fixture
+    def location(self, request, tmp_path):
+        """Repo location, optionally a subdir of the test dir."""
+        return tmp_path / getattr(request, "param", "")
+
+    @pytest.fixture
+    def repo(self, location):
+        (location / "profiles").mkdir(parents=True)
+        (location / "profiles" / "categories").write_text("cat\n")
+        (location / "metadata").mkdir()
+        (location / "metadata" / "layout.conf").write_text("masters =\n")
+        (location / "eclass").mkdir()
+        (location / "eclass" / "foo.eclass").write_text("\n")
+        for cpv in ("cat/pkg-1", "cat/pkg-2", "cat/other-1"):
+            category, pv = cpv.split("/")
+            (path := location / category / pv.rsplit("-", 1)[0]).mkdir(
+                parents=True, exist_ok=True
+            )
+            (path / f"{pv}.ebuild").write_text("EAPI=8\n")
+        for path in location.rglob("*"):
+            os.utime(path, (1000, 1000))
+
+        cache = test_base.DictCache(auxdbkeys=("_eclasses_",))
+        cache["cat/other-1"] = {
+            "_eclasses_": {"foo": LazilyHashedPath("/foo.eclass", mtime=1000)}
+        }
+        cache["cat/pkg-1"] = {}
+
+        def mk_repo():
+            eclasses = eclass_cache.cache(str(location / "eclass"))
+            return repository.UnconfiguredTree(
+                str(location), eclass_cache=eclasses, cache=(cache,)
+            )
+
+        return mk_repo
+
+    def changed(self, mk_repo, journal):
+        repo = mk_repo()
+        pkgs = list(repo.itermatch(packages.AlwaysTrue, pkg_filter=None))
+        changed = regen.changed_packages(repo, pkgs, journal)
+        if changed is None:
+            return None
+        return sorted(pkg.cpvstr for pkg in changed)
+
+    def test_journal(self, repo, tmp_path):
+        path = str(tmp_path / "journal")
+        repo = repo()
+        assert regen.read_journal(path, repo) is None
+        regen.write_journal(path, repo, 2000)
+        regen.write_journal(path, FakeRepo(), 3000)
+        assert regen.read_journal(path, repo) == {
+            "timestamp": 2000,
+            "commit": None,
+            "failed": [],
+        }
+        (tmp_path / "journal").write_text("{")
+        assert regen.read_journal(path, repo) is None
+
+    @staticmethod
+    def touch(path, timestamp):
+        """Modify a file after the given time, keeping its old mtime."""
+        os.utime(path, (1000, 1000))
+        # wait for the change time to be distinguishable on coarse clocks
+        while path.stat().st_ctime <= timestamp:
+            time.sleep(0.001)
+            os.utime(path, (1000, 1000))
+
+    def test_mtime(self, repo, tmp_path):
+        timestamp = max(x.stat().st_ctime for x in tmp_path.rglob("*"))
+        journal = {"timestamp": timestamp, "commit": None}
+        assert self.changed(repo, journal) == []
+        os.utime(tmp_path / "cat" / "pkg" / "pkg-2.ebuild", (10**10, 10**10))
+        assert self.changed(repo, journal) == ["cat/pkg-2"]
+        # pkgs that previously failed are always affected
+        assert self.changed(repo, dict(journal, failed=["cat/pkg-1"])) == [
+            "cat/pkg-1",
+            "cat/pkg-2",
+        ]
+        # files copied with their original mtimes are detected too
+        self.touch(tmp_path / "cat" / "pkg" / "pkg-1.ebuild", timestamp)
+        assert self.changed(repo, journal) == ["cat/pkg-1", "cat/pkg-2"]
+        # packages inheriting changed eclasses are affected
+        self.touch(tmp_path / "eclass" / "foo.eclass", timestamp)
+        assert self.changed(repo, journal) == ["cat/other-1", "cat/pkg-1", "cat/pkg-2"]
+        # global changes affect everything
+        self.touch(tmp_path / "metadata" / "layout.conf", timestamp)
+        assert self.changed(repo, journal) is None
+
+    @pytest.mark.skipif(not shutil.which("git"), reason="requires git")
+    @pytest.mark.parametrize("location", ("", "repo"), indirect=True)
+    def test_git(self, repo, location, tmp_path):
+        git = ["git", "-C", str(tmp_path), "-c", "user.name=a", "-c", "user.email=a@a"]
+        subprocess.run(git + ["init", "-q"], check=True)
+        subprocess.run(git + ["add", "."], check=True)
+        subprocess.run(git + ["commit", "-q", "-m", "init"], check=True)
+        commit = regen.git_head(repo())
+        assert commit is not None
+        # mtimes are ignored in favor of git
+        journal = {"timestamp": 10**10, "commit": commit}
+        assert self.changed(repo, journal) == []
+        (location / "cat" / "pkg" / "pkg-1.ebuild").write_text("EAPI=7\n")
+        (location / "cat" / "pkg" / "pkg-3.ebuild").write_text("EAPI=8\n")
+        # changes outside the repo are ignored
+        (tmp_path / "pkg-4.ebuild").write_text("EAPI=8\n")
+        assert self.changed(repo, journal) == ["cat/pkg-1", "cat/pkg-3"]
+        (location / "eclass" / "foo.eclass").unlink()
+        assert self.changed(repo, journal) == ["cat/other-1", "cat/pkg-1", "cat/pkg-3"]
+
+
+class TestRegenCache:
+    @pytest.fixture
+    def repo(self, tmp_path):
+        for path, data in (
+            ("profiles/repo_name", "test\n"),
+            ("metadata/layout.conf", "masters =\n"),
+            ("eclass/foo.eclass", "FOO=1\n"),
+            ("cat/a/a-1.ebuild", "EAPI=8\ninherit foo\nSLOT=0\n"),
+            ("cat/b/b-1.ebuild", "EAPI=8\nSLOT=0\n"),
+        ):
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text(data)
+
+        def mk_repo():
+            location = str(tmp_path)
+            eclasses = eclass_cache.cache(f"{location}/eclass", location=location)
+            return repository.UnconfiguredTree(
+                location,
+                eclass_cache=eclasses,
+                repo_config=repo_objs.RepoConfig(location),
+                cache=(flat_hash.md5_cache(location),),
+            )
+
+        return mk_repo
+
+    def test_eclass_index(self, repo, tmp_path):
+        index = repo().cache[0].sidecar_path("eclass_index")
+
+        def read_index():
+            with open(index) as f:
+                return [x for x in f if not x.startswith("#")]
+
+        assert repo().operations.regen_cache() == 0
+        assert read_index() == ["cat/a-1\tfoo\n"]
+        os.unlink(index)
+        # queries don't write the index
+        assert repo().eclass_users(["foo"]) == {"cat/a-1"}
+        assert not os.path.exists(index)
+        assert repo().operations.regen_cache() == 0
+        assert read_index() == ["cat/a-1\tfoo\n"]
+
+        # entries updated without pkgcore, e.g. by syncing the repo
+        entries = tmp_path / "metadata" / "md5-cache" / "cat"
+        shutil.copy2(entries / "a-1", entries / "c-1")
+        (entries / "a-1").unlink()
+        assert repo().eclass_users(["foo"]) == {"cat/c-1"}
+        assert repo().operations.regen_cache() == 0
+        assert read_index() == ["cat/a-1\tfoo\n"]
+
+    def test_depset_cache(self, repo, tmp_path):
+        r = repo()
+        for pkg in r:
+            pkg.rdepend
+        cache = r.package_class._depset_cache
+        cache.flush()
+        assert set(depset_cache.DepSetCache(cache.path)._read()) == {
+            "cat/a-1",
+            "cat/b-1",
+        }
+        # parsed DepSets of removed pkgs are dropped by regen
+        (tmp_path / "cat/b/b-1.ebuild").unlink()
+        assert repo().operations.regen_cache() == 0
+        assert set(depset_cache.DepSetCache(cache.path)._read()) == {"cat/a-1"}
+
+    def test_journal(self, repo, tmp_path):
+        journal = str(tmp_path / "journal")
+        ebuild = tmp_path / "cat" / "c" / "c-1.ebuild"
+        ebuild.parent.mkdir()
+        ebuild.write_text("EAPI=8\nSLOT=0\ndie bad\n")
+        assert repo().operations.regen_cache(journal=journal) == 1
+        location = str(tmp_path)
+        assert regen.read_journal(journal, repo())["failed"] == ["cat/c-1"]
+        # failed pkgs are retried without being changed
+        assert repo().operations.regen_cache(journal=journal) == 1
+        ebuild.write_text("EAPI=8\nSLOT=0\n")
+        os.utime(ebuild, (1000, 1000))
+        assert repo().operations.regen_cache(journal=journal) == 0
+        assert regen.read_journal(journal, repo())["failed"] == []
+        assert "cat/c-1" in flat_hash.md5_cache(location)
@@ -0,0 +1,113 @@
+import threading
+from unittest import mock
+
+import pytest
+from pkgcore.operations.scheduler import Scheduler
+
+
+def mk_graph(**deps):
+    return {op: set(required) for op, required in deps.items()}
+
+
+class TestScheduler:
+    def test_merge_order(self):
+        graph = mk_graph(a=(), b=("a",), c=(), d=("b", "c"))
+        merged = []
+
+        def merge(op, result):
+            assert result == op.upper()
+            # all deps are merged beforehand
+            assert graph[op].issubset(merged)
+            merged.append(op)
+
+        scheduler = Scheduler(graph, str.upper, merge, jobs=4)
+        assert scheduler.run() == []
+        assert sorted(merged) == ["a", "b", "c", "d"]
+
+    def test_concurrent_builds(self):
+        graph = mk_graph(a=(), b=(), c=("a", "b"))
+        barrier = threading.Barrier(2, timeout=5)
+
+        def build(op):
+            if op in "ab":
+                # blocks unless a and b are built concurrently
+                barrier.wait()
+            return op
+
+        merged = []
+        scheduler = Scheduler(graph, build, lambda op, x: merged.append(op), jobs=2)
+        assert scheduler.run() == []
+        assert merged[-1] == "c"
+
+    def test_jobs_limit(self):
+        graph = mk_graph(a=(), b=(), c=(), d=())
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def build(op):
+            with lock:
+                running.append(op)
+                max_running.append(len(running))
+            with lock:
+                running.remove(op)
+
+        scheduler = Scheduler(graph, build, lambda op, x: None, jobs=2)
+        assert scheduler.run() == []
+        assert max(max_running) <= 2
+
+    @pytest.mark.parametrize("fail_in", ("build", "merge"))
+    def test_failures(self, fail_in):
+        graph = mk_graph(a=(), b=("a",), c=())
+        merged = []
+
+        def build(op):
+            if fail_in == "build" and op == "a":
+                return False
+            return op
+
+        def merge(op, result):
+            if fail_in == "merge" and op == "a":
+                return False
+            merged.append(op)
+
+        # b is skipped since it depends on the failed op
+        scheduler = Scheduler(graph, build, merge, jobs=1)
+        assert scheduler.run(keep_going=True) == ["a", "b"]
+        assert merged == ["c"]
+
+        # nothing else is started after the first failure
+        merged.clear()
+        scheduler = Scheduler(graph, build, merge, jobs=1)
+        assert scheduler.run() == ["a", "b", "c"]
+        assert merged == []
+
+    def test_exceptions(self):
+        graph = mk_graph(a=(), b=())
+
+        def build(op):
+            raise RuntimeError(op)
+
+        scheduler = Scheduler(graph, build, lambda op, x: None, jobs=2)
+        with pytest.raises(RuntimeError):
+            scheduler.run()
+
+    @mock.patch("os.getloadavg", return_value=(100.0, 100.0, 100.0))
+    def test_load_average(self, _getloadavg):
+        graph = mk_graph(a=(), b=())
+        lock = threading.Lock()
+        running = []
+        max_running = []
+
+        def build(op):
+            with lock:
+                running.append(op)
+                max_running.append(len(running))
+            with lock:
+                running.remove(op)
+
+        scheduler = Scheduler(
+            graph, build, lambda op, x: None, jobs=2, load_average=1.0
+        )
+        assert scheduler.run() == []
+        assert max(max_running) == 1
@@ -1,6 +1,8 @@
 from collections import OrderedDict
 from functools import partial
+from itertools import chain
 
+import pytest
 from pkgcore.repository.multiplex import tree
 from pkgcore.repository.util import SimpleTree
 from pkgcore.restrictions import packages, values
@@ -60,3 +62,30 @@ class TestMultiplex:
             x.cpvstr
             for x in self.ctree.itermatch(packages.AlwaysTrue, sorter=rev_sorted)
         ) == rev_sorted(self.tree1_list + self.tree2_list)
+
+
+class TestParallelMultiplex(TestMultiplex):
+    kls = staticmethod(partial(tree, parallel=True))
+
+    def test_repo_order(self):
+        # unsorted matches keep the order of the trees
+        assert [x.cpvstr for x in self.ctree.itermatch(packages.AlwaysTrue)] == [
+            x.cpvstr for x in chain(self.tree1, self.tree2)
+        ]
+
+    def test_abandoned(self):
+        it = self.ctree.itermatch(packages.AlwaysTrue)
+        assert next(it)
+        it.close()
+        assert packages.AlwaysTrue in self.ctree
+
+    def test_errors(self):
+        class BrokenTree(SimpleTree):
+            def itermatch(self, *args, **kwds):
+                yield from super().itermatch(*args, **kwds)
+                raise OSError("broken")
+
+        ctree = self.kls(self.tree1, BrokenTree(self.d2))
+        it = ctree.itermatch(packages.AlwaysTrue, sorter=sorted)
+        with pytest.raises(OSError, match="broken"):
+            list(it)
@@ -1,6 +1,8 @@
 import pytest
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
 from pkgcore.resolver import plan
-from pkgcore.test.misc import FakePkg
+from pkgcore.test.misc import FakePkg, FakeRepo, fake_repos
 
 
 @pytest.mark.parametrize(
@@ -28,3 +30,145 @@ def test_pkg_sorting(sorter, vers, expected, iter_sort_target):
     if iter_sort_target:
         pkgs = [x[0] for x in pkgs]
     assert [int(x.fullver) for x in pkgs] == expected
+
+
+@pytest.mark.parametrize(
+    ("sorter", "expected"),
+    (
+        pytest.param(plan.highest_iter_sort, ["2", "1", "1"], id="highest iter"),
+        pytest.param(plan.lowest_iter_sort, ["1", "1", "2"], id="lowest iter"),
+    ),
+)
+def test_pkg_sorting_livefs(sorter, expected):
+    repo, vdb = fake_repos()
+    pkgs = [
+        FakePkg("d-b/a-1", repo=repo),
+        FakePkg("d-b/a-2", repo=repo),
+        FakePkg("d-b/a-1", repo=vdb),
+    ]
+    pkgs = [x[0] for x in sorter([[x, []] for x in pkgs])]
+    assert [x.fullver for x in pkgs] == expected
+    # installed pkgs are preferred over equal versions
+    idx = expected.index("1")
+    assert pkgs[idx].repo is vdb and pkgs[idx + 1].repo is repo
+
+
+class TestDependencyGraph:
+    @staticmethod
+    def resolve(*pkgs, targets):
+        repo, vdb = fake_repos((cpv, {"data": data}) for cpv, data in pkgs)
+        resolver_inst = resolver.upgrade_resolver([vdb], [repo])
+        assert not resolver_inst.add_atoms(list(map(atom, targets)), finalize=True)
+        return {
+            op.pkg.cpvstr: sorted(x.pkg.cpvstr for x in deps)
+            for op, deps in resolver_inst.state.dependency_graph().items()
+        }
+
+    def test_graph(self):
+        graph = self.resolve(
+            ("dev-libs/a-1", {"DEPEND": "dev-libs/b dev-libs/c"}),
+            ("dev-libs/b-1", {"RDEPEND": "dev-libs/d"}),
+            ("dev-libs/c-1", {}),
+            ("dev-libs/d-1", {}),
+            ("dev-libs/e-1", {"DEPEND": "!dev-libs/f"}),
+            targets=["dev-libs/a", "dev-libs/e"],
+        )
+        assert graph == {
+            "dev-libs/a-1": ["dev-libs/b-1", "dev-libs/c-1"],
+            "dev-libs/b-1": ["dev-libs/d-1"],
+            "dev-libs/c-1": [],
+            "dev-libs/d-1": [],
+            "dev-libs/e-1": [],
+        }
+
+    def test_any_of(self):
+        graph = self.resolve(
+            ("dev-libs/a-1", {"DEPEND": "|| ( dev-libs/b dev-libs/c )"}),
+            ("dev-libs/b-1", {}),
+            ("dev-libs/c-1", {}),
+            targets=["dev-libs/b", "dev-libs/c", "dev-libs/a"],
+        )
+        # all alternatives of any-of groups are considered
+        assert graph["dev-libs/a-1"] == ["dev-libs/b-1", "dev-libs/c-1"]
+
+
+class TestMatchCache:
+    def test_lru(self):
+        repo = FakeRepo(pkgs=[FakePkg("dev-libs/a-1"), FakePkg("dev-libs/b-1")])
+        cache = plan.match_cache(maxsize=1)
+        a = cache.match(repo, atom("dev-libs/a"))
+        assert list(a) == [repo.pkgs[0]]
+        assert cache.match(repo, atom("dev-libs/a")) is a
+        assert (cache.hits, cache.misses) == (1, 1)
+        # the least recently used query is evicted
+        cache.match(repo, atom("dev-libs/b"))
+        assert len(cache) == 1
+        assert cache.match(repo, atom("dev-libs/a")) is not a
+        assert (cache.hits, cache.misses) == (1, 3)
+        assert cache.hit_rate == 0.25
+
+    def test_disabled(self):
+        repo = FakeRepo(pkgs=[FakePkg("dev-libs/a-1")])
+        cache = plan.match_cache(maxsize=0)
+        assert cache.match(repo, atom("dev-libs/a")) is not cache.match(
+            repo, atom("dev-libs/a")
+        )
+        assert len(cache) == 0
+        assert cache.hits == 0
+
+    def test_invalidate(self):
+        repo1 = FakeRepo(pkgs=[FakePkg("dev-libs/a-1")])
+        repo2 = FakeRepo(pkgs=[FakePkg("dev-libs/a-2")])
+        cache = plan.match_cache()
+        a1 = cache.match(repo1, atom("dev-libs/a"))
+        a2 = cache.match(repo2, atom("dev-libs/a"))
+        cache.invalidate(repo1)
+        assert cache.match(repo1, atom("dev-libs/a")) is not a1
+        assert cache.match(repo2, atom("dev-libs/a")) is a2
+        cache.clear()
+        assert len(cache) == 0
+        # statistics are kept across clearing
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_resolver(self):
+        repo, vdb = fake_repos(
+            [
+                ("dev-libs/a-2", {"data": {"DEPEND": "dev-libs/c"}}),
+                ("dev-libs/b-1", {"data": {"DEPEND": "dev-libs/c"}}),
+                ("dev-libs/c-2", {}),
+            ],
+            installed=["dev-libs/a-1", "dev-libs/c-1"],
+        )
+
+        def resolve(**kwds):
+            resolver_inst = resolver.upgrade_resolver([vdb], [repo], **kwds)
+            assert not resolver_inst.add_atoms(
+                [atom("dev-libs/a"), atom("dev-libs/b")], finalize=True
+            )
+            return resolver_inst, sorted(map(str, resolver_inst.state.iter_ops()))
+
+        resolver_inst, ops = resolve()
+        assert resolve(match_cache_size=0)[1] == ops
+        state = resolver_inst.state
+        assert state.vdb_filter_generation
+        misses = resolver_inst.match_cache.misses
+        cached = resolver_inst._match(resolver_inst.livefs_dbs, atom("dev-libs/a"))
+        # replaced livefs pkgs are filtered out
+        assert list(cached) == []
+
+        # restarting resolution reuses the cached matches
+        resolver_inst.reset()
+        assert not resolver_inst.add_atoms(
+            [atom("dev-libs/a"), atom("dev-libs/b")], finalize=True
+        )
+        assert sorted(map(str, state.iter_ops())) == ops
+        assert resolver_inst.match_cache.hits >= 3
+
+        # backtracking invalidates the cached livefs matches
+        generation = state.vdb_filter_generation
+        resolver_inst.reset()
+        assert state.vdb_filter_generation > generation
+        matches = resolver_inst._match(resolver_inst.livefs_dbs, atom("dev-libs/a"))
+        assert matches is not cached
+        assert [x.cpvstr for x in matches] == ["dev-libs/a-1"]
+        assert resolver_inst.match_cache.misses > misses
@@ -0,0 +1,143 @@
+import os
+
+import pytest
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.resolver import plan_cache
+from pkgcore.test.misc import fake_repos
+
+
+def ops(resolver_inst):
+    return [str(x) for x in resolver_inst.state.iter_ops(True)]
+
+
+def graph(resolver_inst):
+    return {
+        str(op): sorted(map(str, deps))
+        for op, deps in resolver_inst.state.dependency_graph().items()
+    }
+
+
+class TestTreeStamp:
+    def test_changes(self, tmp_path):
+        (tmp_path / "cat" / "pkg").mkdir(parents=True)
+        ebuild = tmp_path / "cat" / "pkg" / "pkg-1.ebuild"
+        ebuild.write_text("EAPI=8\n")
+        stamp = plan_cache.tree_stamp(str(tmp_path), 3)
+        assert stamp == plan_cache.tree_stamp(str(tmp_path), 3)
+        # entries past the given depth are ignored
+        assert plan_cache.tree_stamp(str(tmp_path), 2) != stamp
+        ebuild.write_text("EAPI=7\n")
+        os.utime(ebuild, ns=(0, 0))
+        changed = plan_cache.tree_stamp(str(tmp_path), 3)
+        assert changed != stamp
+        (tmp_path / "cat" / "pkg" / "pkg-2.ebuild").touch()
+        assert plan_cache.tree_stamp(str(tmp_path), 3) != changed
+        assert plan_cache.tree_stamp(str(tmp_path / "missing")) is None
+
+    def test_contents(self, tmp_path):
+        def stamp(path):
+            return plan_cache.tree_stamp(
+                str(path), 2, contents=True, names=frozenset(["USE"])
+            )
+
+        trees = []
+        for name in ("a", "b"):
+            (tmp_path / name / "pkg-1").mkdir(parents=True)
+            (tmp_path / name / "pkg-1" / "USE").write_text("foo\n")
+            (tmp_path / name / "pkg-1" / "CONTENTS").write_text(name)
+            trees.append(tmp_path / name)
+        os.utime(trees[1] / "pkg-1" / "USE", ns=(0, 0))
+        # only the contents of the given files matter
+        assert stamp(trees[0]) == stamp(trees[1])
+        (trees[1] / "pkg-1" / "USE").write_text("bar\n")
+        assert stamp(trees[0]) != stamp(trees[1])
+
+
+def test_fingerprint():
+    key = plan_cache.fingerprint({"b": frozenset("xyz"), "a": [1, None]}, atom("a/b"))
+    assert key == plan_cache.fingerprint({"a": (1, None), "b": frozenset("zyx")}, "a/b")
+    assert key != plan_cache.fingerprint({"a": (1, None), "b": frozenset("zy")}, "a/b")
+
+
+class TestPlan:
+    def test_restore(self):
+        repo, vdb = fake_repos(
+            [
+                (
+                    "dev-libs/a-2",
+                    {"data": {"DEPEND": "dev-libs/c", "RDEPEND": "dev-libs/b"}},
+                ),
+                ("dev-libs/b-1", {"data": {"DEPEND": "dev-libs/a"}}),
+                ("dev-libs/c-2", {}),
+            ],
+            installed=["dev-libs/c-1", "dev-libs/d-1"],
+        )
+        for preload in (False, True):
+            resolver_inst = resolver.upgrade_resolver([vdb], [repo])
+            if preload:
+                resolver_inst.load_vdb_state()
+            assert not resolver_inst.add_atoms([atom("dev-libs/a")], finalize=True)
+            entries = plan_cache.serialize(resolver_inst.state)
+
+            restored = resolver.upgrade_resolver([vdb], [repo])
+            plan_cache.restore(restored, entries)
+            assert ops(restored) == ops(resolver_inst)
+            assert graph(restored) == graph(resolver_inst)
+
+    def test_stale(self):
+        repo, vdb = fake_repos(
+            [("dev-libs/a-2", {}), ("dev-libs/b-1", {})],
+            installed=["dev-libs/a-1"],
+        )
+        resolver_inst = resolver.upgrade_resolver([vdb], [repo])
+        assert not resolver_inst.add_atoms(
+            [atom("dev-libs/a"), atom("dev-libs/b")], finalize=True
+        )
+        entries = plan_cache.serialize(resolver_inst.state)
+        assert entries[1] == (
+            "replace",
+            ("gentoo", False, "dev-libs/a-2"),
+            False,
+            ("vdb", True, "dev-libs/a-1"),
+        )
+
+        repo.pkgs = repo.pkgs[:1]
+        restored = resolver.upgrade_resolver([vdb], [repo])
+        with pytest.raises(plan_cache.StalePlan, match="dev-libs/b-1::gentoo"):
+            plan_cache.restore(restored, entries)
+        restored.reset()
+        assert not ops(restored)
+
+        with pytest.raises(plan_cache.StalePlan, match="unknown plan op"):
+            plan_cache.restore(restored, [("frobnicate", None, False, None)])
+
+
+class TestPlanCache:
+    def test_store(self, tmp_path):
+        cache = plan_cache.PlanCache(str(tmp_path / "plans"))
+        assert cache.get("abc") is None
+        entries = (("add", ("gentoo", False, "dev-libs/a-1"), False, None),)
+        cache.store("abc", entries)
+        assert cache.get("abc") == entries
+        assert cache.get("def") is None
+        cache.discard("abc")
+        assert cache.get("abc") is None
+        cache.discard("abc")
+
+    def test_invalid(self, tmp_path):
+        cache = plan_cache.PlanCache(str(tmp_path))
+        (tmp_path / "abc.plan").write_text("garbage")
+        assert cache.get("abc") is None
+        # entries are validated against their key
+        cache.store("abc", ())
+        os.rename(tmp_path / "abc.plan", tmp_path / "def.plan")
+        assert cache.get("def") is None
+
+    def test_prune(self, tmp_path):
+        cache = plan_cache.PlanCache(str(tmp_path), max_entries=2)
+        for i, key in enumerate("abc"):
+            cache.store(key, ())
+            os.utime(tmp_path / f"{key}.plan", ns=(i, i))
+        cache.store("d", ())
+        assert sorted(os.listdir(tmp_path)) == ["c.plan", "d.plan"]
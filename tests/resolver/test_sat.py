@@ -0,0 +1,294 @@
+import pytest
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.resolver import plan, sat
+from pkgcore.resolver.util import reduce_to_failures
+from pkgcore.test.misc import fake_repos
+
+
+def resolve(src, targets, installed=(), resolver_cls=sat.sat_plan, **kwds):
+    repo, vdb = fake_repos(src, installed)
+    resolver_inst = resolver.upgrade_resolver(
+        [vdb], [repo], resolver_cls=resolver_cls, **kwds
+    )
+    ret = resolver_inst.add_atoms(list(map(atom, targets)), finalize=True)
+    return resolver_inst, ret
+
+
+def ops(resolver_inst):
+    return [str(x) for x in resolver_inst.state.iter_ops()]
+
+
+def dep(**kwds):
+    return {"data": kwds}
+
+
+class TestSolver:
+    def test_sat(self):
+        solver = sat.sat_solver()
+        a, b, c = (solver.new_var() for _ in range(3))
+        solver.add_clause([a, b])
+        solver.add_clause([-a, c])
+        solver.add_clause([-b, c])
+        assert solver.solve()
+        # undecided variables are false
+        assert solver.model[1:] == [False, True, True]
+        assert solver.solve([a])
+        assert solver.model[1:] == [True, False, True]
+        assert not solver.solve([-c])
+        # failing assumptions don't make the problem insoluble
+        assert solver.ok
+        assert solver.solve()
+
+    def test_unsat(self):
+        solver = sat.sat_solver()
+        a, b = solver.new_var(), solver.new_var()
+        for clause in ([a, b], [-a, b], [a, -b], [-a, -b]):
+            solver.add_clause(clause)
+        assert not solver.solve()
+        assert not solver.ok
+        assert not solver.add_clause([a])
+
+    def test_requirements(self):
+        solver = sat.sat_solver()
+        a, b, c, d = (solver.new_var() for _ in range(4))
+        solver.add_requirement([b, c], a)
+        solver.add_requirement([a])
+        solver.add_clause([-b, d])
+        solver.add_clause([-d])
+        assert solver.solve()
+        # literals are tried in order
+        assert solver.model[1:] == [True, False, True, False]
+
+    def test_learning(self):
+        # pigeonhole problem of n + 1 pigeons in n holes
+        n = 5
+        solver = sat.sat_solver()
+        holes = [[solver.new_var() for _ in range(n)] for _ in range(n + 1)]
+        for pigeon in holes:
+            solver.add_clause(pigeon)
+        for hole in range(n):
+            for i in range(n + 1):
+                for j in range(i + 1, n + 1):
+                    solver.add_clause([-holes[i][hole], -holes[j][hole]])
+        assert not solver.solve()
+        assert solver.conflicts
+
+
+class TestSatPlan:
+    def test_matches_merge_plan(self):
+        src = [
+            ("dev-libs/a-2", dep(DEPEND="dev-libs/c", RDEPEND="dev-libs/b")),
+            ("dev-libs/b-1", dep(DEPEND="dev-libs/a")),
+            ("dev-libs/c-2", {}),
+            ("dev-libs/e-1", dep(DEPEND="|| ( dev-libs/f dev-libs/d )")),
+            ("dev-libs/f-1", {}),
+        ]
+        targets = ["dev-libs/a", "dev-libs/e"]
+        installed = ["dev-libs/c-1", "dev-libs/d-1"]
+        expected = ops(resolve(src, targets, installed, plan.merge_plan)[0])
+        resolver_inst, ret = resolve(src, targets, installed)
+        assert not ret
+        assert ops(resolver_inst) == expected
+        assert resolver_inst.forced_restrictions == frozenset(map(atom, targets))
+
+    @pytest.mark.parametrize(
+        "resolver_cls",
+        (resolver.empty_tree_merge_plan, resolver.empty_tree_sat_plan),
+    )
+    def test_empty_tree(self, resolver_cls):
+        src = [("dev-libs/a-1", dep(RDEPEND="dev-libs/c")), ("dev-libs/c-1", {})]
+        resolver_inst, ret = resolve(src, ["dev-libs/a"], ["dev-libs/c-1"])
+        assert ops(resolver_inst) == ["add: ebuild src: dev-libs/a-1"]
+        # installed pkgs are rebuilt
+        resolver_inst, ret = resolve(
+            src, ["dev-libs/a"], ["dev-libs/c-1"], resolver_cls
+        )
+        assert not ret
+        assert ops(resolver_inst) == [
+            "replace: ebuild src: dev-libs/c-1 with ebuild src: dev-libs/c-1",
+            "add: ebuild src: dev-libs/a-1",
+        ]
+
+    def test_pdepend(self):
+        src = [
+            ("dev-libs/a-1", dep(PDEPEND="dev-libs/b")),
+            ("dev-libs/b-1", dep(RDEPEND="dev-libs/a")),
+        ]
+        resolver_inst, ret = resolve(src, ["dev-libs/a"])
+        assert not ret
+        assert ops(resolver_inst) == [
+            "add: ebuild src: dev-libs/a-1",
+            "add: ebuild src: dev-libs/b-1",
+        ]
+
+    def test_slot_conflicts(self):
+        # only the lowest lib version satisfies all apps
+        n = 4
+        src = [(f"dev-libs/lib-{v}", {}) for v in range(1, n + 1)]
+        for i in range(n):
+            versions = range(1, n + 1) if i < n - 1 else [1]
+            src.extend(
+                (f"app-misc/app{i}-{v}", dep(RDEPEND=f"=dev-libs/lib-{v}"))
+                for v in versions
+            )
+        apps = " ".join(f"app-misc/app{i}" for i in range(n))
+        src.append(("app-misc/meta-1", dep(RDEPEND=apps)))
+        resolver_inst, ret = resolve(src, ["app-misc/meta"])
+        assert not ret
+        assert sorted(ops(resolver_inst)) == sorted(
+            ["add: ebuild src: dev-libs/lib-1", "add: ebuild src: app-misc/meta-1"]
+            + [f"add: ebuild src: app-misc/app{i}-1" for i in range(n)]
+        )
+
+    def test_slots(self):
+        src = [
+            ("dev-libs/a-1", {"slot": "1"}),
+            ("dev-libs/a-2", {"slot": "2"}),
+            ("dev-libs/b-1", dep(RDEPEND="=dev-libs/a-1 =dev-libs/a-2")),
+        ]
+        resolver_inst, ret = resolve(src, ["dev-libs/b"])
+        assert not ret
+        assert ops(resolver_inst)[:2] == [
+            "add: ebuild src: dev-libs/a-1",
+            "add: ebuild src: dev-libs/a-2",
+        ]
+
+    def test_any_of(self):
+        src = [
+            ("dev-libs/a-1", dep(RDEPEND="|| ( dev-libs/b dev-libs/c ) dev-libs/d")),
+            ("dev-libs/b-1", dep(RDEPEND="dev-libs/missing")),
+            ("dev-libs/c-1", {}),
+            ("dev-libs/d-1", dep(RDEPEND="!dev-libs/c")),
+            ("dev-libs/d-2", dep(RDEPEND="!dev-libs/c")),
+            ("dev-libs/d-3", dep(RDEPEND="|| ( !dev-libs/c dev-libs/b )")),
+        ]
+        resolver_inst, ret = resolve(src, ["dev-libs/a"])
+        assert ret
+        src.append(("dev-libs/d-0", {}))
+        resolver_inst, ret = resolve(src, ["dev-libs/a"])
+        assert not ret
+        assert ops(resolver_inst) == [
+            "add: ebuild src: dev-libs/c-1",
+            "add: ebuild src: dev-libs/d-0",
+            "add: ebuild src: dev-libs/a-1",
+        ]
+
+    def test_blockers(self):
+        src = [
+            ("dev-libs/a-1", dep(RDEPEND="!<dev-libs/b-2")),
+            ("dev-libs/b-2", {}),
+        ]
+        # blocked installed packages are replaced
+        resolver_inst, ret = resolve(src, ["dev-libs/a"], installed=["dev-libs/b-1"])
+        assert not ret
+        assert ops(resolver_inst) == [
+            "replace: ebuild src: dev-libs/b-1 with ebuild src: dev-libs/b-2",
+            "add: ebuild src: dev-libs/a-1",
+        ]
+        assert resolver_inst.state.blockers_refcnt
+
+        resolver_inst, ret = resolve(src[:1], ["dev-libs/a"], ["dev-libs/b-1"])
+        assert ret
+
+    def test_required_use(self):
+        src = [
+            (
+                "dev-libs/a-2",
+                {"eapi": "8", "iuse": ["x"], "data": {"REQUIRED_USE": "x"}},
+            ),
+            ("dev-libs/a-1", {"eapi": "8"}),
+        ]
+        resolver_inst, ret = resolve(src, ["dev-libs/a"])
+        assert not ret
+        assert ops(resolver_inst) == ["add: ebuild src: dev-libs/a-1"]
+
+        resolver_inst, ret = resolve(src, [">=dev-libs/a-2"])
+        assert ret
+        pkg, events = reduce_to_failures(ret[1])[1]
+        assert events == [("choice", str(pkg), False, "REQUIRED_USE unsatisfied: x")]
+
+    def test_failure(self):
+        src = [
+            ("dev-libs/a-1", dep(RDEPEND="dev-libs/missing")),
+            ("dev-libs/b-1", {}),
+        ]
+        repo, vdb = fake_repos(src)
+        resolver_inst = resolver.upgrade_resolver(
+            [vdb], [repo], resolver_cls=sat.sat_plan
+        )
+        targets = [atom("dev-libs/b"), atom("dev-libs/a"), atom("dev-libs/c")]
+        ret = resolver_inst.add_atoms(targets)
+        assert ret[0] == [atom("dev-libs/a")]
+        frame = ret[1]
+        assert not frame.succeeded
+        assert frame.atom == atom("dev-libs/a")
+        assert reduce_to_failures(frame)[1:] == [
+            (
+                repo.pkgs[0],
+                [("viable", False, False, atom("dev-libs/missing"), "no matches")],
+            )
+        ]
+        # nothing was added
+        assert not ops(resolver_inst)
+
+        ret = resolver_inst.add_atoms([atom("dev-libs/b"), atom("dev-libs/c")])
+        assert ret[0] == [atom("dev-libs/c")]
+        assert ret[1].events == [
+            ("viable", False, False, atom("dev-libs/c"), "no matches")
+        ]
+
+    def test_incremental(self):
+        src = [
+            ("dev-libs/a-1", dep(RDEPEND="=dev-libs/b-1")),
+            ("dev-libs/b-1", {}),
+            ("dev-libs/b-2", {}),
+            ("dev-libs/c-1", dep(RDEPEND="dev-libs/b")),
+        ]
+        repo, vdb = fake_repos(src, installed=["dev-libs/b-1"])
+        resolver_inst = resolver.upgrade_resolver(
+            [vdb], [repo], resolver_cls=sat.sat_plan
+        )
+        resolver_inst.load_vdb_state()
+        assert resolver_inst.vdb_preloaded
+        assert not ops(resolver_inst)
+        # installed packages are preferred
+        assert not resolver_inst.add_atoms([atom("dev-libs/c")])
+        assert ops(resolver_inst) == ["add: ebuild src: dev-libs/c-1"]
+        # but get replaced if requested, unless that breaks the plan
+        assert not resolver_inst.add_atoms([atom(">=dev-libs/b-2")])
+        assert ops(resolver_inst)[-1] == (
+            "replace: ebuild src: dev-libs/b-1 with ebuild src: dev-libs/b-2"
+        )
+        assert resolver_inst.add_atoms([atom("dev-libs/a")])
+
+    @pytest.mark.parametrize("n", (4, 12))
+    def test_any_of_chain(self, n):
+        # alternatives all fail at the end of the chain, exponential for
+        # backtracking over choice points
+        src = []
+        for i in range(n):
+            src.append(
+                (f"dev-libs/p{i}-1", dep(RDEPEND=f"|| ( dev-libs/x{i} dev-libs/y{i} )"))
+            )
+            src.append((f"dev-libs/x{i}-1", dep(RDEPEND=f"dev-libs/p{i + 1}")))
+            src.append((f"dev-libs/y{i}-1", dep(RDEPEND=f"dev-libs/p{i + 1}")))
+        src.append((f"dev-libs/p{n}-1", dep(RDEPEND="dev-libs/missing")))
+        resolver_inst, ret = resolve(src, ["dev-libs/p0"])
+        assert ret
+        src[-1] = (f"dev-libs/p{n}-1", {})
+        resolver_inst, ret = resolve(src, ["dev-libs/p0"])
+        assert not ret
+        assert len(ops(resolver_inst)) == 2 * n + 1
+
+
+def test_trace():
+    events = []
+    resolver_inst, ret = resolve(
+        [("dev-libs/a-1", {})], ["dev-libs/a"], trace=events.append
+    )
+    assert not ret
+    solve = [x for x in events if x["type"] == "solve"]
+    assert len(solve) == 1 and solve[0]["success"]
+    assert solve[0]["variables"] == 2
+    assert events[-1]["type"] == "match_cache"
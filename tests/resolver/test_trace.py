@@ -0,0 +1,144 @@
+import io
+
+import pytest
+from pkgcore.ebuild import resolver
+from pkgcore.ebuild.atom import atom
+from pkgcore.resolver import trace
+from pkgcore.test.misc import fake_repos
+
+
+def resolve(*pkgs, targets, **kwds):
+    repo, vdb = fake_repos((cpv, {"data": data}) for cpv, data in pkgs)
+    events = []
+    resolver_inst = resolver.upgrade_resolver(
+        [vdb], [repo], trace=events.append, **kwds
+    )
+    ret = resolver_inst.add_atoms(list(map(atom, targets)), finalize=True)
+    return ret, events
+
+
+class TestResolverEvents:
+    def test_atoms(self):
+        ret, events = resolve(
+            ("dev-libs/a-2", {"DEPEND": "dev-libs/c", "RDEPEND": "dev-libs/d"}),
+            ("dev-libs/a-1", {"DEPEND": "dev-libs/c"}),
+            ("dev-libs/c-1", {}),
+            targets=["dev-libs/a"],
+        )
+        assert not ret
+        atoms = [x for x in events if x["type"] == "atom"]
+        assert [(x["atom"], x["depth"], x["success"]) for x in atoms] == [
+            ("dev-libs/c", 1, True),
+            ("dev-libs/d", 1, False),
+            ("dev-libs/c", 1, True),
+            ("dev-libs/a", 0, True),
+        ]
+        top = atoms[-1]
+        assert top["mode"] == "none"
+        assert top["candidates"] == 2
+        assert top["cached"] is False
+        # cached matches are reused after backtracking
+        assert atoms[2]["cached"] is True
+        assert top["elapsed"] >= sum(x["elapsed"] for x in atoms[:-1])
+        assert top["own"] == pytest.approx(
+            top["elapsed"] - sum(x["elapsed"] for x in atoms[:-1])
+        )
+
+        # dev-libs/c-1 was added for dev-libs/a-2 and undone
+        assert {"type": "backtrack", "atom": "dev-libs/a", "ops": 1} in events
+        assert events[-1] == {"type": "match_cache", "hits": 1, "misses": 3}
+
+    def test_cycles(self):
+        ret, events = resolve(
+            ("dev-libs/a-1", {"DEPEND": "dev-libs/x"}),
+            targets=["dev-libs/a"],
+            drop_cycles=True,
+        )
+        assert ret
+        assert {
+            "type": "cycle",
+            "atom": "dev-libs/a",
+            "action": "drop cycles",
+        } in events
+
+
+class TestTraceFile:
+    def test_roundtrip(self):
+        f = io.StringIO()
+        sink = trace.jsonlines_sink(f)
+        _ret, events = resolve(
+            ("dev-libs/a-1", {"DEPEND": "dev-libs/b"}),
+            ("dev-libs/b-1", {}),
+            targets=["dev-libs/a"],
+        )
+        for event in events:
+            sink(event)
+        f.seek(0)
+        assert list(trace.read_events(f)) == events
+
+    def test_invalid(self):
+        with pytest.raises(ValueError, match="line 2"):
+            list(trace.read_events(io.StringIO('{"type": "atom"}\n{"atom": 1}\n')))
+        with pytest.raises(ValueError, match="line 1"):
+            list(trace.read_events(io.StringIO("[\n")))
+        assert list(trace.read_events(io.StringIO("\n  \n"))) == []
+
+    def test_summarize(self):
+        events = [
+            {
+                "type": "atom",
+                "atom": "a",
+                "elapsed": 3.0,
+                "own": 1.0,
+                "candidates": 2,
+                "success": True,
+            },
+            {
+                "type": "atom",
+                "atom": "b",
+                "elapsed": 2.0,
+                "own": 2.0,
+                "candidates": 1,
+                "success": False,
+            },
+            {
+                "type": "atom",
+                "atom": "b",
+                "elapsed": 1.0,
+                "own": 1.0,
+                "candidates": 0,
+                "success": True,
+            },
+            {"type": "backtrack", "atom": "a", "ops": 3},
+            {"type": "cycle", "atom": "b", "action": "limit to vdb"},
+            {"type": "match_cache", "hits": 1, "misses": 2},
+            {"type": "match_cache", "hits": 4, "misses": 5},
+            {"type": "unknown"},
+        ]
+        stats, totals = trace.summarize(events)
+        assert totals == {
+            "atoms": 3,
+            "backtracks": 1,
+            "backtracked_ops": 3,
+            "cycles": 1,
+            "hits": 4,
+            "misses": 5,
+            "elapsed": 4.0,
+        }
+        a, b = stats["a"], stats["b"]
+        assert (a.count, a.elapsed, a.own, a.candidates, a.failures) == (
+            1,
+            3.0,
+            1.0,
+            2,
+            0,
+        )
+        assert (a.backtracks, a.cycles) == (1, 0)
+        assert (b.count, b.elapsed, b.own, b.candidates, b.failures) == (
+            2,
+            3.0,
+            3.0,
+            1,
+            1,
+        )
+        assert (b.backtracks, b.cycles) == (0, 1)
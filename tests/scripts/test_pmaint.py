@@ -13,6 +13,7 @@ from pkgcore.scripts import pmaint
 from pkgcore.sync import base
 from pkgcore.test.misc import FakePkg
 from pkgcore.test.scripts.helpers import ArgParseMixin
+from pkgcore.vdb import ondisk
 
 Options = AttrAccessible
 
@@ -66,6 +67,7 @@ class FakeDomain:
         self.repos = repos
         self.source_repos_raw = util.RepositoryGroup(repos)
         self.installed_repos = util.RepositoryGroup(vdb)
+        self.installed_repos_raw = util.RepositoryGroup(vdb)
         self.binary_repos_raw = util.RepositoryGroup(binpkg)
         self.vdb = vdb
 
@@ -267,3 +269,46 @@ class TestRegen(ArgParseMixin):
         options = self.parse("fake", "--threads", "2", domain=make_domain())
         assert isinstance(options.repos[0], util.SimpleTree)
         assert options.threads == 2
+        assert options.processes == 1
+        options = self.parse("fake", "-p", "4", domain=make_domain())
+        assert options.processes == 4
+
+
+class TestOwners(ArgParseMixin):
+    _argparser = pmaint.owners
+
+    def execute_main(self, *a, **kw):
+        config = self.parse(*a, **kw)
+        out = PlainTextFormatter(BytesIO())
+        ret = config.main_func(config, out, out)
+        return ret, config, out
+
+    def test_main(self, tmp_path):
+        vdb = tmp_path / "vdb" / "cat" / "pkg-1"
+        vdb.mkdir(parents=True)
+        (vdb / "CONTENTS").write_text("dir /usr\n")
+
+        def repo():
+            return ondisk.tree(str(tmp_path / "vdb"), str(tmp_path / "cache"))
+
+        repo.pkgcore_config_type = ConfigHint(typename="repo")
+        domain = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [make_repo_config({}, repo_id="fake")],
+                "binpkg": [make_repo_config({}, repo_id="fake_binpkg")],
+                "vdb": [basics.HardCodedConfigSection({"class": repo})],
+                "default": True,
+            }
+        )
+
+        ret, config, out = self.execute_main(domain=domain)
+        assert ret == 0
+        assert (tmp_path / "cache" / "owners").exists()
+        ret, config, out = self.execute_main("--check", domain=domain)
+        assert ret == 0
+
+        # repos without an ownership index are skipped
+        ret, config, out = self.execute_main(domain=make_domain())
+        assert ret == 0
+        assert b"doesn't support a file ownership index" in out.stream.getvalue()
@@ -1,3 +1,5 @@
+from functools import partial
+
 from pkgcore.config import basics
 from pkgcore.config.hint import ConfigHint, configurable
 from pkgcore.ebuild import atom, cpv
@@ -98,3 +100,106 @@ class TestCommandline(ArgParseMixin):
 
     def test_no_contents(self):
         self.assertOut([], "--contents", "--all", test_domain=domain_config)
+
+    def test_inherits(self):
+        class IndexedTree(util.SimpleTree):
+            def eclass_users(self, eclasses):
+                return frozenset(["spork/foon-2"]) if "foo" in eclasses else frozenset()
+
+        indexed_repo_config = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [
+                    basics.HardCodedConfigSection(
+                        {
+                            "class": configurable(typename="repo")(
+                                lambda: IndexedTree(
+                                    {"spork": {"foon": ("1", "2")}},
+                                    pkg_klass=partial(
+                                        FakePkg.for_tree_usage, repo=((), "indexed")
+                                    ),
+                                    repo_id="indexed",
+                                )
+                            )
+                        }
+                    )
+                ],
+                "vdb": [basics.HardCodedConfigSection({"class": fake_vdb})],
+                "default": True,
+            }
+        )
+        self.assertOut(
+            ["spork/foon-2"], "--inherits", "foo", test_domain=indexed_repo_config
+        )
+        self.assertOut([], "--inherits", "bar", test_domain=indexed_repo_config)
+        # repos without an index fall back to package metadata
+        self.assertOut([], "--inherits", "foo", test_domain=domain_config)
+
+    def test_owns(self):
+        class IndexedVdb(util.SimpleTree):
+            def owners(self, paths):
+                return {
+                    p: frozenset(["spork/foon-2"]) for p in paths if p == "/bin/foon"
+                }
+
+            def owners_matching(self, match):
+                return frozenset(["spork/foon-1"] if match("/bin/spork") else ())
+
+        indexed_vdb_config = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [basics.HardCodedConfigSection({"class": fake_repo})],
+                "vdb": [
+                    basics.HardCodedConfigSection(
+                        {
+                            "class": configurable(typename="repo")(
+                                lambda: IndexedVdb(
+                                    {"spork": {"foon": ("1", "2")}},
+                                    pkg_klass=partial(
+                                        FakePkg.for_tree_usage, repo=((), "vdb")
+                                    ),
+                                    repo_id="vdb",
+                                )
+                            )
+                        }
+                    )
+                ],
+                "default": True,
+            }
+        )
+        self.assertOut(
+            ["spork/foon-2"], "--owns", "/bin/foon", test_domain=indexed_vdb_config
+        )
+        self.assertOut([], "--owns", "/bin/spork", test_domain=indexed_vdb_config)
+        self.assertOut(
+            ["spork/foon-1"], "--owns-re", "sp.rk$", test_domain=indexed_vdb_config
+        )
+        # repos without an index fall back to package contents
+        self.assertOut([], "--owns", "/bin/foon", test_domain=domain_config)
+
+    def test_parallel(self):
+        @configurable(typename="repo")
+        def other_repo():
+            return util.SimpleTree(
+                {"spork": {"foon": ("3",), "bar": ("1",)}},
+                pkg_klass=FakePkg.for_tree_usage,
+            )
+
+        config = basics.HardCodedConfigSection(
+            {
+                "class": FakeDomain,
+                "repos": [
+                    basics.HardCodedConfigSection({"class": other_repo}),
+                    basics.HardCodedConfigSection({"class": fake_repo}),
+                ],
+                "vdb": [basics.HardCodedConfigSection({"class": fake_vdb})],
+                "default": True,
+            }
+        )
+        # matches of all repos are merged
+        self.assertOut(
+            ["spork/bar-1", "spork/foon-1", "spork/foon-2", "spork/foon-3"],
+            "--parallel",
+            "--all",
+            test_domain=config,
+        )
@@ -0,0 +1,155 @@
+import os
+
+import pytest
+from pkgcore.fs import fs
+from pkgcore.fs.contents import contentsSet
+from pkgcore.vdb import ondisk
+from pkgcore.vdb.contents import (
+    ContentsFile,
+    PackedContents,
+    PackedContentsSet,
+    load_contents,
+    write_packed_contents,
+)
+
+CONTENTS = (
+    "dir /usr\n"
+    "dir /usr/bin\n"
+    "obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1\n"
+    "sym /usr/bin/bar -> foo 2\n"
+    "obj /usr/share/file with spaces 0123456789abcdef0123456789abcdef 3\n"
+    "sym /usr/lib/link with spaces -> target with spaces 4\n"
+    "fif /run/fifo\n"
+)
+
+
+@pytest.fixture
+def contents_path(tmp_path):
+    path = tmp_path / "CONTENTS"
+    path.write_text(CONTENTS)
+    path = str(path)
+    write_packed_contents(path, ContentsFile(path))
+    return path
+
+
+class TestPackedContents:
+    def test_roundtrip(self, contents_path):
+        cset = load_contents(contents_path, mutable=False)
+        assert isinstance(cset, PackedContentsSet)
+        expected = ContentsFile(contents_path)
+        assert len(cset) == len(expected)
+        assert sorted(cset) == sorted(expected)
+        for obj in cset:
+            orig = expected[obj.location]
+            assert obj.__class__ is orig.__class__
+            if obj.is_reg:
+                assert obj.chksums == orig.chksums
+                assert obj.mtime == orig.mtime
+            elif obj.is_sym:
+                assert obj.target == orig.target
+                assert obj.mtime == orig.mtime
+        assert cset == expected
+        assert cset._materialized is not None
+
+    def test_membership(self, contents_path):
+        cset = load_contents(contents_path)
+        assert "/usr/bin/foo" in cset
+        assert "/usr//bin/foo/" in cset
+        assert fs.fsDir("/usr", strict=False) in cset
+        assert "/usr/share/file with spaces" in cset
+        assert "/usr/bin/missing" not in cset
+        assert "/" not in cset
+        assert cset["/usr/bin/bar"].target == "foo"
+        with pytest.raises(KeyError):
+            cset["/usr/bin/missing"]
+        assert cset._materialized is None
+
+    def test_difference(self, tmp_path, contents_path):
+        other_path = tmp_path / "other"
+        other_path.mkdir()
+        other_path = str(other_path / "CONTENTS")
+        with open(other_path, "w") as f:
+            f.write("dir /usr\nobj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1\n")
+        write_packed_contents(other_path, ContentsFile(other_path))
+
+        cset = load_contents(contents_path)
+        expected = ContentsFile(contents_path).difference(ContentsFile(other_path))
+        assert sorted(cset.difference(load_contents(other_path))) == sorted(expected)
+        assert sorted(cset.difference(ContentsFile(other_path))) == sorted(expected)
+        assert sorted(cset.difference(["/usr", "/usr/bin/foo"])) == sorted(expected)
+        assert cset.difference(cset) == contentsSet()
+        assert cset._materialized is None
+
+    def test_subsets(self, contents_path):
+        cset = load_contents(contents_path)
+        expected = ContentsFile(contents_path)
+        assert cset.issubset(expected)
+        assert not cset.issubset(["/usr"])
+        assert cset.isdisjoint(["/etc"])
+        assert not cset.isdisjoint(["/usr"])
+        assert cset._materialized is None
+
+    @pytest.mark.parametrize(
+        "attr", ("iterfiles", "iterdirs", "itersymlinks", "iterdevs", "iterfifos")
+    )
+    def test_kinds(self, contents_path, attr):
+        cset = load_contents(contents_path)
+        expected = ContentsFile(contents_path)
+        for invert in (False, True):
+            assert sorted(getattr(cset, attr)(invert=invert)) == sorted(
+                getattr(expected, attr)(invert=invert)
+            )
+        assert cset._materialized is None
+
+    def test_mutation(self, contents_path):
+        cset = load_contents(contents_path, mutable=False)
+        with pytest.raises(AttributeError):
+            cset.add(fs.fsDir("/etc", strict=False))
+
+        clone = cset.clone()
+        assert isinstance(clone, PackedContentsSet)
+        clone.add(fs.fsDir("/etc", strict=False))
+        clone.discard("/usr/bin/foo")
+        assert "/etc" in clone
+        assert "/usr/bin/foo" not in clone
+        assert len(clone) == len(cset)
+        # the original set is unaffected
+        assert "/etc" not in cset
+        assert "/usr/bin/foo" in cset
+        assert sorted(cset.clone(empty=True)) == []
+
+    def test_stale(self, contents_path):
+        with open(contents_path, "a") as f:
+            f.write("dir /etc\n")
+        assert PackedContents.load(contents_path) is None
+        cset = load_contents(contents_path)
+        assert isinstance(cset, ContentsFile)
+        assert "/etc" in cset
+
+    def test_invalid(self, tmp_path, contents_path):
+        os.unlink(f"{contents_path}.pack")
+        assert PackedContents.load(contents_path) is None
+        open(f"{contents_path}.pack", "w").close()
+        assert PackedContents.load(contents_path) is None
+        with open(f"{contents_path}.pack", "wb") as f:
+            f.write(b"garbage" * 10)
+        assert PackedContents.load(contents_path) is None
+        assert isinstance(load_contents(contents_path), ContentsFile)
+
+
+class TestVdb:
+    def test_load(self, tmp_path):
+        path = tmp_path / "vdb" / "cat" / "pkg-1"
+        path.mkdir(parents=True)
+        (path / "CONTENTS").write_text(CONTENTS)
+        repo = ondisk.tree(str(tmp_path / "vdb"), disable_cache=True)
+        assert isinstance(repo._internal_load_key(str(path), "contents"), ContentsFile)
+        stamp, paths = repo._owner_entry("cat/pkg-1")
+
+        contents_path = str(path / "CONTENTS")
+        write_packed_contents(contents_path, ContentsFile(contents_path))
+        cset = repo._internal_load_key(str(path), "contents")
+        assert isinstance(cset, PackedContentsSet)
+        assert cset.mutable
+        assert repo._owner_entry("cat/pkg-1")[0] == stamp
+        assert sorted(repo._owner_entry("cat/pkg-1")[1]) == sorted(paths)
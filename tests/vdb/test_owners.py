@@ -0,0 +1,129 @@
+import shutil
+
+import pytest
+from pkgcore.ebuild.cpv import VersionedCPV
+from pkgcore.ebuild.triggers import ProtectOwned
+from pkgcore.fs import fs
+from pkgcore.fs.contents import contentsSet
+from pkgcore.merge import errors
+from pkgcore.vdb import ondisk, owners
+
+CONTENTS = {
+    "cat/pkg-1": (
+        "dir /usr\n"
+        "dir /usr/bin\n"
+        "obj /usr/bin/foo d41d8cd98f00b204e9800998ecf8427e 1\n"
+        "sym /usr/bin/bar -> foo 1\n"
+    ),
+    "cat/other-2": (
+        "dir /usr\n"
+        "obj /usr/share/file with spaces d41d8cd98f00b204e9800998ecf8427e 1\n"
+    ),
+}
+
+
+def write_pkg(vdb, cpv, contents):
+    path = vdb / cpv
+    path.mkdir(parents=True)
+    (path / "CONTENTS").write_text(contents)
+
+
+class TestContentsPaths:
+    def test_parse(self, tmp_path):
+        path = tmp_path / "CONTENTS"
+        path.write_text(
+            "dir /usr//lib/\n"
+            "obj /usr/lib/a b d41d8cd98f00b204e9800998ecf8427e 10\n"
+            "sym /usr/lib/c -> a b 10\n"
+            "fif /run/fifo\n"
+            "\n"
+        )
+        assert list(owners.contents_paths(str(path))) == [
+            "/usr/lib",
+            "/usr/lib/a b",
+            "/usr/lib/c",
+            "/run/fifo",
+        ]
+
+    def test_unknown_entry(self, tmp_path):
+        path = tmp_path / "CONTENTS"
+        path.write_text("foo /usr\n")
+        with pytest.raises(ValueError):
+            list(owners.contents_paths(str(path)))
+
+
+class TestOwnerIndex:
+    @pytest.fixture
+    def vdb(self, tmp_path):
+        for cpv, contents in CONTENTS.items():
+            write_pkg(tmp_path / "vdb", cpv, contents)
+        return tmp_path / "vdb"
+
+    def mk_tree(self, vdb, tmp_path):
+        return ondisk.tree(str(vdb), cache_location=str(tmp_path / "cache"))
+
+    def test_owners(self, vdb, tmp_path):
+        repo = self.mk_tree(vdb, tmp_path)
+        assert repo.owners(["/usr/bin/bar", "/usr", "/nonexistent"]) == {
+            "/usr/bin/bar": {"cat/pkg-1"},
+            "/usr": {"cat/pkg-1", "cat/other-2"},
+        }
+        assert repo.owners_matching(lambda x: x.startswith("/usr/share")) == {
+            "cat/other-2"
+        }
+        # queries populate the stored index
+        assert (tmp_path / "cache" / "owners").exists()
+        assert list(repo.check_owner_index()) == []
+
+    def test_external_changes(self, vdb, tmp_path):
+        repo = self.mk_tree(vdb, tmp_path)
+        assert repo.owners(["/usr/bin/foo"]) == {"/usr/bin/foo": {"cat/pkg-1"}}
+        (vdb / "cat/pkg-1/CONTENTS").write_text("dir /opt\n")
+        assert list(repo.check_owner_index()) == ["cat/pkg-1: outdated entry"]
+        repo = self.mk_tree(vdb, tmp_path)
+        assert repo.owners(["/usr/bin/foo", "/opt"]) == {"/opt": {"cat/pkg-1"}}
+        assert list(repo.check_owner_index()) == []
+
+    def test_notify(self, vdb, tmp_path):
+        repo = self.mk_tree(vdb, tmp_path)
+        assert repo.rebuild_owner_index() == 2
+        write_pkg(
+            vdb, "cat/new-1", "obj /usr/bin/new d41d8cd98f00b204e9800998ecf8427e 1\n"
+        )
+        repo.notify_add_package(VersionedCPV("cat/new-1"))
+        assert list(repo.check_owner_index()) == []
+        assert repo.owners(["/usr/bin/new"]) == {"/usr/bin/new": {"cat/new-1"}}
+        shutil.rmtree(vdb / "cat/other-2")
+        repo.notify_remove_package(VersionedCPV("cat/other-2"))
+        assert list(repo.check_owner_index()) == []
+        assert repo.owners(["/usr"]) == {"/usr": {"cat/pkg-1"}}
+
+    def test_check(self, vdb, tmp_path):
+        repo = self.mk_tree(vdb, tmp_path)
+        assert sorted(repo.check_owner_index()) == [
+            "cat/other-2: not indexed",
+            "cat/pkg-1: not indexed",
+        ]
+        assert repo.operations.check_owner_index() == 2
+        assert repo.operations.rebuild_owner_index()
+        assert repo.operations.check_owner_index() == 0
+
+    def test_disabled_cache(self, vdb, tmp_path):
+        repo = ondisk.tree(str(vdb), disable_cache=True)
+        assert repo.owners(["/usr/bin/foo"]) == {"/usr/bin/foo": {"cat/pkg-1"}}
+
+    def test_protect_owned(self, vdb, tmp_path):
+        repo = self.mk_tree(vdb, tmp_path)
+        trigger = ProtectOwned([repo])
+        trigger.collision(contentsSet([fs.fsFile("/usr/lib/x", strict=False)]))
+        with pytest.raises(errors.BlockModification) as excinfo:
+            trigger.collision(
+                contentsSet(
+                    [
+                        fs.fsFile("/usr/bin/foo", strict=False),
+                        fs.fsFile("/usr/lib/x", strict=False),
+                    ]
+                )
+            )
+        assert "( file:/usr/bin/foo )" in str(excinfo.value)
+        assert "owned by 'cat/pkg-1'" in str(excinfo.value)